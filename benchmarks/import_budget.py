@@ -0,0 +1,92 @@
+"""
+Import-time and memory budget for resolving measurements.
+
+Each registered measurement is resolved through the registry and
+constructed in a fresh interpreter, as a short-lived cron-run probe
+would. The benchmark fails if any of them takes longer than
+`IMPORT_TIME_BUDGET_SECONDS`, peaks above `RSS_BUDGET_KIB`, or imports
+one of the `HEAVY_MODULES` before `measure()` is called.
+
+Usage:
+
+    $ python benchmarks/import_budget.py
+"""
+
+import json
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET_SECONDS = 0.3
+RSS_BUDGET_KIB = 32 * 1024
+HEAVY_MODULES = ("bs4", "requests", "scapy", "speedtest", "youtube_dl")
+
+MEASUREMENT_ARGS = {
+    "download_speed": {"urls": ["http://example.com/file"]},
+    "ip_route": {"hosts": ["127.0.0.1"]},
+    "latency": {"host": "127.0.0.1"},
+    "netflix_fast": {},
+    "speedtestdotnet": {},
+    "webpage_download": {"url": "http://example.com/"},
+    "youtube": {"url": "http://example.com/watch"},
+}
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+from measurement.registry import get_measurement
+measurement = get_measurement(sys.argv[1])("benchmark", **json.loads(sys.argv[2]))
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": sorted(
+        name for name in json.loads(sys.argv[3]) if name in sys.modules
+    ),
+}))
+"""
+
+
+def measure_import(name):
+    """Resolve and construct measurement `name` in a fresh interpreter."""
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            PROBE,
+            name,
+            json.dumps(MEASUREMENT_ARGS[name]),
+            json.dumps(HEAVY_MODULES),
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    failures = []
+    for name in sorted(MEASUREMENT_ARGS):
+        result = measure_import(name)
+        print(
+            "{name:<18} {elapsed:>7.1f} ms {rss:>8} KiB  heavy: {heavy}".format(
+                name=name,
+                elapsed=result["elapsed"] * 1000,
+                rss=result["max_rss_kib"],
+                heavy=", ".join(result["heavy_modules"]) or "-",
+            )
+        )
+        if result["elapsed"] > IMPORT_TIME_BUDGET_SECONDS:
+            failures.append("{name}: import time over budget".format(name=name))
+        if result["max_rss_kib"] > RSS_BUDGET_KIB:
+            failures.append("{name}: peak RSS over budget".format(name=name))
+        if result["heavy_modules"]:
+            failures.append("{name}: heavy modules imported".format(name=name))
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
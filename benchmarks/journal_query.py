@@ -0,0 +1,143 @@
+"""
+Time to query a window of a journal's history.
+
+`COUNT` results of three types are appended to a journal in a temporary
+directory with timestamps spread over `DAYS` days. The last day of
+`NetflixFastMeasurementResult`s is then queried with `JournalReader`,
+and compared against decoding every record of the journal. Indexing the
+segments when the reader is opened is timed separately. The benchmark
+fails if the query is not at least `SPEEDUP_BUDGET` times faster than
+the full pass, or returns different results.
+
+Usage:
+
+    $ python benchmarks/journal_query.py [--count 200000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Import the measurement package of this repository when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from measurement.journal import Journal, JournalReader
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.latency.results import LatencyMeasurementResult
+from measurement.plugins.netflix_fast.results import NetflixFastMeasurementResult
+from measurement.results import loads
+from measurement.units import NetworkUnit, RatioUnit, StorageUnit, TimeUnit
+
+COUNT = 200000
+DAYS = 90
+SPEEDUP_BUDGET = 10
+DAY = 24 * 60 * 60
+
+
+def make_result(index):
+    if index % 3 == 0:
+        return LatencyMeasurementResult(
+            id=str(index),
+            errors=[],
+            host="example.com",
+            minimum_latency=6.5,
+            average_latency=7.25,
+            maximum_latency=9.0,
+            median_deviation=0.5,
+            packets_transmitted=4,
+            packets_received=4,
+            packets_lost=0.0,
+            packets_lost_unit=RatioUnit.percentage,
+            elapsed_time=3003.0,
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+    if index % 3 == 1:
+        return DownloadSpeedMeasurementResult(
+            id=str(index),
+            errors=[],
+            url="http://example.com/file",
+            download_size=10.0,
+            download_size_unit=StorageUnit.megabyte,
+            download_rate=80.0,
+            download_rate_unit=NetworkUnit.megabit_per_second,
+        )
+    return NetflixFastMeasurementResult(
+        id=str(index),
+        errors=[],
+        download_rate=95.5,
+        download_rate_unit=NetworkUnit.megabit_per_second,
+        download_size=120.0,
+        download_size_unit=StorageUnit.megabyte,
+        asn="AS1221",
+        ip="203.0.113.1",
+        isp="Example ISP",
+        city="Sydney",
+        country="AU",
+        urlcount=3,
+        reason_terminated="fixed_duration",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=COUNT)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        end = time.time()
+        start = end - DAYS * DAY
+        with Journal(directory, sync_interval=60) as journal:
+            for index in range(args.count):
+                journal.append(
+                    make_result(index),
+                    timestamp=start + (end - start) * index / args.count,
+                )
+
+        full_start = time.perf_counter()
+        expected = []
+        for record in journal.records():
+            result = loads(record.payload.decode("utf-8"))
+            if record.timestamp >= end - DAY and isinstance(
+                result, NetflixFastMeasurementResult
+            ):
+                expected.append((record.timestamp, result))
+        full = time.perf_counter() - full_start
+
+        with JournalReader(directory) as reader:
+            index_start = time.perf_counter()
+            # Matches nothing, so only indexes the segments
+            list(reader.query(start=end + DAY))
+            indexing = time.perf_counter() - index_start
+            query_start = time.perf_counter()
+            results = list(reader.query(NetflixFastMeasurementResult, start=end - DAY))
+            query = time.perf_counter() - query_start
+    finally:
+        shutil.rmtree(directory)
+
+    print("full decode pass {full:>9.1f} ms".format(full=full * 1000))
+    print("index segments   {indexing:>9.1f} ms".format(indexing=indexing * 1000))
+    print(
+        "query last day   {query:>9.1f} ms ({count} results)".format(
+            query=query * 1000, count=len(results)
+        )
+    )
+    failures = []
+    if results != expected:
+        failures.append("query results differ from the full pass")
+    if query * SPEEDUP_BUDGET > full:
+        failures.append(
+            "query is less than {budget}x faster than the full pass".format(
+                budget=SPEEDUP_BUDGET
+            )
+        )
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
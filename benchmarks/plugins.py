@@ -0,0 +1,197 @@
+"""
+CPU, memory, wall time and throughput of each measurement against
+loopback stand-ins.
+
+Every measurement is run `--runs` times in a fresh interpreter against
+the stand-ins of `standins.py`, so that no network is used and the
+figures reflect the measurements' own overhead rather than the link. For
+each measurement the benchmark reports:
+
+ - the CPU time of the measuring process per run (`cpu`), and of the
+   subprocesses it spawned (`child cpu`),
+ - its peak RSS,
+ - the wall time per run,
+ - the highest download rate a result reported, i.e. the most the
+   measurement can observe on this machine.
+
+The stand-in server runs in the benchmark process so that serving does
+not count towards the figures. `ip_route` and `youtube` are not covered:
+they need raw sockets and a video site respectively.
+
+Usage:
+
+    $ python benchmarks/plugins.py [--runs 3] [--json results.json]
+    $ python benchmarks/plugins.py --baseline results.json [--tolerance 0.25]
+
+With `--baseline`, the benchmark fails if the CPU time or peak RSS of a
+measurement exceeds that of the baseline by more than `--tolerance`. It
+also fails if any measurement reports an error.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from standins import ADDRESS_ENV, STANDIN_HOST, StandInServer, write_fake_tools
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASUREMENT_ARGS = {
+    "download_speed": {
+        "urls": ["http://{host}/file/{size}".format(host=STANDIN_HOST, size=2**28)]
+    },
+    "latency": {"host": STANDIN_HOST},
+    "netflix_fast": {"urlcount": 3},
+    "speedtestdotnet": {},
+    "webpage_download": {"url": "http://{host}/page".format(host=STANDIN_HOST)},
+}
+# Regressions beyond this fraction of the baseline fail the benchmark
+DEFAULT_TOLERANCE = 0.25
+REGRESSION_KEYS = ("cpu_seconds", "max_rss_kib")
+
+
+def probe(name, runs, address):
+    """Run measurement `name` `runs` times and print its figures as JSON.
+
+    Runs in the fresh interpreter started by `measure_plugin`.
+    """
+    import resource
+    import time
+
+    from standins import redirect_hosts
+
+    from measurement.units import BIT_PER_SECOND_FACTORS
+    from measurement.registry import get_measurement
+
+    measurement_class = get_measurement(name)
+    wall_times = []
+    max_rate = None
+    errors = set()
+    start_cpu_time = time.process_time()
+    with redirect_hosts(address):
+        for _ in range(runs):
+            # Measurements such as `netflix_fast` are not reusable
+            measurement = measurement_class("benchmark", **MEASUREMENT_ARGS[name])
+            start = time.perf_counter()
+            results = measurement.measure()
+            wall_times.append(time.perf_counter() - start)
+            for result in results if isinstance(results, list) else [results]:
+                errors.update(error.key for error in result.errors)
+                rate = getattr(result, "download_rate", None)
+                factor = BIT_PER_SECOND_FACTORS.get(
+                    getattr(result, "download_rate_unit", None)
+                )
+                if rate is not None and factor is not None:
+                    max_rate = max(max_rate or 0, rate * factor)
+    cpu_time = time.process_time() - start_cpu_time
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(
+        json.dumps(
+            {
+                "cpu_seconds": cpu_time / runs,
+                "child_cpu_seconds": (children.ru_utime + children.ru_stime) / runs,
+                "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "wall_seconds": sum(wall_times) / runs,
+                "max_rate_bits_per_second": max_rate,
+                "errors": sorted(errors),
+            }
+        )
+    )
+
+
+def measure_plugin(name, runs, address, tools_dir):
+    """Benchmark measurement `name` in a fresh interpreter."""
+    env = dict(os.environ)
+    env["PATH"] = tools_dir + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO_ROOT
+    env[ADDRESS_ENV] = address
+    out = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--probe",
+            name,
+            "--runs",
+            str(runs),
+            "--address",
+            address,
+        ],
+        stdout=subprocess.PIPE,
+        env=env,
+        check=True,
+        universal_newlines=True,
+    )
+    return json.loads(out.stdout)
+
+
+def find_regressions(results, baseline, tolerance):
+    """Return a message for each figure over its baseline by `tolerance`."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        for key in REGRESSION_KEYS:
+            limit = baseline.get(name, {}).get(key)
+            if limit is not None and result[key] > limit * (1 + tolerance):
+                regressions.append(
+                    "{name}: {key} of {value:.3f} exceeds baseline of {limit:.3f}".format(
+                        name=name, key=key, value=result[key], limit=limit
+                    )
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--baseline", help="Compare against this results file.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--address", help=argparse.SUPPRESS)
+    parser.add_argument("names", nargs="*", default=sorted(MEASUREMENT_ARGS))
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        probe(args.probe, args.runs, args.address)
+        return 0
+
+    results = {}
+    with StandInServer() as server, tempfile.TemporaryDirectory() as tools_dir:
+        write_fake_tools(tools_dir)
+        for name in args.names:
+            result = measure_plugin(name, args.runs, server.address, tools_dir)
+            results[name] = result
+            rate = result["max_rate_bits_per_second"]
+            print(
+                "{name:<18} cpu {cpu:>8.1f} ms  child cpu {child:>8.1f} ms  "
+                "{rss:>8} KiB  wall {wall:>8.1f} ms  max {rate}".format(
+                    name=name,
+                    cpu=result["cpu_seconds"] * 1000,
+                    child=result["child_cpu_seconds"] * 1000,
+                    rss=result["max_rss_kib"],
+                    wall=result["wall_seconds"] * 1000,
+                    rate="-" if rate is None else "{0:.1f} Mbit/s".format(rate / 1e6),
+                )
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    failures = [
+        "{name}: reported {errors}".format(name=name, errors=", ".join(r["errors"]))
+        for name, r in sorted(results.items())
+        if r["errors"]
+    ]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += find_regressions(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Serialisation time of results.
+
+`COUNT` latency results are serialised one at a time with `dumps()` from
+`measurement.results`, and compared against converting equivalent
+dataclasses with `dataclasses.asdict` and serialising them with
+`json.dumps` and an encoder for units, as results were serialised before
+the codecs existed. The serialised results are then deserialised with
+`loads()` and checked against the originals. The benchmark fails if the
+JSON codec is not faster than the baseline, or a result does not
+round-trip.
+
+Usage:
+
+    $ python benchmarks/result_codec.py [--count 1000000]
+"""
+
+import argparse
+import dataclasses
+import enum
+import json
+import os
+import sys
+import time
+
+# Import the measurement package of this repository when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from measurement.plugins.latency.results import LatencyMeasurementResult
+from measurement.results import Error, dumps, loads
+from measurement.units import RatioUnit, TimeUnit
+
+COUNT = 1000000
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class UnitEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, enum.Enum):
+            return o.value
+        return super().default(o)
+
+
+def make_results(count):
+    errors = [Error(key="ping-err", description="", traceback="timeout")]
+    return [
+        LatencyMeasurementResult(
+            id=str(index),
+            errors=errors if index % 10 == 0 else [],
+            host="example.com",
+            minimum_latency=6.5,
+            average_latency=7.25 + index % 100,
+            maximum_latency=9.0,
+            median_deviation=0.5,
+            packets_transmitted=4,
+            packets_received=4,
+            packets_lost=0.0,
+            packets_lost_unit=RatioUnit.percentage,
+            elapsed_time=3003.0,
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+        for index in range(count)
+    ]
+
+
+def make_dataclasses(results):
+    error_type = dataclasses.make_dataclass("Error", Error._fields)
+    result_type = dataclasses.make_dataclass(
+        "LatencyMeasurementResult", LatencyMeasurementResult._fields
+    )
+    return [
+        result_type(
+            **dict(
+                result._asdict(),
+                errors=[error_type(*error._values(error)) for error in result.errors],
+            )
+        )
+        for result in results
+    ]
+
+
+def timed(function, values):
+    start = time.perf_counter()
+    output = [function(value) for value in values]
+    return time.perf_counter() - start, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=COUNT)
+    args = parser.parse_args()
+
+    results = make_results(args.count)
+    baseline, _ = timed(
+        lambda result: json.dumps(dataclasses.asdict(result), cls=UnitEncoder),
+        make_dataclasses(results),
+    )
+    encoding, data = timed(dumps, results)
+    decoding, decoded = timed(loads, data)
+    timings = [
+        ("asdict + json.dumps", baseline),
+        ("json dumps", encoding),
+        ("json loads", decoding),
+    ]
+    if msgpack is not None:
+        msgpack_encoding, msgpack_data = timed(
+            lambda result: dumps(result, codec="msgpack"), results
+        )
+        msgpack_decoding, _ = timed(
+            lambda data: loads(data, codec="msgpack"), msgpack_data
+        )
+        timings.append(("msgpack dumps", msgpack_encoding))
+        timings.append(("msgpack loads", msgpack_decoding))
+    for name, elapsed in timings:
+        print(
+            "{name:<20} {elapsed:>7.2f} s {per:>7.0f} ns/result".format(
+                name=name, elapsed=elapsed, per=elapsed / args.count * 10**9
+            )
+        )
+
+    failures = []
+    if encoding >= baseline:
+        failures.append("json dumps is not faster than asdict + json.dumps")
+    if decoded != results:
+        failures.append("results do not round-trip")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Per-object memory and construction time of result types.
+
+Each result type is constructed `COUNT` times and the memory retained per
+object is measured with `tracemalloc`, alongside that of the frozen
+dataclass with the same fields that result types used to be. The
+benchmark fails if any result type carries a `__dict__`, retains more
+than `OVERHEAD_BUDGET_BYTES` beyond one pointer per slot, or is slower
+than the dataclass to construct from keyword arguments.
+
+Usage:
+
+    $ python benchmarks/result_memory.py
+"""
+
+import dataclasses
+import os
+import sys
+import timeit
+import tracemalloc
+
+# Import the measurement package of this repository when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.latency.results import (
+    LatencyIndividualMeasurementResult,
+    LatencyMeasurementResult,
+)
+from measurement.plugins.netflix_fast.results import NetflixFastThreadResult
+from measurement.plugins.webpage_download.results import WebpageMeasurementResult
+
+COUNT = 100000
+REPEAT = 20
+POINTER_BYTES = 8
+# The object header and garbage collector links of an instance
+OVERHEAD_BUDGET_BYTES = 64
+
+RESULT_TYPES = (
+    LatencyMeasurementResult,
+    LatencyIndividualMeasurementResult,
+    DownloadSpeedMeasurementResult,
+    NetflixFastThreadResult,
+    WebpageMeasurementResult,
+)
+
+
+def _make_dataclass(result_type):
+    """Return a frozen dataclass with the fields of `result_type`."""
+    return dataclasses.make_dataclass(
+        "Dataclass" + result_type.__name__,
+        list(result_type._field_types.items()),
+        frozen=True,
+    )
+
+
+def _slot_count(result_type):
+    """Return the number of slots of `result_type`, including its bases'."""
+    return sum(len(base.__dict__.get("__slots__", ())) for base in result_type.__mro__)
+
+
+def measure_size(cls, fields):
+    """Return the bytes retained per object."""
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [cls(**fields) for _ in range(COUNT)]
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del objects
+    # Exclude the list holding the objects
+    return retained / COUNT - POINTER_BYTES
+
+
+def measure_construction(classes, fields):
+    """Return the nanoseconds each of `classes` takes to construct.
+
+    The classes are timed in turn, `REPEAT` times each, and the fastest
+    time of each is kept, so that other processes disturb them alike.
+    """
+    times = [[] for _ in classes]
+    for _ in range(REPEAT):
+        for cls, cls_times in zip(classes, times):
+            cls_times.append(
+                timeit.timeit(lambda: cls(**fields), number=COUNT // REPEAT)
+            )
+    return [min(cls_times) / (COUNT // REPEAT) * 10**9 for cls_times in times]
+
+
+def main():
+    failures = []
+    for result_type in RESULT_TYPES:
+        # Shared values, so only the objects themselves are measured
+        fields = {name: None for name in result_type._fields}
+        dataclass = _make_dataclass(result_type)
+        size = measure_size(result_type, fields)
+        dataclass_size = measure_size(dataclass, fields)
+        construction, dataclass_construction = measure_construction(
+            (result_type, dataclass), fields
+        )
+        print(
+            "{name:<36} {size:>6.0f} B {construction:>6.0f} ns  "
+            "(dataclass: {dataclass_size:>4.0f} B {dataclass_construction:>6.0f} "
+            "ns, -{reduction:.0%})".format(
+                name=result_type.__name__,
+                size=size,
+                construction=construction,
+                dataclass_size=dataclass_size,
+                dataclass_construction=dataclass_construction,
+                reduction=1 - size / dataclass_size,
+            )
+        )
+        if hasattr(result_type(**fields), "__dict__"):
+            failures.append("{name}: has a __dict__".format(name=result_type.__name__))
+        if size > _slot_count(result_type) * POINTER_BYTES + OVERHEAD_BUDGET_BYTES:
+            failures.append(
+                "{name}: size over budget".format(name=result_type.__name__)
+            )
+        if construction > dataclass_construction:
+            failures.append(
+                "{name}: slower than the dataclass".format(name=result_type.__name__)
+            )
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
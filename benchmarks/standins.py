@@ -0,0 +1,357 @@
+"""
+Loopback stand-ins for the services and tools the measurements use.
+
+`StandInServer` answers, on one loopback port, every request the
+measurements make of the outside world:
+
+ - `/file/<size>`: `size` bytes of payload, for wget and the fast.com
+   download targets.
+ - `/page` and `/assets/<name>`: a webpage with `PAGE_ASSET_COUNT` assets.
+ - `/`, `/app.js` and `/netflix/speedtest/v2`: the fast.com page, script
+   token and API.
+ - `/speedtest-config.php`, `/speedtest-servers-static.php` and
+   `/speedtest/...`: the speedtest.net configuration, server list and
+   test server.
+
+The measurements address these by their real host names, or by
+`STANDIN_HOST` where they need a host without a port, and
+`redirect_hosts()` rewrites those to the stand-in. `write_fake_tools()`
+writes `ping` and `wget` executables that do the same for subprocesses:
+`ping` prints a canned reply instantly and `wget` downloads from the
+stand-in, reporting in wget's format.
+"""
+
+import contextlib
+import json
+import os
+import re
+import stat
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, urlunsplit
+
+STANDIN_HOST = "standin.test"
+REDIRECTED_HOSTS = (
+    STANDIN_HOST,
+    "fast.com",
+    "api.fast.com",
+    "www.speedtest.net",
+    "c.speedtest.net",
+)
+# The environment variable the fake tools read the stand-in address from
+ADDRESS_ENV = "MEASUREMENT_STANDIN_ADDRESS"
+
+PAGE_ASSET_COUNT = 20
+ASSET_SIZE = 16 * 2**10
+CHUNK = b"\0" * (64 * 2**10)
+
+SPEEDTEST_CONFIG = """<?xml version="1.0" encoding="UTF-8"?>
+<settings>
+<client ip="127.0.0.1" lat="0" lon="0" isp="Loopback" isprating="3.7"
+    rating="0" ispdlavg="0" ispulavg="0" loggedin="0" country="LO"/>
+<server-config threadcount="2" ignoreids="" notonmap="" forcepingid=""
+    preferredserverid=""/>
+<download testlength="10" initialtest="250K" mintestsize="250K"
+    threadsperurl="1"/>
+<upload testlength="10" ratio="5" initialtest="0" mintestsize="32K"
+    threads="2" maxchunksize="512K" maxchunkcount="6" threadsperurl="4"/>
+</settings>
+"""
+SPEEDTEST_SERVERS = """<?xml version="1.0" encoding="UTF-8"?>
+<settings><servers>
+<server url="http://{address}/speedtest/upload.php" lat="0" lon="0"
+    name="Loopback" country="Local" cc="LO" sponsor="Benchmark" id="1"
+    host="{address}"/>
+</servers></settings>
+"""
+FAST_PAGE = '<html><body><script src="/app.js"></script></body></html>'
+FAST_SCRIPT = 'var config={token:"standin",urlCount:5};'
+FAST_LOCATION = {"city": "Loopback", "country": "LO"}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't delay the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path = parts.path
+        match = re.match(r"^/file/(\d+)$", path)
+        if match:
+            return self._send_payload(int(match.group(1)))
+        match = re.match(r"^/speedtest/random(\d+)x\d+\.jpg$", path)
+        if match:
+            # Roughly the size of speedtest.net's images
+            return self._send_payload(int(match.group(1)) ** 2 * 2)
+        if path.startswith("/assets/"):
+            return self._send_payload(ASSET_SIZE)
+        if path == "/page":
+            return self._send_body(_render_page(), "text/html")
+        if path == "/":
+            return self._send_body(FAST_PAGE, "text/html")
+        if path == "/app.js":
+            return self._send_body(FAST_SCRIPT, "application/javascript")
+        if path == "/netflix/speedtest/v2":
+            query = dict(
+                item.split("=", 1) for item in parts.query.split("&") if "=" in item
+            )
+            return self._send_body(
+                _render_fast_api(int(query.get("urlCount", 3)), self.server.file_size),
+                "application/json",
+            )
+        if path == "/speedtest-config.php":
+            return self._send_body(SPEEDTEST_CONFIG, "text/xml")
+        if path == "/speedtest-servers-static.php":
+            return self._send_body(
+                SPEEDTEST_SERVERS.format(address=self.server.address), "text/xml"
+            )
+        if path == "/speedtest/latency.txt":
+            return self._send_body("test=test", "text/plain")
+        self.send_error(404)
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/speedtest/upload.php":
+            self.send_error(404)
+            return
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            read = len(self.rfile.read(min(remaining, len(CHUNK))))
+            if not read:
+                break
+            remaining -= read
+        self._send_body(
+            "size={size}".format(size=self.headers.get("Content-Length", 0)),
+            "text/plain",
+        )
+
+    def _send_body(self, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_payload(self, size):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        try:
+            while size > 0:
+                self.wfile.write(CHUNK[:size])
+                size -= len(CHUNK)
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients such as the fast.com threads stop reading early
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(object):
+    """Serves every stand-in on one loopback port.
+
+    :param file_size: The size in bytes of each fast.com download
+    target.
+    """
+
+    def __init__(self, file_size=25 * 2**20):
+        self.file_size = file_size
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """The `host:port` the server is listening on."""
+        return "{0}:{1}".format(*self._server.server_address)
+
+    def start(self):
+        """Start serving on a background thread."""
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self._server.file_size = self.file_size
+        self._server.address = self.address
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _render_page():
+    assets = []
+    for i in range(PAGE_ASSET_COUNT):
+        if i % 3 == 0:
+            assets.append('<link rel="stylesheet" href="/assets/{i}.css">'.format(i=i))
+        elif i % 3 == 1:
+            assets.append('<img src="/assets/{i}.png">'.format(i=i))
+        else:
+            assets.append('<script src="/assets/{i}.js"></script>'.format(i=i))
+    return (
+        "<html><head><title>Stand-in</title></head><body>{assets}</body></html>".format(
+            assets="\n".join(assets)
+        )
+    )
+
+
+def _render_fast_api(url_count, file_size):
+    return json.dumps(
+        {
+            "client": {
+                "asn": "0",
+                "ip": "127.0.0.1",
+                "isp": "Loopback",
+                "location": FAST_LOCATION,
+            },
+            "targets": [
+                {
+                    "name": "http://{host}/file/{size}?target={i}".format(
+                        host=STANDIN_HOST, size=file_size, i=i
+                    ),
+                    "url": "http://{host}/file/{size}?target={i}".format(
+                        host=STANDIN_HOST, size=file_size, i=i
+                    ),
+                    "location": FAST_LOCATION,
+                }
+                for i in range(url_count)
+            ],
+        }
+    )
+
+
+def rewrite_url(url, address):
+    """Point `url` at the stand-in at `address` if its host is redirected."""
+    parts = urlsplit(url)
+    if parts.hostname not in REDIRECTED_HOSTS:
+        return url
+    return urlunsplit(("http", address) + tuple(parts[2:]))
+
+
+@contextlib.contextmanager
+def redirect_hosts(address):
+    """Redirect the HTTP requests of the measurements to the stand-in.
+
+    Patches `requests` and `speedtest` (where installed) so that requests
+    for any of `REDIRECTED_HOSTS` are sent to `address` instead.
+    """
+    patches = []
+    try:
+        import requests
+    except ImportError:
+        pass
+    else:
+        request = requests.Session.request
+
+        def redirected_request(self, method, url, *args, **kwargs):
+            return request(self, method, rewrite_url(url, address), *args, **kwargs)
+
+        patches.append((requests.Session, "request", redirected_request))
+    try:
+        import speedtest
+    except ImportError:
+        pass
+    else:
+        build_request = speedtest.build_request
+
+        def redirected_build_request(url, *args, **kwargs):
+            if url.startswith("://"):
+                url = "http" + url
+            return build_request(rewrite_url(url, address), *args, **kwargs)
+
+        patches.append((speedtest, "build_request", redirected_build_request))
+
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    for owner, name, replacement in patches:
+        setattr(owner, name, replacement)
+    try:
+        yield
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+
+FAKE_PING = r"""
+import sys
+
+count = int(sys.argv[sys.argv.index("-c") + 1]) if "-c" in sys.argv else 4
+host = sys.argv[-1]
+lines = ["PING {host} (127.0.0.1) 56(84) bytes of data.".format(host=host)]
+for seq in range(1, count + 1):
+    lines.append(
+        "64 bytes from localhost (127.0.0.1): icmp_seq={seq} ttl=64 "
+        "time=0.0{seq} ms".format(seq=seq % 10)
+    )
+lines += [
+    "",
+    "--- {host} ping statistics ---".format(host=host),
+    "{count} packets transmitted, {count} received, 0% packet loss, "
+    "time {time}ms".format(count=count, time=(count - 1) * 1000),
+    "rtt min/avg/max/mdev = 0.010/0.025/0.040/0.011 ms",
+    "",
+]
+sys.stdout.write("\n".join(lines))
+"""
+
+FAKE_WGET = r"""
+import os, sys, time
+from urllib.request import urlopen
+
+sys.path.insert(0, {benchmarks_dir!r})
+from standins import ADDRESS_ENV, rewrite_url
+
+url = rewrite_url(sys.argv[-1], os.environ[ADDRESS_ENV])
+start = time.perf_counter()
+size = 0
+with urlopen(url) as response:
+    while True:
+        chunk = response.read(2 ** 16)
+        if not chunk:
+            break
+        size += len(chunk)
+rate = size / max(time.perf_counter() - start, 1e-9) / 2 ** 10
+# wget reports in KB/s or MB/s, the units the measurement understands
+unit = "KB/s"
+if rate >= 2 ** 10:
+    rate, unit = rate / 2 ** 10, "MB/s"
+sys.stderr.write(
+    "Saving to: '/dev/null'\n\n"
+    "{{date}} ({{rate:.1f}} {{unit}}) - '/dev/null' saved [{{size}}/{{size}}]\n\n".format(
+        date=time.strftime("%Y-%m-%d %H:%M:%S"), rate=rate, unit=unit, size=size
+    )
+)
+"""
+
+
+def write_fake_tools(directory):
+    """Write fake `ping` and `wget` executables into `directory`.
+
+    Prepend `directory` to `PATH` and set `ADDRESS_ENV` to the stand-in
+    address in the environment of the measurements to use them.
+    """
+    benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+    for name, source in (
+        ("ping", FAKE_PING),
+        ("wget", FAKE_WGET.format(benchmarks_dir=benchmarks_dir)),
+    ):
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write("#!{python}\n".format(python=sys.executable) + source)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
@@ -0,0 +1,202 @@
+"""
+Command line entry point.
+
+    $ python -m measurement daemon schedule.json [--workers 2] [--metrics-port 9357] [--journal DIR] [--history PATH] [--tracebacks DIR]
+    $ python -m measurement trigger <job> [--wait]
+    $ python -m measurement jobs
+    $ python -m measurement record <corpus> <measurement> [--args JSON]
+    $ python -m measurement replay <corpus>... [--repeat N] [--output PATH] [--compare PATH]
+"""
+
+import argparse
+import json
+import signal
+import sys
+
+from measurement.daemon import (
+    DEFAULT_SOCKET_PATH,
+    MeasurementDaemon,
+    load_schedule,
+    send_command,
+    summarise_results,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m measurement")
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help="The Unix socket the daemon listens for commands on.",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    daemon_parser = subparsers.add_parser(
+        "daemon", help="Run the measurements of a schedule file."
+    )
+    daemon_parser.add_argument("schedule", help="The path of a JSON schedule file.")
+    daemon_parser.add_argument(
+        "--workers", type=int, default=2, help="The number of worker processes."
+    )
+    daemon_parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics of the results on this port.",
+    )
+    daemon_parser.add_argument(
+        "--journal", help="Append the results to a journal in this directory."
+    )
+    daemon_parser.add_argument(
+        "--history", help="Insert the results into a SQLite history at this path."
+    )
+    daemon_parser.add_argument(
+        "--tracebacks",
+        help="Keep the full text of capped error tracebacks in this directory.",
+    )
+
+    trigger_parser = subparsers.add_parser(
+        "trigger", help="Run a job of a running daemon now."
+    )
+    trigger_parser.add_argument("job", help="The name of the job.")
+    trigger_parser.add_argument(
+        "--wait", action="store_true", help="Wait for the run to complete."
+    )
+
+    subparsers.add_parser("jobs", help="List the jobs of a running daemon.")
+
+    record_parser = subparsers.add_parser(
+        "record", help="Run a measurement, recording its exchanges to a corpus."
+    )
+    record_parser.add_argument("corpus", help="The corpus to append to.")
+    record_parser.add_argument(
+        "measurement", help="The registered name or import path of a measurement."
+    )
+    record_parser.add_argument(
+        "--args",
+        default="{}",
+        help="The keyword arguments of the measurement as a JSON object.",
+    )
+
+    replay_parser = subparsers.add_parser(
+        "replay", help="Replay corpora through the measurement parsers."
+    )
+    replay_parser.add_argument("corpus", nargs="+", help="The corpora to replay.")
+    replay_parser.add_argument(
+        "--repeat", type=int, default=1, help="Replay the corpora this many times."
+    )
+    replay_parser.add_argument("--output", help="Write the parsed outputs to a file.")
+    replay_parser.add_argument(
+        "--compare", help="Compare the parsed outputs with those of a file."
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "daemon":
+        return run_daemon(args)
+    if args.command == "record":
+        return run_record(args)
+    if args.command == "replay":
+        return run_replay(args)
+    if args.command == "trigger":
+        command = {"command": "run", "job": args.job, "wait": args.wait}
+    else:
+        command = {"command": "jobs"}
+    reply = send_command(command, socket_path=args.socket)
+    print(json.dumps(reply))
+    return 0 if reply["status"] == "ok" else 1
+
+
+def run_daemon(args):
+    try:
+        jobs = load_schedule(args.schedule)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    exporter = None
+    if args.metrics_port is not None:
+        from measurement.exporter import MetricsExporter, MetricsServer
+
+        exporter = MetricsExporter()
+        MetricsServer(exporter, port=args.metrics_port).start()
+
+    journal = None
+    if args.journal is not None:
+        from measurement.journal import Journal
+
+        journal = Journal(args.journal)
+    history = None
+    if args.history is not None:
+        from measurement.history import HistoryStore
+
+        history = HistoryStore(args.history)
+    if args.tracebacks is not None:
+        from measurement.tracebacks import TracebackStore, configure
+
+        configure(store=TracebackStore(args.tracebacks))
+
+    def on_results(job, results):
+        if journal is not None:
+            journal.append(results)
+        if history is not None:
+            history.insert(results)
+        if exporter is not None:
+            exporter.update(results)
+        print(
+            json.dumps({"job": job.name, "results": summarise_results(results)}),
+            flush=True,
+        )
+
+    daemon = MeasurementDaemon(
+        jobs,
+        workers=args.workers,
+        socket_path=args.socket,
+        on_results=on_results,
+        traceback_directory=args.tracebacks,
+    )
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    try:
+        daemon.run_forever()
+    finally:
+        if journal is not None:
+            journal.close()
+        if history is not None:
+            history.close()
+    return 0
+
+
+def run_record(args):
+    from measurement.registry import get_measurement
+    from measurement.replay import Recorder
+
+    measurement = get_measurement(args.measurement)("record", **json.loads(args.args))
+    with Recorder(args.corpus):
+        results = measurement.measure()
+    print(json.dumps(summarise_results(results)))
+    return 0
+
+
+def run_replay(args):
+    from measurement.replay import replay_corpus
+
+    report = replay_corpus(
+        args.corpus, repeat=args.repeat, output=args.output, compare=args.compare
+    )
+    total = sum(report.counts.values())
+    for kind, count in sorted(report.counts.items()):
+        print("{kind:<14} {count:>10}".format(kind=kind, count=count))
+    print(
+        "{total} records in {elapsed:.3f} s ({rate:.0f} records/s)".format(
+            total=total,
+            elapsed=report.elapsed,
+            rate=total / report.elapsed if report.elapsed else 0,
+        )
+    )
+    for mismatch in report.mismatches:
+        print(mismatch, file=sys.stderr)
+    return 1 if report.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
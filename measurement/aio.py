@@ -0,0 +1,246 @@
+"""
+Asyncio primitives shared by the measurement plugins.
+
+These helpers mirror the blocking calls used by the synchronous
+`measure()` implementations (`subprocess.run` and `requests.get`) so
+that a plugin's `measure_async()` can reuse the same output parsing:
+
+ - `run_subprocess` returns a `subprocess.CompletedProcess` and raises
+   `subprocess.TimeoutExpired`, exactly like `subprocess.run`.
+ - `http_get` returns an `HTTPResponse` exposing `status_code`, `text`
+   and `content` in the same way as a `requests.Response`.
+
+Only the standard library is used, so one event loop can drive many
+measurements without a thread per measurement.
+"""
+
+import asyncio
+import collections
+import functools
+import ssl
+import subprocess
+import sys
+
+from six.moves.urllib.parse import urljoin, urlparse
+
+HTTP_REDIRECT_CODES = (301, 302, 303, 307, 308)
+HTTP_DEFAULT_PORTS = {"http": 80, "https": 443}
+# Before Python 3.8, an asyncio subprocess needs a child watcher attached
+# to its loop, which only the default loop of the main thread can have,
+# so subprocesses are run in an executor instead
+THREADED_SUBPROCESSES = sys.version_info < (3, 8)
+
+
+class HTTPResponse(
+    collections.namedtuple("HTTPResponse", "url status_code headers content")
+):
+    """The response to an `http_get` request.
+
+    :param url: The URL that produced the response, after redirects.
+    :param status_code: The integer HTTP status code.
+    :param headers: A dict of response headers with lower-cased keys.
+    :param content: The response body as bytes.
+    """
+
+    __slots__ = ()
+
+    @property
+    def encoding(self):
+        content_type = self.headers.get("content-type", "")
+        for param in content_type.split(";")[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "charset" and value:
+                return value.strip('"')
+        return "utf-8"
+
+    @property
+    def text(self):
+        try:
+            return self.content.decode(self.encoding, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+def run(coroutine):
+    """Run `coroutine` to completion on a new event loop.
+
+    A Python 3.5 compatible equivalent of `asyncio.run`, which may be
+    called from any thread, as `run_subprocess` needs no child watcher.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def run_subprocess(args, timeout=None):
+    """Run a command without blocking the event loop.
+
+    :param args: The command and its arguments.
+    :param timeout: The number of seconds to wait for the command to
+    exit, or `None` to wait indefinitely.
+    :return: A `subprocess.CompletedProcess` with decoded `stdout` and
+    `stderr`.
+    :raises subprocess.TimeoutExpired: If the command is still running
+    after `timeout` seconds. The command is killed before raising, and
+    the output it printed until then is attached to the exception as
+    bytes.
+    """
+    if THREADED_SUBPROCESSES:
+        process = await asyncio.get_event_loop().run_in_executor(
+            None,
+            functools.partial(
+                subprocess.run,
+                args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+            ),
+        )
+        stdout, stderr = process.stdout, process.stderr
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # Read as it is printed, to keep the output if the command is killed
+        stdout, stderr = bytearray(), bytearray()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    _read_into(process.stdout, stdout),
+                    _read_into(process.stderr, stderr),
+                    process.wait(),
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(
+                args, timeout, output=bytes(stdout), stderr=bytes(stderr)
+            )
+    return subprocess.CompletedProcess(
+        args=args,
+        returncode=process.returncode,
+        stdout=stdout.decode(errors="replace"),
+        stderr=stderr.decode(errors="replace"),
+    )
+
+
+async def _read_into(stream, buffer):
+    while True:
+        data = await stream.read(65536)
+        if not data:
+            return
+        buffer.extend(data)
+
+
+async def http_get(url, headers=None, timeout=None, max_redirects=5):
+    """Perform an HTTP GET request without blocking the event loop.
+
+    Redirects are followed up to `max_redirects` times.
+
+    :param url: The http or https URL to request.
+    :param headers: Additional request headers.
+    :param timeout: The number of seconds allowed for the whole request,
+    or `None` to wait indefinitely.
+    :param max_redirects: The number of redirects to follow.
+    :return: An `HTTPResponse`.
+    :raises ValueError: If `url` is not an http or https URL.
+    :raises OSError: If the connection fails, or a `ConnectionError` if
+    the response is malformed or cut short.
+    :raises asyncio.TimeoutError: If `timeout` expires.
+    """
+    return await asyncio.wait_for(_http_get(url, headers or {}, max_redirects), timeout)
+
+
+async def _http_get(url, headers, max_redirects):
+    for _ in range(max_redirects + 1):
+        response = await _http_request(url, headers)
+        location = response.headers.get("location")
+        if response.status_code not in HTTP_REDIRECT_CODES or not location:
+            return response
+        url = urljoin(url, location)
+    return response
+
+
+async def _http_request(url, headers):
+    parsed = urlparse(url)
+    if parsed.scheme not in HTTP_DEFAULT_PORTS or not parsed.hostname:
+        raise ValueError("`{url}` is not a valid http url".format(url=url))
+
+    ssl_context = ssl.create_default_context() if parsed.scheme == "https" else None
+    port = parsed.port or HTTP_DEFAULT_PORTS[parsed.scheme]
+    reader, writer = await asyncio.open_connection(
+        parsed.hostname, port, ssl=ssl_context
+    )
+    try:
+        path = parsed.path or "/"
+        if parsed.query:
+            path = "{path}?{query}".format(path=path, query=parsed.query)
+        request_headers = {
+            "host": parsed.netloc,
+            "accept-encoding": "identity",
+            "connection": "close",
+        }
+        request_headers.update((k.lower(), v) for k, v in headers.items())
+        request = "GET {path} HTTP/1.1\r\n".format(path=path) + "".join(
+            "{k}: {v}\r\n".format(k=k, v=v) for k, v in request_headers.items()
+        )
+        writer.write((request + "\r\n").encode("latin-1"))
+
+        status_line = await reader.readline()
+        try:
+            status_code = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise ConnectionError(
+                "Invalid HTTP status line: {line!r}".format(line=status_line)
+            )
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in response_headers.get("transfer-encoding", "").lower():
+            content = await _read_chunked(reader)
+        elif "content-length" in response_headers:
+            content = await _read_exactly(
+                reader, int(response_headers["content-length"])
+            )
+        else:
+            content = await reader.read()
+    finally:
+        writer.close()
+
+    return HTTPResponse(
+        url=url, status_code=status_code, headers=response_headers, content=content
+    )
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        size = int(size_line.split(b";")[0].strip() or b"0", 16)
+        if size == 0:
+            # Discard any trailers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await _read_exactly(reader, size))
+        await reader.readline()
+
+
+async def _read_exactly(reader, size):
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError as e:
+        # Not an `OSError`, as the errors of `requests` are
+        raise ConnectionError(
+            "Incomplete HTTP response: {received} of {expected} bytes "
+            "received".format(received=len(e.partial), expected=e.expected)
+        )
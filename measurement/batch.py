@@ -0,0 +1,406 @@
+"""
+Columnar storage of many results of one type.
+
+A `ResultBatch` stores each field of its result type as a column, chosen
+from the type the field is declared with:
+
+ - `float` and `int` fields are contiguous `array.array`s of doubles and
+   64-bit integers, with a byte per row flagging `None` values.
+ - Unit (`Enum`) fields are 8-bit codes indexing the members of the
+   unit, with `-1` for `None`.
+ - `str` fields, such as `host` and `url`, are 32-bit codes indexing a
+   table of the column's distinct strings, so each string is stored once.
+ - Any other field, such as `errors`, is a list of the values.
+
+A value that does not fit its column's type, e.g. a string in a `float`
+field, turns that column into a list so that no value is lost. Numbers
+are stored as the column's type, so an `int` in a `float` field is read
+back as an equal `float`.
+
+    >>> batch = ResultBatch.from_results(latency_results)
+    >>> columns = batch.to_numpy()
+    >>> columns["average_latency"].mean()
+
+`normalise()` returns a copy of a batch with each field that has a
+`*_unit` field converted to the canonical unit of its kind, e.g. bit/s,
+in one pass over each column, which is vectorised if numpy is installed.
+
+`to_numpy()` and `to_arrow()` share the memory of the numeric and code
+columns rather than copying it, and require numpy and pyarrow
+respectively to be installed. While arrays exported by `to_numpy()` are
+alive the batch cannot be extended. `to_arrow().to_pandas()` gives a
+pandas `DataFrame` with categorical unit and string columns.
+"""
+
+import array
+import collections
+import enum
+import math
+
+from measurement.results import unwrap_optional
+from measurement.units import CANONICAL_UNITS, convert, convert_codes, get_unit_fields
+
+FLOAT = "float"
+INT = "int"
+ENUM = "enum"
+STRING = "string"
+OBJECT = "object"
+
+# The typecodes of the numeric and code columns, which are fixed-width
+# on every platform Python supports
+FLOAT_TYPECODE = "d"
+INT_TYPECODE = "q"
+ENUM_TYPECODE = "b"
+STRING_TYPECODE = "i"
+
+
+class _NumberColumn(object):
+    def __init__(self, kind):
+        self.kind = kind
+        self.values = array.array(FLOAT_TYPECODE if kind == FLOAT else INT_TYPECODE)
+        # 1 where the value is `None`
+        self.nulls = bytearray()
+        self.null_count = 0
+
+    def append(self, value):
+        if value is None:
+            self.values.append(math.nan if self.kind == FLOAT else 0)
+            self.nulls.append(1)
+            self.null_count += 1
+            return True
+        if isinstance(value, bool) or not isinstance(
+            value, (int, float) if self.kind == FLOAT else int
+        ):
+            return False
+        try:
+            self.values.append(value)
+        except OverflowError:
+            # e.g. an int of 2 ** 63 or more
+            return False
+        self.nulls.append(0)
+        return True
+
+    def __getitem__(self, index):
+        return None if self.nulls[index] else self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class _CodeColumn(object):
+    def __init__(self, kind, categories=None):
+        self.kind = kind
+        self.categories = list(categories or [])
+        self._codes_by_category = {c: i for i, c in enumerate(self.categories)}
+        self.codes = array.array(ENUM_TYPECODE if kind == ENUM else STRING_TYPECODE)
+        self.null_count = 0
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            self.null_count += 1
+            return True
+        code = self._codes_by_category.get(value)
+        if code is None:
+            # Enum columns only hold the members of their unit
+            if self.kind == ENUM or not isinstance(value, str):
+                return False
+            code = len(self.categories)
+            self.categories.append(value)
+            self._codes_by_category[value] = code
+        self.codes.append(code)
+        return True
+
+    def __getitem__(self, index):
+        code = self.codes[index]
+        return None if code < 0 else self.categories[code]
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class _ObjectColumn(object):
+    kind = OBJECT
+    null_count = 0
+
+    def __init__(self, values=()):
+        self.values = list(values)
+
+    def append(self, value):
+        self.values.append(value)
+        return True
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ResultBatch(object):
+    """Stores results of one type as a column per field.
+
+    :param result_type: The type of the results, e.g.
+    `LatencyMeasurementResult`.
+    :param results: Results of `result_type` to add to the batch.
+    """
+
+    def __init__(self, result_type, results=()):
+        self.result_type = result_type
+        self._columns = collections.OrderedDict(
+            (name, _make_column(field_type))
+            for name, field_type in result_type._field_types.items()
+        )
+        self._length = 0
+        self.extend(results)
+
+    @classmethod
+    def from_results(cls, results):
+        """Return a batch of `results`, which must all be of one type."""
+        results = list(results)
+        if not results:
+            raise ValueError("At least one result must be provided.")
+        return cls(type(results[0]), results)
+
+    @property
+    def fields(self):
+        """The names of the fields, in order."""
+        return tuple(self._columns)
+
+    def append(self, result):
+        """Add a result to the end of the batch."""
+        if type(result) is not self.result_type:
+            raise ValueError(
+                "A {type} cannot be added to a batch of {result_type}.".format(
+                    type=type(result).__name__,
+                    result_type=self.result_type.__name__,
+                )
+            )
+        for name, value in zip(self._columns, result._values(result)):
+            column = self._columns[name]
+            if not column.append(value):
+                column = self._columns[name] = _ObjectColumn(
+                    [column[index] for index in range(len(column))]
+                )
+                column.append(value)
+        self._length += 1
+
+    def extend(self, results):
+        """Add each of `results` to the end of the batch."""
+        for result in results:
+            self.append(result)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("batch index out of range")
+        return self.result_type(*[column[index] for column in self._columns.values()])
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def column(self, name):
+        """Return the values of field `name` as a list."""
+        column = self._columns[name]
+        return [column[index] for index in range(self._length)]
+
+    def kind(self, name):
+        """Return how field `name` is stored: `"float"`, `"int"`, `"enum"`,
+        `"string"` or `"object"`."""
+        return self._columns[name].kind
+
+    def categories(self, name):
+        """Return the values the codes of an `"enum"` or `"string"` field
+        index."""
+        return list(self._columns[name].categories)
+
+    def normalise(self):
+        """Return a copy of the batch with each field that has a `*_unit`
+        field converted to the canonical unit of its kind.
+
+        Values without a unit are left unchanged. Converted `int` fields
+        become `float` fields.
+        """
+        batch = ResultBatch(self.result_type)
+        batch._length = self._length
+        for name, column in self._columns.items():
+            batch._columns[name] = _copy_column(column)
+        for name, unit_name in get_unit_fields(self.result_type):
+            units = self._columns[unit_name]
+            unit_type = type(units.categories[0]) if units.kind == ENUM else None
+            if unit_type not in CANONICAL_UNITS:
+                # Not a unit field, or holding values that are not units
+                continue
+            canonical = units.categories.index(CANONICAL_UNITS[unit_type])
+            column = self._columns[name]
+            if column.kind in (FLOAT, INT):
+                values = _NumberColumn(FLOAT)
+                values.values = _convert_codes(column.values, units.codes, unit_type)
+                values.nulls = bytearray(column.nulls)
+                values.null_count = column.null_count
+            else:
+                values = _ObjectColumn(
+                    (
+                        convert(column[index], units[index])
+                        if column[index] is not None and units[index] is not None
+                        else column[index]
+                    )
+                    for index in range(len(column))
+                )
+            batch._columns[name] = values
+            batch._columns[unit_name].codes = array.array(
+                ENUM_TYPECODE, [canonical if code >= 0 else -1 for code in units.codes]
+            )
+        return batch
+
+    def to_numpy(self):
+        """Return an ordered dict of a numpy array per field.
+
+        `float` fields are `float64` arrays with `nan` for `None`, and
+        `int` fields are `int64` arrays, masked where `None`. `enum` and
+        `string` fields are arrays of their codes, with `-1` for `None`,
+        which index `categories(name)`. These share the batch's memory.
+        Other fields are copied into arrays of objects.
+        """
+        import numpy
+
+        arrays = collections.OrderedDict()
+        for name, column in self._columns.items():
+            if column.kind == FLOAT:
+                arrays[name] = numpy.frombuffer(column.values, dtype=numpy.float64)
+            elif column.kind == INT:
+                values = numpy.frombuffer(column.values, dtype=numpy.int64)
+                if column.null_count:
+                    values = numpy.ma.MaskedArray(
+                        values, mask=numpy.frombuffer(column.nulls, dtype=numpy.bool_)
+                    )
+                arrays[name] = values
+            elif column.kind in (ENUM, STRING):
+                arrays[name] = numpy.frombuffer(
+                    column.codes,
+                    dtype=numpy.int8 if column.kind == ENUM else numpy.int32,
+                )
+            else:
+                values = numpy.empty(len(column), dtype=object)
+                values[:] = column.values
+                arrays[name] = values
+        return arrays
+
+    def to_arrow(self):
+        """Return a `pyarrow.Table` with a column per field.
+
+        `float` and `int` fields share the batch's memory, with nulls for
+        `None`. `enum` and `string` fields are dictionary arrays of the
+        unit values and strings, sharing the batch's codes. `errors` is a
+        list of the error keys of each result, and other fields are
+        converted by pyarrow.
+        """
+        import pyarrow
+
+        arrays = []
+        for name, column in self._columns.items():
+            if column.kind in (FLOAT, INT):
+                arrays.append(
+                    pyarrow.Array.from_buffers(
+                        pyarrow.float64() if column.kind == FLOAT else pyarrow.int64(),
+                        len(column),
+                        [
+                            _validity_bitmap(pyarrow, column.nulls, column.null_count),
+                            pyarrow.py_buffer(column.values),
+                        ],
+                        null_count=column.null_count,
+                    )
+                )
+            elif column.kind in (ENUM, STRING):
+                nulls = bytearray(code < 0 for code in column.codes)
+                indices = pyarrow.Array.from_buffers(
+                    pyarrow.int8() if column.kind == ENUM else pyarrow.int32(),
+                    len(column),
+                    [
+                        _validity_bitmap(pyarrow, nulls, column.null_count),
+                        pyarrow.py_buffer(column.codes),
+                    ],
+                    null_count=column.null_count,
+                )
+                dictionary = pyarrow.array(
+                    [
+                        c.value if isinstance(c, enum.Enum) else c
+                        for c in column.categories
+                    ],
+                    type=pyarrow.string(),
+                )
+                arrays.append(pyarrow.DictionaryArray.from_arrays(indices, dictionary))
+            elif name == "errors":
+                arrays.append(
+                    pyarrow.array(
+                        [
+                            [error.key for error in errors or []]
+                            for errors in column.values
+                        ],
+                        type=pyarrow.list_(pyarrow.string()),
+                    )
+                )
+            else:
+                arrays.append(pyarrow.array(column.values))
+        return pyarrow.Table.from_arrays(arrays, names=list(self._columns))
+
+
+def _make_column(field_type):
+    field_type = unwrap_optional(field_type)
+    if field_type is float:
+        return _NumberColumn(FLOAT)
+    if field_type is int:
+        return _NumberColumn(INT)
+    if field_type is str:
+        return _CodeColumn(STRING)
+    if isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+        return _CodeColumn(ENUM, categories=list(field_type))
+    return _ObjectColumn()
+
+
+def _copy_column(column):
+    if column.kind in (FLOAT, INT):
+        copy = _NumberColumn(column.kind)
+        copy.values = array.array(column.values.typecode, column.values)
+        copy.nulls = bytearray(column.nulls)
+        copy.null_count = column.null_count
+    elif column.kind in (ENUM, STRING):
+        copy = _CodeColumn(column.kind, column.categories)
+        copy.codes = array.array(column.codes.typecode, column.codes)
+        copy.null_count = column.null_count
+    else:
+        copy = _ObjectColumn(column.values)
+    return copy
+
+
+def _convert_codes(values, codes, unit_type):
+    """Convert a column of numbers with a column of unit codes to the
+    canonical unit, as an array of doubles."""
+    try:
+        import numpy
+    except ImportError:
+        return convert_codes(values, codes, unit_type)
+    dtype = numpy.float64 if values.typecode == FLOAT_TYPECODE else numpy.int64
+    result = convert_codes(
+        numpy.frombuffer(values, dtype=dtype),
+        numpy.frombuffer(codes, dtype=numpy.int8),
+        unit_type,
+    )
+    converted = array.array(FLOAT_TYPECODE)
+    converted.frombytes(result.astype(numpy.float64).tobytes())
+    return converted
+
+
+def _validity_bitmap(pyarrow, nulls, null_count):
+    if not null_count:
+        return None
+    bitmap = bytearray((len(nulls) + 7) // 8)
+    for index, null in enumerate(nulls):
+        if not null:
+            bitmap[index >> 3] |= 1 << (index & 7)
+    return pyarrow.py_buffer(bitmap)
@@ -0,0 +1,538 @@
+"""
+A long-running measurement daemon.
+
+`MeasurementDaemon` runs the jobs of a schedule on jittered intervals in
+a pool of worker processes that are kept warm between runs, so each run
+skips interpreter startup and the import of the measurement and its
+`deferred_imports`. Each run constructs a fresh measurement, so no state
+is carried between runs. Exclusive measurements are given the link to
+themselves as in `MeasurementRunner`.
+
+A schedule is a JSON file listing the jobs to run:
+
+    {
+        "jobs": [
+            {
+                "name": "latency-cloudflare",
+                "measurement": "latency",
+                "args": {"id": "1", "host": "1.1.1.1"},
+                "interval": 300,
+                "jitter": 30,
+                "deadline": 60
+            }
+        ]
+    }
+
+ - `measurement` is a registered measurement name, or an import path of
+   the form `"package.module:ClassName"`.
+ - `args` are the keyword arguments the measurement is constructed with.
+ - `interval` is the number of seconds between runs, and each run is
+   moved earlier or later by up to `jitter` seconds (default `0`).
+ - `deadline` optionally bounds each run, in seconds, including the time
+   it waits for the link. A run still waiting when it expires is reported
+   with a `runner-timeout` error.
+
+The daemon listens on a Unix socket for commands, one JSON object per
+line, which `send_command` sends. The socket is created in the user's
+runtime directory, `$XDG_RUNTIME_DIR`, or otherwise in a directory of the
+temporary directory that only the user may access:
+
+ - `{"command": "run", "job": "<name>", "wait": false}` runs a job now.
+   With `"wait": true` the reply is sent once the run completes.
+ - `{"command": "jobs"}` lists the scheduled jobs.
+
+Usage:
+
+    $ python -m measurement daemon schedule.json
+    $ python -m measurement trigger latency-cloudflare --wait
+"""
+
+import collections
+import errno
+import heapq
+import importlib
+import json
+import math
+import os
+import random
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from measurement.deadline import Deadline
+from measurement.registry import get_measurement
+from measurement.results import Error, MeasurementResult
+from measurement.runner import LinkLock, RUNNER_ERRORS
+from measurement.timing import Stopwatch, attach_timing
+from measurement.tracebacks import (
+    TracebackStore,
+    cap_traceback,
+    configure as configure_tracebacks,
+    get_store as get_traceback_store,
+)
+
+# A directory for the socket when the user has no runtime directory
+PRIVATE_SOCKET_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), "measurement-{uid}".format(uid=os.getuid())
+)
+DEFAULT_SOCKET_PATH = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or PRIVATE_SOCKET_DIRECTORY,
+    "measurement-daemon.sock",
+)
+
+
+class Job(
+    collections.namedtuple("Job", "name measurement args interval jitter deadline")
+):
+    """A measurement run on an interval.
+
+    :param name: A unique name for the job.
+    :param measurement: A registered measurement name, or an import
+    path of the form `"package.module:ClassName"`.
+    :param args: A dict of keyword arguments to construct the
+    measurement with.
+    :param interval: The number of seconds between runs.
+    :param jitter: The maximum number of seconds each run is moved
+    earlier or later by.
+    :param deadline: The number of seconds each run may take, or `None`.
+    """
+
+    __slots__ = ()
+
+
+Job.__new__.__defaults__ = (0, None)
+
+
+def load_schedule(path):
+    """Load and validate the jobs of a schedule file.
+
+    :param path: The path of a JSON schedule file.
+    :return: A list of `Job`.
+    :raises ValueError: If the schedule is invalid.
+    """
+    with open(path) as f:
+        try:
+            schedule = json.load(f)
+        except ValueError as e:
+            raise ValueError(
+                "`{path}` is not a valid schedule: {e}".format(path=path, e=e)
+            )
+    return parse_schedule(schedule)
+
+
+def parse_schedule(schedule):
+    """Validate the jobs of a decoded schedule.
+
+    :param schedule: A dict containing a list of `jobs`.
+    :return: A list of `Job`.
+    :raises ValueError: If the schedule is invalid.
+    """
+    try:
+        jobs = [
+            Job(
+                name=job["name"],
+                measurement=job["measurement"],
+                args=job.get("args", {}),
+                interval=job["interval"],
+                jitter=job.get("jitter", 0),
+                deadline=job.get("deadline"),
+            )
+            for job in schedule["jobs"]
+        ]
+    except (KeyError, TypeError) as e:
+        raise ValueError("The schedule is missing {e}".format(e=e))
+
+    names = set()
+    for job in jobs:
+        if job.name in names:
+            raise ValueError("The job `{name}` is duplicated".format(name=job.name))
+        names.add(job.name)
+        _validate_job(job)
+    return jobs
+
+
+def _validate_job(job):
+    if job.interval <= 0:
+        raise ValueError(
+            "A value of {interval} was provided for the interval of `{name}`. This "
+            "must be a positive number.".format(interval=job.interval, name=job.name)
+        )
+    if not 0 <= job.jitter < job.interval:
+        raise ValueError(
+            "A value of {jitter} was provided for the jitter of `{name}`. This must "
+            "be a positive number less than the interval.".format(
+                jitter=job.jitter, name=job.name
+            )
+        )
+    if job.deadline is not None and job.deadline < 0:
+        raise ValueError(
+            "A value of {deadline} was provided for the deadline of `{name}`. This "
+            "must be a positive number.".format(deadline=job.deadline, name=job.name)
+        )
+    try:
+        # Construct the measurement to validate its arguments
+        get_measurement(job.measurement)(**job.args)
+    except KeyError as e:
+        raise ValueError(
+            "The job `{name}` has an unknown measurement: {e}".format(
+                name=job.name, e=e
+            )
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(
+            "The job `{name}` has invalid args: {e}".format(name=job.name, e=e)
+        )
+
+
+def summarise_results(results):
+    """Summarise results as a list of dicts of their type and error keys."""
+    if not isinstance(results, list):
+        results = [results]
+    return [
+        {
+            "type": type(result).__name__,
+            "errors": [error.key for error in result.errors],
+        }
+        for result in results
+    ]
+
+
+def send_command(command, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+    """Send a command to a running daemon.
+
+    :param command: A JSON serialisable dict.
+    :param socket_path: The path of the daemon's Unix socket.
+    :param timeout: The number of seconds to wait for the reply.
+    :return: The decoded reply.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(command).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline().decode("utf-8"))
+
+
+class MeasurementDaemon(object):
+    """Runs scheduled jobs in warm worker processes."""
+
+    def __init__(
+        self,
+        jobs,
+        workers=2,
+        socket_path=None,
+        on_results=None,
+        traceback_directory=None,
+    ):
+        """Initialisation of a measurement daemon.
+
+        :param jobs: A list of `Job`.
+        :param workers: The number of worker processes.
+        :param socket_path: The path of the Unix socket to listen for
+        commands on, or `None` to not listen.
+        :param on_results: A function called with the `Job` and the
+        results of each run.
+        :param traceback_directory: A directory the workers store the full
+        text of capped tracebacks in, or `None` to keep it in the memory of
+        each worker.
+        """
+        if workers < 1:
+            raise ValueError(
+                "A value of {workers} was provided for the number of workers. This "
+                "must be a positive integer greater than 0.".format(workers=workers)
+            )
+        self.jobs = collections.OrderedDict((job.name, job) for job in jobs)
+        self.workers = workers
+        self.socket_path = socket_path
+        self.on_results = on_results
+        self.traceback_directory = traceback_directory
+        self.link_lock = LinkLock()
+        self._condition = threading.Condition()
+        self._queue = []
+        self._running = set()
+        self._stopping = False
+        self._executor = None
+        self._socket_server = None
+
+    def run_forever(self):
+        """Run the schedule until `stop()` is called."""
+        self.start()
+        try:
+            with self._condition:
+                while not self._stopping:
+                    now = time.monotonic()
+                    if not self._queue or self._queue[0][0] > now:
+                        timeout = self._queue[0][0] - now if self._queue else None
+                        self._condition.wait(timeout)
+                        continue
+                    _, due, name = heapq.heappop(self._queue)
+                    job = self.jobs[name]
+                    # Scheduled from the unjittered due time, so that runs
+                    # do not drift by how late each one was dispatched, and
+                    # skipping any runs missed while the daemon was stalled
+                    due += job.interval
+                    if due <= now:
+                        due += math.ceil((now - due) / job.interval) * job.interval
+                    self._schedule(job, due)
+                    self._dispatch(job)
+        finally:
+            self.close()
+
+    def start(self):
+        """Start the worker processes and the command socket."""
+        self._executor = self._create_executor()
+        now = time.monotonic()
+        with self._condition:
+            for job in self.jobs.values():
+                # Spread the first runs over the jitter window
+                self._schedule(job, now)
+        if self.socket_path is not None:
+            self._socket_server = _CommandServer(self.socket_path, self)
+            thread = threading.Thread(target=self._socket_server.serve_forever)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """Stop scheduling runs. Runs already started are completed."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop listening for commands and shut down the workers."""
+        if self._socket_server is not None:
+            self._socket_server.shutdown()
+            self._socket_server.server_close()
+            self._socket_server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def trigger(self, name, callback=None):
+        """Run a job now, outside of its schedule.
+
+        :param name: The name of the job.
+        :param callback: A function called with the results of the run.
+        :return: `False` if the job is already running, otherwise `True`.
+        :raises KeyError: If there is no job called `name`.
+        """
+        job = self.jobs[name]
+        with self._condition:
+            return self._dispatch(job, callback)
+
+    def _schedule(self, job, due):
+        jittered = due + random.uniform(-job.jitter, job.jitter)
+        heapq.heappush(self._queue, (jittered, due, job.name))
+        self._condition.notify_all()
+
+    def _dispatch(self, job, callback=None):
+        # Runs of the same job never overlap; a run that is due while the
+        # previous one is still running is skipped
+        if job.name in self._running or self._executor is None:
+            return False
+        self._running.add(job.name)
+        thread = threading.Thread(target=self._run, args=(job, callback))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _run(self, job, callback):
+        resource_class = get_measurement(job.measurement).resource_class
+        stopwatch = Stopwatch()
+        # The time spent waiting for the link counts against the deadline
+        deadline = Deadline(job.deadline)
+        try:
+            if self.link_lock.acquire(resource_class, deadline):
+                try:
+                    results = self._submit(job, deadline, stopwatch)
+                finally:
+                    self.link_lock.release(resource_class)
+            else:
+                results = attach_timing(
+                    _get_runner_error(job.args, None, key="runner-timeout"),
+                    stopwatch.stop(),
+                )
+        finally:
+            with self._condition:
+                self._running.discard(job.name)
+        if self.on_results is not None:
+            self.on_results(job, results)
+        if callback is not None:
+            callback(results)
+
+    def _submit(self, job, deadline, stopwatch):
+        executor = self._executor
+        try:
+            future = executor.submit(
+                _run_job,
+                job.measurement,
+                job.args,
+                deadline.remaining(),
+                self.traceback_directory,
+            )
+            return future.result()
+        except BrokenProcessPool:
+            results = attach_timing(
+                _get_runner_error(job.args, traceback.format_exc()), stopwatch.stop()
+            )
+            self._replace_executor(executor)
+            return results
+        except Exception:
+            return attach_timing(
+                _get_runner_error(job.args, traceback.format_exc()), stopwatch.stop()
+            )
+
+    def _create_executor(self):
+        measurements = sorted(set(job.measurement for job in self.jobs.values()))
+        if sys.version_info < (3, 7):
+            # Workers are warmed by their first run instead
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_warm_worker,
+            initargs=(measurements,),
+        )
+
+    def _replace_executor(self, executor):
+        # A worker that dies (e.g. is killed by the OOM killer) breaks the
+        # whole pool, so it is replaced rather than failing every later run
+        with self._condition:
+            if self._executor is not executor or self._stopping:
+                return
+            self._executor = self._create_executor()
+        executor.shutdown(wait=False)
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            command = json.loads(self.rfile.readline().decode("utf-8"))
+            reply = self._handle_command(command)
+        except (ValueError, KeyError, TypeError) as e:
+            reply = {"status": "error", "message": str(e)}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+    def _handle_command(self, command):
+        daemon = self.server.measurement_daemon
+        if command["command"] == "jobs":
+            return {"status": "ok", "jobs": list(daemon.jobs)}
+        if command["command"] != "run":
+            raise ValueError(
+                "Unknown command `{command}`".format(command=command["command"])
+            )
+        if command["job"] not in daemon.jobs:
+            raise ValueError("Unknown job `{job}`".format(job=command["job"]))
+
+        done = threading.Event()
+        replies = []
+
+        def callback(results):
+            replies.append(summarise_results(results))
+            done.set()
+
+        if not daemon.trigger(command["job"], callback=callback):
+            return {"status": "busy"}
+        if not command.get("wait"):
+            return {"status": "ok"}
+        done.wait()
+        return {"status": "ok", "results": replies[0]}
+
+
+class _CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, daemon):
+        if os.path.dirname(socket_path) == PRIVATE_SOCKET_DIRECTORY:
+            _make_private_directory(PRIVATE_SOCKET_DIRECTORY)
+        _remove_stale_socket(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, _CommandHandler)
+        self.measurement_daemon = daemon
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def _make_private_directory(path):
+    """Create a directory only the user may access, or check that an
+    existing one is."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(errno.EACCES, "Not a directory private to the user", path)
+
+
+def _remove_stale_socket(socket_path):
+    """Remove the socket of a daemon of the user that did not exit
+    cleanly, leaving any other file or a live socket in place."""
+    try:
+        info = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise FileExistsError(errno.EEXIST, "Not a socket of the user", socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+    raise OSError(errno.EADDRINUSE, "A daemon is already listening", socket_path)
+
+
+def _warm_worker(measurements):
+    """Import each measurement and its deferred imports in a worker."""
+    for name in measurements:
+        for module in get_measurement(name).deferred_imports:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+
+def _run_job(measurement, args, deadline, traceback_directory=None):
+    """Construct and run a measurement in a worker process."""
+    if (
+        traceback_directory is not None
+        and get_traceback_store().directory != traceback_directory
+    ):
+        configure_tracebacks(store=TracebackStore(traceback_directory))
+    stopwatch = Stopwatch()
+    try:
+        instance = get_measurement(measurement)(**args)
+        return instance._measure(None if deadline is None else Deadline(deadline))
+    except Exception:
+        return attach_timing(
+            _get_runner_error(args, traceback.format_exc()), stopwatch.stop()
+        )
+
+
+def _get_runner_error(args, traceback, key="runner-err"):
+    # A list, like the results of every measurement
+    return [
+        MeasurementResult(
+            id=args.get("id"),
+            errors=[
+                Error(
+                    key=key,
+                    description=RUNNER_ERRORS.get(key, ""),
+                    traceback=cap_traceback(traceback),
+                )
+            ],
+        )
+    ]
@@ -0,0 +1,84 @@
+"""
+Time budgets shared by a measurement and its sub-measurements.
+
+A `Deadline` is passed down through `measure()` so that every sub-step
+of a composite measurement (subprocesses, HTTP requests, traceroutes and
+nested measurements) draws on the same overall budget. A deadline may
+also be cancelled from another thread, which expires it immediately.
+
+Sub-steps that are started after the deadline has expired, or that are
+interrupted by it, are reported with the plugin's `*-timeout` error so
+that the composite can still return the results it has.
+"""
+
+import threading
+import time
+
+
+class Deadline(object):
+    """A cancellable time budget.
+
+    :param seconds: The number of seconds until the deadline expires,
+    or `None` for a deadline that only expires when cancelled.
+    """
+
+    def __init__(self, seconds=None):
+        if seconds is not None and seconds < 0:
+            raise ValueError(
+                "A value of {seconds} was provided for the deadline. This must be a "
+                "positive number or `None` for no deadline.".format(seconds=seconds)
+            )
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def coerce(cls, deadline):
+        """Return `deadline`, or an unlimited `Deadline` if it is `None`."""
+        return cls() if deadline is None else deadline
+
+    def cancel(self):
+        """Expire the deadline immediately."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        """Return the number of seconds left, or `None` if unlimited."""
+        if self.cancelled:
+            return 0
+        if self.expires_at is None:
+            return None
+        return max(0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() == 0
+
+    def timeout(self, timeout=None):
+        """Bound a sub-step's own timeout by the time remaining.
+
+        :param timeout: The sub-step's own timeout in seconds, or `None`
+        for no timeout.
+        :return: The smaller of `timeout` and the time remaining, or
+        `None` if neither is limited.
+        """
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if remaining is None:
+            return timeout
+        return min(timeout, remaining)
+
+    def bound(self, seconds=None):
+        """Return a deadline expiring in `seconds`, or when this deadline
+        does if that is sooner.
+
+        The returned deadline shares the cancellation of this one.
+
+        :param seconds: The number of seconds, or `None` for no bound
+        other than this deadline.
+        """
+        bounded = Deadline(self.timeout(seconds))
+        bounded._cancelled = self._cancelled
+        return bounded
@@ -0,0 +1,308 @@
+"""
+Export measurement results as Prometheus/OpenMetrics metrics.
+
+`MetricsExporter` maps any `MeasurementResult` to metrics by its field
+names, so new result types are exported without any extra code:
+
+ - `minimum_latency`, `average_latency` and `maximum_latency` become
+   `measurement_latency_seconds` with a `stat` label of `min`, `avg` or
+   `max`.
+ - `download_rate` and `upload_rate` become
+   `measurement_download_rate_bits_per_second` and
+   `measurement_upload_rate_bits_per_second`, normalised to bit/s from
+   their `*_unit` field.
+ - `packets_lost` becomes `measurement_packet_loss_ratio`.
+ - `hop_count` becomes `measurement_hop_count`.
+ - Each `Error` increments `measurement_errors_total`, labelled by its
+   `key`.
+ - The phases of an attached `MeasurementTrace` become
+   `measurement_phase_wall_seconds` and `measurement_phase_cpu_seconds`,
+   labelled by the traced `measurement` and the `phase`.
+
+Every other metric is labelled with the `result_type` of the result and,
+where the result has a `host` or `url`, a `target`.
+
+The exposition text is rendered once per `update()` rather than per
+scrape, so `MetricsServer` answers scrapes with a pre-rendered response
+and never contends with the measurements being recorded:
+
+    >>> exporter = MetricsExporter()
+    >>> server = MetricsServer(exporter, port=9357)
+    >>> server.start()
+    >>> exporter.update(LatencyMeasurement("1", "example.com").measure())
+"""
+
+import collections
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from measurement.units import BIT_PER_SECOND_FACTORS, LATENCY_DIVISOR, RatioUnit
+
+DEFAULT_PORT = 9357
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Divisors converting each unit to a ratio between 0 and 1
+RATIO_DIVISORS = {RatioUnit.percentage: 100}
+
+LATENCY_FIELDS = (
+    ("minimum_latency", "min"),
+    ("average_latency", "avg"),
+    ("maximum_latency", "max"),
+)
+RATE_FIELDS = ("download_rate", "upload_rate")
+TARGET_FIELDS = ("host", "url")
+
+MetricFamily = collections.namedtuple("MetricFamily", "name type help")
+
+FAMILIES = {
+    family.name: family
+    for family in [
+        MetricFamily(
+            "measurement_latency_seconds",
+            "gauge",
+            "The latency of the most recent measurement.",
+        ),
+        MetricFamily(
+            "measurement_download_rate_bits_per_second",
+            "gauge",
+            "The download rate of the most recent measurement.",
+        ),
+        MetricFamily(
+            "measurement_upload_rate_bits_per_second",
+            "gauge",
+            "The upload rate of the most recent measurement.",
+        ),
+        MetricFamily(
+            "measurement_packet_loss_ratio",
+            "gauge",
+            "The ratio of packets lost in the most recent measurement.",
+        ),
+        MetricFamily(
+            "measurement_hop_count",
+            "gauge",
+            "The number of hops to the host in the most recent measurement.",
+        ),
+        MetricFamily(
+            "measurement_errors",
+            "counter",
+            "The number of errors encountered by measurements.",
+        ),
+        MetricFamily(
+            "measurement_phase_wall_seconds",
+            "gauge",
+            "The wall time of each phase of the most recent traced measurement.",
+        ),
+        MetricFamily(
+            "measurement_phase_cpu_seconds",
+            "gauge",
+            "The CPU time of each phase of the most recent traced measurement.",
+        ),
+    ]
+}
+
+
+class MetricsExporter(object):
+    """Accumulates metrics from results and pre-renders their exposition."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # family name -> {sorted label tuple: value}
+        self._samples = collections.defaultdict(dict)
+        self._render()
+
+    def update(self, results):
+        """Record the metrics of one or more results.
+
+        :param results: A `MeasurementResult`, or an iterable of them.
+        """
+        if hasattr(results, "errors"):
+            results = [results]
+        with self._lock:
+            for result in results:
+                self._record(result)
+            self._render()
+
+    def exposition(self, openmetrics=False):
+        """Return the pre-rendered exposition text as bytes.
+
+        :param openmetrics: Render in the OpenMetrics format rather than
+        the Prometheus text format.
+        """
+        return self._openmetrics_text if openmetrics else self._prometheus_text
+
+    def _record(self, result):
+        fields = result._asdict()
+        labels = {"result_type": type(result).__name__}
+        for name in TARGET_FIELDS:
+            if fields.get(name) is not None:
+                labels["target"] = fields[name]
+                break
+
+        for name, stat in LATENCY_FIELDS:
+            if fields.get(name) is not None:
+                self._set(
+                    "measurement_latency_seconds",
+                    dict(labels, stat=stat),
+                    fields[name] / LATENCY_DIVISOR,
+                )
+        for name in RATE_FIELDS:
+            factor = BIT_PER_SECOND_FACTORS.get(fields.get(name + "_unit"))
+            if fields.get(name) is not None and factor is not None:
+                self._set(
+                    "measurement_{name}_bits_per_second".format(name=name),
+                    labels,
+                    fields[name] * factor,
+                )
+        divisor = RATIO_DIVISORS.get(fields.get("packets_lost_unit"))
+        if fields.get("packets_lost") is not None and divisor is not None:
+            self._set(
+                "measurement_packet_loss_ratio",
+                labels,
+                fields["packets_lost"] / divisor,
+            )
+        if fields.get("hop_count") is not None:
+            self._set("measurement_hop_count", labels, fields["hop_count"])
+
+        for error in fields.get("errors") or []:
+            error_labels = dict(labels, key=error.key)
+            key = _label_key(error_labels)
+            samples = self._samples["measurement_errors"]
+            samples[key] = samples.get(key, 0) + 1
+
+        trace = getattr(result, "trace", None)
+        if trace is not None:
+            for phase in trace.phases:
+                phase_labels = {"measurement": trace.measurement, "phase": phase.name}
+                self._set(
+                    "measurement_phase_wall_seconds", phase_labels, phase.wall_time
+                )
+                self._set("measurement_phase_cpu_seconds", phase_labels, phase.cpu_time)
+
+    def _set(self, name, labels, value):
+        self._samples[name][_label_key(labels)] = value
+
+    def _render(self):
+        prometheus_lines = []
+        openmetrics_lines = []
+        for name in sorted(self._samples):
+            family = FAMILIES[name]
+            samples = self._samples[name]
+            # Counters are exposed with a `_total` suffix in both formats
+            suffix = "_total" if family.type == "counter" else ""
+            for lines, family_name in (
+                (prometheus_lines, name + suffix),
+                (openmetrics_lines, name),
+            ):
+                lines.append(
+                    "# HELP {name} {help}".format(name=family_name, help=family.help)
+                )
+                lines.append(
+                    "# TYPE {name} {type}".format(name=family_name, type=family.type)
+                )
+            for key in sorted(samples):
+                line = "{name}{labels} {value}".format(
+                    name=name + suffix,
+                    labels=_format_labels(key),
+                    value=_format_value(samples[key]),
+                )
+                prometheus_lines.append(line)
+                openmetrics_lines.append(line)
+        openmetrics_lines.append("# EOF")
+        self._prometheus_text = "".join(
+            line + "\n" for line in prometheus_lines
+        ).encode("utf-8")
+        self._openmetrics_text = "".join(
+            line + "\n" for line in openmetrics_lines
+        ).encode("utf-8")
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.server.exporter.exposition(openmetrics=openmetrics)
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(object):
+    """Serves the metrics of a `MetricsExporter` at `/metrics`."""
+
+    def __init__(self, exporter, host="127.0.0.1", port=DEFAULT_PORT):
+        """Initialisation of a metrics server.
+
+        :param exporter: The `MetricsExporter` to serve.
+        :param host: The address to listen on. Defaults to the loopback
+        interface.
+        :param port: The port to listen on, or `0` for any free port.
+        """
+        self.exporter = exporter
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """The `(host, port)` the server is listening on."""
+        return self._server.server_address if self._server else None
+
+    def start(self):
+        """Start serving on a background thread."""
+        self._server = _ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self._server.exporter = self.exporter
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+
+def _label_key(labels):
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    labels = ",".join('{k}="{v}"'.format(k=k, v=_escape_label_value(v)) for k, v in key)
+    return "{" + labels + "}"
+
+
+def _escape_label_value(value):
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
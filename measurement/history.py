@@ -0,0 +1,336 @@
+"""
+A local history of results in SQLite.
+
+`HistoryStore` keeps the results of a probe in a SQLite database, so it
+can decide what to do next from its own history, e.g. which server has
+been fastest recently:
+
+    >>> store = HistoryStore("/var/lib/measurement/history.db")
+    >>> store.insert(latency_results)
+    >>> store.latest(LatencyMeasurementResult, 10, host="1.1.1.1")
+    >>> store.aggregate(LatencyMeasurementResult, "average_latency")
+
+Each result type is stored in a table named after it, created when it is
+first inserted, with a `timestamp` column and a column per field. Fields
+are stored as `REAL`, `INTEGER` or `TEXT` according to their type, units
+as their values, and errors and other values as JSON encoded with
+`measurement.results.encode`. Values are converted to the type of their
+column where SQLite can, so a numeric string in a `float` field, as the
+ping parser stores, is read back as a number. The tables are indexed on
+the timestamp and on `id`, `host` and `url` with the timestamp.
+
+The database is opened in WAL mode, so readers do not block the writer,
+and each call to `insert()` is a single transaction, with the results of
+each type inserted by one `executemany`.
+"""
+
+import collections
+import enum
+import json
+import sqlite3
+import threading
+import time
+
+from measurement.results import decode, encode, unwrap_optional
+from measurement.timing import get_start_time
+
+# The columns a table is indexed on, with the timestamp, if it has them
+INDEXED_COLUMNS = ("id", "host", "url")
+
+HostAggregate = collections.namedtuple("HostAggregate", "count mean minimum maximum")
+
+
+class HistoryStore(object):
+    """A SQLite database of results.
+
+    The store can be shared between threads.
+
+    :param path: The path of the database, which is created if it does
+    not exist, or `":memory:"`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Durable at each checkpoint of the WAL rather than each commit
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        # The columns of each table, by result type
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
+
+    def insert(self, results, timestamp=None):
+        """Insert a result, or a list of results, in one transaction.
+
+        :param timestamp: The time the results were recorded at, as a Unix
+        timestamp, or `None` for the time each result started being
+        measured at, or the current time if it is not stamped.
+        """
+        if not isinstance(results, list):
+            results = [results]
+        now = time.time()
+        results_by_type = collections.OrderedDict()
+        for result in results:
+            results_by_type.setdefault(type(result), []).append(result)
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                for result_type, typed_results in results_by_type.items():
+                    columns = self._get_columns(result_type)
+                    self._connection.executemany(
+                        "INSERT INTO {table} (timestamp, {columns}) "
+                        "VALUES (?, {values})".format(
+                            table=_quote(result_type.__name__),
+                            columns=", ".join(_quote(name) for name, _ in columns),
+                            values=", ".join("?" for _ in columns),
+                        ),
+                        [
+                            [
+                                (
+                                    get_start_time(result, now)
+                                    if timestamp is None
+                                    else timestamp
+                                )
+                            ]
+                            + [
+                                _to_column(kind, value)
+                                for (_, kind), value in zip(
+                                    columns, result._values(result)
+                                )
+                            ]
+                            for result in typed_results
+                        ],
+                    )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def latest(self, result_type, count=1, host=None):
+        """Return the timestamps and results of the last `count` results of
+        a type, newest first.
+
+        :param host: Only return results of this `host`, or `url` for
+        result types without a host.
+        """
+        return self._select(result_type, host=host, descending=True, limit=count)
+
+    def window(self, result_type, start=None, end=None, host=None):
+        """Return the timestamps and results of a type recorded between
+        `start` and `end` inclusive, oldest first.
+
+        :param host: Only return results of this `host`, or `url` for
+        result types without a host.
+        """
+        return self._select(result_type, start=start, end=end, host=host)
+
+    def aggregate(self, result_type, field, start=None, end=None):
+        """Return a `HostAggregate` of the values of a numeric field for
+        each host, or url for result types without a host.
+
+        Results without a value for the field are not counted.
+
+        :raises ValueError: If the result type has no host or url.
+        """
+        # Creates the table if it does not exist yet
+        self._get_columns(result_type)
+        host_column = _get_host_column(result_type)
+        if field not in result_type._fields:
+            raise ValueError(
+                "{type} has no field '{field}'".format(
+                    type=result_type.__name__, field=field
+                )
+            )
+        conditions, parameters = _get_conditions(start, end)
+        conditions.append("{field} IS NOT NULL".format(field=_quote(field)))
+        rows = self._execute(
+            "SELECT {host}, COUNT({field}), AVG({field}), MIN({field}), MAX({field}) "
+            "FROM {table} WHERE {conditions} GROUP BY {host} ORDER BY {host}".format(
+                host=_quote(host_column),
+                field=_quote(field),
+                table=_quote(result_type.__name__),
+                conditions=" AND ".join(conditions),
+            ),
+            parameters,
+        )
+        return collections.OrderedDict(
+            (row[0], HostAggregate(*row[1:])) for row in rows
+        )
+
+    def _select(
+        self, result_type, start=None, end=None, host=None, descending=False, limit=None
+    ):
+        columns = self._get_columns(result_type)
+        conditions, parameters = _get_conditions(start, end)
+        if host is not None:
+            conditions.append(
+                "{host} = ?".format(host=_quote(_get_host_column(result_type)))
+            )
+            parameters.append(host)
+        query = "SELECT timestamp, {columns} FROM {table}".format(
+            columns=", ".join(_quote(name) for name, _ in columns),
+            table=_quote(result_type.__name__),
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY timestamp {order}, rowid {order}".format(
+            order="DESC" if descending else "ASC"
+        )
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [
+            (
+                row[0],
+                result_type(
+                    *[
+                        _from_column(kind, value)
+                        for (_, kind), value in zip(columns, row[1:])
+                    ]
+                ),
+            )
+            for row in self._execute(query, parameters)
+        ]
+
+    def _execute(self, query, parameters=()):
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def _get_columns(self, result_type):
+        """Return the name and kind of each column of a result type's table,
+        creating or extending the table first if needed."""
+        columns = self._tables.get(result_type)
+        if columns is not None:
+            return columns
+        columns = [
+            (name, _get_column_kind(field_type))
+            for name, field_type in result_type._field_types.items()
+        ]
+        table = _quote(result_type.__name__)
+        with self._lock:
+            existing = [
+                row[1]
+                for row in self._connection.execute(
+                    "PRAGMA table_info({table})".format(table=table)
+                )
+            ]
+            if not existing:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS {table} "
+                    "(timestamp REAL NOT NULL, {columns})".format(
+                        table=table,
+                        columns=", ".join(
+                            "{name} {type}".format(
+                                name=_quote(name), type=_get_sql_type(kind)
+                            )
+                            for name, kind in columns
+                        ),
+                    )
+                )
+            else:
+                # Fields added to the result type since the table was created
+                for name, kind in columns:
+                    if name not in existing:
+                        self._connection.execute(
+                            "ALTER TABLE {table} ADD COLUMN {name} {type}".format(
+                                table=table, name=_quote(name), type=_get_sql_type(kind)
+                            )
+                        )
+            indexed_columns = [
+                name for name in INDEXED_COLUMNS if name in result_type._fields
+            ]
+            for name in ["timestamp"] + indexed_columns:
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})".format(
+                        index=_quote(
+                            "{type}_{name}".format(type=result_type.__name__, name=name)
+                        ),
+                        table=table,
+                        columns=(
+                            "timestamp"
+                            if name == "timestamp"
+                            else "{name}, timestamp".format(name=_quote(name))
+                        ),
+                    )
+                )
+        self._tables[result_type] = columns
+        return columns
+
+
+def _get_column_kind(field_type):
+    """Return the type a field is stored as: `float`, `int`, `str`, a unit,
+    or `None` for JSON."""
+    field_type = unwrap_optional(field_type)
+    if field_type in (float, int, str):
+        return field_type
+    if isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+        return field_type
+    return None
+
+
+def _get_sql_type(kind):
+    if kind is float:
+        return "REAL"
+    if kind is int:
+        return "INTEGER"
+    return "TEXT"
+
+
+def _to_column(kind, value):
+    if value is None:
+        return None
+    if kind is None:
+        return json.dumps(encode(value), separators=(",", ":"))
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _from_column(kind, value):
+    if value is None:
+        return None
+    if kind is None:
+        return decode(json.loads(value))
+    if kind not in (float, int, str):
+        try:
+            return kind(value)
+        except ValueError:
+            # A value that was not a unit
+            return value
+    return value
+
+
+def _get_host_column(result_type):
+    for name in ("host", "url"):
+        if name in result_type._fields:
+            return name
+    raise ValueError("{type} has no host or url".format(type=result_type.__name__))
+
+
+def _get_conditions(start, end):
+    conditions = []
+    parameters = []
+    if start is not None:
+        conditions.append("timestamp >= ?")
+        parameters.append(start)
+    if end is not None:
+        conditions.append("timestamp <= ?")
+        parameters.append(end)
+    return conditions, parameters
+
+
+def _quote(identifier):
+    return '"{identifier}"'.format(identifier=identifier.replace('"', '""'))
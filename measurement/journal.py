@@ -0,0 +1,773 @@
+"""
+A crash-safe, append-only journal of results.
+
+`Journal.append()` queues results and returns immediately. A writer
+thread appends them to segment files in the journal's directory, so a
+measurement never waits for the disk:
+
+    >>> journal = Journal("/var/lib/measurement/journal")
+    >>> for result in measurement.measure_iter():
+    ...     journal.append(result)
+
+Segments are named by their number, e.g. `000000000001.journal`, and a
+new segment is started once the current one reaches `segment_size`
+bytes. Writes are batched and made durable with `fsync` at most every
+`sync_interval` seconds, and on `flush()`, `close()` and rotation, so a
+power loss loses at most the results of the last interval. Each record
+is a header of the length of the record, a CRC-32 of the rest of the
+record, the time it was appended and the length of its result type's
+name, followed by the name and the result serialised with a codec of
+`measurement.results`. When a journal is opened, the last segment is
+truncated after its last intact record, removing any record torn by a
+crash. A write that fails, e.g. when the disk is full, is truncated in
+the same way before it is retried, and a result the codec cannot
+serialise is logged and skipped. If a segment cannot be rotated or
+closed, the writer stops and `flush()` and `close()` raise the error.
+
+Results are read back from a `JournalPosition`, the segment and byte
+offset after a record. A consumer saves its position with `commit()`,
+which also deletes the segments before it, and resumes from
+`checkpoint()`. `drain()` uploads the results of a journal in batches
+from an asyncio event loop, committing each batch once it is uploaded:
+
+    >>> loop.create_task(drain(journal, upload))
+
+`JournalReader` queries the results of a journal by time window and
+result type using a sparse index of its memory-mapped segments, decoding
+only the records that match, and optionally returning only some fields:
+
+    >>> reader = JournalReader("/var/lib/measurement/journal")
+    >>> reader.query(
+    ...     NetflixFastMeasurementResult,
+    ...     start=time.time() - 24 * 60 * 60,
+    ...     fields=["download_rate", "download_rate_unit"],
+    ... )
+"""
+
+import asyncio
+import collections
+import enum
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from measurement.results import (
+    CODECS,
+    decode,
+    encode,
+    get_result_type,
+    unwrap_optional,
+)
+from measurement.timing import get_start_time
+
+SEGMENT_SUFFIX = ".journal"
+SEGMENT_MAGIC = b"HBMJ"
+SEGMENT_VERSION = 1
+SEGMENT_SIZE = 16 * 1024 * 1024
+SYNC_INTERVAL = 1.0
+CHECKPOINT_FILENAME = "checkpoint.json"
+DRAIN_BATCH_SIZE = 100
+DRAIN_POLL_INTERVAL = 5.0
+DRAIN_RETRY_INTERVAL = 30.0
+INDEX_INTERVAL = 64
+
+# The length of the record after the CRC, the CRC, the time the record
+# was appended and the length of the name of the result type
+RECORD_HEADER = struct.Struct("<IIdB")
+# The bytes of the record covered by the CRC, after the length and CRC
+_CRC_START = 8
+# The magic, version and codec name length, and the longest codec name
+_MAX_SEGMENT_HEADER_SIZE = len(SEGMENT_MAGIC) + 2 + 255
+
+logger = logging.getLogger(__name__)
+
+JournalPosition = collections.namedtuple("JournalPosition", "segment offset")
+JournalRecord = collections.namedtuple(
+    "JournalRecord", "position timestamp result_type codec payload"
+)
+
+
+class Journal(object):
+    """Appends results to size-rotated segment files in a directory.
+
+    :param directory: The directory of the segments, which is created if
+    it does not exist.
+    :param segment_size: The size in bytes at which a new segment is
+    started.
+    :param sync_interval: The maximum number of seconds between writing a
+    result and making it durable with `fsync`.
+    :param codec: The name of the `measurement.results` codec results are
+    serialised with.
+    """
+
+    def __init__(
+        self,
+        directory,
+        segment_size=SEGMENT_SIZE,
+        sync_interval=SYNC_INTERVAL,
+        codec="json",
+    ):
+        if codec not in CODECS:
+            raise ValueError("Unknown codec '{codec}'".format(codec=codec))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_interval = sync_interval
+        self.codec = codec
+        self._dumps = CODECS[codec].dumps
+        self._commit_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._file = None
+        self._segment = None
+        # The offset after the last record written whole to the segment
+        self._offset = None
+        # The error that stopped the writer thread
+        self._error = None
+        self._open_segment()
+        self._thread = threading.Thread(target=self._write_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, results, timestamp=None):
+        """Queue a result, or a list of results, to be written.
+
+        This never blocks on the disk; use `flush()` to wait until the
+        results are durable.
+
+        :param timestamp: The time the results are recorded at, as a Unix
+        timestamp, or `None` for the time each result started being
+        measured at, or the current time if it is not stamped.
+        """
+        if not isinstance(results, list):
+            results = [results]
+        now = time.time()
+        for result in results:
+            if timestamp is None:
+                self._queue.put((get_start_time(result, now), result))
+            else:
+                self._queue.put((timestamp, result))
+
+    def flush(self, timeout=None):
+        """Wait until the results appended so far are durable.
+
+        :return: `False` if `timeout` seconds passed first, otherwise
+        `True`.
+        :raises OSError: If the writer stopped because a segment could not
+        be rotated or closed, dropping the results not yet written.
+        """
+        synced = threading.Event()
+        self._queue.put(synced)
+        flushed = synced.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return flushed
+
+    def close(self):
+        """Write and sync the queued results, and stop the writer thread.
+
+        :raises OSError: As for `flush()`.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def segments(self):
+        """Return the numbers of the segments, in order."""
+        return _list_segments(self.directory)
+
+    def segment_path(self, segment):
+        """Return the path of the segment numbered `segment`."""
+        return os.path.join(
+            self.directory,
+            "{segment:012d}{suffix}".format(segment=segment, suffix=SEGMENT_SUFFIX),
+        )
+
+    def records(self, position=None):
+        """Yield the `JournalRecord`s after `position`, without decoding
+        their results.
+
+        Only records that have been written are read; those still queued
+        are not.
+
+        :param position: A `JournalPosition`, or `None` to read from the
+        checkpoint.
+        """
+        if position is None:
+            position = self.checkpoint()
+        for segment in self.segments():
+            if position is not None and segment < position.segment:
+                continue
+            offset = position.offset if position and segment == position.segment else 0
+            try:
+                with open(self.segment_path(segment), "rb") as f:
+                    header = _read_segment_header(f.read(_MAX_SEGMENT_HEADER_SIZE))
+                    if header is None:
+                        continue
+                    start, codec = header
+                    offset = max(offset, start)
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                # Deleted by a commit while being read
+                continue
+            for record in _scan_records(segment, codec, data, 0, base=offset):
+                yield record
+
+    def read(self, position=None):
+        """Yield the position after each result after `position`, and the
+        result.
+
+        :param position: A `JournalPosition`, or `None` to read from the
+        checkpoint.
+        """
+        for record in self.records(position):
+            yield record.position, decode(CODECS[record.codec].loads(record.payload))
+
+    def read_batch(self, size, position=None):
+        """Return a list of up to `size` results after `position`, and the
+        position after the last of them, or `position` if there are none.
+        """
+        if position is None:
+            position = self.checkpoint()
+        results = []
+        if size <= 0:
+            return results, position
+        for position, result in self.read(position):
+            results.append(result)
+            if len(results) >= size:
+                break
+        return results, position
+
+    def checkpoint(self):
+        """Return the position last committed, or `None`."""
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILENAME)) as f:
+                return JournalPosition(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def commit(self, position):
+        """Save `position` as the checkpoint, and delete the segments
+        before it.
+
+        The checkpoint is replaced atomically, so it is either the old or
+        the new position after a crash.
+        """
+        path = os.path.join(self.directory, CHECKPOINT_FILENAME)
+        with self._commit_lock:
+            temporary_path = path + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump(position._asdict(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, path)
+            _sync_directory(self.directory)
+            for segment in self.segments():
+                if segment >= position.segment:
+                    break
+                os.remove(self.segment_path(segment))
+
+    def _open_segment(self):
+        segments = self.segments()
+        if not segments:
+            self._start_segment(1)
+            return
+        segment = segments[-1]
+        path = self.segment_path(segment)
+        with open(path, "rb") as f:
+            data = f.read()
+        header = _read_segment_header(data)
+        if header is None:
+            # A crash while the header was being written
+            os.remove(path)
+            self._start_segment(segment)
+            return
+        start, codec = header
+        end = start
+        for record in _scan_records(segment, codec, data, start):
+            end = record.position.offset
+        # Unbuffered, so a failed write leaves no bytes to be written later
+        self._file = open(path, "r+b", buffering=0)
+        self._segment = segment
+        if end < len(data):
+            # Remove a record torn by a crash
+            self._file.truncate(end)
+            os.fsync(self._file.fileno())
+        self._file.seek(end)
+        self._offset = end
+        if end >= self.segment_size or codec != self.codec:
+            self._rotate()
+
+    def _start_segment(self, segment):
+        self._file = open(self.segment_path(segment), "xb", buffering=0)
+        codec = self.codec.encode("utf-8")
+        header = SEGMENT_MAGIC + bytes([SEGMENT_VERSION, len(codec)]) + codec
+        _write_all(self._file, header)
+        self._sync()
+        _sync_directory(self.directory)
+        self._segment = segment
+        self._offset = len(header)
+
+    def _rotate(self):
+        self._sync()
+        self._file.close()
+        self._start_segment(self._segment + 1)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_forever(self):
+        pending = collections.deque()
+        waiting = []
+        closing = False
+        unsynced_since = None
+        while True:
+            timeout = None
+            if pending:
+                timeout = self.sync_interval
+            elif unsynced_since is not None:
+                timeout = max(0, unsynced_since + self.sync_interval - time.monotonic())
+            items = []
+            try:
+                items.append(self._queue.get(timeout=timeout))
+                # Write everything queued at once
+                while True:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            for item in items:
+                if item is None:
+                    closing = True
+                elif isinstance(item, threading.Event):
+                    waiting.append(item)
+                else:
+                    record = self._encode_record(*item)
+                    if record is not None:
+                        pending.append(record)
+            try:
+                while pending:
+                    self._write_record(pending[0])
+                    pending.popleft()
+                    if unsynced_since is None:
+                        unsynced_since = time.monotonic()
+                    if self._offset >= self.segment_size:
+                        try:
+                            self._rotate()
+                        except OSError as e:
+                            # The segment may be closed, so nothing more
+                            # can be written
+                            self._fail(e, pending, waiting, closing)
+                            return
+                        unsynced_since = None
+                if unsynced_since is not None and (
+                    waiting
+                    or closing
+                    or time.monotonic() - unsynced_since >= self.sync_interval
+                ):
+                    self._sync()
+                    unsynced_since = None
+                for event in waiting:
+                    event.set()
+                del waiting[:]
+            except OSError as e:
+                # e.g. the disk is full. Unwritten results are retried after
+                # the sync interval, unless the journal is closing
+                if closing:
+                    self._fail(e, pending, waiting, closing)
+                    return
+            if closing:
+                try:
+                    self._file.close()
+                except OSError as e:
+                    self._fail(e, pending, waiting, closing)
+                return
+
+    def _fail(self, error, pending, waiting, closing):
+        """Stop writing after `error`, dropping the `pending` records.
+
+        The events of `flush()` calls, those `waiting` and any queued
+        until the journal is closed, are set, and `flush()` and `close()`
+        raise `error`.
+        """
+        logger.error(
+            "Cannot write journal %s, dropping %d results: %s",
+            self.directory,
+            len(pending),
+            error,
+        )
+        self._error = error
+        for event in waiting:
+            event.set()
+        while not closing:
+            item = self._queue.get()
+            if item is None:
+                closing = True
+            elif isinstance(item, threading.Event):
+                item.set()
+
+    def _encode_record(self, timestamp, result):
+        """Return the bytes of the record of a result, or `None` if the
+        codec cannot serialise it, which is logged and skipped rather than
+        stopping the writer."""
+        try:
+            name = type(result).__name__.encode("utf-8")
+            payload = self._dumps(encode(result))
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+            body = (
+                RECORD_HEADER.pack(0, 0, timestamp, len(name))[_CRC_START:]
+                + name
+                + payload
+            )
+        except Exception:
+            logger.exception("Cannot journal %r", result)
+            return None
+        return struct.pack("<II", len(body), zlib.crc32(body)) + body
+
+    def _write_record(self, record):
+        if self._file.tell() != self._offset:
+            # Remove the part of a record a failed write left, e.g. when
+            # the disk was full, before writing it again
+            self._file.truncate(self._offset)
+            self._file.seek(self._offset)
+        _write_all(self._file, record)
+        self._offset += len(record)
+
+
+class JournalReader(object):
+    """Queries the results of a journal's segments by time and type.
+
+    Each segment is memory-mapped, and a sparse index of it is kept in
+    memory: for each block of `index_interval` records, the offset of the
+    block, the range of the times its records were appended and the names
+    of their result types. A query only walks the headers of the records
+    of the blocks that can match it, and only decodes the records that do,
+    so the time to query a window does not grow with the size of the
+    journal. Segments appended to or deleted since the last query are
+    indexed or dropped when the next query starts.
+
+    :param directory: The directory of the journal's segments.
+    :param index_interval: The number of records in each block of the
+    index.
+    """
+
+    def __init__(self, directory, index_interval=INDEX_INTERVAL):
+        self.directory = directory
+        self.index_interval = index_interval
+        self._segments = collections.OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Unmap the segments."""
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+    def query(self, result_type=None, start=None, end=None, fields=None):
+        """Yield the time each matching result was appended, and the
+        result, in the order they were appended.
+
+        :param result_type: A result type, or the name of one, to return
+        results of, or `None` for all types.
+        :param start: The Unix timestamp to return results from, inclusive,
+        or `None` for the earliest.
+        :param end: The Unix timestamp to return results until, inclusive,
+        or `None` for the latest.
+        :param fields: A list of the names of the fields to return in an
+        ordered dict instead of the result, or `None` to return whole
+        results. The payload of each matching record is still deserialised
+        whole by its codec.
+        """
+        if isinstance(result_type, type):
+            result_type = result_type.__name__
+        name = None if result_type is None else result_type.encode("utf-8")
+        for segment in self._refresh():
+            loads = CODECS[segment.codec].loads
+            for block in segment.blocks:
+                if (
+                    (start is not None and block.max_timestamp < start)
+                    or (end is not None and block.min_timestamp > end)
+                    or (name is not None and name not in block.result_types)
+                ):
+                    continue
+                for timestamp, payload in segment.scan(block, name, start, end):
+                    data = loads(payload)
+                    if fields is None:
+                        yield timestamp, decode(data)
+                    else:
+                        yield timestamp, _decode_fields(data, fields)
+
+    def _refresh(self):
+        segments = _list_segments(self.directory)
+        for number in set(self._segments) - set(segments):
+            self._segments.pop(number).close()
+        for number in segments:
+            segment = self._segments.get(number)
+            if segment is None:
+                path = os.path.join(
+                    self.directory,
+                    "{segment:012d}{suffix}".format(
+                        segment=number, suffix=SEGMENT_SUFFIX
+                    ),
+                )
+                segment = _IndexedSegment(path, number, self.index_interval)
+                self._segments[number] = segment
+            try:
+                segment.update()
+            except FileNotFoundError:
+                # Deleted by a commit since the segments were listed
+                self._segments.pop(number).close()
+        return list(self._segments.values())
+
+
+class _IndexBlock(object):
+    __slots__ = (
+        "offset",
+        "end",
+        "count",
+        "min_timestamp",
+        "max_timestamp",
+        "result_types",
+    )
+
+    def __init__(self, offset):
+        self.offset = offset
+        self.end = offset
+        self.count = 0
+        self.min_timestamp = float("inf")
+        self.max_timestamp = float("-inf")
+        self.result_types = set()
+
+
+class _IndexedSegment(object):
+    """A memory-mapped segment and the blocks of its sparse index."""
+
+    def __init__(self, path, number, index_interval):
+        self.path = path
+        self.number = number
+        self.index_interval = index_interval
+        self.codec = None
+        self.blocks = []
+        self._mmap = None
+        self._size = 0
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def update(self):
+        """Map the segment again if it has grown, and index new records."""
+        size = os.path.getsize(self.path)
+        if size == self._size or size < len(SEGMENT_MAGIC) + 2:
+            return
+        if size < self._size:
+            # Truncated after a crash by the journal
+            self.blocks = []
+        with open(self.path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _read_segment_header(data)
+        if header is None:
+            data.close()
+            return
+        self.close()
+        self._mmap = data
+        self._size = size
+        start, self.codec = header
+        if not self.blocks:
+            self.blocks.append(_IndexBlock(start))
+        block = self.blocks[-1]
+        offset = block.end
+        size = len(data)
+        while offset + RECORD_HEADER.size <= size:
+            length, _, timestamp, name_length = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + _CRC_START + length
+            if end > size:
+                # Torn, or still being written
+                break
+            if block.count == self.index_interval:
+                block = _IndexBlock(offset)
+                self.blocks.append(block)
+            name_start = offset + RECORD_HEADER.size
+            block.result_types.add(data[name_start : name_start + name_length])
+            block.min_timestamp = min(block.min_timestamp, timestamp)
+            block.max_timestamp = max(block.max_timestamp, timestamp)
+            block.count += 1
+            block.end = offset = end
+
+    def scan(self, block, name, start, end):
+        """Yield the time and payload of the intact records of a block that
+        match a result type name and time window."""
+        data = self._mmap
+        offset = block.offset
+        while offset < block.end:
+            length, crc, timestamp, name_length = RECORD_HEADER.unpack_from(
+                data, offset
+            )
+            record_end = offset + _CRC_START + length
+            name_start = offset + RECORD_HEADER.size
+            payload_start = name_start + name_length
+            if (
+                (name is None or data[name_start:payload_start] == name)
+                and (start is None or timestamp >= start)
+                and (end is None or timestamp <= end)
+            ):
+                if zlib.crc32(data[offset + _CRC_START : record_end]) != crc:
+                    # The rest of the segment cannot be trusted
+                    return
+                yield timestamp, data[payload_start:record_end]
+            offset = record_end
+
+
+async def drain(
+    journal,
+    upload,
+    batch_size=DRAIN_BATCH_SIZE,
+    poll_interval=DRAIN_POLL_INTERVAL,
+    retry_interval=DRAIN_RETRY_INTERVAL,
+):
+    """Upload the results of a journal from its checkpoint until cancelled.
+
+    Reading and committing run in the event loop's default executor, so
+    the loop is never blocked on the disk.
+
+    :param journal: The `Journal` to drain.
+    :param upload: A coroutine function called with a list of results.
+    The batch is committed once it returns, and retried after
+    `retry_interval` seconds if it raises an exception.
+    :param batch_size: The maximum number of results uploaded at once.
+    :param poll_interval: The number of seconds to wait for more results
+    once the journal is drained.
+    :param retry_interval: The number of seconds to wait before retrying a
+    failed upload.
+    """
+    loop = asyncio.get_event_loop()
+    position = None
+    while True:
+        results, next_position = await loop.run_in_executor(
+            None, journal.read_batch, batch_size, position
+        )
+        if not results:
+            await asyncio.sleep(poll_interval)
+            continue
+        try:
+            await upload(results)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await asyncio.sleep(retry_interval)
+            continue
+        await loop.run_in_executor(None, journal.commit, next_position)
+        position = next_position
+
+
+def _list_segments(directory):
+    segments = []
+    for filename in os.listdir(directory):
+        name, suffix = os.path.splitext(filename)
+        if suffix == SEGMENT_SUFFIX and name.isdigit():
+            segments.append(int(name))
+    return sorted(segments)
+
+
+def _read_segment_header(data):
+    """Return the offset of the first record of a segment and the name of
+    its codec, or `None` if the header is incomplete.
+
+    :raises ValueError: If `data` does not start with a segment header.
+    """
+    start = len(SEGMENT_MAGIC) + 2
+    if data[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC[: len(data)]:
+        raise ValueError("Not a journal segment")
+    if len(data) < start:
+        return None
+    if data[len(SEGMENT_MAGIC)] != SEGMENT_VERSION:
+        raise ValueError(
+            "Unsupported journal segment version {version}".format(
+                version=data[len(SEGMENT_MAGIC)]
+            )
+        )
+    codec_start = start
+    start += data[len(SEGMENT_MAGIC) + 1]
+    if len(data) < start:
+        return None
+    return start, bytes(data[codec_start:start]).decode("utf-8")
+
+
+def _scan_records(segment, codec, data, offset, base=0):
+    """Yield the intact records of a segment from `offset` in `data`, which
+    starts at offset `base` of the segment, stopping at the first torn or
+    corrupt record."""
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc, timestamp, name_length = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + _CRC_START + length
+        if end > len(data) or zlib.crc32(data[offset + _CRC_START : end]) != crc:
+            return
+        name_start = offset + RECORD_HEADER.size
+        payload_start = name_start + name_length
+        yield JournalRecord(
+            position=JournalPosition(segment, base + end),
+            timestamp=timestamp,
+            result_type=bytes(data[name_start:payload_start]).decode("utf-8"),
+            codec=codec,
+            payload=data[payload_start:end],
+        )
+        offset = end
+
+
+def _decode_fields(data, names):
+    """Return the named fields of a deserialised result in an ordered dict."""
+    result_type = get_result_type(data["type"])
+    fields = data["fields"]
+    decoded = collections.OrderedDict()
+    for name in names:
+        value = fields.get(name)
+        field_type = unwrap_optional(result_type._field_types.get(name))
+        if (
+            value is not None
+            and isinstance(field_type, type)
+            and issubclass(field_type, enum.Enum)
+        ):
+            value = field_type(value)
+        else:
+            value = decode(value)
+        decoded[name] = value
+    return decoded
+
+
+def _write_all(f, data):
+    """Write all of `data` to an unbuffered file."""
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view) :]
+
+
+def _sync_directory(directory):
+    # Makes the creation, renaming and deletion of files durable
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
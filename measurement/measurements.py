@@ -20,9 +20,27 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 
+import asyncio
+import functools
 import typing
+from enum import Enum
+
+from measurement.trace import attach_trace, phase
 
 from measurement.results import MeasurementResult
+from measurement.timing import timed
+
+
+class ResourceClass(Enum):
+    """How a measurement uses the network link while it runs.
+
+    `shared` measurements (e.g. latency and traceroute probes) may run
+    alongside each other. `exclusive` measurements saturate the link and
+    must run alone so that they neither skew nor are skewed by others.
+    """
+
+    shared = "shared"
+    exclusive = "exclusive"
 
 
 class BaseMeasurement(object):
@@ -32,6 +50,13 @@ class BaseMeasurement(object):
     interface for creating new measurement types.
     """
 
+    resource_class = ResourceClass.shared
+    # Set to a `MeasurementTrace` to record the phases of `measure()`
+    trace = None
+    # Modules that `measure()` imports on first use, which long-running
+    # processes may import up front
+    deferred_imports = ()
+
     def __init__(self, id):
         """Initialisation of a base measurement
 
@@ -40,6 +65,69 @@ class BaseMeasurement(object):
         super(BaseMeasurement, self).__init__()
         self.id = id
 
-    def measure(self):
-        """Perform the measurement and return the measurement results."""
+    def measure(self, deadline=None):
+        """Perform the measurement and return the measurement results.
+
+        :param deadline: An optional `measurement.deadline.Deadline`
+        bounding the measurement and every sub-step it performs.
+        """
         raise NotImplementedError
+
+    def measure_iter(self, deadline=None):
+        """Perform the measurement, yielding each result as it is produced.
+
+        Composite measurements implement `_iter_results` so that the
+        results of each step are yielded as the step completes, before the
+        whole measurement does, which may not be the order `measure`
+        returns them in. Otherwise the results of `measure` are yielded
+        once it returns.
+        """
+        results = self._iter_results(deadline)
+        if results is None:
+            results = self._measure(deadline)
+            if not isinstance(results, list):
+                results = [results]
+        for result in results:
+            yield self._attach_trace(result)
+
+    def _iter_results(self, deadline):
+        """Perform the measurement step by step, yielding each result as
+        soon as it is produced, or return `None` if the measurement is not
+        performed in steps.
+
+        Measurements implementing this generator may build the results of
+        `measure` from `list(self._iter_results(deadline))`, reordering
+        them if need be.
+        """
+        return None
+
+    async def measure_async(self, deadline=None):
+        """Perform the measurement without blocking the event loop.
+
+        Measurements that can be performed natively with asyncio should
+        override this coroutine. By default `measure` is run in the
+        event loop's default executor.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self._measure, deadline)
+        )
+
+    def _phase(self, name):
+        """Record the enclosed block as the phase `name` if tracing."""
+        return phase(self.trace, name)
+
+    def _attach_trace(self, results):
+        """Attach the trace, if any, to each of `results`."""
+        if self.trace is not None and self.trace.measurement is None:
+            self.trace.measurement = type(self).__name__
+        return attach_trace(results, self.trace)
+
+    # Stamps any results the measurement did not stamp itself
+    @timed
+    def _measure(self, deadline):
+        # Measurements written before deadlines were introduced may not
+        # accept one, so it is only passed on when it is set.
+        if deadline is None:
+            return self.measure()
+        return self.measure(deadline=deadline)
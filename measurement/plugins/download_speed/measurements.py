@@ -5,10 +5,19 @@ import subprocess
 from six.moves.urllib.parse import urlparse
 from validators import ValidationFailure
 
-from measurement.measurements import BaseMeasurement
+from measurement import aio
+from measurement.deadline import Deadline
+from measurement.trace import record_bytes, record_subprocess
+from measurement.measurements import BaseMeasurement, ResourceClass
 from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
-from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.plugins.latency.measurements import (
+    ENGINES,
+    LatencyMeasurement,
+    MultiLatencyMeasurement,
+)
 from measurement.results import Error
+from measurement.timing import timed
+from measurement.tracebacks import cap_traceback
 from measurement.units import NetworkUnit, StorageUnit
 
 WGET_OUTPUT_REGEX = re.compile(
@@ -35,7 +44,9 @@ WGET_DOWNLOAD_RATE_UNIT_MAP = {
 class DownloadSpeedMeasurement(BaseMeasurement):
     """A measurement designed to test download speed."""
 
-    def __init__(self, id, urls, count=4, download_timeout=180):
+    resource_class = ResourceClass.exclusive
+
+    def __init__(self, id, urls, count=4, download_timeout=180, engine="ping"):
         """Initialisation of a download speed measurement.
 
         :param id: A unique identifier for the measurement.
@@ -45,6 +56,10 @@ class DownloadSpeedMeasurement(BaseMeasurement):
         pings to perform. Defaults to 4.
         :param download_timeout: An integer describing the number of
         seconds for the test to last. 0 means no timeout.
+        :param engine: How latency is measured, one of the latency
+        plugin's `ENGINES`. Every URL is tested at once to find the
+        least latent, with a `ping` each in parallel for the `ping`
+        engine.
         """
         super(DownloadSpeedMeasurement, self).__init__(id=id)
         if len(urls) < 1:
@@ -66,56 +81,160 @@ class DownloadSpeedMeasurement(BaseMeasurement):
                 "integer or `0` to turn off the timeout.".format(count=count)
             )
 
+        if engine not in ENGINES:
+            raise ValueError(
+                "A value of {engine} was provided for the engine. This must be one of "
+                "{engines}.".format(engine=engine, engines=", ".join(ENGINES))
+            )
+
         self.urls = urls
         self.count = count
         self.download_timeout = download_timeout
+        self.engine = engine
+
+    def measure(self, deadline=None):
+        """Perform the measurement.
+
+        :param deadline: An optional `Deadline` shared by the latency
+        tests and the download. Steps that cannot complete within it
+        are reported with a timeout error.
+        """
+        results = list(self._iter_results(deadline))
+        # The initial latency results are yielded first, but returned last
+        count = len(self.urls)
+        return self._attach_trace(results[count:] + results[:count])
+
+    def _iter_results(self, deadline):
+        """Yield the initial latency results, least latent first, once the
+        URLs are tested, then the download result, then the latency
+        result of the least latent URL."""
+        with self._phase("find_least_latent_url"):
+            initial_latency_results = self._find_least_latent_url(
+                self.urls, deadline=deadline
+            )
+        for _, result in initial_latency_results:
+            yield result
+        least_latent_url = initial_latency_results[0][0]
+        yield self._get_wget_results(
+            least_latent_url, self.download_timeout, deadline=deadline
+        )
+        if self.count > 0:
+            host = urlparse(least_latent_url).netloc
+            latency_measurement = LatencyMeasurement(
+                self.id, host, count=self.count, engine=self.engine
+            )
+            with self._phase("latency"):
+                latency_result = latency_measurement.measure(deadline=deadline)[0]
+            yield latency_result
 
-    def measure(self):
-        """Perform the measurement."""
-        initial_latency_results = self._find_least_latent_url(self.urls)
+    async def measure_async(self, deadline=None):
+        """Perform the measurement using asyncio subprocesses.
+
+        The initial latency tests against each URL run concurrently.
+        """
+        initial_latency_results = await self._find_least_latent_url_async(
+            self.urls, deadline=deadline
+        )
         least_latent_url = initial_latency_results[0][0]
-        results = [self._get_wget_results(least_latent_url, self.download_timeout)]
+        results = [
+            await self._get_wget_results_async(
+                least_latent_url, self.download_timeout, deadline=deadline
+            )
+        ]
         if self.count > 0:
             host = urlparse(least_latent_url).netloc
-            latency_measurement = LatencyMeasurement(self.id, host, count=self.count)
-            results.append(latency_measurement.measure()[0])
+            latency_measurement = LatencyMeasurement(
+                self.id, host, count=self.count, engine=self.engine
+            )
+            results.append((await latency_measurement.measure_async(deadline))[0])
 
         results.extend([res for _, res in initial_latency_results])
         return results
 
-    def _find_least_latent_url(self, urls):
+    def _find_least_latent_url(self, urls, deadline=None):
         """
-        Performs a latency test for each specified endpoint
+        Performs a concurrent latency test for each specified endpoint
         Returns a sorted list of LatencyResults, sorted by average latency and None
         """
-        initial_latency_results = []
-        for url in urls:
-            host = urlparse(url).netloc
-            latency_measurement = LatencyMeasurement(self.id, host, count=2)
-            initial_latency_results.append((url, latency_measurement.measure()[0]))
+        latency_measurement = self._get_initial_latency_measurement(urls)
+        return self._sort_latency_results(
+            list(zip(urls, latency_measurement.measure(deadline)))
+        )
+
+    async def _find_least_latent_url_async(self, urls, deadline=None):
+        """
+        Performs a concurrent latency test for each specified endpoint
+        Returns a sorted list of LatencyResults, sorted by average latency and None
+        """
+        latency_measurement = self._get_initial_latency_measurement(urls)
+        return self._sort_latency_results(
+            list(zip(urls, await latency_measurement.measure_async(deadline)))
+        )
+
+    def _get_initial_latency_measurement(self, urls):
+        return MultiLatencyMeasurement(
+            self.id, [urlparse(url).netloc for url in urls], count=2, engine=self.engine
+        )
+
+    def _sort_latency_results(self, latency_results):
         return sorted(
-            initial_latency_results,
+            latency_results,
             key=lambda x: (x[1].average_latency is None, x[1].average_latency),
         )
 
-    def _get_wget_results(self, url, download_timeout):
+    @timed
+    def _get_wget_results(self, url, download_timeout, deadline=None):
         """Perform the download measurement."""
         if url is None:
             return self._get_wget_error("wget-no-server", url, traceback=None)
 
         if download_timeout == 0:
             download_timeout = None
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return self._get_wget_error("wget-timeout", url, traceback=None)
+        with self._phase("wget"):
+            try:
+                record_subprocess()
+                wget_out = subprocess.run(
+                    self._get_wget_args(url),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    timeout=deadline.timeout(download_timeout),
+                    universal_newlines=True,
+                )
+            except subprocess.TimeoutExpired:
+                return self._get_wget_error("wget-timeout", url, traceback=None)
+            result = self._parse_wget_output(url, wget_out)
+            if result.download_size is not None:
+                # wget reports the size of the download in bytes
+                record_bytes(int(result.download_size))
+        return result
+
+    @timed
+    async def _get_wget_results_async(self, url, download_timeout, deadline=None):
+        """Perform the download measurement using an asyncio subprocess."""
+        if url is None:
+            return self._get_wget_error("wget-no-server", url, traceback=None)
+
+        if download_timeout == 0:
+            download_timeout = None
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return self._get_wget_error("wget-timeout", url, traceback=None)
         try:
-            wget_out = subprocess.run(
-                ["wget", "--tries=2", "-O", "/dev/null", url],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=download_timeout,
-                universal_newlines=True,
+            wget_out = await aio.run_subprocess(
+                self._get_wget_args(url), timeout=deadline.timeout(download_timeout)
             )
         except subprocess.TimeoutExpired:
             return self._get_wget_error("wget-timeout", url, traceback=None)
+        return self._parse_wget_output(url, wget_out)
+
+    def _get_wget_args(self, url):
+        return ["wget", "--tries=2", "-O", "/dev/null", url]
 
+    def _parse_wget_output(self, url, wget_out):
+        """Parse the output of a completed wget process."""
         if wget_out.returncode != 0:
             return self._get_wget_error("wget-err", url, traceback=wget_out.stderr)
         try:
@@ -175,7 +294,9 @@ class DownloadSpeedMeasurement(BaseMeasurement):
             download_size_unit=None,
             errors=[
                 Error(
-                    key=key, description=WGET_ERRORS.get(key, ""), traceback=traceback
+                    key=key,
+                    description=WGET_ERRORS.get(key, ""),
+                    traceback=cap_traceback(traceback),
                 )
             ],
         )
@@ -1,12 +1,26 @@
-import collections
-import sys
-
-import six
-
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    DownloadSpeedMeasurementResult = collections.namedtuple(
-        "DownloadSpeedMeasurementResult",
-        "id errors url download_size download_size_unit download_rate download_rate_unit",
-    )
+import typing
+
+from measurement.results import Field, MeasurementResult
+from measurement.units import NetworkUnit, StorageUnit
+
+
+class DownloadSpeedMeasurementResult(MeasurementResult):
+    """Encapsulates the results from a download speed measurement.
+
+    :param url: The URL that was used to perform the download speed
+    measurement.
+    :param download_size: The size of the download (excluding units)
+    that was used to perform the download speed measurement.
+    :param download_size_unit: The unit of measurement used
+    to describe the `download_size`.
+    :param download_rate: The rate measured in the download speed
+    measurement excluding units:
+    :param download_rate_unit: The unit of measurement used to
+    measure the `download_rate`.
+    """
+
+    url = Field(str)
+    download_size = Field(typing.Optional[float])
+    download_size_unit = Field(typing.Optional[StorageUnit])
+    download_rate = Field(typing.Optional[float])
+    download_rate_unit = Field(typing.Optional[NetworkUnit])
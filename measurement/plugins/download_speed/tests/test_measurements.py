@@ -3,8 +3,14 @@ from unittest import TestCase, mock
 import six
 import subprocess
 
-from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement import aio
+from measurement.deadline import Deadline
+from measurement.plugins.latency.measurements import (
+    LatencyMeasurement,
+    MultiLatencyMeasurement,
+)
 from measurement.results import Error
+from measurement.trace import MeasurementTrace
 from measurement.plugins.download_speed.measurements import WGET_OUTPUT_REGEX
 from measurement.plugins.download_speed.measurements import DownloadSpeedMeasurement
 from measurement.plugins.download_speed.measurements import WGET_ERRORS
@@ -211,7 +217,7 @@ class DownloadSpeedMeasurementClosestServerTestCase(TestCase):
         self.measurement = DownloadSpeedMeasurement("test", self.example_urls)
         print("asdf")
 
-    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
     def test_sort_least_latent_url(self, mock_latency_results):
         results = [
             (
@@ -266,7 +272,7 @@ class DownloadSpeedMeasurementClosestServerTestCase(TestCase):
                 ),
             ),
         ]
-        mock_latency_results.side_effect = results
+        mock_latency_results.return_value = [result for result, in results]
         self.assertEqual(
             self.measurement._find_least_latent_url(self.example_urls),
             [
@@ -276,7 +282,7 @@ class DownloadSpeedMeasurementClosestServerTestCase(TestCase):
             ],
         )
 
-    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
     def test_sort_one_url(self, mock_latency_results):
         results = [
             (
@@ -297,8 +303,258 @@ class DownloadSpeedMeasurementClosestServerTestCase(TestCase):
                 ),
             )
         ]
-        mock_latency_results.side_effect = results
+        mock_latency_results.return_value = [result for result, in results]
         self.assertEqual(
             self.measurement._find_least_latent_url([self.example_urls[1]]),
             [(self.example_urls[1], results[0][0])],
         )
+
+    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
+    def test_sort_least_latent_url_icmp(self, mock_multi_results, mock_results):
+        results = [
+            LatencyMeasurementResult(
+                id="test",
+                host=host,
+                minimum_latency=None,
+                average_latency=average_latency,
+                maximum_latency=None,
+                median_deviation=None,
+                errors=[],
+                packets_transmitted=None,
+                packets_received=None,
+                packets_lost=None,
+                packets_lost_unit=None,
+                elapsed_time=None,
+                elapsed_time_unit=None,
+            )
+            for host, average_latency in [
+                ("n1-validfakehost.com", None),
+                ("n2-validfakehost.com", 25.0),
+                ("n3-validfakehost.com", 999.0),
+            ]
+        ]
+        mock_multi_results.return_value = results
+        measurement = DownloadSpeedMeasurement("test", self.example_urls, engine="icmp")
+        self.assertEqual(
+            measurement._find_least_latent_url(self.example_urls),
+            [
+                (self.example_urls[1], results[1]),
+                (self.example_urls[2], results[2]),
+                (self.example_urls[0], results[0]),
+            ],
+        )
+        mock_multi_results.assert_called_once()
+        mock_results.assert_not_called()
+
+
+class DownloadSpeedMeasurementAsyncTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.example_urls = [
+            "http://n1-validfakehost.com",
+            "http://n2-validfakehost.com",
+        ]
+        self.measurement = DownloadSpeedMeasurement("test", self.example_urls)
+
+    @mock.patch("measurement.aio.run_subprocess")
+    def test_wget_results_async(self, mock_run_subprocess):
+        async def run_subprocess(args, timeout=None):
+            return subprocess.CompletedProcess(
+                args=args,
+                returncode=0,
+                stdout="",
+                stderr="\n2019-08-07 09:12:08 (16.7 KB/s) - '/dev/null’ saved [11376]\n\n",
+            )
+
+        mock_run_subprocess.side_effect = run_subprocess
+        result = aio.run(
+            self.measurement._get_wget_results_async(
+                "http://validfakehost.com/test", self.measurement.download_timeout
+            )
+        )
+        self.assertEqual(
+            result,
+            DownloadSpeedMeasurementResult(
+                id="test",
+                url="http://validfakehost.com/test",
+                download_rate_unit=NetworkUnit("Kibit/s"),
+                download_rate=133.6,
+                download_size=11376,
+                download_size_unit=StorageUnit.bit,
+                errors=[],
+            ),
+        )
+
+    @mock.patch("measurement.aio.run_subprocess")
+    def test_wget_results_async_timeout(self, mock_run_subprocess):
+        mock_run_subprocess.side_effect = subprocess.TimeoutExpired([], 180)
+        result = aio.run(
+            self.measurement._get_wget_results_async(
+                "http://validfakehost.com/test", self.measurement.download_timeout
+            )
+        )
+        self.assertEqual(result.errors[0].key, "wget-timeout")
+
+    @mock.patch.object(LatencyMeasurement, "measure_async")
+    def test_sort_least_latent_url_async(self, mock_measure_async):
+        async def measure_async(deadline=None):
+            return [
+                LatencyMeasurementResult(
+                    id="test",
+                    host="n1-validfakehost.com",
+                    minimum_latency=None,
+                    average_latency=latencies.pop(0),
+                    maximum_latency=None,
+                    median_deviation=None,
+                    errors=[],
+                    packets_transmitted=None,
+                    packets_received=None,
+                    packets_lost=None,
+                    packets_lost_unit=None,
+                    elapsed_time=None,
+                    elapsed_time_unit=None,
+                )
+            ]
+
+        latencies = [30.0, 25.0]
+        mock_measure_async.side_effect = measure_async
+        sorted_results = aio.run(
+            self.measurement._find_least_latent_url_async(self.example_urls)
+        )
+        self.assertEqual(
+            [(url, res.average_latency) for url, res in sorted_results],
+            [(self.example_urls[1], 25.0), (self.example_urls[0], 30.0)],
+        )
+
+
+class DownloadSpeedMeasurementIterTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.example_urls = [
+            "http://n1-validfakehost.com",
+            "http://n2-validfakehost.com",
+        ]
+        self.measurement = DownloadSpeedMeasurement("test", self.example_urls)
+        self.latency_results = [
+            LatencyMeasurementResult(
+                id="test",
+                host=host,
+                minimum_latency=None,
+                average_latency=average_latency,
+                maximum_latency=None,
+                median_deviation=None,
+                errors=[],
+                packets_transmitted=None,
+                packets_received=None,
+                packets_lost=None,
+                packets_lost_unit=None,
+                elapsed_time=None,
+                elapsed_time_unit=None,
+            )
+            for host, average_latency in [
+                ("n1-validfakehost.com", 30.0),
+                ("n2-validfakehost.com", 25.0),
+                ("n2-validfakehost.com", 24.0),
+            ]
+        ]
+        self.wget_result = DownloadSpeedMeasurementResult(
+            id="test",
+            url="http://n2-validfakehost.com",
+            download_rate_unit=NetworkUnit("Kibit/s"),
+            download_rate=133.6,
+            download_size=11376,
+            download_size_unit=StorageUnit.bit,
+            errors=[],
+        )
+
+    @mock.patch.object(DownloadSpeedMeasurement, "_get_wget_results")
+    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
+    def test_measure_iter(
+        self, mock_multi_results, mock_latency_results, mock_get_wget_results
+    ):
+        mock_multi_results.return_value = self.latency_results[:2]
+        mock_latency_results.return_value = [self.latency_results[2]]
+        mock_get_wget_results.return_value = self.wget_result
+        results = self.measurement.measure_iter()
+        # The initial latency results are yielded before the download
+        self.assertEqual(
+            [next(results), next(results)],
+            [self.latency_results[1], self.latency_results[0]],
+        )
+        mock_get_wget_results.assert_not_called()
+        self.assertEqual(next(results), self.wget_result)
+        # The download result is yielded before the final latency test
+        mock_latency_results.assert_not_called()
+        self.assertEqual(list(results), [self.latency_results[2]])
+        mock_get_wget_results.assert_called_once_with(
+            "http://n2-validfakehost.com", 180, deadline=None
+        )
+
+
+class DownloadSpeedMeasurementDeadlineTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.measurement = DownloadSpeedMeasurement(
+            "test", ["http://n1-validfakehost.com", "http://n2-validfakehost.com"]
+        )
+
+    @mock.patch("subprocess.run")
+    def test_cancelled_deadline_returns_timeouts(self, mock_run):
+        deadline = Deadline(60)
+        deadline.cancel()
+        results = self.measurement.measure(deadline=deadline)
+        mock_run.assert_not_called()
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0].errors[0].key, "wget-timeout")
+        self.assertEqual(
+            [result.errors[0].key for result in results[1:]], ["ping-timeout"] * 3
+        )
+
+    @mock.patch("subprocess.run")
+    def test_deadline_bounds_download_timeout(self, mock_run):
+        mock_run.side_effect = subprocess.TimeoutExpired([], 5)
+        result = self.measurement._get_wget_results(
+            "http://n1-validfakehost.com", 180, deadline=Deadline(5)
+        )
+        self.assertLessEqual(mock_run.call_args[1]["timeout"], 5)
+        self.assertEqual(result.errors[0].key, "wget-timeout")
+
+
+class DownloadSpeedMeasurementTraceTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.measurement = DownloadSpeedMeasurement(
+            "test", ["http://n1-validfakehost.com", "http://n2-validfakehost.com"]
+        )
+        self.measurement.trace = MeasurementTrace()
+
+    @mock.patch("subprocess.run")
+    def test_measure_records_phases(self, mock_run):
+        def run(args, **kwargs):
+            if args[0] == "ping":
+                return subprocess.CompletedProcess(
+                    args=args,
+                    returncode=0,
+                    stdout="rtt min/avg/max/mdev = 6.211/6.617/7.069/0.315 ms\n",
+                    stderr="",
+                )
+            return subprocess.CompletedProcess(
+                args=args,
+                returncode=0,
+                stdout="",
+                stderr="\n2019-08-07 09:12:08 (16.7 KB/s) - '/dev/null’ saved [11376]\n\n",
+            )
+
+        mock_run.side_effect = run
+        results = self.measurement.measure()
+        self.assertEqual(
+            [(p.name, p.subprocess_count) for p in self.measurement.trace.phases],
+            [("find_least_latent_url", 2), ("wget", 1), ("latency", 1)],
+        )
+        self.assertEqual(
+            self.measurement.trace.get_phases("wget")[0].bytes_transferred, 11376
+        )
+        for result in results:
+            self.assertIs(result.trace, self.measurement.trace)
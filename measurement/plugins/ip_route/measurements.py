@@ -9,29 +9,37 @@ Traceroute measurement is provided by the "scapy" library. Note that this librar
 raw sockets, or to have the CAP_NET_RAW capability set.
 
 """
+
+import asyncio
+import functools
 import socket
 import validators
 from validators import ValidationFailure
 
-# Both of these imports seem to be required in order to mock the traceroute function
-import scapy
-from scapy.layers.inet import traceroute
-
-
+from measurement.deadline import Deadline
 from measurement.measurements import BaseMeasurement
 from measurement.results import Error
+from measurement.timing import timed
+from measurement.tracebacks import cap_traceback
 from measurement.plugins.ip_route.results import IPRouteMeasurementResult
-from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.plugins.latency.measurements import (
+    ENGINES,
+    LatencyMeasurement,
+    MultiLatencyMeasurement,
+)
 
 ROUTE_ERRORS = {
     "route-err": "iproute encountered an unknown error",
     "route-address": "iproute failed to find socket address",
     "route-permission": "iproute does not have permission to create a raw socket",
+    "route-timeout": "iproute measurement deadline expired",
 }
 
 
 class IPRouteMeasurement(BaseMeasurement):
-    def __init__(self, id, hosts, route_timeout=10, count=4):
+    deferred_imports = ("scapy.layers.inet",)
+
+    def __init__(self, id, hosts, route_timeout=10, count=4, engine="ping"):
         super(IPRouteMeasurement, self).__init__(id=id)
 
         if len(hosts) < 1:
@@ -50,44 +58,122 @@ class IPRouteMeasurement(BaseMeasurement):
                 "integer or `0` to turn off the ping.".format(count=count)
             )
 
+        if engine not in ENGINES:
+            raise ValueError(
+                "A value of {engine} was provided for the engine. This must be one of "
+                "{engines}.".format(engine=engine, engines=", ".join(ENGINES))
+            )
+
         self.id = id
         self.hosts = hosts
         self.route_timeout = route_timeout
         self.count = count
+        self.engine = engine
+
+    def measure(self, deadline=None):
+        results = list(self._iter_results(deadline))
+        # The initial latency results are yielded first, but returned last
+        count = len(self.hosts)
+        return self._attach_trace(results[count:] + results[:count])
+
+    def _iter_results(self, deadline):
+        """Yield the initial latency results, least latent first, once the
+        hosts are tested, then the route result, then the latency result
+        of the least latent host."""
+        with self._phase("find_least_latent_host"):
+            initial_latency_results = self._find_least_latent_host(
+                self.hosts, deadline=deadline
+            )
+        for _, result in initial_latency_results:
+            yield result
+        least_latent_host = initial_latency_results[0][0]
+        with self._phase("traceroute"):
+            route_result = self._get_traceroute_result(
+                least_latent_host, deadline=deadline
+            )
+        yield route_result
+        if self.count > 0:
+            latency_measurement = LatencyMeasurement(
+                self.id, least_latent_host, count=self.count, engine=self.engine
+            )
+            with self._phase("latency"):
+                latency_result = latency_measurement.measure(deadline=deadline)[0]
+            yield latency_result
+
+    async def measure_async(self, deadline=None):
+        """Perform the measurement using asyncio.
 
-    def measure(self):
-        initial_latency_results = self._find_least_latent_host(self.hosts)
+        The initial latency tests run concurrently. scapy offers no
+        asyncio interface, so the traceroute itself runs in the event
+        loop's default executor.
+        """
+        initial_latency_results = await self._find_least_latent_host_async(
+            self.hosts, deadline=deadline
+        )
         least_latent_host = initial_latency_results[0][0]
-        results = [self._get_traceroute_result(least_latent_host)]
+        loop = asyncio.get_event_loop()
+        results = [
+            await loop.run_in_executor(
+                None,
+                functools.partial(
+                    self._get_traceroute_result, least_latent_host, deadline=deadline
+                ),
+            )
+        ]
         if self.count > 0:
             latency_measurement = LatencyMeasurement(
-                self.id, least_latent_host, count=self.count
+                self.id, least_latent_host, count=self.count, engine=self.engine
             )
-            results.append(latency_measurement.measure()[0])
+            results.append((await latency_measurement.measure_async(deadline))[0])
         results.extend([res for _, res in initial_latency_results])
         return results
 
-    def _find_least_latent_host(self, hosts):
+    def _find_least_latent_host(self, hosts, deadline=None):
         """
-        Performs a latency test for each specified host
+        Performs a concurrent latency test for each specified host
         Returns a sorted list of LatencyResults, sorted by average latency
         """
-        initial_latency_results = []
-        for host in hosts:
-            latency_measurement = LatencyMeasurement(self.id, host, count=2)
-            initial_latency_results.append((host, latency_measurement.measure()[0]))
+        latency_measurement = MultiLatencyMeasurement(
+            self.id, hosts, count=2, engine=self.engine
+        )
+        return self._sort_latency_results(
+            list(zip(hosts, latency_measurement.measure(deadline)))
+        )
+
+    async def _find_least_latent_host_async(self, hosts, deadline=None):
+        """
+        Performs a concurrent latency test for each specified host
+        Returns a sorted list of LatencyResults, sorted by average latency
+        """
+        latency_measurement = MultiLatencyMeasurement(
+            self.id, hosts, count=2, engine=self.engine
+        )
+        return self._sort_latency_results(
+            list(zip(hosts, await latency_measurement.measure_async(deadline)))
+        )
+
+    def _sort_latency_results(self, latency_results):
         return sorted(
-            initial_latency_results,
+            latency_results,
             key=lambda x: (x[1].average_latency is None, x[1].average_latency),
         )
 
-    def _get_traceroute_result(self, host):
+    @timed
+    def _get_traceroute_result(self, host, deadline=None):
+        # scapy is slow to import, so it is only imported when first used
+        import scapy.layers.inet
+
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return self._get_ip_route_error("route-timeout", traceback=None)
         try:
             # Test whether raw socket privileges exist:
             socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
 
             # Commence traceroute test:
-            traceroute_out = scapy.layers.inet.traceroute(host, verbose=0)
+            traceroute_out = scapy.layers.inet.traceroute(
+                host, timeout=deadline.timeout(self.route_timeout), verbose=0
+            )
             traceroute_trace = traceroute_out[0].get_trace()
             ip = list(traceroute_trace.keys())[0]
             hop_count = len(traceroute_trace[ip])
@@ -117,7 +203,9 @@ class IPRouteMeasurement(BaseMeasurement):
             route=None,
             errors=[
                 Error(
-                    key=key, description=ROUTE_ERRORS.get(key, ""), traceback=traceback
+                    key=key,
+                    description=ROUTE_ERRORS.get(key, ""),
+                    traceback=cap_traceback(traceback),
                 )
             ],
         )
@@ -1,11 +1,12 @@
-import collections
-import sys
+import typing
 
-import six
+from measurement.results import Field, MeasurementResult
 
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    IPRouteMeasurementResult = collections.namedtuple(
-        "IPRouteMeasurementResult", "id errors host hop_count ip route"
-    )
+
+class IPRouteMeasurementResult(MeasurementResult):
+    """Encapsulates the result from an IPRoute measurement."""
+
+    host = Field(typing.Optional[str])
+    hop_count = Field(typing.Optional[int])
+    ip = Field(typing.Optional[str])
+    route = Field(typing.Optional[list])
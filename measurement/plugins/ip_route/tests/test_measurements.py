@@ -1,8 +1,12 @@
 import socket
 from unittest import TestCase, mock
 
+from measurement import aio
 from measurement.plugins.ip_route.measurements import IPRouteMeasurement, ROUTE_ERRORS
-from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.plugins.latency.measurements import (
+    LatencyMeasurement,
+    MultiLatencyMeasurement,
+)
 from measurement.plugins.ip_route.results import IPRouteMeasurementResult
 from measurement.plugins.latency.results import LatencyMeasurementResult
 from measurement.results import Error
@@ -149,20 +153,21 @@ class IPRouteTestCase(TestCase):
 
     @mock.patch.object(socket, "socket")
     @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
     @mock.patch("scapy.layers.inet.traceroute")
-    def test_measure(self, mock_get_traceroute, mock_latency_results, mock_socket):
+    def test_measure(
+        self, mock_get_traceroute, mock_multi_results, mock_latency_results, mock_socket
+    ):
         iprm_three = IPRouteMeasurement(
             self.id, hosts=self.example_hosts_three, count=4
         )
         mock_trace = mock.MagicMock()
         mock_trace.get_trace.return_value = self.example_trace_five
         mock_get_traceroute.return_value = [mock_trace, None]
-        mock_latency_results.side_effect = [
-            self.example_latency_results_three[0],
-            self.example_latency_results_three[1],
-            self.example_latency_results_three[2],
-            self.example_least_latent_result,
+        mock_multi_results.return_value = [
+            results[0] for results in self.example_latency_results_three
         ]
+        mock_latency_results.return_value = self.example_least_latent_result
         self.assertEqual(
             iprm_three.measure(),
             [
@@ -174,6 +179,70 @@ class IPRouteTestCase(TestCase):
             ],
         )
 
+    @mock.patch.object(IPRouteMeasurement, "_get_traceroute_result")
+    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
+    def test_measure_iter(
+        self, mock_multi_results, mock_latency_results, mock_get_traceroute_result
+    ):
+        iprm_three = IPRouteMeasurement(
+            self.id, hosts=self.example_hosts_three, count=4
+        )
+        mock_get_traceroute_result.return_value = self.example_result_five
+        mock_multi_results.return_value = [
+            results[0] for results in self.example_latency_results_three
+        ]
+        mock_latency_results.return_value = self.example_least_latent_result
+        results = iprm_three.measure_iter()
+        # The initial latency results are yielded before the traceroute
+        self.assertEqual(
+            [next(results), next(results), next(results)],
+            [
+                self.example_latency_results_three[1][0],
+                self.example_latency_results_three[2][0],
+                self.example_latency_results_three[0][0],
+            ],
+        )
+        mock_get_traceroute_result.assert_not_called()
+        self.assertEqual(next(results), self.example_result_five)
+        # The route result is yielded before the final latency test
+        mock_latency_results.assert_not_called()
+        self.assertEqual(list(results), [self.example_least_latent_result[0]])
+        mock_get_traceroute_result.assert_called_once_with(
+            "www.fakesitetwo.com", deadline=None
+        )
+
+    @mock.patch.object(IPRouteMeasurement, "_get_traceroute_result")
+    def test_measure_async(self, mock_get_traceroute_result):
+        iprm_three = IPRouteMeasurement(
+            self.id, hosts=self.example_hosts_three, count=4
+        )
+        mock_get_traceroute_result.return_value = self.example_result_five
+        latency_results = dict(
+            zip(self.example_hosts_three, self.example_latency_results_three)
+        )
+
+        async def measure_async(measurement, deadline=None):
+            if measurement.count == 4:
+                return list(self.example_least_latent_result)
+            return list(latency_results[measurement.host])
+
+        with mock.patch.object(LatencyMeasurement, "measure_async", measure_async):
+            results = aio.run(iprm_three.measure_async())
+        mock_get_traceroute_result.assert_called_once_with(
+            "www.fakesitetwo.com", deadline=None
+        )
+        self.assertEqual(
+            results,
+            [
+                self.example_result_five,
+                self.example_least_latent_result[0],
+                self.example_latency_results_three[1][0],
+                self.example_latency_results_three[2][0],
+                self.example_latency_results_three[0][0],
+            ],
+        )
+
     @mock.patch.object(socket, "socket")
     @mock.patch("scapy.layers.inet.traceroute")
     def test_get_trace_five(self, mock_get_traceroute, mock_socket):
@@ -295,9 +364,11 @@ class IPRouteMeasurementLeastLatentTestCase(TestCase):
             self.id, hosts=self.example_hosts_three, count=4
         )
 
-    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
     def test_sort_least_latent_host(self, mock_latency_results):
-        mock_latency_results.side_effect = self.example_results_three
+        mock_latency_results.return_value = [
+            results[0] for results in self.example_results_three
+        ]
         self.assertEqual(
             self.iprm_three._find_least_latent_host(self.example_hosts_three),
             [
@@ -307,7 +378,7 @@ class IPRouteMeasurementLeastLatentTestCase(TestCase):
             ],
         )
 
-    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
     def test_sort_one_host(self, mock_latency_results):
         mock_latency_results.return_value = self.example_results_one
         self.assertEqual(
@@ -315,6 +386,26 @@ class IPRouteMeasurementLeastLatentTestCase(TestCase):
             [(self.example_hosts_one[0], self.example_results_one[0])],
         )
 
+    @mock.patch.object(LatencyMeasurement, "measure")
+    @mock.patch.object(MultiLatencyMeasurement, "measure")
+    def test_sort_least_latent_host_icmp(self, mock_multi_results, mock_results):
+        mock_multi_results.return_value = [
+            results[0] for results in self.example_results_three
+        ]
+        measurement = IPRouteMeasurement(
+            self.id, hosts=self.example_hosts_three, engine="icmp"
+        )
+        self.assertEqual(
+            measurement._find_least_latent_host(self.example_hosts_three),
+            [
+                (self.example_hosts_three[1], self.example_results_three[1][0]),
+                (self.example_hosts_three[2], self.example_results_three[2][0]),
+                (self.example_hosts_three[0], self.example_results_three[0][0]),
+            ],
+        )
+        mock_multi_results.assert_called_once()
+        mock_results.assert_not_called()
+
 
 class IPRouteMeasurementCreationTestCase(TestCase):
     def test_invalid_hosts(self, *args):
@@ -336,3 +427,8 @@ class IPRouteMeasurementCreationTestCase(TestCase):
 
     def test_valid_ip_host(self):
         IPRouteMeasurement("test", ["1.1.1.1"])
+
+    def test_invalid_engine(self):
+        self.assertRaises(
+            ValueError, IPRouteMeasurement, "test", ["1.1.1.1"], engine="fping"
+        )
@@ -0,0 +1,330 @@
+"""
+An in-process ICMP echo engine for latency measurements.
+
+`ping()` measures the latency to an address by sending ICMP echo
+requests from the measuring process itself, rather than running the
+`ping` command and parsing its output:
+
+    >>> replies, summary = ping("127.0.0.1", count=4)
+    >>> summary.average_latency
+    0.052
+
+`IcmpSocket` uses an unprivileged ICMP datagram socket where the kernel
+allows it, i.e. where the `net.ipv4.ping_group_range` sysctl includes the
+process's group, and otherwise falls back to a raw socket, which needs
+`CAP_NET_RAW`. Probes are sent every `interval` seconds, replies are
+received as they arrive in between, and both are timed with
+`perf_counter_ns()`. `ping_hosts()` interleaves the probes to many
+addresses over one socket, like `fping`.
+
+The values of each `Reply` and the `Summary` are computed in integer
+microseconds and rounded exactly as iputils `ping` prints them, so
+`LatencyMeasurement` builds the same results from either.
+"""
+
+import collections
+import math
+import random
+import socket
+import struct
+
+from measurement.deadline import Deadline
+from measurement.timing import perf_counter_ns
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+# The number of data bytes of each request, as sent by `ping`
+PAYLOAD_SIZE = 56
+# The number of seconds between requests, as sent by `ping`
+INTERVAL = 1.0
+# The number of seconds to wait for replies after the last request, as
+# `ping` lingers
+REPLY_TIMEOUT = 10.0
+
+# Not defined by the `socket` module
+IP_RECVTTL = getattr(socket, "IP_RECVTTL", 12)
+IP_TTL = getattr(socket, "IP_TTL", 2)
+
+_HEADER = struct.Struct("!BBHHH")
+_TTL = struct.Struct("i")
+
+
+class Reply(collections.namedtuple("Reply", "size address sequence ttl time")):
+    """An echo reply.
+
+    :param size: The number of bytes of the ICMP message.
+    :param address: The IPv4 address the reply is from.
+    :param sequence: The sequence number of the request, from 1.
+    :param ttl: The time to live of the reply.
+    :param time: The round trip time in microseconds.
+    """
+
+    __slots__ = ()
+
+
+class Summary(
+    collections.namedtuple(
+        "Summary",
+        "packets_transmitted packets_received minimum_latency average_latency "
+        "maximum_latency median_deviation elapsed_time expired",
+    )
+):
+    """The statistics of a ping, as `ping` prints them.
+
+    The latencies are in milliseconds, or `None` if there were no
+    replies, and `elapsed_time` is in whole milliseconds. `expired` is
+    whether the deadline expired before every reply was received.
+    """
+
+    __slots__ = ()
+
+
+class IcmpSocket(object):
+    """A socket sending ICMP echo requests and receiving their replies.
+
+    :raises OSError: If neither a datagram nor a raw ICMP socket can be
+    opened.
+    """
+
+    def __init__(self):
+        try:
+            self._socket = socket.socket(
+                socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP
+            )
+        except OSError:
+            self._socket = socket.socket(
+                socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP
+            )
+            self.raw = True
+        else:
+            self.raw = False
+            self._socket.setsockopt(socket.IPPROTO_IP, IP_RECVTTL, 1)
+        # The kernel replaces the identifier of datagram sockets with
+        # their port, and only delivers them their own replies
+        self.identifier = random.getrandbits(16)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._socket.close()
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def send(self, address, sequence, payload):
+        """Send an echo request with a sequence number to an address."""
+        header = _HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, self.identifier, sequence)
+        checksum = _get_checksum(header + payload)
+        header = _HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, self.identifier, sequence)
+        self._socket.sendto(header + payload, (address, 0))
+
+    def receive(self, timeout):
+        """Receive the next echo reply to this socket.
+
+        :param timeout: The number of seconds to wait for a reply.
+        :return: The `Reply`, with the `perf_counter_ns()` it was received
+        at instead of its time, or `None` if none arrived in time.
+        """
+        end_ns = perf_counter_ns() + int(timeout * 1e9)
+        while True:
+            self._socket.settimeout(max(0, end_ns - perf_counter_ns()) / 1e9)
+            try:
+                data, ancillary, _, (address, _) = self._socket.recvmsg(
+                    65535, socket.CMSG_SPACE(_TTL.size)
+                )
+            except socket.timeout:
+                return None
+            received_ns = perf_counter_ns()
+            if self.raw:
+                header_size = (data[0] & 0x0F) * 4
+                ttl = data[8]
+                data = data[header_size:]
+            else:
+                ttl = None
+                for level, kind, value in ancillary:
+                    if level == socket.IPPROTO_IP and kind == IP_TTL:
+                        ttl = _TTL.unpack(value[: _TTL.size])[0]
+            if len(data) < _HEADER.size:
+                continue
+            kind, _, _, identifier, sequence = _HEADER.unpack(data[: _HEADER.size])
+            if kind != ICMP_ECHO_REPLY or (self.raw and identifier != self.identifier):
+                continue
+            return Reply(
+                size=len(data),
+                address=address,
+                sequence=sequence,
+                ttl=ttl,
+                time=received_ns,
+            )
+
+
+def ping(
+    address,
+    count=4,
+    interval=INTERVAL,
+    timeout=REPLY_TIMEOUT,
+    deadline=None,
+    icmp_socket=None,
+    on_reply=None,
+):
+    """Ping an address.
+
+    :param address: The IPv4 address to ping.
+    :param count: The number of echo requests to send.
+    :param interval: The number of seconds between requests.
+    :param timeout: The number of seconds to wait for replies after the
+    last request.
+    :param deadline: A `Deadline` bounding the whole ping.
+    :param icmp_socket: The `IcmpSocket` to ping with, or `None` to open
+    one for the ping.
+    :param on_reply: A callable called with each `Reply` as it is
+    received, which returns whether to stop pinging, or `None`.
+    :return: The list of `Reply`, in the order received, and the
+    `Summary`.
+    :raises OSError: If a socket cannot be opened, or a request cannot be
+    sent.
+    """
+    return ping_hosts(
+        [address],
+        count,
+        interval,
+        timeout,
+        deadline,
+        icmp_socket=icmp_socket,
+        on_reply=on_reply,
+    )[address]
+
+
+def ping_hosts(
+    addresses,
+    count=4,
+    interval=INTERVAL,
+    timeout=REPLY_TIMEOUT,
+    deadline=None,
+    icmp_socket=None,
+    on_reply=None,
+):
+    """Ping many addresses at once over one socket.
+
+    Each interval a request is sent to every address in turn, so pinging
+    any number of addresses takes about as long as pinging one.
+
+    Accepts the same parameters as `ping()`, but for `addresses`, an
+    iterable of IPv4 addresses.
+
+    :return: A dict of the list of `Reply` and the `Summary` of each
+    address.
+    """
+    deadline = Deadline.coerce(deadline)
+    if icmp_socket is None:
+        with IcmpSocket() as icmp_socket:
+            return ping_hosts(
+                addresses, count, interval, timeout, deadline, icmp_socket, on_reply
+            )
+
+    addresses = list(collections.OrderedDict.fromkeys(addresses))
+    payload = bytes(index & 0xFF for index in range(PAYLOAD_SIZE))
+    interval_ns = int(interval * 1e9)
+    start_ns = next_ns = perf_counter_ns()
+    end_ns = None
+    transmitted = 0
+    # The time each request awaiting a reply was sent, by address and
+    # sequence number
+    sent = {}
+    replies = {address: [] for address in addresses}
+    outstanding = count * len(addresses)
+    expired = False
+    while True:
+        now_ns = perf_counter_ns()
+        if transmitted < count and now_ns >= next_ns:
+            transmitted += 1
+            sequence = transmitted & 0xFFFF
+            for address in addresses:
+                sent[(address, sequence)] = perf_counter_ns()
+                icmp_socket.send(address, sequence, payload)
+            next_ns += interval_ns
+            if transmitted == count:
+                end_ns = now_ns + int(timeout * 1e9)
+            continue
+        if not outstanding or (end_ns is not None and now_ns >= end_ns):
+            break
+        remaining = deadline.remaining()
+        if remaining == 0:
+            expired = True
+            break
+        wait = ((next_ns if end_ns is None else end_ns) - now_ns) / 1e9
+        reply = icmp_socket.receive(wait if remaining is None else min(wait, remaining))
+        if reply is None:
+            continue
+        sent_ns = sent.pop((reply.address, reply.sequence), None)
+        if sent_ns is None:
+            # A duplicate, a reply to an earlier ping, or from elsewhere
+            continue
+        outstanding -= 1
+        reply = reply._replace(time=(reply.time - sent_ns) // 1000)
+        replies[reply.address].append(reply)
+        if on_reply is not None and on_reply(reply):
+            break
+    elapsed_ns = perf_counter_ns() - start_ns
+    return {
+        address: (
+            replies[address],
+            _get_summary(
+                transmitted,
+                replies[address],
+                elapsed_ns,
+                expired and len(replies[address]) < count,
+            ),
+        )
+        for address in addresses
+    }
+
+
+def format_time(microseconds):
+    """Return a round trip time in milliseconds as `ping` prints it."""
+    if microseconds >= 100000 - 50:
+        return "{0}".format((microseconds + 500) // 1000)
+    if microseconds >= 10000 - 5:
+        microseconds += 50
+        return "{0}.{1:01d}".format(microseconds // 1000, microseconds % 1000 // 100)
+    if microseconds >= 1000:
+        microseconds += 5
+        return "{0}.{1:02d}".format(microseconds // 1000, microseconds % 1000 // 10)
+    return "{0}.{1:03d}".format(microseconds // 1000, microseconds % 1000)
+
+
+def _get_summary(transmitted, replies, elapsed_ns, expired):
+    received = len(replies)
+    latencies = [None] * 4
+    if received:
+        times = [reply.time for reply in replies]
+        average = sum(times) // received
+        deviation = int(
+            math.sqrt(max(0, sum(t * t for t in times) // received - average**2))
+        )
+        latencies = [
+            value / 1000 for value in (min(times), average, max(times), deviation)
+        ]
+    return Summary(
+        packets_transmitted=transmitted,
+        packets_received=received,
+        minimum_latency=latencies[0],
+        average_latency=latencies[1],
+        maximum_latency=latencies[2],
+        median_deviation=latencies[3],
+        elapsed_time=(elapsed_ns + 500000) // 1000000,
+        expired=expired,
+    )
+
+
+def _get_checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack("!{0}H".format(len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
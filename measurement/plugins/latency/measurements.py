@@ -1,16 +1,37 @@
+import asyncio
+import collections
+import concurrent.futures
+import math
 import re
+import signal
+import socket
 import subprocess
+import threading
 
 import validators
 from validators import ValidationFailure
 
+from measurement import aio
+from measurement.deadline import Deadline
+from measurement.plugins.latency.icmp import (
+    INTERVAL,
+    REPLY_TIMEOUT,
+    IcmpSocket,
+    format_time,
+    ping,
+    ping_hosts,
+)
+from measurement.plugins.latency.stream import ReplyMonitor, ReplyStatistics
+from measurement.trace import active_phases, inherit_phases, record_subprocess
 from measurement.measurements import BaseMeasurement
 from measurement.plugins.latency.results import (
     LatencyMeasurementResult,
     LatencyIndividualMeasurementResult,
 )
 from measurement.results import Error
-from measurement.units import RatioUnit, TimeUnit, StorageUnit
+from measurement.timing import timed
+from measurement.tracebacks import cap_traceback
+from measurement.units import RatioUnit, TimeUnit, StorageUnit, convert
 
 LATENCY_OUTPUT_REGEX = re.compile(
     r"= (?P<minimum_latency>[\d.].*)/(?P<average_latency>[\d.].*)/(?P<maximum_latency>[\d.].*)/(?P<median_deviation>[\d.].*) "
@@ -36,17 +57,103 @@ LATENCY_ERRORS = {
     "ping-median-deviation": "ping could not process the median deviation.",
     "ping-no-server": "No closest server could be resolved.",
     "ping-timeout": "Measurement request timed out.",
+    "ping-socket": "An ICMP socket could not be opened.",
 }
+# How latency is measured: by running `ping`, with an in-process ICMP
+# socket, or with an ICMP socket where one can be opened and `ping`
+# otherwise
+ENGINES = ("ping", "icmp", "auto")
+# The count from which `ping` output is parsed as it is printed, rather
+# than once `ping` exits
+STREAM_COUNT = 100
+# The number of lines of streamed `ping` output kept for errors
+STREAM_TAIL_LINES = 8
+# The number of seconds `ping` is given past its time limit to print
+# its statistics and exit, before it is killed
+DEADLINE_GRACE = 1.0
 
 
 class LatencyMeasurement(BaseMeasurement):
-    def __init__(self, id, host, count=4, include_individual_results=False):
+    def __init__(
+        self,
+        id,
+        host,
+        count=4,
+        include_individual_results=False,
+        engine="ping",
+        on_reply=None,
+        target_replies=None,
+        target_margin=None,
+        interval=None,
+        per_reply_timeout=None,
+        time_limit=None,
+    ):
+        """Initialisation of a latency measurement.
+
+        :param id: A unique identifier for the measurement.
+        :param host: The host name or IPv4 address to measure the
+        latency to.
+        :param count: The number of pings to perform.
+        :param include_individual_results: Should each of the
+        individualised ping iterations be included in the results?
+        :param engine: How latency is measured, one of `ENGINES`.
+        :param on_reply: A callable called with each reply as a
+        `LatencyIndividualMeasurementResult` as it arrives.
+        :param target_replies: The number of replies to stop pinging
+        after, before `count` pings if every reply arrives.
+        :param target_margin: The margin of error in milliseconds of the
+        95% confidence interval of the average latency to stop pinging
+        at.
+        :param interval: The number of seconds between pings, or `None`
+        for one second.
+        :param per_reply_timeout: The number of seconds to wait for each
+        reply, or `None` for the default of the engine.
+        :param time_limit: The number of seconds to stop pinging after,
+        or `None` for no limit.
+
+        When `time_limit` stops the measurement before every reply has
+        arrived, the statistics of the replies received are reported with
+        a `ping-timeout` error. `ping` is killed if it is still running
+        `DEADLINE_GRACE` seconds after the time limit, as when the host
+        name is slow to resolve.
+
+        With any of `on_reply`, `target_replies` or `target_margin`, or
+        a `count` of at least `STREAM_COUNT`, the output of `ping` is
+        parsed line by line as it is printed, in constant memory.
+        """
         super(LatencyMeasurement, self).__init__(id=id)
         if count < 1:
             raise ValueError(
                 "A value of {count} was provided for the number of pings. This must be a positive "
                 "integer greater than 0.".format(count=count)
             )
+        if target_replies is not None and target_replies < 1:
+            raise ValueError(
+                "A value of {target_replies} was provided for the target number of replies. This "
+                "must be a positive integer greater than 0.".format(
+                    target_replies=target_replies
+                )
+            )
+        if target_margin is not None and target_margin <= 0:
+            raise ValueError(
+                "A value of {target_margin} was provided for the target margin of error. This "
+                "must be a positive number.".format(target_margin=target_margin)
+            )
+        for name, value in (
+            ("interval between pings", interval),
+            ("reply timeout", per_reply_timeout),
+            ("time limit", time_limit),
+        ):
+            if value is not None and value <= 0:
+                raise ValueError(
+                    "A value of {value} was provided for the {name}. This must be a "
+                    "positive number.".format(value=value, name=name)
+                )
+        if engine not in ENGINES:
+            raise ValueError(
+                "A value of {engine} was provided for the engine. This must be one of "
+                "{engines}.".format(engine=engine, engines=", ".join(ENGINES))
+            )
 
         validated_domain = validators.domain(host)
         validated_ip = validators.ipv4(host)
@@ -58,16 +165,35 @@ class LatencyMeasurement(BaseMeasurement):
         self.host = host
         self.count = count
         self.include_individual_results = include_individual_results
+        self.engine = engine
+        self.on_reply = on_reply
+        self.target_replies = target_replies
+        self.target_margin = target_margin
+        self.interval = interval
+        self.per_reply_timeout = per_reply_timeout
+        self.time_limit = time_limit
+
+    def measure(self, deadline=None):
+        return self._attach_trace(
+            self._get_latency_results(
+                self.host,
+                count=self.count,
+                include_individual_results=self.include_individual_results,
+                deadline=deadline,
+            )
+        )
 
-    def measure(self):
-        return self._get_latency_results(
+    async def measure_async(self, deadline=None):
+        return await self._get_latency_results_async(
             self.host,
             count=self.count,
             include_individual_results=self.include_individual_results,
+            deadline=deadline,
         )
 
-    def _get_latency_results(  # noqa: C901
-        self, host, count=4, include_individual_results=False
+    @timed
+    def _get_latency_results(
+        self, host, count=4, include_individual_results=False, deadline=None
     ):
         """Perform the latency measurement.
 
@@ -75,6 +201,7 @@ class LatencyMeasurement(BaseMeasurement):
         :param count: The number of pings to determine latency with.
         :param include_individual_results: Should each of the
         individualised ping iterations be included in the results?
+        :param deadline: A `Deadline` bounding the ping process.
         :return: A list of `LatencyMeasurementResult` and
         `LatencyIndividualMeasurementResult` if individual results are
         enabled.
@@ -82,13 +209,385 @@ class LatencyMeasurement(BaseMeasurement):
         if host is None:
             return [self._get_latency_error("ping-no-server", host, traceback=None)]
 
-        latency_out = subprocess.run(
-            ["ping", "-c", "{c}".format(c=count), "{h}".format(h=host)],
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return [self._get_latency_error("ping-timeout", host, traceback=None)]
+        if self.engine != "ping":
+            with self._phase("ping"):
+                results = self._get_icmp_results(
+                    host, count, include_individual_results, deadline
+                )
+            if results is not None:
+                return results
+        deadline = self._get_ping_deadline(deadline)
+        if self._is_streamed(count):
+            with self._phase("ping"):
+                return self._stream_latency_results(
+                    host, count, include_individual_results, deadline
+                )
+        try:
+            with self._phase("ping"):
+                record_subprocess()
+                latency_out = subprocess.run(
+                    self._get_ping_args(host, count),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    timeout=deadline.remaining(),
+                    universal_newlines=True,
+                )
+        except subprocess.TimeoutExpired as e:
+            return self._parse_partial_latency_output(
+                host, e.stdout, include_individual_results=include_individual_results
+            )
+        return self._parse_latency_output(
+            host, latency_out, include_individual_results=include_individual_results
+        )
+
+    @timed
+    async def _get_latency_results_async(
+        self, host, count=4, include_individual_results=False, deadline=None
+    ):
+        """Perform the latency measurement using an asyncio subprocess.
+
+        Accepts the same parameters and returns the same results as
+        `_get_latency_results`.
+        """
+        if host is None:
+            return [self._get_latency_error("ping-no-server", host, traceback=None)]
+
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return [self._get_latency_error("ping-timeout", host, traceback=None)]
+        if self.engine != "ping":
+            results = await asyncio.get_event_loop().run_in_executor(
+                None,
+                self._get_icmp_results,
+                host,
+                count,
+                include_individual_results,
+                deadline,
+            )
+            if results is not None:
+                return results
+        deadline = self._get_ping_deadline(deadline)
+        if self._is_streamed(count):
+            return await asyncio.get_event_loop().run_in_executor(
+                None,
+                self._stream_latency_results,
+                host,
+                count,
+                include_individual_results,
+                deadline,
+            )
+        try:
+            latency_out = await aio.run_subprocess(
+                self._get_ping_args(host, count), timeout=deadline.remaining()
+            )
+        except subprocess.TimeoutExpired as e:
+            return self._parse_partial_latency_output(
+                host, e.stdout, include_individual_results=include_individual_results
+            )
+        return self._parse_latency_output(
+            host, latency_out, include_individual_results=include_individual_results
+        )
+
+    def _get_icmp_results(self, host, count, include_individual_results, deadline):
+        """Perform the latency measurement with an in-process ICMP socket.
+
+        Accepts the same parameters and returns the same results as
+        `_get_latency_results`, or `None` if the engine is `auto` and no
+        ICMP socket can be opened, for `ping` to be run instead.
+        """
+        deadline = deadline.bound(self.time_limit)
+        try:
+            icmp_socket = IcmpSocket()
+        except OSError as e:
+            if self.engine == "auto":
+                return None
+            return [self._get_latency_error("ping-socket", host, traceback=str(e))]
+        monitor = self._get_reply_monitor()
+        reverse_dns_addresses = {}
+
+        def on_reply(reply):
+            return monitor.add(
+                self._get_icmp_individual_result(host, reply, reverse_dns_addresses)
+            )
+
+        with icmp_socket:
+            try:
+                address = socket.gethostbyname(host)
+                replies, summary = ping(
+                    address,
+                    count,
+                    interval=INTERVAL if self.interval is None else self.interval,
+                    timeout=(
+                        REPLY_TIMEOUT
+                        if self.per_reply_timeout is None
+                        else self.per_reply_timeout
+                    ),
+                    deadline=deadline,
+                    icmp_socket=icmp_socket,
+                    on_reply=on_reply if self._is_streamed(count) else None,
+                )
+            except OSError as e:
+                return [self._get_latency_error("ping-err", host, traceback=str(e))]
+        return self._get_icmp_ping_results(
+            host, replies, summary, include_individual_results
+        )
+
+    def _get_icmp_ping_results(
+        self, host, replies, summary, include_individual_results=False
+    ):
+        """Build the results of a ping by the ICMP engine.
+
+        :param host: The host name the test was performed against.
+        :param replies: The list of `Reply` of the ping.
+        :param summary: The `Summary` of the ping.
+        :param include_individual_results: Should each of the
+        individualised ping iterations be included in the results?
+        """
+        errors = []
+        if summary.expired:
+            # The statistics of the replies received before the deadline
+            # are still reported
+            errors.append(self._get_error("ping-timeout", traceback=None))
+        elif not summary.packets_received:
+            # As `ping` exits with an error when there are no replies
+            return [
+                self._get_latency_error(
+                    "ping-err",
+                    host,
+                    traceback="{transmitted} packets transmitted, 0 received".format(
+                        transmitted=summary.packets_transmitted
+                    ),
+                )
+            ]
+
+        results = [
+            LatencyMeasurementResult(
+                id=self.id,
+                host=host,
+                minimum_latency=summary.minimum_latency,
+                average_latency=summary.average_latency,
+                maximum_latency=summary.maximum_latency,
+                median_deviation=summary.median_deviation,
+                packets_transmitted=summary.packets_transmitted,
+                packets_received=summary.packets_received,
+                packets_lost=_get_packets_lost(
+                    summary.packets_transmitted, summary.packets_received
+                ),
+                packets_lost_unit=RatioUnit.percentage,
+                elapsed_time=float(summary.elapsed_time),
+                elapsed_time_unit=TimeUnit.millisecond,
+                errors=errors,
+            )
+        ]
+
+        if include_individual_results:
+            reverse_dns_addresses = {}
+            for reply in replies:
+                results.append(
+                    self._get_icmp_individual_result(host, reply, reverse_dns_addresses)
+                )
+
+        return results
+
+    def _get_icmp_individual_result(self, host, reply, reverse_dns_addresses):
+        """Build the result of a reply received by the ICMP engine.
+
+        :param reverse_dns_addresses: A dict caching the reverse DNS
+        address of each IP address.
+        """
+        if reply.address not in reverse_dns_addresses:
+            reverse_dns_addresses[reply.address] = _get_reverse_dns_address(
+                reply.address
+            )
+        # As strings, as the text parser produces
+        return LatencyIndividualMeasurementResult(
+            id=self.id,
+            host=host,
+            errors=[],
+            packet_size=str(reply.size),
+            packet_size_unit=StorageUnit.bytes,
+            reverse_dns_address=reverse_dns_addresses[reply.address],
+            ip_address=reply.address,
+            icmp_sequence=str(reply.sequence),
+            time_to_live=str(reply.ttl),
+            elapsed_time=format_time(reply.time),
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+
+    def _is_streamed(self, count):
+        """Return whether replies are handled as they arrive."""
+        return (
+            count >= STREAM_COUNT
+            or self.on_reply is not None
+            or self.target_replies is not None
+            or self.target_margin is not None
+        )
+
+    def _get_reply_monitor(self):
+        return ReplyMonitor(
+            on_reply=self.on_reply,
+            target_replies=self.target_replies,
+            target_margin=self.target_margin,
+        )
+
+    def _stream_latency_results(  # noqa: C901
+        self, host, count, include_individual_results, deadline
+    ):
+        """Perform the latency measurement, parsing each line of the
+        output of ping as it is printed.
+
+        Each reply is passed to `on_reply` as it is parsed, and ping is
+        interrupted once the replies meet `target_replies` or
+        `target_margin`, upon which it prints its statistics and exits.
+        Only the individual results, if included, are kept.
+
+        Accepts the same parameters and returns the same results as
+        `_get_latency_results`.
+        """
+        monitor = self._get_reply_monitor()
+        individual_results = []
+        packets = latencies = None
+        # The last lines, to report if the output is not as anticipated
+        tail = collections.deque(maxlen=STREAM_TAIL_LINES)
+        interrupted = False
+        # The highest sequence number replied to, for the number of pings
+        # sent if ping is killed before printing its statistics
+        transmitted = None
+
+        record_subprocess()
+        # Errors are read with the output, so that neither pipe can fill
+        # and block ping while the other is read
+        process = subprocess.Popen(
+            self._get_ping_args(host, count),
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             universal_newlines=True,
         )
+        timer = None
+        if deadline.remaining() is not None:
+            timer = threading.Timer(deadline.remaining(), process.kill)
+            timer.daemon = True
+            timer.start()
+        try:
+            for line in process.stdout:
+                tail.append(line)
+                match = LATENCY_INDIVIDUAL_PING_REGEX.search(line.rstrip("\n"))
+                if match is not None:
+                    result = self._get_individual_result(host, match.groups())
+                    transmitted = _get_transmitted(transmitted, result)
+                    if include_individual_results:
+                        individual_results.append(result)
+                    if monitor.add(result) and not interrupted:
+                        process.send_signal(signal.SIGINT)
+                        interrupted = True
+                    continue
+                match = LATENCY_PACKETS_REGEX.search(line)
+                if match is not None:
+                    packets = match.groupdict()
+                    continue
+                match = LATENCY_OUTPUT_REGEX.search(line)
+                if match is not None:
+                    latencies = match.groupdict()
+            returncode = process.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+        if deadline.expired() or (
+            returncode == 1 and self.time_limit is not None and not interrupted
+        ):
+            # Killed at the deadline, or stopped by ping at the time limit
+            return [
+                self._get_partial_latency_result(
+                    host,
+                    packets,
+                    latencies,
+                    monitor.statistics,
+                    transmitted,
+                    traceback="".join(tail),
+                )
+            ] + individual_results
+        # With a time limit, ping also exits with 1 when it is interrupted
+        # at the target before `count` replies
+        if returncode != 0 and not (returncode == 1 and interrupted):
+            return [self._get_latency_error("ping-err", host, traceback="".join(tail))]
+        if packets is None:
+            return [
+                self._get_latency_error("ping-regex", host, traceback="".join(tail))
+            ]
 
+        try:
+            latencies = _get_latencies(latencies, monitor.statistics)
+        except ValueError:
+            return [
+                self._get_latency_error("ping-regex", host, traceback="".join(tail))
+            ]
+
+        results = [
+            LatencyMeasurementResult(
+                id=self.id,
+                host=host,
+                minimum_latency=latencies[0],
+                average_latency=latencies[1],
+                maximum_latency=latencies[2],
+                median_deviation=latencies[3],
+                packets_transmitted=int(packets["packets_transmitted"]),
+                packets_received=int(packets["packets_received"]),
+                packets_lost=float(packets["packet_loss"]),
+                packets_lost_unit=RatioUnit.percentage,
+                elapsed_time=float(packets["time"]),
+                elapsed_time_unit=TimeUnit(packets["time_unit"]),
+                errors=[],
+            )
+        ]
+        return results + individual_results
+
+    def _get_ping_deadline(self, deadline):
+        """Return the deadline to kill ping at, `deadline` bounded by the
+        measurement's time limit and `DEADLINE_GRACE`."""
+        if self.time_limit is None:
+            return deadline
+        return deadline.bound(math.ceil(self.time_limit) + DEADLINE_GRACE)
+
+    def _get_ping_args(self, host, count):
+        args = ["ping", "-c", "{c}".format(c=count)]
+        if self.interval is not None:
+            args += ["-i", "{i:g}".format(i=self.interval)]
+        if self.per_reply_timeout is not None:
+            args += ["-W", "{W:g}".format(W=self.per_reply_timeout)]
+        if self.time_limit is not None:
+            # In whole seconds, as ping accepts
+            args += ["-w", "{w}".format(w=math.ceil(self.time_limit))]
+        return args + ["{h}".format(h=host)]
+
+    def _parse_latency_output(  # noqa: C901
+        self, host, latency_out, include_individual_results=False
+    ):
+        """Parse the output of a completed ping process.
+
+        :param host: The host name the test was performed against.
+        :param latency_out: The `subprocess.CompletedProcess` of the
+        ping command.
+        :param include_individual_results: Should each of the
+        individualised ping iterations be included in the results?
+        :return: A list of `LatencyMeasurementResult` and
+        `LatencyIndividualMeasurementResult` if individual results are
+        enabled.
+        """
+        if latency_out.returncode == 1 and "-w" in latency_out.args:
+            # ping reached its time limit before every reply arrived
+            return self._parse_partial_latency_output(
+                host,
+                latency_out.stdout,
+                include_individual_results=include_individual_results,
+            )
         # Note: only this error cares about stderr, other issues will be evident in stdout
         if latency_out.returncode != 0:
             return [
@@ -204,24 +703,116 @@ class LatencyMeasurement(BaseMeasurement):
         if include_individual_results:
             matches = LATENCY_INDIVIDUAL_PING_REGEX.findall(latency_out.stdout)
             for match in matches:
-                results.append(
-                    LatencyIndividualMeasurementResult(
-                        id=self.id,
-                        host=host,
-                        errors=[],
-                        packet_size=match[0],
-                        packet_size_unit=StorageUnit(match[1].replace("bytes", "B")),
-                        reverse_dns_address=match[2],
-                        ip_address=match[3],
-                        icmp_sequence=match[4],
-                        time_to_live=match[5],
-                        elapsed_time=match[6],
-                        elapsed_time_unit=TimeUnit(match[7]),
-                    )
-                )
+                results.append(self._get_individual_result(host, match))
 
         return results
 
+    def _parse_partial_latency_output(
+        self, host, stdout, include_individual_results=False
+    ):
+        """Parse the output of a ping stopped by a deadline.
+
+        The statistics ping printed are reported if it printed them, and
+        otherwise those of the replies it printed, with a `ping-timeout`
+        error.
+
+        Accepts the same parameters and returns the same results as
+        `_parse_latency_output`, but for `stdout`, the output of ping up
+        to the deadline, or `None`.
+        """
+        if isinstance(stdout, bytes):
+            stdout = stdout.decode(errors="replace")
+        stdout = stdout or ""
+        statistics = ReplyStatistics()
+        individual_results = []
+        transmitted = None
+        for match in LATENCY_INDIVIDUAL_PING_REGEX.findall(stdout):
+            result = self._get_individual_result(host, match)
+            statistics.add(
+                convert(
+                    result.elapsed_time, result.elapsed_time_unit, TimeUnit.millisecond
+                )
+            )
+            transmitted = _get_transmitted(transmitted, result)
+            if include_individual_results:
+                individual_results.append(result)
+
+        packets = LATENCY_PACKETS_REGEX.search(stdout)
+        latencies = LATENCY_OUTPUT_REGEX.search(stdout)
+        return [
+            self._get_partial_latency_result(
+                host,
+                packets and packets.groupdict(),
+                latencies and latencies.groupdict(),
+                statistics,
+                transmitted,
+                traceback=stdout,
+            )
+        ] + individual_results
+
+    def _get_partial_latency_result(
+        self, host, packets, latencies, statistics, transmitted, traceback
+    ):
+        """Build the result of a ping stopped by a deadline.
+
+        :param host: The host name the test was performed against.
+        :param packets: The groups of the match of
+        `LATENCY_PACKETS_REGEX`, or `None` if ping printed no statistics.
+        :param latencies: The groups of the match of
+        `LATENCY_OUTPUT_REGEX`, or `None`.
+        :param statistics: The `ReplyStatistics` of the replies printed.
+        :param transmitted: The number of pings known to have been sent,
+        or `None`, if ping printed no statistics.
+        :param traceback: The output of ping, for the `ping-timeout`
+        error.
+        """
+        received = statistics.count
+        packets_lost = _get_packets_lost(transmitted, received)
+        elapsed_time = elapsed_time_unit = None
+        if packets is not None:
+            transmitted = int(packets["packets_transmitted"])
+            received = int(packets["packets_received"])
+            packets_lost = float(packets["packet_loss"])
+            elapsed_time = float(packets["time"])
+            elapsed_time_unit = TimeUnit(packets["time_unit"])
+        try:
+            latencies = _get_latencies(latencies, statistics)
+        except ValueError:
+            latencies = _get_latencies(None, statistics)
+
+        return LatencyMeasurementResult(
+            id=self.id,
+            host=host,
+            minimum_latency=latencies[0],
+            average_latency=latencies[1],
+            maximum_latency=latencies[2],
+            median_deviation=latencies[3],
+            packets_transmitted=transmitted,
+            packets_received=received if transmitted is not None else None,
+            packets_lost=packets_lost,
+            packets_lost_unit=None if packets_lost is None else RatioUnit.percentage,
+            elapsed_time=elapsed_time,
+            elapsed_time_unit=elapsed_time_unit,
+            errors=[self._get_error("ping-timeout", traceback=traceback)],
+        )
+
+    def _get_individual_result(self, host, match):
+        """Build the result of a reply from the groups of its match of
+        `LATENCY_INDIVIDUAL_PING_REGEX`."""
+        return LatencyIndividualMeasurementResult(
+            id=self.id,
+            host=host,
+            errors=[],
+            packet_size=match[0],
+            packet_size_unit=StorageUnit(match[1].replace("bytes", "B")),
+            reverse_dns_address=match[2],
+            ip_address=match[3],
+            icmp_sequence=match[4],
+            time_to_live=match[5],
+            elapsed_time=match[6],
+            elapsed_time_unit=TimeUnit(match[7]),
+        )
+
     def _get_latency_error(self, key, host, traceback):
         return LatencyMeasurementResult(
             id=self.id,
@@ -236,11 +827,215 @@ class LatencyMeasurement(BaseMeasurement):
             packets_lost_unit=None,
             elapsed_time=None,
             elapsed_time_unit=None,
-            errors=[
-                Error(
-                    key=key,
-                    description=LATENCY_ERRORS.get(key, ""),
-                    traceback=traceback,
+            errors=[self._get_error(key, traceback)],
+        )
+
+    def _get_error(self, key, traceback):
+        return Error(
+            key=key,
+            description=LATENCY_ERRORS.get(key, ""),
+            traceback=cap_traceback(traceback),
+        )
+
+
+class MultiLatencyMeasurement(BaseMeasurement):
+    """A measurement of the latency to many hosts at once.
+
+    With an ICMP engine the probes to every host are interleaved over
+    one socket, and otherwise a `ping` is run for each host
+    concurrently, in a thread each by `measure()`, so measuring any
+    number of hosts takes about as long as measuring one.
+    """
+
+    def __init__(self, id, hosts, count=4, engine="auto"):
+        """Initialisation of a multiple host latency measurement.
+
+        :param id: A unique identifier for the measurement.
+        :param hosts: A list of the hosts to measure the latency to.
+        :param count: The number of pings to each host.
+        :param engine: How latency is measured, one of `ENGINES`.
+        """
+        super(MultiLatencyMeasurement, self).__init__(id=id)
+        if len(hosts) < 1:
+            raise ValueError("At least one host must be provided.")
+        # Validate the arguments, and run `ping` where there is no socket
+        self.measurements = [
+            LatencyMeasurement(id, host, count=count, engine="ping") for host in hosts
+        ]
+        if engine not in ENGINES:
+            raise ValueError(
+                "A value of {engine} was provided for the engine. This must be one of "
+                "{engines}.".format(engine=engine, engines=", ".join(ENGINES))
+            )
+        self.hosts = hosts
+        self.count = count
+        self.engine = engine
+
+    def measure(self, deadline=None):
+        """Perform the measurement.
+
+        :return: A `LatencyMeasurementResult` for each host, in the order
+        of `hosts`.
+        """
+        return self._attach_trace(self._get_latency_results(deadline=deadline))
+
+    async def measure_async(self, deadline=None):
+        return await self._get_latency_results_async(deadline=deadline)
+
+    @timed
+    def _get_latency_results(self, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        if self.engine != "ping":
+            with self._phase("ping"):
+                results = self._get_icmp_results(deadline)
+            if results is not None:
+                return results
+        with self._phase("ping"):
+            return self._get_ping_results(deadline)
+
+    @timed
+    async def _get_latency_results_async(self, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        if self.engine != "ping":
+            results = await asyncio.get_event_loop().run_in_executor(
+                None, self._get_icmp_results, deadline
+            )
+            if results is not None:
+                return results
+        return await self._get_ping_results_async(deadline)
+
+    def _get_ping_results(self, deadline):
+        """Run a `ping` for each host concurrently, in a thread each."""
+        # The pings count towards the phases of the calling thread
+        phases = active_phases()
+
+        def get_latency_results(measurement):
+            with inherit_phases(phases):
+                return measurement._get_latency_results(
+                    measurement.host, count=measurement.count, deadline=deadline
                 )
-            ],
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.measurements)
+        ) as executor:
+            futures = [
+                executor.submit(get_latency_results, measurement)
+                for measurement in self.measurements
+            ]
+            return [future.result()[0] for future in futures]
+
+    async def _get_ping_results_async(self, deadline):
+        """Run a `ping` for each host concurrently."""
+        results = await asyncio.gather(
+            *[measurement.measure_async(deadline) for measurement in self.measurements]
         )
+        return [host_results[0] for host_results in results]
+
+    def _get_icmp_results(self, deadline):
+        """Ping every host at once with an in-process ICMP socket.
+
+        :return: The results, or `None` if the engine is `auto` and no
+        ICMP socket can be opened, for `ping` to be run instead.
+        """
+        try:
+            icmp_socket = IcmpSocket()
+        except OSError as e:
+            if self.engine == "auto":
+                return None
+            return [
+                measurement._get_latency_error(
+                    "ping-socket", measurement.host, traceback=str(e)
+                )
+                for measurement in self.measurements
+            ]
+        if deadline.expired():
+            icmp_socket.close()
+            return [
+                measurement._get_latency_error(
+                    "ping-timeout", measurement.host, traceback=None
+                )
+                for measurement in self.measurements
+            ]
+
+        results = [None] * len(self.measurements)
+        addresses = {}
+        with icmp_socket:
+            for index, measurement in enumerate(self.measurements):
+                try:
+                    addresses[index] = socket.gethostbyname(measurement.host)
+                except OSError as e:
+                    results[index] = measurement._get_latency_error(
+                        "ping-err", measurement.host, traceback=str(e)
+                    )
+            try:
+                pings = ping_hosts(
+                    addresses.values(),
+                    self.count,
+                    deadline=deadline,
+                    icmp_socket=icmp_socket,
+                )
+            except OSError as e:
+                return [
+                    measurement._get_latency_error(
+                        "ping-err", measurement.host, traceback=str(e)
+                    )
+                    for measurement in self.measurements
+                ]
+        for index, address in addresses.items():
+            measurement = self.measurements[index]
+            replies, summary = pings[address]
+            results[index] = measurement._get_icmp_ping_results(
+                measurement.host, replies, summary
+            )[0]
+        return results
+
+
+def _get_latencies(latencies, statistics):
+    """Return the minimum, average and maximum latency and the median
+    deviation of a ping, from the replies it printed, or from its round
+    trip statistics if no replies were parsed.
+
+    :param latencies: The groups of the match of `LATENCY_OUTPUT_REGEX`,
+    or `None` if ping printed no round trip statistics.
+    :param statistics: The `ReplyStatistics` of the replies printed.
+    :raises ValueError: If the round trip statistics are used and are not
+    numbers.
+    """
+    if statistics.count or latencies is None:
+        return [
+            statistics.minimum,
+            statistics.average,
+            statistics.maximum,
+            statistics.deviation,
+        ]
+    return [
+        float(latencies[name])
+        for name in (
+            "minimum_latency",
+            "average_latency",
+            "maximum_latency",
+            "median_deviation",
+        )
+    ]
+
+
+def _get_transmitted(transmitted, result):
+    """Return the number of pings known to have been sent, given the
+    number known before a reply."""
+    sequence = int(result.icmp_sequence or 0)
+    return sequence if transmitted is None else max(transmitted, sequence)
+
+
+def _get_packets_lost(transmitted, received):
+    """Return the percentage of pings without a reply, or `None` if none
+    are known to have been sent."""
+    if not transmitted:
+        return None
+    return 100.0 * (transmitted - received) / transmitted
+
+
+def _get_reverse_dns_address(address):
+    try:
+        return socket.gethostbyaddr(address)[0]
+    except OSError:
+        return address
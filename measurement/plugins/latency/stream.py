@@ -0,0 +1,107 @@
+"""
+Running statistics of ping replies, for latency measurements that
+handle each reply as it arrives.
+
+`ReplyStatistics` keeps the count, minimum, maximum, average and
+deviation of round trip times as each is added, in constant memory, so a
+ping of any count is summarised without keeping its replies.
+
+`ReplyMonitor` passes each reply of a measurement to its `on_reply`
+callback and decides when the measurement has enough replies to stop
+early: once it has `target_replies` replies, or once the margin of error
+of the 95% confidence interval of the average latency is at most
+`target_margin` milliseconds.
+"""
+
+import math
+
+from measurement.units import TimeUnit, convert
+
+# The z-score of a 95% confidence interval
+Z_95 = 1.96
+# The margin of error of fewer replies is too unreliable to stop on
+MIN_MARGIN_REPLIES = 3
+
+
+class ReplyStatistics(object):
+    """The running statistics of round trip times, in milliseconds."""
+
+    __slots__ = ("count", "minimum", "maximum", "average", "_sum_of_squares")
+
+    def __init__(self):
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.average = None
+        # Of the differences from the average, updated as in Welford's
+        # algorithm
+        self._sum_of_squares = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        if self.count == 1:
+            self.minimum = self.maximum = self.average = latency
+            return
+        self.minimum = min(self.minimum, latency)
+        self.maximum = max(self.maximum, latency)
+        difference = latency - self.average
+        self.average += difference / self.count
+        self._sum_of_squares += difference * (latency - self.average)
+
+    @property
+    def deviation(self):
+        """The standard deviation, as `ping` reports its `mdev`, or `None`
+        if there are no times."""
+        if not self.count:
+            return None
+        return math.sqrt(self._sum_of_squares / self.count)
+
+    def margin(self, z=Z_95):
+        """Return the margin of error of the confidence interval of the
+        average, or `None` if there are fewer than two times."""
+        if self.count < 2:
+            return None
+        return z * math.sqrt(self._sum_of_squares / (self.count - 1) / self.count)
+
+
+class ReplyMonitor(object):
+    """Follows the replies of a latency measurement as they arrive.
+
+    :param on_reply: A callable called with each reply as a
+    `LatencyIndividualMeasurementResult`, or `None`.
+    :param target_replies: The number of replies to stop after, or
+    `None`.
+    :param target_margin: The margin of error in milliseconds of the 95%
+    confidence interval of the average latency to stop at, or `None`.
+    """
+
+    def __init__(self, on_reply=None, target_replies=None, target_margin=None):
+        self.on_reply = on_reply
+        self.target_replies = target_replies
+        self.target_margin = target_margin
+        self.statistics = ReplyStatistics()
+
+    def add(self, result):
+        """Add a reply.
+
+        :param result: The `LatencyIndividualMeasurementResult` of the
+        reply.
+        :return: Whether the measurement has enough replies to stop.
+        """
+        self.statistics.add(
+            convert(result.elapsed_time, result.elapsed_time_unit, TimeUnit.millisecond)
+        )
+        if self.on_reply is not None:
+            self.on_reply(result)
+        return self.is_complete()
+
+    def is_complete(self):
+        """Return whether the measurement has enough replies to stop."""
+        statistics = self.statistics
+        if self.target_replies is not None and statistics.count >= self.target_replies:
+            return True
+        return (
+            self.target_margin is not None
+            and statistics.count >= MIN_MARGIN_REPLIES
+            and statistics.margin() <= self.target_margin
+        )
@@ -0,0 +1,135 @@
+from unittest import TestCase, skipIf
+
+from measurement.deadline import Deadline
+from measurement.plugins.latency.icmp import (
+    IcmpSocket,
+    Reply,
+    _get_checksum,
+    _get_summary,
+    format_time,
+    ping,
+    ping_hosts,
+)
+from measurement.plugins.latency.measurements import (
+    LatencyMeasurement,
+    MultiLatencyMeasurement,
+)
+from measurement.plugins.latency.results import (
+    LatencyIndividualMeasurementResult,
+    LatencyMeasurementResult,
+)
+from measurement.units import RatioUnit, StorageUnit, TimeUnit
+
+try:
+    IcmpSocket().close()
+except OSError:
+    can_open_socket = False
+else:
+    can_open_socket = True
+
+
+class IcmpTestCase(TestCase):
+    def test_format_time(self):
+        # As `ping` prints the round trip times
+        self.assertEqual(format_time(52), "0.052")
+        self.assertEqual(format_time(6211), "6.21")
+        self.assertEqual(format_time(7069), "7.07")
+        self.assertEqual(format_time(12345), "12.3")
+        self.assertEqual(format_time(123456), "123")
+
+    def test_summary(self):
+        replies = [
+            Reply(size=64, address="1.1.1.1", sequence=i + 1, ttl=55, time=time)
+            for i, time in enumerate([6211, 6420, 6768, 7069])
+        ]
+        summary = _get_summary(5, replies, 4004600000, False)
+        self.assertEqual(summary.packets_transmitted, 5)
+        self.assertEqual(summary.packets_received, 4)
+        self.assertEqual(summary.minimum_latency, 6.211)
+        self.assertEqual(summary.average_latency, 6.617)
+        self.assertEqual(summary.maximum_latency, 7.069)
+        self.assertEqual(summary.median_deviation, 0.328)
+        self.assertEqual(summary.elapsed_time, 4005)
+        summary = _get_summary(2, [], 1000000, True)
+        self.assertIsNone(summary.average_latency)
+        self.assertTrue(summary.expired)
+
+    def test_checksum(self):
+        self.assertEqual(_get_checksum(b"\x08\x00\x00\x00\x12\x34\x00\x01"), 0xE5CA)
+        self.assertEqual(_get_checksum(b"\x08\x00\xe5\xca\x12\x34\x00\x01"), 0)
+
+
+@skipIf(not can_open_socket, "An ICMP socket cannot be opened")
+class IcmpLoopbackTestCase(TestCase):
+    def test_ping(self):
+        replies, summary = ping("127.0.0.1", count=3, interval=0.05)
+        self.assertEqual([reply.sequence for reply in replies], [1, 2, 3])
+        for reply in replies:
+            self.assertEqual(reply.size, 64)
+            self.assertEqual(reply.address, "127.0.0.1")
+            self.assertGreater(reply.ttl, 0)
+        self.assertEqual(summary.packets_transmitted, 3)
+        self.assertEqual(summary.packets_received, 3)
+        self.assertLessEqual(summary.minimum_latency, summary.average_latency)
+        self.assertLessEqual(summary.average_latency, summary.maximum_latency)
+        self.assertFalse(summary.expired)
+
+    def test_deadline(self):
+        replies, summary = ping("127.0.0.1", count=100, deadline=Deadline(0.1))
+        self.assertTrue(summary.expired)
+        self.assertEqual(summary.packets_transmitted, 1)
+        self.assertEqual(len(replies), 1)
+
+    def test_measurement(self):
+        results = LatencyMeasurement(
+            "test", "127.0.0.1", count=2, include_individual_results=True, engine="icmp"
+        ).measure()
+        self.assertEqual(len(results), 3)
+        self.assertIsInstance(results[0], LatencyMeasurementResult)
+        self.assertEqual(results[0].errors, [])
+        self.assertEqual(results[0].packets_received, 2)
+        self.assertEqual(results[0].packets_lost, 0.0)
+        self.assertEqual(results[0].packets_lost_unit, RatioUnit.percentage)
+        self.assertEqual(results[0].elapsed_time_unit, TimeUnit.millisecond)
+        for sequence, result in enumerate(results[1:], 1):
+            self.assertIsInstance(result, LatencyIndividualMeasurementResult)
+            self.assertEqual(result.packet_size, "64")
+            self.assertEqual(result.packet_size_unit, StorageUnit.bytes)
+            self.assertEqual(result.ip_address, "127.0.0.1")
+            self.assertEqual(result.icmp_sequence, str(sequence))
+            self.assertEqual(result.elapsed_time_unit, TimeUnit.millisecond)
+
+    def test_measurement_time_limit(self):
+        results = LatencyMeasurement(
+            "test",
+            "127.0.0.1",
+            count=100,
+            engine="icmp",
+            interval=0.02,
+            time_limit=0.1,
+        ).measure()
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertGreater(results[0].packets_received, 0)
+        self.assertLess(results[0].packets_received, 100)
+        self.assertIsNotNone(results[0].average_latency)
+
+    def test_ping_hosts(self):
+        pings = ping_hosts(
+            ["127.0.0.1", "127.0.0.2", "127.0.0.1"], count=2, interval=0.05
+        )
+        self.assertEqual(list(pings), ["127.0.0.1", "127.0.0.2"])
+        for address, (replies, summary) in pings.items():
+            self.assertEqual([reply.address for reply in replies], [address] * 2)
+            self.assertEqual([reply.sequence for reply in replies], [1, 2])
+            self.assertEqual(summary.packets_received, 2)
+
+    def test_multi_measurement(self):
+        hosts = ["127.0.0.2", "127.0.0.1", "127.0.0.2"]
+        results = MultiLatencyMeasurement(
+            "test", hosts, count=1, engine="icmp"
+        ).measure()
+        self.assertEqual([result.host for result in results], hosts)
+        for result in results:
+            self.assertEqual(result.errors, [])
+            self.assertEqual(result.packets_received, 1)
+            self.assertIsNotNone(result.timing)
@@ -1,7 +1,15 @@
+import asyncio
 import subprocess
+import threading
 from unittest import TestCase, mock
 
-from measurement.plugins.latency.measurements import LatencyMeasurement, LATENCY_ERRORS
+from measurement import aio
+from measurement.deadline import Deadline
+from measurement.plugins.latency.measurements import (
+    LATENCY_ERRORS,
+    LatencyMeasurement,
+    MultiLatencyMeasurement,
+)
 from measurement.plugins.latency.results import (
     LatencyMeasurementResult,
     LatencyIndividualMeasurementResult,
@@ -235,3 +243,281 @@ class LatencyMeasurementInitTestCase(TestCase):
 
     def test_valid_ip_host(self):
         LatencyMeasurement("test", "1.1.1.1")
+
+
+class LatencyMeasurementAsyncTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.measurement = LatencyMeasurement("test", "validfakehost.com")
+
+    @mock.patch("measurement.aio.run_subprocess")
+    def test_measure_async(self, mock_run_subprocess):
+        async def run_subprocess(args, timeout=None):
+            return subprocess.CompletedProcess(
+                args=args,
+                returncode=0,
+                stdout="PING www.google.com (216.58.199.36) 56(84) bytes of data.\n64 bytes from syd09s12-in-f4.1e100.net (216.58.199.36): icmp_seq=1 ttl=55 time=7.07 ms\n\n--- www.google.com ping statistics ---\n4 packets transmitted, 4 received, 0% packet loss, time 7ms\nrtt min/avg/max/mdev = 6.211/6.617/7.069/0.315 ms\n",
+                stderr="",
+            )
+
+        mock_run_subprocess.side_effect = run_subprocess
+        results = aio.run(self.measurement.measure_async())
+        mock_run_subprocess.assert_called_once_with(
+            ["ping", "-c", "4", "validfakehost.com"], timeout=None
+        )
+        self.assertEqual(results[0].average_latency, 6.617)
+        self.assertEqual(results[0].errors, [])
+
+    @mock.patch("measurement.aio.run_subprocess")
+    def test_measure_async_error(self, mock_run_subprocess):
+        async def run_subprocess(args, timeout=None):
+            return subprocess.CompletedProcess(
+                args=args, returncode=1, stdout="", stderr="the ping messed up!"
+            )
+
+        mock_run_subprocess.side_effect = run_subprocess
+        results = aio.run(self.measurement.measure_async())
+        self.assertEqual(results[0].errors[0].key, "ping-err")
+        self.assertEqual(results[0].errors[0].traceback, "the ping messed up!")
+
+
+class LatencyMeasurementDeadlineTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.measurement = LatencyMeasurement("test", "validfakehost.com")
+
+    @mock.patch("subprocess.run")
+    def test_expired_deadline_skips_ping(self, mock_run):
+        results = self.measurement.measure(deadline=Deadline(0))
+        mock_run.assert_not_called()
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertEqual(
+            results[0].errors[0].description, LATENCY_ERRORS.get("ping-timeout")
+        )
+
+    @mock.patch("subprocess.run")
+    def test_deadline_bounds_ping(self, mock_run):
+        mock_run.side_effect = subprocess.TimeoutExpired(
+            ["ping"], 5, output="64 bytes from validfakehost.com"
+        )
+        results = self.measurement.measure(deadline=Deadline(5))
+        self.assertLessEqual(mock_run.call_args[1]["timeout"], 5)
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertEqual(
+            results[0].errors[0].traceback, "64 bytes from validfakehost.com"
+        )
+
+    @mock.patch("subprocess.run")
+    def test_bounds_are_passed_to_ping(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess(
+            args=[], returncode=2, stdout="", stderr="unknown host"
+        )
+        LatencyMeasurement(
+            "test",
+            "validfakehost.com",
+            interval=0.2,
+            per_reply_timeout=2,
+            time_limit=2.5,
+        ).measure()
+        self.assertEqual(
+            mock_run.call_args[0][0],
+            [
+                "ping",
+                "-c",
+                "4",
+                "-i",
+                "0.2",
+                "-W",
+                "2",
+                "-w",
+                "3",
+                "validfakehost.com",
+            ],
+        )
+        # Killed if ping does not exit at its time limit
+        self.assertGreater(mock_run.call_args[1]["timeout"], 3)
+        self.assertLessEqual(mock_run.call_args[1]["timeout"], 4)
+
+    @mock.patch("subprocess.run")
+    def test_time_limit_reports_partial_statistics(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess(
+            args=["ping", "-c", "4", "-w", "2", "validfakehost.com"],
+            returncode=1,
+            stdout=(
+                "PING validfakehost.com (1.1.1.1) 56(84) bytes of data.\n"
+                "64 bytes from validfakehost.com (1.1.1.1): icmp_seq=1 ttl=55 time=6.21 ms\n"
+                "64 bytes from validfakehost.com (1.1.1.1): icmp_seq=2 ttl=55 time=7.07 ms\n"
+                "\n"
+                "--- validfakehost.com ping statistics ---\n"
+                "3 packets transmitted, 2 received, 33% packet loss, time 2003ms\n"
+                "rtt min/avg/max/mdev = 6.211/6.640/7.069/0.429 ms\n"
+            ),
+            stderr="",
+        )
+        results = LatencyMeasurement(
+            "test", "validfakehost.com", time_limit=2, include_individual_results=True
+        ).measure()
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertEqual(results[0].packets_transmitted, 3)
+        self.assertEqual(results[0].packets_received, 2)
+        self.assertEqual(results[0].packets_lost, 33.0)
+        self.assertEqual(results[0].minimum_latency, 6.21)
+        self.assertEqual(results[0].maximum_latency, 7.07)
+        self.assertAlmostEqual(results[0].median_deviation, 0.43)
+        self.assertEqual(results[0].elapsed_time, 2003.0)
+        self.assertEqual(results[2].icmp_sequence, "2")
+
+    @mock.patch("subprocess.run")
+    def test_killed_ping_reports_partial_replies(self, mock_run):
+        mock_run.side_effect = subprocess.TimeoutExpired(
+            ["ping"],
+            5,
+            output=(
+                b"64 bytes from validfakehost.com (1.1.1.1): icmp_seq=1 ttl=55 time=6.00 ms\n"
+                b"64 bytes from validfakehost.com (1.1.1.1): icmp_seq=3 ttl=55 time=8.00 ms\n"
+            ),
+        )
+        results = self.measurement.measure(deadline=Deadline(5))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertEqual(results[0].packets_transmitted, 3)
+        self.assertEqual(results[0].packets_received, 2)
+        self.assertAlmostEqual(results[0].packets_lost, 100 / 3)
+        self.assertEqual(results[0].packets_lost_unit, RatioUnit.percentage)
+        self.assertEqual(results[0].minimum_latency, 6.0)
+        self.assertEqual(results[0].average_latency, 7.0)
+        self.assertEqual(results[0].maximum_latency, 8.0)
+        self.assertEqual(results[0].median_deviation, 1.0)
+        self.assertIsNone(results[0].elapsed_time)
+
+    @mock.patch("measurement.aio.run_subprocess")
+    def test_killed_ping_reports_partial_replies_async(self, mock_run_subprocess):
+        mock_run_subprocess.side_effect = subprocess.TimeoutExpired(
+            ["ping"],
+            5,
+            output=(
+                b"64 bytes from validfakehost.com (1.1.1.1): icmp_seq=1 ttl=55 time=6.00 ms\n"
+                b"64 bytes from validfakehost.com (1.1.1.1): icmp_seq=3 ttl=55 time=8.00 ms\n"
+            ),
+        )
+        results = aio.run(self.measurement.measure_async(deadline=Deadline(5)))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertEqual(results[0].packets_transmitted, 3)
+        self.assertEqual(results[0].packets_received, 2)
+        self.assertEqual(results[0].average_latency, 7.0)
+
+    def test_invalid_bounds_get_raised(self):
+        for bound in ("interval", "per_reply_timeout", "time_limit"):
+            with self.assertRaises(ValueError):
+                LatencyMeasurement("test", "validfakehost.com", **{bound: 0})
+
+
+class LatencyMeasurementEngineTestCase(TestCase):
+    def test_invalid_engine_gets_raised(self):
+        with self.assertRaises(ValueError):
+            LatencyMeasurement("test", "test.com", engine="fping")
+
+    @mock.patch("measurement.plugins.latency.measurements.IcmpSocket")
+    @mock.patch("subprocess.run")
+    def test_auto_falls_back_to_ping(self, mock_run, mock_socket):
+        mock_socket.side_effect = PermissionError(13, "Permission denied")
+        mock_run.return_value = subprocess.CompletedProcess(
+            args=[],
+            returncode=0,
+            stdout="PING validfakehost.com (1.1.1.1) 56(84) bytes of data.\n\n--- validfakehost.com ping statistics ---\n4 packets transmitted, 4 received, 0% packet loss, time 7ms\nrtt min/avg/max/mdev = 6.211/6.617/7.069/0.315 ms\n",
+            stderr="",
+        )
+        results = LatencyMeasurement(
+            "test", "validfakehost.com", engine="auto"
+        ).measure()
+        mock_run.assert_called_once()
+        self.assertEqual(results[0].average_latency, 6.617)
+
+    @mock.patch("measurement.plugins.latency.measurements.IcmpSocket")
+    @mock.patch("subprocess.run")
+    def test_icmp_socket_error(self, mock_run, mock_socket):
+        mock_socket.side_effect = PermissionError(13, "Permission denied")
+        results = LatencyMeasurement(
+            "test", "validfakehost.com", engine="icmp"
+        ).measure()
+        mock_run.assert_not_called()
+        self.assertEqual(results[0].errors[0].key, "ping-socket")
+        self.assertEqual(results[0].errors[0].traceback, "[Errno 13] Permission denied")
+
+
+class MultiLatencyMeasurementTestCase(TestCase):
+    def test_invalid_arguments_get_raised(self):
+        with self.assertRaises(ValueError):
+            MultiLatencyMeasurement("test", [])
+        with self.assertRaises(ValueError):
+            MultiLatencyMeasurement("test", ["test.com", "%test"])
+        with self.assertRaises(ValueError):
+            MultiLatencyMeasurement("test", ["test.com"], engine="fping")
+
+    @mock.patch("measurement.plugins.latency.measurements.IcmpSocket")
+    @mock.patch("measurement.aio.run_subprocess")
+    def test_auto_runs_pings_concurrently(self, mock_run_subprocess, mock_socket):
+        mock_socket.side_effect = PermissionError(13, "Permission denied")
+        running = []
+
+        async def run_subprocess(args, timeout=None):
+            running.append(args[-1])
+            # Every ping is started before any completes
+            while len(running) < 2:
+                await asyncio.sleep(0)
+            average_latency = {"a.com": "6.617", "b.com": "3.500"}[args[-1]]
+            return subprocess.CompletedProcess(
+                args=args,
+                returncode=0,
+                stdout="2 packets transmitted, 2 received, 0% packet loss, time 1001ms\n"
+                "rtt min/avg/max/mdev = 1.0/{0}/9.0/0.3 ms\n".format(average_latency),
+                stderr="",
+            )
+
+        mock_run_subprocess.side_effect = run_subprocess
+        results = aio.run(
+            MultiLatencyMeasurement("test", ["a.com", "b.com"], count=2).measure_async()
+        )
+        self.assertEqual(
+            [(result.host, result.average_latency) for result in results],
+            [("a.com", 6.617), ("b.com", 3.5)],
+        )
+
+    @mock.patch("measurement.plugins.latency.measurements.IcmpSocket")
+    @mock.patch("subprocess.run")
+    def test_auto_runs_pings_in_threads(self, mock_run, mock_socket):
+        mock_socket.side_effect = PermissionError(13, "Permission denied")
+        # Every ping is started before any completes
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run(args, **kwargs):
+            barrier.wait()
+            average_latency = {"a.com": "6.617", "b.com": "3.500"}[args[-1]]
+            return subprocess.CompletedProcess(
+                args=args,
+                returncode=0,
+                stdout="2 packets transmitted, 2 received, 0% packet loss, time 1001ms\n"
+                "rtt min/avg/max/mdev = 1.0/{0}/9.0/0.3 ms\n".format(average_latency),
+                stderr="",
+            )
+
+        mock_run.side_effect = run
+        results = MultiLatencyMeasurement("test", ["a.com", "b.com"], count=2).measure()
+        self.assertEqual(
+            [(result.host, result.average_latency) for result in results],
+            [("a.com", 6.617), ("b.com", 3.5)],
+        )
+        for result in results:
+            self.assertIsNotNone(result.timing)
+
+    @mock.patch("measurement.plugins.latency.measurements.IcmpSocket")
+    def test_icmp_socket_error(self, mock_socket):
+        mock_socket.side_effect = PermissionError(13, "Permission denied")
+        results = MultiLatencyMeasurement(
+            "test", ["a.com", "b.com"], engine="icmp"
+        ).measure()
+        self.assertEqual(
+            [result.errors[0].key for result in results], ["ping-socket"] * 2
+        )
@@ -0,0 +1,194 @@
+import math
+import statistics
+import sys
+from unittest import TestCase, mock
+
+from measurement import aio
+from measurement.deadline import Deadline
+from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.plugins.latency.results import LatencyIndividualMeasurementResult
+from measurement.plugins.latency.stream import ReplyMonitor, ReplyStatistics
+from measurement.units import StorageUnit, TimeUnit
+
+# Prints the output of iputils `ping`, a reply every 10ms, and its
+# statistics when interrupted, exiting with 1 if it is interrupted before
+# `count` replies when given a time limit with `-w`
+FAKE_PING = r"""
+import signal, sys, time
+count = int(sys.argv[1])
+time_limit = "-w" in sys.argv
+interrupted = []
+signal.signal(signal.SIGINT, lambda *args: interrupted.append(True))
+print("PING a.com (1.1.1.1) 56(84) bytes of data.", flush=True)
+times = []
+while len(times) < count and not interrupted:
+    times.append(6 + len(times) % 3 / 10)
+    print(
+        "64 bytes from a.com (1.1.1.1): icmp_seq={0} ttl=55 time={1:.2f} ms".format(
+            len(times), times[-1]
+        ),
+        flush=True,
+    )
+    time.sleep(0.01)
+print("\n--- a.com ping statistics ---")
+print(
+    "{0} packets transmitted, {0} received, 0% packet loss, time {1}ms".format(
+        len(times), len(times) * 10
+    )
+)
+print(
+    "rtt min/avg/max/mdev = {0:.3f}/{1:.3f}/{2:.3f}/0.082 ms".format(
+        min(times), sum(times) / len(times), max(times)
+    )
+)
+sys.exit(1 if time_limit and len(times) < count else 0)
+"""
+
+
+def _get_fake_ping_args(measurement, host, count):
+    args = [sys.executable, "-c", FAKE_PING, str(count)]
+    if measurement.time_limit is not None:
+        args.append("-w")
+    return args
+
+
+def _reply(elapsed_time):
+    return LatencyIndividualMeasurementResult(
+        id="test",
+        host="a.com",
+        errors=[],
+        packet_size="64",
+        packet_size_unit=StorageUnit.bytes,
+        reverse_dns_address="a.com",
+        ip_address="1.1.1.1",
+        icmp_sequence="1",
+        time_to_live="55",
+        elapsed_time=elapsed_time,
+        elapsed_time_unit=TimeUnit.millisecond,
+    )
+
+
+class ReplyStatisticsTestCase(TestCase):
+    def test_statistics(self):
+        times = [6.21, 6.68, 7.07, 6.51, 12.5]
+        reply_statistics = ReplyStatistics()
+        self.assertIsNone(reply_statistics.deviation)
+        for time in times:
+            reply_statistics.add(time)
+        self.assertEqual(reply_statistics.count, 5)
+        self.assertEqual(reply_statistics.minimum, 6.21)
+        self.assertEqual(reply_statistics.maximum, 12.5)
+        self.assertAlmostEqual(reply_statistics.average, statistics.mean(times))
+        self.assertAlmostEqual(reply_statistics.deviation, statistics.pstdev(times))
+        self.assertAlmostEqual(
+            reply_statistics.margin(), 1.96 * statistics.stdev(times) / math.sqrt(5)
+        )
+
+    def test_monitor(self):
+        replies = []
+        monitor = ReplyMonitor(on_reply=replies.append, target_replies=2)
+        self.assertFalse(monitor.add(_reply("6.21")))
+        self.assertTrue(monitor.add(_reply("6.22")))
+        self.assertEqual(replies, [_reply("6.21"), _reply("6.22")])
+
+        monitor = ReplyMonitor(target_margin=0.1)
+        self.assertFalse(monitor.add(_reply("6.2")))
+        self.assertFalse(monitor.add(_reply("6.2")))
+        # The margin of error of too few replies is not trusted
+        self.assertTrue(monitor.add(_reply("6.2")))
+        monitor = ReplyMonitor(target_margin=0.1)
+        for elapsed_time in ["1", "9", "1"]:
+            self.assertFalse(monitor.add(_reply(elapsed_time)))
+
+
+@mock.patch.object(LatencyMeasurement, "_get_ping_args", _get_fake_ping_args)
+class LatencyMeasurementStreamTestCase(TestCase):
+    def test_on_reply(self):
+        replies = []
+        results = LatencyMeasurement(
+            "test", "a.com", count=5, on_reply=replies.append
+        ).measure()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].errors, [])
+        self.assertEqual(results[0].packets_transmitted, 5)
+        self.assertEqual(results[0].minimum_latency, 6.0)
+        self.assertEqual(results[0].maximum_latency, 6.2)
+        self.assertEqual(
+            [reply.icmp_sequence for reply in replies], ["1", "2", "3", "4", "5"]
+        )
+        self.assertEqual(replies[1].elapsed_time, "6.10")
+
+    def test_statistics_from_replies(self):
+        results = LatencyMeasurement(
+            "test", "a.com", count=3, on_reply=lambda reply: None
+        ).measure()
+        self.assertAlmostEqual(results[0].average_latency, 6.1)
+        self.assertAlmostEqual(
+            results[0].median_deviation, statistics.pstdev([6.0, 6.1, 6.2])
+        )
+
+    def test_filled_error_pipe(self):
+        # More errors than a pipe holds, before ping fails
+        script = (
+            "import sys; sys.stderr.write('x' * 1000000 + '\\nfailed\\n'); sys.exit(2)"
+        )
+        with mock.patch.object(
+            LatencyMeasurement,
+            "_get_ping_args",
+            lambda measurement, host, count: [sys.executable, "-c", script],
+        ):
+            results = LatencyMeasurement(
+                "test", "a.com", count=3, on_reply=lambda reply: None
+            ).measure(deadline=Deadline(30))
+        self.assertEqual(results[0].errors[0].key, "ping-err")
+        self.assertIn("failed", results[0].errors[0].traceback)
+
+    def test_target_replies(self):
+        results = LatencyMeasurement(
+            "test",
+            "a.com",
+            count=1000,
+            include_individual_results=True,
+            target_replies=3,
+        ).measure()
+        self.assertEqual(results[0].errors, [])
+        # Replies may arrive before ping is interrupted
+        self.assertGreaterEqual(results[0].packets_received, 3)
+        self.assertLess(results[0].packets_received, 1000)
+        self.assertEqual(len(results), 1 + results[0].packets_received)
+
+    def test_target_replies_within_time_limit(self):
+        results = LatencyMeasurement(
+            "test", "a.com", count=1000, target_replies=3, time_limit=60
+        ).measure()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].errors, [])
+        self.assertGreaterEqual(results[0].packets_received, 3)
+        self.assertLess(results[0].packets_received, 1000)
+
+    def test_measure_async(self):
+        replies = []
+        results = aio.run(
+            LatencyMeasurement(
+                "test", "a.com", count=3, on_reply=replies.append
+            ).measure_async()
+        )
+        self.assertEqual(results[0].packets_received, 3)
+        self.assertEqual(len(replies), 3)
+
+    def test_deadline_reports_partial_statistics(self):
+        results = LatencyMeasurement("test", "a.com", count=1000).measure(
+            deadline=Deadline(0.2)
+        )
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].errors[0].key, "ping-timeout")
+        self.assertGreater(results[0].packets_received, 0)
+        self.assertEqual(results[0].packets_transmitted, results[0].packets_received)
+        self.assertEqual(results[0].minimum_latency, 6.0)
+        self.assertEqual(results[0].maximum_latency, 6.2)
+
+    def test_invalid_targets_get_raised(self):
+        with self.assertRaises(ValueError):
+            LatencyMeasurement("test", "a.com", target_replies=0)
+        with self.assertRaises(ValueError):
+            LatencyMeasurement("test", "a.com", target_margin=0)
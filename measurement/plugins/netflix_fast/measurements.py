@@ -1,5 +1,6 @@
 """
 Using the netflix_fast v2 api, the test collects some details about the client, and launches 1 thread per provided URL to download. Every `sleep_seconds` (presently 0.2) the test will append the latest speed (calculated by total downloaded bytes/total time taken) before checking for, in order:
+    - The `deadline` passed to `measure()` expired, in which case a `netflix-timeout` error is also reported
     - `max_time_seconds` (presently 30s) expired.
     - Results have become "stabilised"
     - All threads have finished downloading
@@ -19,7 +20,6 @@ After this, each of the URLs downloaded from has a latency test then have an Hon
 All these results are then returned as a list.
 """
 
-import requests
 import re
 import time
 import urllib
@@ -28,11 +28,14 @@ from threading import Thread
 from collections import deque
 from statistics import mean
 
-from measurement.measurements import BaseMeasurement
+from measurement.deadline import Deadline
+from measurement.measurements import BaseMeasurement, ResourceClass
 from measurement.results import Error
+from measurement.timing import Stopwatch, attach_timing, timed
+from measurement.tracebacks import cap_traceback
+from measurement.trace import record_bytes
 from measurement.units import RatioUnit, TimeUnit, StorageUnit, NetworkUnit
 from measurement.plugins.latency.measurements import LatencyMeasurement
-from measurement.plugins.download_speed.measurements import DownloadSpeedMeasurement
 from measurement.plugins.netflix_fast.results import (
     NetflixFastMeasurementResult,
     NetflixFastThreadResult,
@@ -51,7 +54,10 @@ NETFLIX_ERRORS = {
     "netflix-api-parse": "Netflix test failed interpret elements of the decoded JSON",
     "netflix-connection": "Netflix test failed to connect to download URLs",
     "netflix-download": "Netflix test encountered an error downloading data",
+    "netflix-timeout": "Netflix test deadline expired",
 }
+FAST_SCRIPT_REGEX = re.compile(r'<script src="(.*?)">')
+FAST_TOKEN_REGEX = re.compile(r'token:"(.*?)"')
 MIN_TIME_SECONDS = 3
 PING_COUNT = 4
 MEASUREMENTS_COUNTED_BEFORE_CONSIDERED_STABLE = 6
@@ -60,6 +66,9 @@ BITS_PER_BYTE = 8
 
 
 class NetflixFastMeasurement(BaseMeasurement):
+    resource_class = ResourceClass.exclusive
+    deferred_imports = ("requests",)
+
     def __init__(
         self,
         id,
@@ -85,11 +94,33 @@ class NetflixFastMeasurement(BaseMeasurement):
         self.client_data = {"asn": None, "ip": None, "isp": None, "location": None}
         self.targets = []
         self.thread_results = []
+        # The `Timing` of each thread's download, by thread index
+        self.thread_timings = {}
         self.completed_total = 0
         self.completed_elapsed_time = None
+        self.deadline = Deadline()
+
+    def measure(self, deadline=None):
+        return self._attach_trace(list(self._iter_results(deadline)))
+
+    def _iter_results(self, deadline):
+        """Yield the `NetflixFastMeasurementResult` once the download
+        completes, followed by the `NetflixFastThreadResult` and
+        `LatencyMeasurementResult` of each URL as its latency test
+        completes."""
+        self.deadline = Deadline.coerce(deadline)
+        self._init_thread_results()
+
+        with self._phase("fast"):
+            fast_result = self._get_fast_result()
+        yield fast_result
+        for thread_result in self.thread_results:
+            with self._phase("latency"):
+                url_results = self._get_url_result(thread_result)
+            for result in url_results:
+                yield result
 
-    def measure(self):
-        results = []
+    def _init_thread_results(self):
         # Generate thread results dict structure
         for i in range(self.urlcount):
             self.thread_results.append(
@@ -103,30 +134,35 @@ class NetflixFastMeasurement(BaseMeasurement):
                 }
             )
 
-        results.append(self._get_fast_result())
-        for thread_result in self.thread_results:
-            results = results + self._get_url_result(thread_result)
-        return results
-
+    @timed
     def _get_fast_result(self):
+        import requests
+
+        if self.deadline.expired():
+            return self._get_netflix_error("netflix-timeout", traceback=None)
+
         s = requests.Session()
-        try:
-            resp = self._get_response(s)
-        except ConnectionError as e:
-            return self._get_netflix_error("netflix-response", traceback=str(e))
+        resp, error = self._send("netflix-response", self._get_response, s)
+        if error is not None:
+            return error
 
         try:
-            script = re.search(r'<script src="(.*?)">', resp.text).group(1)
+            script = FAST_SCRIPT_REGEX.search(resp.text).group(1)
         except AttributeError:
             return self._get_netflix_error("netflix-script-regex", traceback=resp.text)
 
-        try:
-            script_resp = s.get("https://fast.com{script}".format(script=script))
-        except ConnectionError as e:
-            return self._get_netflix_error("netflix-script-response", traceback=str(e))
+        script_resp, error = self._send(
+            "netflix-script-response",
+            lambda: s.get(
+                "https://fast.com{script}".format(script=script),
+                timeout=self._get_request_timeout(),
+            ),
+        )
+        if error is not None:
+            return error
 
         try:
-            token = re.search(r'token:"(.*?)"', script_resp.text).group(1)
+            token = FAST_TOKEN_REGEX.search(script_resp.text).group(1)
         except AttributeError:
             return self._get_netflix_error(
                 "netflix-token-regex", traceback=script_resp.text
@@ -134,24 +170,41 @@ class NetflixFastMeasurement(BaseMeasurement):
 
         try:
             self._query_api(s, token)
-        except ConnectionError as e:
-            return self._get_netflix_error("netflix-api-response", traceback=str(e))
+        except requests.exceptions.Timeout as e:
+            return self._get_netflix_error("netflix-timeout", traceback=str(e))
         except json.decoder.JSONDecodeError as e:
+            # Before `RequestException`, which the JSON errors of `requests`
+            # also derive from
             return self._get_netflix_error("netflix-api-json", traceback=str(e))
+        except (ConnectionError, requests.exceptions.RequestException) as e:
+            return self._get_netflix_error("netflix-api-response", traceback=str(e))
         except TypeError as e:
             return self._get_netflix_error("netflix-api-parse", traceback=str(e))
         except KeyError as e:
             return self._get_netflix_error("netflix-api-parse", traceback=str(e))
 
-        try:
-            conns = [
+        conns, error = self._send(
+            "netflix-connection",
+            lambda: [
                 self._get_connection(target["url"]) for target in self.thread_results
-            ]
-        except ConnectionError as e:
-            return self._get_netflix_error("netflix-connection", traceback=str(e))
+            ],
+        )
+        if error is not None:
+            return error
 
-        fast_data = self._manage_threads(conns)
+        with self._phase("download"):
+            fast_data = self._manage_threads(conns)
+            record_bytes(int(fast_data["total"]))
 
+        errors = []
+        if fast_data["reason_terminated"] == "deadline_expired":
+            errors.append(
+                Error(
+                    key="netflix-timeout",
+                    description=NETFLIX_ERRORS["netflix-timeout"],
+                    traceback=None,
+                )
+            )
         return NetflixFastMeasurementResult(
             id=self.id,
             download_rate=float(fast_data["speed_bits"]),
@@ -165,9 +218,25 @@ class NetflixFastMeasurement(BaseMeasurement):
             country=self.client_data["location"]["country"],
             urlcount=self.urlcount,
             reason_terminated=fast_data["reason_terminated"],
-            errors=[],
+            errors=errors,
         )
 
+    def _send(self, key, send, *args):
+        """Send requests, reporting a failure as the `key` error, or as a
+        `netflix-timeout` error if a request timed out.
+
+        :return: The return value of `send(*args)` and `None`, or `None`
+        and the error result.
+        """
+        import requests
+
+        try:
+            return send(*args), None
+        except requests.exceptions.Timeout as e:
+            return None, self._get_netflix_error("netflix-timeout", traceback=str(e))
+        except (ConnectionError, requests.exceptions.RequestException) as e:
+            return None, self._get_netflix_error(key, traceback=str(e))
+
     def _manage_threads(self, conns):
         # Create worker threads
         threads = [None] * len(self.thread_results)
@@ -234,12 +303,20 @@ class NetflixFastMeasurement(BaseMeasurement):
             time.sleep(self.sleep_seconds)
 
     def _threaded_download(self, conn, thread_result, start_time):
+        import requests
+
+        stopwatch = Stopwatch()
         # Iterate through the URL content
         g = conn.iter_content(chunk_size=self.chunk_size)
-        for chunk in g:
-            if self.exit_threads:
-                break
-            thread_result["download_size"] += len(chunk)
+        try:
+            for chunk in g:
+                if self.exit_threads:
+                    break
+                thread_result["download_size"] += len(chunk)
+        except requests.exceptions.RequestException:
+            # A read timing out at the deadline, or a dropped connection,
+            # ends the download with the bytes received so far
+            pass
 
         completed_time = time.time()
         elapsed_time = completed_time - start_time
@@ -254,18 +331,25 @@ class NetflixFastMeasurement(BaseMeasurement):
             thread_result["download_size"] / elapsed_time * BITS_PER_BYTE
         )
         thread_result["elapsed_time"] = elapsed_time
+        self.thread_timings[thread_result["index"]] = stopwatch.stop()
         self.finished_threads += 1
 
     def _query_api(self, s, token):
         params = {"https": "true", "token": token, "urlCount": self.urlcount}
         # '/v2/' path returns all location data about the servers
-        api_resp = s.get("https://api.fast.com/netflix/speedtest/v2", params=params)
-        api_json = api_resp.json()
+        api_resp = s.get(
+            "https://api.fast.com/netflix/speedtest/v2",
+            params=params,
+            timeout=self._get_request_timeout(),
+        )
+        self._parse_api_json(api_resp.json())
+
+    def _parse_api_json(self, api_json):
+        """Record the target URLs and client details of an API response."""
         for i in range(len(api_json["targets"])):
             self.thread_results[i]["url"] = api_json["targets"][i]["url"]
             self.thread_results[i]["location"] = api_json["targets"][i]["location"]
         self.client_data = api_json["client"]
-        return
 
     def _is_stabilised(self, recent_percent_deltas, elapsed_time):
         return (
@@ -276,15 +360,33 @@ class NetflixFastMeasurement(BaseMeasurement):
         )
 
     def _get_response(self, s):
-        return s.get("http://fast.com/")
+        return s.get("http://fast.com/", timeout=self._get_request_timeout())
 
     def _get_connection(self, url):
+        import requests
+
         s = requests.Session()
         self.sessions.append(s)
-        conn = s.get(url, stream=True)
+        conn = s.get(url, stream=True, timeout=self._get_request_timeout())
         return conn
 
+    def _get_request_timeout(self):
+        """Return the timeout of a request, the time left before the
+        deadline.
+
+        :raises requests.exceptions.Timeout: If the deadline has expired,
+        rather than passing a timeout of 0, which urllib3 rejects.
+        """
+        import requests
+
+        remaining = self.deadline.remaining()
+        if remaining == 0:
+            raise requests.exceptions.Timeout("The deadline expired")
+        return remaining
+
     def _is_test_complete(self, elapsed_time, recent_percent_deltas):
+        if self.deadline.expired():
+            return "deadline_expired"
         if elapsed_time > self.max_time_seconds:
             return "time_expired"
         if (self.terminate_on_result_stable) & (
@@ -298,26 +400,33 @@ class NetflixFastMeasurement(BaseMeasurement):
         return False
 
     def _get_url_result(self, thread_result):
+        if thread_result["url"] is None:
+            # fast.com failed before providing the URL
+            return []
         host = urllib.parse.urlparse(thread_result["url"]).netloc
         city = thread_result["location"]["city"]
         country = thread_result["location"]["country"]
-        LatencyResult = LatencyMeasurement(self.id, host, count=PING_COUNT).measure()[0]
-        return [
-            NetflixFastThreadResult(
-                id=self.id,
-                host=host,
-                city=city,
-                country=country,
-                download_size=thread_result["download_size"],
-                download_size_unit=StorageUnit("B"),
-                download_rate=thread_result["download_rate"],
-                download_rate_unit=NetworkUnit("bit/s"),
-                elapsed_time=thread_result["elapsed_time"],
-                elapsed_time_unit=TimeUnit("s"),
-                errors=[],
-            ),
-            LatencyResult,
-        ]
+        LatencyResult = LatencyMeasurement(self.id, host, count=PING_COUNT).measure(
+            deadline=self.deadline
+        )[0]
+        ThreadResult = NetflixFastThreadResult(
+            id=self.id,
+            host=host,
+            city=city,
+            country=country,
+            download_size=thread_result["download_size"],
+            download_size_unit=StorageUnit("B"),
+            download_rate=thread_result["download_rate"],
+            download_rate_unit=NetworkUnit("bit/s"),
+            elapsed_time=thread_result["elapsed_time"],
+            elapsed_time_unit=TimeUnit("s"),
+            errors=[],
+        )
+        # Stamped with the time of the thread's download
+        timing = self.thread_timings.get(thread_result.get("index"))
+        if timing is not None:
+            attach_timing(ThreadResult, timing)
+        return [ThreadResult, LatencyResult]
 
     def _get_netflix_error(self, key, traceback):
         return NetflixFastMeasurementResult(
@@ -337,7 +446,7 @@ class NetflixFastMeasurement(BaseMeasurement):
                 Error(
                     key=key,
                     description=NETFLIX_ERRORS.get(key, ""),
-                    traceback=traceback,
+                    traceback=cap_traceback(traceback),
                 )
             ],
         )
@@ -1,19 +1,34 @@
-import collections
-import sys
+import typing
 
-import six
+from measurement.results import Field, MeasurementResult
+from measurement.units import TimeUnit, StorageUnit, NetworkUnit
 
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    NetflixFastMeasurementResult = collections.namedtuple(
-        "NetflixFastMeasurementResult",
-        "id errors download_rate download_rate_unit download_size download_size_unit"
-        " asn ip isp city country urlcount reason_terminated ",
-    )
 
-    NetflixFastThreadResult = collections.namedtuple(
-        "NetflixFastThreadResult",
-        "id errors host download_size download_size_unit download_rate download_rate_unit"
-        " elapsed_time elapsed_time_unit city country ",
-    )
+class NetflixFastMeasurementResult(MeasurementResult):
+    """Encapsulates the results from a NetflixFast measurement."""
+
+    download_rate = Field(typing.Optional[float])
+    download_rate_unit = Field(typing.Optional[NetworkUnit])
+    download_size = Field(typing.Optional[float])
+    download_size_unit = Field(typing.Optional[StorageUnit])
+    asn = Field(typing.Optional[str])
+    ip = Field(typing.Optional[str])
+    isp = Field(typing.Optional[str])
+    city = Field(typing.Optional[str])
+    country = Field(typing.Optional[str])
+    urlcount = Field(typing.Optional[int])
+    reason_terminated = Field(typing.Optional[str])
+
+
+class NetflixFastThreadResult(MeasurementResult):
+    """Encapsulates the latency test results from an individual download url."""
+
+    host = Field(str)
+    download_size = Field(typing.Optional[float])
+    download_size_unit = Field(typing.Optional[StorageUnit])
+    download_rate = Field(typing.Optional[float])
+    download_rate_unit = Field(typing.Optional[NetworkUnit])
+    elapsed_time = Field(typing.Optional[float])
+    elapsed_time_unit = Field(typing.Optional[TimeUnit])
+    city = Field(typing.Optional[str])
+    country = Field(typing.Optional[str])
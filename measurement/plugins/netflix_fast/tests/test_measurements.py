@@ -5,6 +5,9 @@ from unittest import TestCase, mock
 from threading import active_count
 from itertools import cycle
 
+import requests
+
+from measurement.deadline import Deadline
 from measurement.plugins.netflix_fast.measurements import (
     NetflixFastMeasurement,
     NETFLIX_ERRORS,
@@ -203,6 +206,26 @@ class NetflixResultTestCase(TestCase):
             + self.thread_result_three_list[2]
         )
 
+    @mock.patch(
+        "measurement.plugins.netflix_fast.measurements.NetflixFastMeasurement._get_fast_result"
+    )
+    @mock.patch(
+        "measurement.plugins.netflix_fast.measurements.NetflixFastMeasurement._get_url_result"
+    )
+    def test_measure_iter(self, mock_get_url_result, mock_get_fast_result):
+        mock_get_url_result.side_effect = self.thread_result_three_list
+        mock_get_fast_result.return_value = self.fast_result_three
+        results = self.nft.measure_iter()
+        assert next(results) == self.fast_result_three
+        assert mock_get_url_result.call_count == 0
+        assert next(results) == self.thread_result_three_list[0][0]
+        assert mock_get_url_result.call_count == 1
+        assert list(results) == (
+            self.thread_result_three_list[0][1:]
+            + self.thread_result_three_list[1]
+            + self.thread_result_three_list[2]
+        )
+
     @mock.patch(
         "measurement.plugins.netflix_fast.measurements.NetflixFastMeasurement._manage_threads"
     )
@@ -732,3 +755,34 @@ class ErrorsTestCase(TestCase):
             for i in range(self.nft.urlcount)  # Generate thread results dict structure
         ]
         assert self.nft._get_fast_result() == mock_error_result
+
+    @mock.patch("requests.Session")
+    def test_netflix_read_timeout(self, mock_get_session):
+        mock_session = mock.MagicMock()
+        mock_session.get.side_effect = [
+            requests.exceptions.ReadTimeout("Read timed out")
+        ]
+        mock_get_session.return_value = mock_session
+        results = self.nft.measure(deadline=Deadline(5))
+        assert len(results) == 1
+        assert results[0].errors[0].key == "netflix-timeout"
+        assert results[0].errors[0].traceback == "Read timed out"
+
+    @mock.patch("requests.Session")
+    def test_netflix_expired_deadline_skips_requests(self, mock_get_session):
+        deadline = Deadline(5)
+        mock_resp = mock.MagicMock()
+        mock_resp.text = '<script src="(This is the script)">'
+
+        def get(*args, **kwargs):
+            deadline.cancel()
+            return mock_resp
+
+        mock_session = mock.MagicMock()
+        mock_session.get.side_effect = get
+        mock_get_session.return_value = mock_session
+        self.nft.deadline = deadline
+        result = self.nft._get_fast_result()
+        # Rather than requesting the script with a timeout of 0
+        assert mock_session.get.call_count == 1
+        assert result.errors[0].key == "netflix-timeout"
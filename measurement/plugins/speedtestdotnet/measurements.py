@@ -3,11 +3,14 @@ import subprocess
 
 import validators
 from validators import ValidationFailure
-import speedtest
 
-from measurement.measurements import BaseMeasurement
+from measurement.deadline import Deadline
+from measurement.measurements import BaseMeasurement, ResourceClass
 from measurement.plugins.speedtestdotnet.results import SpeedtestdotnetMeasurementResult
 from measurement.results import Error
+from measurement.timing import timed
+from measurement.tracebacks import cap_traceback
+from measurement.trace import record_bytes
 from measurement.units import RatioUnit, TimeUnit, StorageUnit, NetworkUnit
 
 SPEEDTEST_ERRORS = {
@@ -16,37 +19,65 @@ SPEEDTEST_ERRORS = {
     "speedtest-best-server": "speedtest could not find the best server",
     "speedtest-share": "speedtest could not share results",
     "speedtest-convert": "could not convert result values",
+    "speedtest-timeout": "speedtest measurement deadline expired",
 }
+SPEEDTEST_TIMEOUT = 10
 
 
 class SpeedtestdotnetMeasurement(BaseMeasurement):
+    resource_class = ResourceClass.exclusive
+    deferred_imports = ("speedtest",)
+
     def __init__(self, id, servers=None):
         super(SpeedtestdotnetMeasurement, self).__init__(id=id)
         self.id = id
         self.servers = servers
 
-    def measure(self, share=False):
+    def measure(self, share=False, deadline=None):
         """
         @params share: Boolean determining whether to generate a PNG on speedtest.net displaying the result of the test.
+        @params deadline: An optional `Deadline`, checked before each step of the test and bounding the length of the download and upload.
         """
+        return self._attach_trace(self._get_speedtest_result(share, deadline))
+
+    @timed
+    def _get_speedtest_result(self, share, deadline):
+        import speedtest
+
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return self._get_speedtest_error("speedtest-timeout", traceback=None)
         try:
-            s = speedtest.Speedtest()
+            with self._phase("config"):
+                s = speedtest.Speedtest(timeout=deadline.timeout(SPEEDTEST_TIMEOUT))
         except speedtest.ConfigRetrievalError as e:
             return self._get_speedtest_error("speedtest-config", traceback=str(e))
 
-        s.get_servers(self.servers)
-
         try:
-            s.get_best_server()
+            with self._phase("best_server"):
+                s.get_servers(self.servers)
+                s.get_best_server()
         except speedtest.SpeedtestBestServerFailure as e:
             return self._get_speedtest_error("speedtest-best-server", traceback=str(e))
 
-        s.download()
-        s.upload()
+        if deadline.expired():
+            return self._get_speedtest_error("speedtest-timeout", traceback=None)
+        with self._phase("download"):
+            self._bound_transfer(s, "download", deadline)
+            s.download()
+            record_bytes(s.results.bytes_received)
+
+        if deadline.expired():
+            return self._get_speedtest_error("speedtest-timeout", traceback=None)
+        with self._phase("upload"):
+            self._bound_transfer(s, "upload", deadline)
+            s.upload()
+            record_bytes(s.results.bytes_sent)
 
         if share:
             try:
-                s.results.share()
+                with self._phase("share"):
+                    s.results.share()
             except speedtest.ShareResultsConnectFailure as e:
                 return self._get_speedtest_error("speedtest-share", traceback=str(e))
 
@@ -70,6 +101,17 @@ class SpeedtestdotnetMeasurement(BaseMeasurement):
         except ValueError as e:
             return self._get_speedtest_error("speedtest-convert", traceback=str(e))
 
+    def _bound_transfer(self, s, direction, deadline):
+        """Stop a transfer by the deadline.
+
+        speedtest stops reading `config["length"][direction]` seconds
+        after a transfer starts. A read that stalls may still overrun the
+        deadline by up to the socket timeout, which is bounded when the
+        `Speedtest` is constructed.
+        """
+        length = s.config["length"]
+        length[direction] = deadline.timeout(length[direction])
+
     def _get_speedtest_error(self, key, traceback):
         return SpeedtestdotnetMeasurementResult(
             id=self.id,
@@ -88,7 +130,7 @@ class SpeedtestdotnetMeasurement(BaseMeasurement):
                 Error(
                     key=key,
                     description=SPEEDTEST_ERRORS.get(key, ""),
-                    traceback=traceback,
+                    traceback=cap_traceback(traceback),
                 )
             ],
         )
@@ -1,13 +1,37 @@
-import collections
-import sys
-
-import six
-
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    SpeedtestdotnetMeasurementResult = collections.namedtuple(
-        "SpeedtestdotnetMeasurementResult",
-        "id errors download_rate download_rate_unit upload_rate upload_rate_unit "
-        "data_received data_received_unit latency server_name server_id server_sponsor server_host",
-    )
+import typing
+
+from measurement.results import Field, MeasurementResult
+from measurement.units import StorageUnit, NetworkUnit
+
+
+class SpeedtestdotnetMeasurementResult(MeasurementResult):
+    """Encapsulates the results from a speedtestdotnet measurement.
+
+    :param download_rate: The measured download rate.
+    :param download_rate_unit: The unit of measurement of `download_rate`.
+    :param upload_rate: The measured upload rate.
+    :param upload_rate_unit: The unit of measurement of `upload_rate`.
+    :param data_received: The quantity of data report by the speedtest utility
+    :param data_received_unit: The unit of measurement of `data_received`
+    :param latency: The measured latency.
+    :param server_name: The name of the speedtest.net server used to perform
+    the speedtestdotnet measurement.
+    :param server_id: The id of the speedtest.net server used to perform the
+    speedtestdotnet measurement.
+    :param server_sponsor: The sponsor of the speedtest.net server used to
+    perform the speedtestdotnet measurement.
+    :param server_host: The host name of the speedtest.net server used to
+    perform the speedtestdotnet measurement.
+    """
+
+    download_rate = Field(typing.Optional[float])
+    download_rate_unit = Field(typing.Optional[NetworkUnit])
+    upload_rate = Field(typing.Optional[float])
+    upload_rate_unit = Field(typing.Optional[NetworkUnit])
+    data_received = Field(typing.Optional[float])
+    data_received_unit = Field(typing.Optional[StorageUnit])
+    latency = Field(typing.Optional[float])
+    server_name = Field(typing.Optional[str])
+    server_id = Field(typing.Optional[str])
+    server_sponsor = Field(typing.Optional[str])
+    server_host = Field(typing.Optional[str])
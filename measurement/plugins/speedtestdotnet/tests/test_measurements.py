@@ -3,6 +3,7 @@ from unittest import TestCase, mock
 
 import speedtest
 
+from measurement.deadline import Deadline
 from measurement.plugins.speedtestdotnet.measurements import (
     SpeedtestdotnetMeasurement,
     SPEEDTEST_ERRORS,
@@ -140,11 +141,23 @@ class SpeedtestdotnetTestCase(TestCase):
         results_mock.share = mock.Mock(return_value=None)
         results_mock.dict = mock.Mock(return_value=self.sample_results_dict_valid)
         run_mock.results = results_mock
+        run_mock.config = {"length": {"download": 10, "upload": 10}}
 
         mock_speedtest_constructor.return_value = run_mock
         result = self.stdnm.measure()
         self.assertEqual(result, self.sample_result_valid)
 
+    @mock.patch("speedtest.Speedtest")
+    def test_deadline_bounds_transfers(self, mock_speedtest_constructor):
+        run_mock = mock.Mock()
+        run_mock.results.dict.return_value = self.sample_results_dict_valid
+        run_mock.config = {"length": {"download": 10, "upload": 10}}
+        mock_speedtest_constructor.return_value = run_mock
+        self.stdnm.measure(deadline=Deadline(5))
+        self.assertLessEqual(run_mock.config["length"]["download"], 5)
+        self.assertLessEqual(run_mock.config["length"]["upload"], 5)
+        self.assertLessEqual(mock_speedtest_constructor.call_args[1]["timeout"], 5)
+
     @mock.patch("speedtest.Speedtest")
     def test_speedtest_config_failure(self, mock_speedtest_constructor):
         mock_speedtest_constructor.side_effect = speedtest.ConfigRetrievalError(
@@ -173,6 +186,7 @@ class SpeedtestdotnetTestCase(TestCase):
             )
         )
         run_mock.results = results_mock
+        run_mock.config = {"length": {"download": 10, "upload": 10}}
         mock_speedtest_constructor.return_value = run_mock
         result = self.stdnm.measure(share=True)
         self.assertEqual(result, self.sample_result_share)
@@ -1,16 +1,18 @@
+import asyncio
 import time
 from six.moves.urllib.parse import urlparse
 
-import requests
-from bs4 import BeautifulSoup
-
-from measurement.measurements import BaseMeasurement
+from measurement import aio
+from measurement.deadline import Deadline
+from measurement.measurements import BaseMeasurement, ResourceClass
 from measurement.results import Error
+from measurement.timing import timed
+from measurement.tracebacks import cap_traceback
+from measurement.trace import record_bytes
 from measurement.units import RatioUnit, TimeUnit, StorageUnit, NetworkUnit
 from measurement.plugins.webpage_download.results import WebpageMeasurementResult
 from measurement.plugins.latency.measurements import LatencyMeasurement
 
-
 WEB_ERRORS = {
     "web-get": "Failed to complete the initial connection",
     "web-parse": "Failed to parse assets from HTML",
@@ -29,53 +31,121 @@ VALID_LINK_REL_ATTRIBUTES = [
     "icon",
     "shortcut icon",
 ]
+WEB_HEADERS = {
+    "dnt": "1",
+    "upgrade-insecure-requests": "1",
+    "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.61 Safari/537.36",
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
+    "sec-fetch-site": "none",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-user": "?1",
+    "sec-fetch-dest": "document",
+    "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
+}
 
 
 class WebpageMeasurement(BaseMeasurement):
+    resource_class = ResourceClass.exclusive
+    deferred_imports = ("requests", "bs4")
+
     def __init__(self, id, url, count=4, download_timeout=180):
         self.id = id
         self.url = url
         self.count = count
         self.download_timeout = download_timeout
 
-    def measure(self):
+    def measure(self, deadline=None):
         host = urlparse(self.url).netloc
         protocol = urlparse(self.url).scheme
-        return self._get_webpage_result(self.url, host, protocol)
+        return self._attach_trace(
+            self._get_webpage_result(self.url, host, protocol, deadline=deadline)
+        )
 
-    def _get_webpage_result(self, url, host, protocol):
-        s = requests.Session()
-        headers = {
-            "dnt": "1",
-            "upgrade-insecure-requests": "1",
-            "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.61 Safari/537.36",
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-            "sec-fetch-site": "none",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-user": "?1",
-            "sec-fetch-dest": "document",
-            "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
-        }
+    async def measure_async(self, deadline=None):
+        host = urlparse(self.url).netloc
+        protocol = urlparse(self.url).scheme
+        return await self._get_webpage_result_async(
+            self.url, host, protocol, deadline=deadline
+        )
+
+    @timed
+    def _get_webpage_result(self, url, host, protocol, deadline=None):
+        import requests
 
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return self._get_webpage_error("web-timeout", traceback=None)
+        s = requests.Session()
         start_time = time.time()
         try:
-            r = s.get(url, headers=headers, timeout=self.download_timeout)
+            with self._phase("download_page"):
+                r = s.get(
+                    url,
+                    headers=WEB_HEADERS,
+                    timeout=deadline.timeout(self.download_timeout),
+                )
+                record_bytes(len(r.text))
         except (ConnectionError, requests.ConnectionError) as e:
             return self._get_webpage_error("web-get", traceback=str(e))
         except requests.exceptions.ReadTimeout as e:
             return self._get_webpage_error("web-timeout", traceback=str(e))
+        try:
+            with self._phase("parse_html"):
+                to_download = self._parse_html(r.text)
+        except TypeError as e:
+            return self._get_webpage_error("web-parse-rel", traceback=str(e))
+        try:
+            with self._phase("download_assets"):
+                asset_download_metrics = self._download_assets(
+                    s, to_download, host, protocol, deadline=deadline
+                )
+                record_bytes(asset_download_metrics["asset_download_size"])
+        except TypeError as e:
+            return self._get_webpage_error("web-assets", traceback=str(e))
+
+        return self._get_webpage_success(
+            url, r.text, to_download, asset_download_metrics, start_time
+        )
+
+    @timed
+    async def _get_webpage_result_async(self, url, host, protocol, deadline=None):
+        """Perform the webpage measurement using asyncio sockets.
+
+        Secondary assets are downloaded concurrently.
+        """
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return self._get_webpage_error("web-timeout", traceback=None)
+        start_time = time.time()
+        try:
+            r = await aio.http_get(
+                url,
+                headers=WEB_HEADERS,
+                timeout=deadline.timeout(self.download_timeout),
+            )
+        except asyncio.TimeoutError as e:
+            return self._get_webpage_error("web-timeout", traceback=str(e))
+        except (OSError, ValueError) as e:
+            return self._get_webpage_error("web-get", traceback=str(e))
         try:
             to_download = self._parse_html(r.text)
         except TypeError as e:
             return self._get_webpage_error("web-parse-rel", traceback=str(e))
         try:
-            asset_download_metrics = self._download_assets(
-                s, to_download, host, protocol
+            asset_download_metrics = await self._download_assets_async(
+                to_download, host, protocol, deadline=deadline
             )
         except TypeError as e:
             return self._get_webpage_error("web-assets", traceback=str(e))
 
-        primary_download_size = len(r.text)
+        return self._get_webpage_success(
+            url, r.text, to_download, asset_download_metrics, start_time
+        )
+
+    def _get_webpage_success(
+        self, url, text, to_download, asset_download_metrics, start_time
+    ):
+        primary_download_size = len(text)
         asset_download_size = asset_download_metrics["asset_download_size"]
         elapsed_time = asset_download_metrics["completion_time"] - start_time
         download_rate = (primary_download_size + asset_download_size) * 8 / elapsed_time
@@ -96,6 +166,8 @@ class WebpageMeasurement(BaseMeasurement):
         )
 
     def _parse_html(self, content):
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(content, "html.parser")
         imgs = soup.find_all("img")
         links = soup.find_all("link")
@@ -116,27 +188,26 @@ class WebpageMeasurement(BaseMeasurement):
 
         return to_download
 
-    def _download_assets(self, session, to_download, host, protocol):
+    def _download_assets(self, session, to_download, host, protocol, deadline=None):
+        import requests
+
+        deadline = Deadline.coerce(deadline)
         # Store the amount of bytes downloaded
         asset_download_sizes = []
         failed_asset_downloads = 0
         for asset in to_download:
             try:
-                # Identify data URLs (already downloaded inline, counted in main download size)
-                if "data:" in asset:
+                download_url = self._get_asset_url(asset, host, protocol)
+                if download_url is None:
+                    continue
+                # Assets that cannot be started before the deadline are failed
+                if deadline.expired():
+                    failed_asset_downloads = failed_asset_downloads + 1
                     continue
 
-                # Check if path w/o preceeding slashes is a valid URL
-                if asset.startswith("//"):
-                    download_url = protocol + ":" + asset
-                # Check if path is a relative path
-                elif asset.startswith("/"):
-                    download_url = protocol + "://" + host + asset
-                # ...or simply a normal file link
-                else:
-                    download_url = asset
-
-                a = session.get(download_url, timeout=self.download_timeout)
+                a = session.get(
+                    download_url, timeout=deadline.timeout(self.download_timeout)
+                )
                 if a.status_code >= 400:
                     raise ConnectionError
                 asset_download_sizes.append(len(a.text))
@@ -153,6 +224,56 @@ class WebpageMeasurement(BaseMeasurement):
             "completion_time": time.time(),
         }
 
+    async def _download_assets_async(self, to_download, host, protocol, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        download_urls = [
+            self._get_asset_url(asset, host, protocol) for asset in to_download
+        ]
+        asset_download_sizes = await asyncio.gather(
+            *[
+                self._download_asset_async(url, deadline=deadline)
+                for url in download_urls
+                if url
+            ]
+        )
+        return {
+            "asset_download_size": sum(
+                size for size in asset_download_sizes if size is not None
+            ),
+            "failed_asset_downloads": asset_download_sizes.count(None),
+            "completion_time": time.time(),
+        }
+
+    async def _download_asset_async(self, download_url, deadline=None):
+        """Download a single asset, returning its size or `None` on failure."""
+        deadline = Deadline.coerce(deadline)
+        if deadline.expired():
+            return None
+        try:
+            a = await aio.http_get(
+                download_url, timeout=deadline.timeout(self.download_timeout)
+            )
+        except (OSError, ValueError, asyncio.TimeoutError):
+            return None
+        if a.status_code >= 400:
+            return None
+        return len(a.text)
+
+    def _get_asset_url(self, asset, host, protocol):
+        """Resolve an asset reference to a URL, or `None` if it is inline."""
+        # Identify data URLs (already downloaded inline, counted in main download size)
+        if "data:" in asset:
+            return None
+
+        # Check if path w/o preceeding slashes is a valid URL
+        if asset.startswith("//"):
+            return protocol + ":" + asset
+        # Check if path is a relative path
+        elif asset.startswith("/"):
+            return protocol + "://" + host + asset
+        # ...or simply a normal file link
+        return asset
+
     def _get_webpage_error(self, key, traceback):
         return WebpageMeasurementResult(
             id=self.id,
@@ -166,6 +287,10 @@ class WebpageMeasurement(BaseMeasurement):
             elapsed_time=None,
             elapsed_time_unit=None,
             errors=[
-                Error(key=key, description=WEB_ERRORS.get(key, ""), traceback=traceback)
+                Error(
+                    key=key,
+                    description=WEB_ERRORS.get(key, ""),
+                    traceback=cap_traceback(traceback),
+                )
             ],
         )
@@ -1,13 +1,18 @@
-import collections
-import sys
-
-import six
-
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    WebpageMeasurementResult = collections.namedtuple(
-        "WebpageMeasurementResult",
-        "id errors url download_rate download_rate_unit download_size download_size_unit "
-        "asset_count failed_asset_downloads elapsed_time elapsed_time_unit",
-    )
+import typing
+
+from measurement.results import Field, MeasurementResult
+from measurement.units import TimeUnit, StorageUnit, NetworkUnit
+
+
+class WebpageMeasurementResult(MeasurementResult):
+    """Encapsulates the results from a Webpage download measurement."""
+
+    url = Field(typing.Optional[str])
+    download_rate = Field(typing.Optional[float])
+    download_rate_unit = Field(typing.Optional[NetworkUnit])
+    download_size = Field(typing.Optional[float])
+    download_size_unit = Field(typing.Optional[StorageUnit])
+    asset_count = Field(typing.Optional[int])
+    failed_asset_downloads = Field(typing.Optional[int])
+    elapsed_time = Field(typing.Optional[float])
+    elapsed_time_unit = Field(typing.Optional[TimeUnit])
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from unittest import TestCase, mock
 from unittest.mock import call
 
 import six
 import subprocess
 
+from measurement import aio
+from measurement.aio import HTTPResponse
 from measurement.plugins.latency.measurements import LatencyMeasurement
 from measurement.results import Error
 from measurement.plugins.webpage_download.measurements import WebpageMeasurement
@@ -309,3 +312,73 @@ class WebpageAssetDownloadTestCase(TestCase):
             ),
             self.all_failure_dict,
         )
+
+
+class WebpageMeasurementAsyncTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.wpm = WebpageMeasurement("test", "http://validfakehost.com/test")
+        self.get_error_result = WebpageMeasurementResult(
+            id="test",
+            url="http://validfakehost.com/test",
+            download_rate_unit=None,
+            download_rate=None,
+            download_size=None,
+            download_size_unit=None,
+            asset_count=None,
+            failed_asset_downloads=None,
+            elapsed_time=None,
+            elapsed_time_unit=None,
+            errors=[
+                Error(
+                    key="web-get",
+                    description=WEB_ERRORS.get("web-get", ""),
+                    traceback="[Errno -2] Name or service not known",
+                )
+            ],
+        )
+        self.page = (
+            '<img src="/logo.png"/>\n'
+            '<img src="data:image/png;base64,AAAA"/>\n'
+            '<script src="//validfakehost.com/missing.js"></script>\n'
+            '<link href="http://externalfakehost.com/style.css" rel="stylesheet"/>\n'
+        )
+        self.responses = {
+            "http://validfakehost.com/test": HTTPResponse(
+                "http://validfakehost.com/test", 200, {}, self.page.encode()
+            ),
+            "http://validfakehost.com/logo.png": HTTPResponse(
+                "http://validfakehost.com/logo.png", 200, {}, b"0123456789"
+            ),
+            "http://validfakehost.com/missing.js": HTTPResponse(
+                "http://validfakehost.com/missing.js", 404, {}, b"Not found"
+            ),
+        }
+
+    @mock.patch("measurement.aio.http_get")
+    def test_measure_async(self, mock_http_get):
+        async def http_get(url, headers=None, timeout=None):
+            try:
+                return self.responses[url]
+            except KeyError:
+                raise ConnectionError("[Errno -2] Name or service not known")
+
+        mock_http_get.side_effect = http_get
+        result = aio.run(self.wpm.measure_async())
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.asset_count, 4)
+        self.assertEqual(result.failed_asset_downloads, 2)
+        self.assertEqual(result.download_size, len(self.page) + 10)
+
+    @mock.patch("measurement.aio.http_get")
+    def test_measure_async_get_error(self, mock_http_get):
+        mock_http_get.side_effect = ConnectionError(
+            "[Errno -2] Name or service not known"
+        )
+        self.assertEqual(aio.run(self.wpm.measure_async()), self.get_error_result)
+
+    @mock.patch("measurement.aio.http_get")
+    def test_measure_async_timeout(self, mock_http_get):
+        mock_http_get.side_effect = asyncio.TimeoutError()
+        result = aio.run(self.wpm.measure_async())
+        self.assertEqual(result.errors[0].key, "web-timeout")
@@ -5,12 +5,15 @@ import tempfile
 import os
 import shutil
 
-import youtube_dl
 import validators
 from validators import ValidationFailure
 
-from measurement.measurements import BaseMeasurement
+from measurement.deadline import Deadline
+from measurement.measurements import BaseMeasurement, ResourceClass
 from measurement.results import Error
+from measurement.timing import timed
+from measurement.tracebacks import cap_traceback
+from measurement.trace import record_bytes
 from measurement.units import RatioUnit, TimeUnit, StorageUnit, NetworkUnit
 from measurement.plugins.youtube.results import YouTubeMeasurementResult
 
@@ -23,10 +26,18 @@ YOUTUBE_ERRORS = {
     "youtube-file": "Could not remove file!!",
     "youtube-no_directory": "Could not find directory!!",
     "youtube-directory_nonempty": "Could not remove directory, non-empty!",
+    "youtube-timeout": "Download was stopped when the deadline expired",
 }
 
 
+class _DeadlineExpired(Exception):
+    """Raised from the progress hook to abort a download."""
+
+
 class YouTubeMeasurement(BaseMeasurement):
+    resource_class = ResourceClass.exclusive
+    deferred_imports = ("youtube_dl",)
+
     def __init__(self, id, url):
         super(YouTubeMeasurement, self).__init__(id=id)
         validated_url = validators.url(url)
@@ -35,11 +46,19 @@ class YouTubeMeasurement(BaseMeasurement):
         self.id = id
         self.url = url
         self.progress_dicts = []
+        self.deadline = Deadline()
 
-    def measure(self):
-        return self._get_youtube_result(self.url)
+    def measure(self, deadline=None):
+        self.deadline = Deadline.coerce(deadline)
+        return self._attach_trace(self._get_youtube_result(self.url))
 
+    @timed
     def _get_youtube_result(self, url):
+        # youtube_dl is slow to import, so it is only imported when first used
+        import youtube_dl
+
+        if self.deadline.expired():
+            return self._get_youtube_error("youtube-timeout", traceback=None)
         # Unique filename from process ID and timestamp
         file_dir = "{}/youtube-dl_{}".format(tempfile.gettempdir(), os.getpid())
         filename = "{}/youtube-dl_{}/{}".format(
@@ -52,11 +71,19 @@ class YouTubeMeasurement(BaseMeasurement):
         }
         ydl = youtube_dl.YoutubeDL(params=params)
         try:
-            ydl.extract_info(url)
+            with self._phase("download"):
+                ydl.extract_info(url)
+                if self.progress_dicts:
+                    record_bytes(self.progress_dicts[-1].get("downloaded_bytes") or 0)
         except youtube_dl.utils.ExtractorError as e:
             return self._get_youtube_error("youtube-extractor", traceback=str(e))
         except youtube_dl.utils.DownloadError as e:
             return self._get_youtube_error("youtube-download", traceback=str(e))
+        except _DeadlineExpired:
+            shutil.rmtree(file_dir, ignore_errors=True)
+            return self._get_youtube_error(
+                "youtube-timeout", traceback=str(self.progress_dicts[-1:])
+            )
         try:
             # Extract size and duration from final progress step
             download_size = self.progress_dicts[-1]["total_bytes"]
@@ -94,9 +121,12 @@ class YouTubeMeasurement(BaseMeasurement):
     def _store_progress_dicts_hook(self, s):
         """
         Saves the results of the download progress to a list for later parsing.
-        This function is called at every progress step in the download utility
+        This function is called at every progress step in the download utility,
+        and aborts the download once the deadline has expired.
         """
         self.progress_dicts.append(s)
+        if self.deadline.expired():
+            raise _DeadlineExpired()
 
     def _get_youtube_error(self, key, traceback):
         return YouTubeMeasurementResult(
@@ -112,7 +142,7 @@ class YouTubeMeasurement(BaseMeasurement):
                 Error(
                     key=key,
                     description=YOUTUBE_ERRORS.get(key, ""),
-                    traceback=traceback,
+                    traceback=cap_traceback(traceback),
                 )
             ],
         )
@@ -1,13 +1,16 @@
-import collections
-import sys
-
-import six
-
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    YouTubeMeasurementResult = collections.namedtuple(
-        "YouTubeMeasurementResult",
-        "id errors download_rate download_rate_unit download_size download_size_unit"
-        " url elapsed_time elapsed_time_unit ",
-    )
+import typing
+
+from measurement.results import Field, MeasurementResult
+from measurement.units import TimeUnit, StorageUnit, NetworkUnit
+
+
+class YouTubeMeasurementResult(MeasurementResult):
+    """Encapsulates the results from a YouTube measurement."""
+
+    download_rate = Field(typing.Optional[float])
+    download_rate_unit = Field(typing.Optional[NetworkUnit])
+    download_size = Field(typing.Optional[float])
+    download_size_unit = Field(typing.Optional[StorageUnit])
+    url = Field(typing.Optional[str])
+    elapsed_time = Field(typing.Optional[float])
+    elapsed_time_unit = Field(typing.Optional[TimeUnit])
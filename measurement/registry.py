@@ -0,0 +1,149 @@
+"""
+A lazy registry of measurement classes.
+
+Measurements are registered by name against an import path of the form
+`"package.module:ClassName"`, and the module is only imported when the
+class is first resolved with `get_measurement`. Plugin modules in turn
+defer importing their heavy dependencies (scapy, youtube_dl, requests,
+bs4, speedtest) until `measure()` is first called, so a short-lived
+latency probe does not pay for them at startup.
+
+Third-party packages can provide measurements by declaring an entry
+point in the `honestybox_measurement.plugins` group, e.g. in a poetry
+`pyproject.toml`:
+
+    [tool.poetry.plugins."honestybox_measurement.plugins"]
+    "my_measurement" = "my_package.measurements:MyMeasurement"
+
+Entry points are only scanned when a name is not registered already.
+"""
+
+import importlib
+
+ENTRY_POINT_GROUP = "honestybox_measurement.plugins"
+
+BUILTIN_MEASUREMENTS = {
+    "download_speed": "measurement.plugins.download_speed.measurements:DownloadSpeedMeasurement",
+    "ip_route": "measurement.plugins.ip_route.measurements:IPRouteMeasurement",
+    "latency": "measurement.plugins.latency.measurements:LatencyMeasurement",
+    "netflix_fast": "measurement.plugins.netflix_fast.measurements:NetflixFastMeasurement",
+    "speedtestdotnet": "measurement.plugins.speedtestdotnet.measurements:SpeedtestdotnetMeasurement",
+    "webpage_download": "measurement.plugins.webpage_download.measurements:WebpageMeasurement",
+    "youtube": "measurement.plugins.youtube.measurements:YouTubeMeasurement",
+}
+
+
+class MeasurementRegistry(object):
+    """Resolves measurement classes by name, importing them on demand."""
+
+    def __init__(self, measurements=None, entry_point_group=ENTRY_POINT_GROUP):
+        """Initialisation of a measurement registry.
+
+        :param measurements: A dict mapping names to import paths of the
+        form `"package.module:ClassName"`.
+        :param entry_point_group: The entry point group scanned for
+        additional measurements, or `None` to disable scanning.
+        """
+        self._paths = dict(measurements or {})
+        self._classes = {}
+        self._entry_point_group = entry_point_group
+        self._entry_points_loaded = entry_point_group is None
+
+    def register(self, name, measurement):
+        """Register a measurement.
+
+        :param name: The name the measurement is resolved by.
+        :param measurement: A `BaseMeasurement` subclass, or an import
+        path of the form `"package.module:ClassName"`.
+        """
+        self._classes.pop(name, None)
+        if isinstance(measurement, str):
+            self._paths[name] = measurement
+        else:
+            self._paths.pop(name, None)
+            self._classes[name] = measurement
+
+    def get(self, name):
+        """Resolve a measurement class by name.
+
+        :param name: The registered name of the measurement, or an
+        import path of the form `"package.module:ClassName"`.
+        :return: The `BaseMeasurement` subclass.
+        :raises KeyError: If no measurement is registered as `name`.
+        """
+        if ":" in name and name not in self._paths:
+            return self._import(name)
+        if name not in self._classes:
+            if name not in self._paths:
+                self._load_entry_points()
+            try:
+                path = self._paths[name]
+            except KeyError:
+                raise KeyError(
+                    "`{name}` is not a registered measurement".format(name=name)
+                )
+            self._classes[name] = self._import(path)
+        return self._classes[name]
+
+    def names(self):
+        """Return the sorted names of every available measurement."""
+        self._load_entry_points()
+        return sorted(set(self._paths) | set(self._classes))
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def _import(self, path):
+        module_name, _, attrs = path.partition(":")
+        measurement = importlib.import_module(module_name)
+        for attr in attrs.split("."):
+            measurement = getattr(measurement, attr)
+        return measurement
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for name, path in _iter_entry_points(self._entry_point_group):
+            self._paths.setdefault(name, path)
+
+
+def _iter_entry_points(group):
+    """Yield `(name, "module:attr")` for each entry point in `group`.
+
+    Entry points are read without being loaded, so no plugin module is
+    imported until it is resolved.
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        try:
+            import pkg_resources
+        except ImportError:
+            return
+        for entry_point in pkg_resources.iter_entry_points(group):
+            yield entry_point.name, "{module}:{attr}".format(
+                module=entry_point.module_name, attr=".".join(entry_point.attrs)
+            )
+        return
+
+    all_entry_points = entry_points()
+    if hasattr(all_entry_points, "select"):
+        group_entry_points = all_entry_points.select(group=group)
+    else:
+        group_entry_points = all_entry_points.get(group, [])
+    for entry_point in group_entry_points:
+        yield entry_point.name, entry_point.value
+
+
+registry = MeasurementRegistry(BUILTIN_MEASUREMENTS)
+
+
+def get_measurement(name):
+    """Resolve a measurement class by name from the default registry."""
+    return registry.get(name)
+
+
+def register_measurement(name, measurement):
+    """Register a measurement with the default registry."""
+    registry.register(name, measurement)
@@ -0,0 +1,322 @@
+"""
+Record raw tool output and HTTP responses, and replay them through the
+measurements' parsers.
+
+A `Recorder` captures the output of every `subprocess.run()` call (ping,
+wget) and the text of every non-streamed `requests` response (fast.com,
+webpage pages and assets) made while it is active, appending them to a
+gzip-compressed corpus of JSON lines:
+
+    >>> with Recorder("corpus.jsonl.gz"):
+    ...     LatencyMeasurement("1", "example.com").measure()
+
+`CorpusReplayer` feeds each recorded exchange to the same parsing code
+the measurement ran it through, without any network access or waiting:
+
+ - ping output to `LatencyMeasurement._parse_latency_output`, including
+   the individual replies,
+ - wget output to `DownloadSpeedMeasurement._parse_wget_output`,
+ - the fast.com page, script and API responses to the script and token
+   regexes and `NetflixFastMeasurement._parse_api_json`,
+ - any other HTML page to `WebpageMeasurement._parse_html`, and other
+   responses to the size the webpage measurement counts for an asset.
+
+Exchanges no parser handles are skipped. Replaying a corpus before and
+after a parser change, saving the outputs of the first run with
+`--output` and checking the second against them with `--compare`, shows
+whether the change alters any result:
+
+    $ python -m measurement record corpus.jsonl.gz latency --args '{"host": "example.com"}'
+    $ python -m measurement replay corpus.jsonl.gz --output before.jsonl.gz
+    $ python -m measurement replay corpus.jsonl.gz --compare before.jsonl.gz
+
+Only the blocking `measure()` implementations are recorded;
+`measure_async()` bypasses `subprocess.run()` and `requests`, as do
+latency measurements that stream the output of `ping`.
+"""
+
+import collections
+import gzip
+import json
+import os
+import subprocess
+import threading
+import time
+from six.moves.urllib.parse import urlparse
+
+from measurement.results import encode
+
+REPLAY_ID = "replay"
+FAST_HOSTS = ("fast.com", "www.fast.com")
+FAST_API_HOSTS = ("api.fast.com",)
+# fast.com serves its token in a script at e.g. `/app-1a2b3c.js`
+FAST_SCRIPT_PATH_SUFFIX = ".js"
+
+ReplayReport = collections.namedtuple("ReplayReport", "counts elapsed mismatches")
+
+
+class Recorder(object):
+    """Appends the exchanges of measurements to a corpus while active.
+
+    :param path: The path of the gzip-compressed corpus. Recordings are
+    appended to an existing corpus.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def __enter__(self):
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._run = subprocess.run
+        self._patch(subprocess, "run", self._recording_run)
+        try:
+            import requests
+        except ImportError:
+            pass
+        else:
+            self._patch(
+                requests.Session,
+                "request",
+                self._get_recording_request(requests.Session.request),
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+        self._file.close()
+        self._file = None
+
+    def write(self, record):
+        """Append `record`, a JSON serialisable dict, to the corpus."""
+        record = dict(record, time=time.time())
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def _patch(self, owner, name, replacement):
+        self._patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def _recording_run(self, *args, **kwargs):
+        completed = self._run(*args, **kwargs)
+        self.write(
+            {
+                "type": "subprocess",
+                "args": [str(arg) for arg in completed.args],
+                "returncode": completed.returncode,
+                "stdout": _decode(completed.stdout),
+                "stderr": _decode(completed.stderr),
+            }
+        )
+        return completed
+
+    def _get_recording_request(self, request):
+        def recording_request(session, method, url, *args, **kwargs):
+            response = request(session, method, url, *args, **kwargs)
+            # Reading a streamed body here would consume it
+            if not kwargs.get("stream"):
+                self.write(
+                    {
+                        "type": "http",
+                        "method": method,
+                        "url": url,
+                        "status": response.status_code,
+                        "content_type": response.headers.get("Content-Type"),
+                        "text": response.text,
+                    }
+                )
+            return response
+
+        return recording_request
+
+
+def read_corpus(path):
+    """Yield each record of the corpus at `path`."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CorpusReplayer(object):
+    """Replays recorded exchanges through the measurements' parsers."""
+
+    def __init__(self):
+        from measurement.plugins.download_speed.measurements import (
+            DownloadSpeedMeasurement,
+        )
+        from measurement.plugins.latency.measurements import LatencyMeasurement
+        from measurement.plugins.webpage_download.measurements import (
+            WebpageMeasurement,
+        )
+
+        self._latency = LatencyMeasurement(REPLAY_ID, "127.0.0.1")
+        self._download_speed = DownloadSpeedMeasurement(
+            REPLAY_ID, ["http://127.0.0.1/"]
+        )
+        self._webpage = WebpageMeasurement(REPLAY_ID, "http://127.0.0.1/")
+        self._replayers = {
+            "ping": self._replay_ping,
+            "wget": self._replay_wget,
+            "fast-page": self._replay_fast_page,
+            "fast-script": self._replay_fast_script,
+            "fast-api": self._replay_fast_api,
+            "webpage": self._replay_webpage,
+            "webpage-asset": self._replay_webpage_asset,
+        }
+
+    def get_kind(self, record):
+        """Return the name of the parser `record` replays through, or `None`."""
+        if record["type"] == "subprocess":
+            tool = os.path.basename(record["args"][0])
+            return tool if tool in ("ping", "wget") else None
+        if record["type"] == "http":
+            host = urlparse(record["url"]).hostname
+            if host in FAST_API_HOSTS:
+                return "fast-api"
+            if host in FAST_HOSTS:
+                if FAST_SCRIPT_PATH_SUFFIX in urlparse(record["url"]).path:
+                    return "fast-script"
+                return "fast-page"
+            if "html" in (record.get("content_type") or ""):
+                return "webpage"
+            return "webpage-asset"
+        return None
+
+    def replay_record(self, record, kind=None):
+        """Return the parsed output of `record`.
+
+        :param kind: The kind of `record`, as returned by `get_kind`.
+        """
+        return self._replayers[kind or self.get_kind(record)](record)
+
+    def replay(self, records):
+        """Yield `(kind, output)` for each record a parser handles."""
+        for record in records:
+            kind = self.get_kind(record)
+            if kind is not None:
+                yield kind, self.replay_record(record, kind)
+
+    def _replay_ping(self, record):
+        return self._latency._parse_latency_output(
+            record["args"][-1], _completed_process(record), True
+        )
+
+    def _replay_wget(self, record):
+        return self._download_speed._parse_wget_output(
+            record["args"][-1], _completed_process(record)
+        )
+
+    def _replay_fast_page(self, record):
+        from measurement.plugins.netflix_fast.measurements import FAST_SCRIPT_REGEX
+
+        match = FAST_SCRIPT_REGEX.search(record["text"])
+        return match.group(1) if match else None
+
+    def _replay_fast_script(self, record):
+        from measurement.plugins.netflix_fast.measurements import FAST_TOKEN_REGEX
+
+        match = FAST_TOKEN_REGEX.search(record["text"])
+        return match.group(1) if match else None
+
+    def _replay_fast_api(self, record):
+        from measurement.plugins.netflix_fast.measurements import NetflixFastMeasurement
+
+        try:
+            api_json = json.loads(record["text"])
+            measurement = NetflixFastMeasurement(
+                REPLAY_ID, urlcount=len(api_json["targets"])
+            )
+            measurement._init_thread_results()
+            measurement._parse_api_json(api_json)
+        except ValueError:
+            return "netflix-api-json"
+        except (TypeError, KeyError):
+            return "netflix-api-parse"
+        return {
+            "client": measurement.client_data,
+            "targets": [
+                [thread_result["url"], thread_result["location"]]
+                for thread_result in measurement.thread_results
+            ],
+        }
+
+    def _replay_webpage(self, record):
+        try:
+            return self._webpage._parse_html(record["text"])
+        except TypeError:
+            return "web-parse-rel"
+
+    def _replay_webpage_asset(self, record):
+        return len(record["text"])
+
+
+def to_jsonable(output):
+    """Convert parsed output, including results, to JSON serialisable data."""
+    return encode(output)
+
+
+def replay_corpus(paths, repeat=1, output=None, compare=None):
+    """Replay corpora, returning statistics and any mismatched outputs.
+
+    The corpora are loaded into memory first so that only replaying is
+    timed.
+
+    :param paths: The paths of the corpora to replay.
+    :param repeat: The number of times to replay the corpora.
+    :param output: A path to write the outputs of the first replay to.
+    :param compare: The path of outputs written by an earlier replay to
+    compare the outputs of the first replay with.
+    :return: A `ReplayReport`.
+    """
+    replayer = CorpusReplayer()
+    records = [record for path in paths for record in read_corpus(path)]
+    counts = collections.Counter()
+    outputs = []
+    start = time.perf_counter()
+    for i in range(repeat):
+        for kind, parsed in replayer.replay(records):
+            counts[kind] += 1
+            if i == 0 and (output or compare):
+                outputs.append({"kind": kind, "output": parsed})
+    elapsed = time.perf_counter() - start
+
+    outputs = [dict(o, output=to_jsonable(o["output"])) for o in outputs]
+    if output:
+        with gzip.open(output, "wt", encoding="utf-8") as f:
+            for o in outputs:
+                f.write(json.dumps(o, sort_keys=True) + "\n")
+    mismatches = []
+    if compare:
+        expected = list(read_corpus(compare))
+        if len(expected) != len(outputs):
+            mismatches.append(
+                "{count} outputs were expected but {actual} were replayed".format(
+                    count=len(expected), actual=len(outputs)
+                )
+            )
+        for index, (e, o) in enumerate(zip(expected, outputs)):
+            if e != o:
+                mismatches.append(
+                    "output {index} ({kind}) differs".format(
+                        index=index, kind=o["kind"]
+                    )
+                )
+    return ReplayReport(counts=counts, elapsed=elapsed, mismatches=mismatches)
+
+
+def _completed_process(record):
+    return subprocess.CompletedProcess(
+        record["args"], record["returncode"], record["stdout"], record["stderr"]
+    )
+
+
+def _decode(output):
+    if output is None or isinstance(output, str):
+        return output
+    return output.decode("utf-8", errors="replace")
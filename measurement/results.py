@@ -1,10 +1,512 @@
+"""
+Immutable, slotted result types.
+
+Result types declare their fields in order with `Field`, after those of
+the types they extend:
+
+    >>> class ExampleResult(MeasurementResult):
+    ...     host = Field(str)
+    ...     rate = Field(typing.Optional[float])
+    >>> ExampleResult(id="1", errors=[], host="example.com", rate=None)
+    ExampleResult(id='1', errors=[], host='example.com', rate=None)
+
+Instances store their fields in `__slots__` rather than a per-instance
+`__dict__`, and each type gets a generated `__init__` that sets the slots
+directly, so results are compact and fast to construct on every
+supported Python version. Results compare equal when they are of the
+same type with equal fields, cannot be modified once constructed, and
+provide the `_fields`, `_asdict()` and `_replace()` of a namedtuple.
+
+Results are serialised by `dumps()` and `loads()`, which accept a result
+or any list or dict of them, with the `"json"` codec or, if the msgpack
+package is installed, the `"msgpack"` codec:
+
+    >>> data = dumps(results, codec="msgpack")
+    >>> loads(data, codec="msgpack") == results
+    True
+
+Both codecs share an intermediate form from `encode()`, in which each
+result is a dict of its type name and fields and units are their values:
+
+    >>> encode(ExampleResult(id="1", errors=[], host="example.com", rate=None))
+    {'type': 'ExampleResult', 'fields': {'id': '1', 'errors': [], 'host': 'example.com', 'rate': None}}
+
+The encoder and decoder of each result type are built from its field
+types when first used, so no value is inspected or copied that does not
+need converting. Tuples are decoded as lists, and a result's
+`trace` is not serialised. A result's `timing` is encoded as a list
+under the `"timing"` key when it is set. Other codecs can be added with
+`register_codec()`.
+"""
+
 import collections
-import sys
+import enum
+import importlib
+import json
+import keyword
+import operator
+import typing
+
+
+class Field(object):
+    """Declares a field of a result type.
+
+    :param type: The type of the field's values, for documentation.
+    """
+
+    def __init__(self, type=typing.Any):
+        self.type = type
+
+
+# Result types by name, for decoding
+_result_types = {}
+
+
+class _ResultType(type):
+    @classmethod
+    def __prepare__(mcs, name, bases, **kwargs):
+        # Python 3.5 does not preserve the order of a class body
+        return collections.OrderedDict()
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        field_types = collections.OrderedDict()
+        for base in reversed(bases):
+            field_types.update(getattr(base, "_field_types", {}))
+        own_fields = collections.OrderedDict(
+            (key, value.type)
+            for key, value in namespace.items()
+            if isinstance(value, Field)
+        )
+        field_types.update(own_fields)
+        namespace = collections.OrderedDict(
+            (key, value)
+            for key, value in namespace.items()
+            if not isinstance(value, Field)
+        )
+        namespace["__slots__"] = tuple(namespace.get("__slots__", ())) + tuple(
+            own_fields
+        )
+        namespace["_field_types"] = field_types
+        namespace["_fields"] = tuple(field_types)
+        cls = super(_ResultType, mcs).__new__(mcs, name, bases, dict(namespace))
+        if cls._fields:
+            cls.__init__ = _make_init(cls)
+            # Returns the values of the fields as a tuple
+            cls._values = staticmethod(
+                operator.attrgetter(*cls._fields)
+                if len(cls._fields) > 1
+                else lambda self: (getattr(self, cls._fields[0]),)
+            )
+        _result_types[name] = cls
+        return cls
+
+
+def _make_init(cls):
+    for name in cls._fields:
+        if not name.isidentifier() or keyword.iskeyword(name) or name[0] == "_":
+            raise ValueError(
+                "A value of {name} was provided for a field of {type}. This "
+                "must be an identifier that does not start with an "
+                "underscore.".format(name=name, type=cls.__name__)
+            )
+    # Setting each slot through its descriptor bypasses the frozen
+    # `__setattr__`, and is faster than `object.__setattr__`
+    namespace = {
+        "_set_{name}".format(name=name): getattr(cls, name).__set__
+        for name in cls._fields
+    }
+    # Slots that are not fields, e.g. `MeasurementResult.trace`, start as
+    # `None`
+    others = [
+        name
+        for base in cls.__mro__
+        for name in base.__dict__.get("__slots__", ())
+        if name not in cls._field_types
+    ]
+    namespace.update(
+        ("_set_{name}".format(name=name), getattr(cls, name).__set__) for name in others
+    )
+    # Arguments are bound to named parameters rather than copied into a
+    # `**kwargs` dict, so that keyword construction is faster than for a
+    # frozen dataclass
+    source = "def __init__(_self, {args}):\n{body}".format(
+        args=", ".join(cls._fields),
+        body="".join(
+            "    _set_{name}(_self, {name})\n".format(name=name) for name in cls._fields
+        )
+        + "".join(
+            "    _set_{name}(_self, None)\n".format(name=name) for name in others
+        ),
+    )
+    # The source is built only from the field names checked above
+    exec(source, namespace)  # nosec B102
+    __init__ = namespace["__init__"]
+    __init__.__qualname__ = "{name}.__init__".format(name=cls.__name__)
+    return __init__
+
+
+class _Result(metaclass=_ResultType):
+    __slots__ = ()
+
+    def __repr__(self):
+        return "{name}({fields})".format(
+            name=type(self).__name__,
+            fields=", ".join(
+                "{name}={value!r}".format(name=name, value=value)
+                for name, value in zip(self._fields, self._values(self))
+            ),
+        )
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values(self) == other._values(other)
+
+    def __ne__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values(self) != other._values(other)
+
+    def __hash__(self):
+        return hash(self._values(self))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "cannot assign to field '{name}' of {type}".format(
+                name=name, type=type(self).__name__
+            )
+        )
+
+    def __delattr__(self, name):
+        raise AttributeError(
+            "cannot delete field '{name}' of {type}".format(
+                name=name, type=type(self).__name__
+            )
+        )
+
+    def __getstate__(self):
+        return self._values(self)
+
+    def __setstate__(self, state):
+        for name, value in zip(self._fields, state):
+            object.__setattr__(self, name, value)
+
+    def _asdict(self):
+        """Return the fields as an ordered dict."""
+        return collections.OrderedDict(zip(self._fields, self._values(self)))
+
+    def _replace(self, **changes):
+        """Return a copy with the given fields replaced."""
+        fields = self._asdict()
+        fields.update(changes)
+        return type(self)(**fields)
+
+
+class Error(_Result):
+    """An error format for use with `MeasurementResult`.
+
+    This class is designed to be used with the `MeasurementResult`
+    class and its' subclasses to describe any errors that occurred in a
+    measurement.
+
+    :param key: A key to describe the error type.
+    :param description: A human readable description of the encountered
+    error.
+    :param traceback: The traceback or outputs of a command that caused
+    the error to occur.
+    """
+
+    key = Field(str)
+    description = Field(str)
+    traceback = Field(str)
+
+
+class Timing(collections.namedtuple("Timing", "start_time end_time start_ns end_ns")):
+    """When a result was measured.
+
+    :param start_time: The Unix timestamp the measurement started at.
+    :param end_time: The Unix timestamp the measurement ended at, derived
+    from `start_time` and the monotonic elapsed time.
+    :param start_ns: The `time.perf_counter_ns()` the measurement started
+    at, only comparable within a process.
+    :param end_ns: The `time.perf_counter_ns()` the measurement ended at.
+    """
+
+    __slots__ = ()
+
+    @property
+    def elapsed(self):
+        """The monotonic time the measurement took, in seconds."""
+        return (self.end_ns - self.start_ns) / 1e9
+
+
+class MeasurementResult(_Result):
+    """A standard interface for measurement results
+
+    :param id: A unique identifier for the measurement result.
+    :param errors: The errors that occurred while attempting to take
+    the measurement.
+
+    A `MeasurementTrace` of the measurement is available as `trace` if
+    tracing was enabled, and a `Timing` of when it was measured as
+    `timing`. They are not fields, so they do not affect equality, and
+    are `None` until set.
+    """
+
+    __slots__ = ("trace", "timing")
+
+    id = Field(str)
+    errors = Field(typing.List[Error])
+
+    def __getstate__(self):
+        return self._values(self), self.trace, self.timing
+
+    def __setstate__(self, state):
+        # Results pickled before `timing` was added have no timing
+        values, trace, timing = (tuple(state) + (None,))[:3]
+        super(MeasurementResult, self).__setstate__(values)
+        object.__setattr__(self, "trace", trace)
+        object.__setattr__(self, "timing", timing)
+
+    def _replace(self, **changes):
+        """Return a copy with the given fields replaced, and the same
+        `trace` and `timing`."""
+        result = super(MeasurementResult, self)._replace(**changes)
+        object.__setattr__(result, "trace", self.trace)
+        object.__setattr__(result, "timing", self.timing)
+        return result
+
+
+Codec = collections.namedtuple("Codec", ["dumps", "loads"])
+
+
+def _msgpack_dumps(data):
+    import msgpack
+
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _msgpack_loads(data):
+    import msgpack
+
+    return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {
+    # A shared encoder, as `json.dumps` creates one per call when given options
+    "json": Codec(
+        dumps=json.JSONEncoder(separators=(",", ":"), check_circular=False).encode,
+        loads=json.loads,
+    ),
+    "msgpack": Codec(dumps=_msgpack_dumps, loads=_msgpack_loads),
+}
+
+# Generated encoders by result type, and decoders by result type name
+_encoders = {}
+_decoders = {}
+
+_PLAIN_TYPES = (str, int, float, bool)
+
+
+def register_codec(name, dumps, loads):
+    """Register a codec for use with `dumps()` and `loads()`.
+
+    :param name: The name the codec is selected by.
+    :param dumps: A function serialising the output of `encode()`.
+    :param loads: A function deserialising the output of `dumps`.
+    """
+    CODECS[name] = Codec(dumps=dumps, loads=loads)
+
+
+def dumps(value, codec="json"):
+    """Serialise a result, or a list or dict of results.
+
+    :param value: The value to serialise.
+    :param codec: The name of the codec to serialise with.
+    :return: A `str` for the `"json"` codec, or `bytes` for `"msgpack"`.
+    """
+    return _get_codec(codec).dumps(encode(value))
+
+
+def loads(data, codec="json"):
+    """Deserialise a value serialised by `dumps()`.
+
+    :param data: The serialised value.
+    :param codec: The name of the codec `data` was serialised with.
+    :raises ValueError: If an encoded result cannot be decoded.
+    """
+    return decode(_get_codec(codec).loads(data))
+
+
+def encode(value):
+    """Convert a result, or a list or dict of results, to the plain lists,
+    dicts, strings and numbers that every codec can serialise."""
+    encoder = _encoders.get(value.__class__)
+    if encoder is not None:
+        return encoder(value)
+    if value is None or value.__class__ in _PLAIN_TYPES:
+        return value
+    if isinstance(value, _Result):
+        encoder = _encoders[value.__class__] = _compile_encoder(value.__class__)
+        return encoder(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        return {key: encode(v) for key, v in value.items()}
+    return value
+
+
+def decode(data):
+    """Convert the output of `encode()` back to results.
+
+    :raises ValueError: If an encoded result cannot be decoded.
+    """
+    if isinstance(data, list):
+        return [decode(v) for v in data]
+    if isinstance(data, dict):
+        if "type" in data and "fields" in data:
+            if len(data) == 2:
+                return _decode_result(data["type"], data["fields"])
+            if len(data) == 3 and "timing" in data:
+                result = _decode_result(data["type"], data["fields"])
+                object.__setattr__(result, "timing", Timing(*data["timing"]))
+                return result
+        return {key: decode(v) for key, v in data.items()}
+    return data
+
+
+def get_result_type(name):
+    """Return the result type named `name`.
+
+    :raises ValueError: If no result type is named `name`.
+    """
+    if name not in _result_types:
+        # The result types of the built-in measurements may not have been
+        # imported yet
+        from measurement.registry import BUILTIN_MEASUREMENTS
+
+        for path in BUILTIN_MEASUREMENTS.values():
+            module = path.split(":")[0].rsplit(".", 1)[0]
+            importlib.import_module(module + ".results")
+    try:
+        return _result_types[name]
+    except KeyError:
+        raise ValueError("Unknown result type '{name}'".format(name=name))
+
+
+def _get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError("Unknown codec '{name}'".format(name=name))
+
+
+def _decode_result(name, fields):
+    decoder = _decoders.get(name)
+    if decoder is None:
+        decoder = _decoders[name] = _compile_decoder(get_result_type(name))
+    try:
+        return decoder(fields)
+    except (KeyError, TypeError) as e:
+        raise ValueError(
+            "Cannot decode {name}: {error!r}".format(name=name, error=e)
+        ) from e
+
+
+def _get_field_kind(field_type):
+    """Return how values of `field_type` are encoded: `"plain"` values are
+    kept, `"enum"` values are replaced by their value, `"results"` are
+    lists of results, and anything else is encoded by inspecting it."""
+    field_type = unwrap_optional(field_type)
+    if field_type in _PLAIN_TYPES:
+        return "plain"
+    if isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+        return "enum"
+    args = getattr(field_type, "__args__", None)
+    if (
+        getattr(field_type, "__origin__", None) in (list, typing.List)
+        and args
+        and isinstance(args[0], type)
+        and issubclass(args[0], _Result)
+    ):
+        return "results"
+    return "any"
+
+
+def _compile_encoder(cls):
+    names = cls._fields
+    values = cls._values
+    type_name = cls.__name__
+    # The fields whose values are converted, and how
+    converters = tuple(
+        (name, _get_converter(_get_field_kind(field_type), field_type, encode))
+        for name, field_type in cls._field_types.items()
+        if _get_field_kind(field_type) != "plain"
+    )
+    has_timing = issubclass(cls, MeasurementResult)
+
+    def encode_result(result):
+        fields = dict(zip(names, values(result)))
+        for name, converter in converters:
+            value = fields[name]
+            if value is not None:
+                fields[name] = converter(value)
+        encoded = {"type": type_name, "fields": fields}
+        if has_timing and result.timing is not None:
+            encoded["timing"] = list(result.timing)
+        return encoded
+
+    return encode_result
+
+
+def _compile_decoder(cls):
+    names = cls._fields
+    # The indexes of the fields whose values are converted, and how
+    converters = tuple(
+        (index, _get_converter(_get_field_kind(field_type), field_type, decode))
+        for index, field_type in enumerate(cls._field_types.values())
+        if _get_field_kind(field_type) != "plain"
+    )
+
+    def decode_result(fields):
+        values = [fields[name] for name in names]
+        for index, converter in converters:
+            value = values[index]
+            if value is not None:
+                values[index] = converter(value)
+        return cls(*values)
+
+    return decode_result
+
+
+def _get_converter(kind, field_type, convert):
+    """Return the function converting a value of a field of `kind`, given
+    `encode` or `decode` as `convert`."""
+    if kind == "enum":
+        if convert is encode:
+            return operator.attrgetter("value")
+        # Looking up members by value is faster than calling the enum
+        return {
+            member.value: member for member in unwrap_optional(field_type)
+        }.__getitem__
+    if kind == "results":
+        return lambda values: [convert(value) for value in values]
+    return convert
 
-import six
 
-if six.PY3 and not sys.version_info.minor == 5:  # All python 3 expect for 3.5
-    from .results_py3 import *
-else:
-    Error = collections.namedtuple("Error", "key description traceback")
-    MeasurementResult = collections.namedtuple("MeasurementResult", "id errors")
+def unwrap_optional(field_type):
+    """Return `T` for `typing.Optional[T]`, or `field_type` otherwise."""
+    # `__union_params__` on Python 3.5
+    args = getattr(field_type, "__args__", None) or getattr(
+        field_type, "__union_params__", None
+    )
+    if (
+        getattr(field_type, "__origin__", None) is typing.Union
+        or type(field_type).__name__ == "UnionMeta"
+    ) and args:
+        others = [arg for arg in args if arg is not type(None)]
+        if len(others) == 1:
+            return others[0]
+    return field_type
@@ -0,0 +1,187 @@
+"""
+Run a suite of measurements concurrently.
+
+`MeasurementRunner` runs a list of `BaseMeasurement` instances on a
+bounded pool of worker threads. Access to the network link is arbitrated
+by each measurement's `resource_class`:
+
+ - `ResourceClass.shared` measurements (latency, traceroute) run
+   alongside any other shared measurements.
+ - `ResourceClass.exclusive` measurements (bandwidth tests) run alone,
+   with no other measurement of either class in flight.
+
+Exclusive measurements take precedence over shared measurements waiting
+for the link, so a suite completes in roughly the sum of its exclusive
+measurements plus the longest chain of shared ones, rather than the sum
+of every measurement.
+"""
+
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from measurement.measurements import ResourceClass
+from measurement.results import Error, MeasurementResult
+from measurement.timing import Stopwatch, attach_timing
+from measurement.tracebacks import cap_traceback
+
+RUNNER_ERRORS = {
+    "runner-err": "The measurement raised an unhandled exception.",
+    "runner-timeout": "The deadline expired while the measurement waited for the link.",
+}
+# The number of seconds between checks of the deadline of a measurement
+# waiting for the link, which is not notified when a deadline expires
+LINK_POLL_INTERVAL = 0.1
+
+
+class LinkLock(object):
+    """A readers-writer lock guarding the network link.
+
+    Any number of shared holders may hold the lock at once, while an
+    exclusive holder holds it alone. Waiting exclusive holders block new
+    shared holders so that bandwidth tests cannot be starved.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._shared_holders = 0
+        self._exclusive_held = False
+        self._exclusive_waiting = 0
+
+    def acquire(self, resource_class, deadline=None):
+        """Wait for the link.
+
+        :param deadline: An optional `Deadline` to stop waiting at.
+        :return: `True` if the lock was acquired, or `False` if the
+        deadline expired first.
+        """
+        with self._condition:
+            if resource_class is ResourceClass.exclusive:
+                self._exclusive_waiting += 1
+                try:
+                    while self._exclusive_held or self._shared_holders:
+                        if not self._wait(deadline):
+                            return False
+                finally:
+                    self._exclusive_waiting -= 1
+                    # Shared holders may have been waiting on this one
+                    self._condition.notify_all()
+                self._exclusive_held = True
+            else:
+                while self._exclusive_held or self._exclusive_waiting:
+                    if not self._wait(deadline):
+                        return False
+                self._shared_holders += 1
+            return True
+
+    def release(self, resource_class):
+        with self._condition:
+            if resource_class is ResourceClass.exclusive:
+                self._exclusive_held = False
+            else:
+                self._shared_holders -= 1
+            self._condition.notify_all()
+
+    def _wait(self, deadline):
+        if deadline is None:
+            self._condition.wait()
+            return True
+        if deadline.expired():
+            return False
+        self._condition.wait(deadline.timeout(LINK_POLL_INTERVAL))
+        return not deadline.expired()
+
+
+class MeasurementRunner(object):
+    """Runs a suite of measurements on a bounded worker pool."""
+
+    def __init__(self, measurements, max_workers=4):
+        """Initialisation of a measurement runner.
+
+        :param measurements: A list of `BaseMeasurement` instances.
+        :param max_workers: The maximum number of measurements that may
+        run at the same time.
+        """
+        if max_workers < 1:
+            raise ValueError(
+                "A value of {max_workers} was provided for the number of workers. This "
+                "must be a positive integer greater than 0.".format(
+                    max_workers=max_workers
+                )
+            )
+        self.measurements = list(measurements)
+        self.max_workers = max_workers
+        self.link_lock = LinkLock()
+
+    def run(self, deadline=None):
+        """Run every measurement in the suite.
+
+        :param deadline: An optional `Deadline` shared by every
+        measurement in the suite, including those still waiting for the
+        link. Cancelling it stops the suite early.
+        :return: A list containing the return value of each
+        measurement's `measure()`, in the order the measurements were
+        provided. A measurement that raises is reported as a
+        `MeasurementResult` with a `runner-err` error, and one still
+        waiting for the link when the deadline expires with a
+        `runner-timeout` error.
+        """
+        # Submit exclusive measurements first so that they claim the link
+        # before the shared measurements fill the pool.
+        order = sorted(
+            range(len(self.measurements)),
+            key=lambda i: self.measurements[i].resource_class
+            is not ResourceClass.exclusive,
+        )
+        results = [None] * len(self.measurements)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                (
+                    i,
+                    executor.submit(
+                        self._run_measurement, self.measurements[i], deadline
+                    ),
+                )
+                for i in order
+            ]
+            for i, future in futures:
+                results[i] = future.result()
+        return results
+
+    def _run_measurement(self, measurement, deadline=None):
+        resource_class = measurement.resource_class
+        stopwatch = Stopwatch()
+        if not self.link_lock.acquire(resource_class, deadline):
+            return [
+                attach_timing(
+                    self._get_runner_error(
+                        measurement, "runner-timeout", traceback=None
+                    ),
+                    stopwatch.stop(),
+                )
+            ]
+        try:
+            return measurement._measure(deadline)
+        except Exception:
+            return [
+                attach_timing(
+                    self._get_runner_error(
+                        measurement, "runner-err", traceback=traceback.format_exc()
+                    ),
+                    stopwatch.stop(),
+                )
+            ]
+        finally:
+            self.link_lock.release(resource_class)
+
+    def _get_runner_error(self, measurement, key, traceback):
+        return MeasurementResult(
+            id=measurement.id,
+            errors=[
+                Error(
+                    key=key,
+                    description=RUNNER_ERRORS.get(key, ""),
+                    traceback=cap_traceback(traceback),
+                )
+            ],
+        )
@@ -0,0 +1,454 @@
+"""
+Mergeable streaming percentiles of results.
+
+`PercentileSketch` estimates the quantiles of a stream of non-negative
+values in bounded memory. Like an HDR histogram, it counts values in
+logarithmically sized buckets: a value `x` is counted in the bucket
+`ceil(log(x, gamma))`, where `gamma = (1 + a) / (1 - a)` for a relative
+accuracy `a`, so every quantile is estimated to within `a` of its true
+value whatever the distribution. Two sketches of the same accuracy merge
+exactly by adding their bucket counts, so the percentiles of a fleet are
+the merge of the sketches of each probe. When a sketch has more than
+`max_bins` buckets its lowest buckets are collapsed into one, keeping the
+accuracy of the upper percentiles, which matter most for latency.
+
+`PercentileAggregator` keeps a sketch per metric and target, fed from
+results:
+
+    >>> aggregator = PercentileAggregator()
+    >>> aggregator.add(LatencyMeasurement("1", "1.1.1.1").measure())
+    >>> aggregator.quantiles("average_latency", "1.1.1.1", [0.5, 0.95, 0.99])
+    [0.0071, 0.0074, 0.0074]
+
+The metrics are normalised to seconds and bit/s:
+
+ - `average_latency` is the `average_latency` of each
+   `LatencyMeasurementResult`.
+ - `latency` is the `elapsed_time` of each
+   `LatencyIndividualMeasurementResult`, i.e. each ping reply.
+ - `download_rate` and `upload_rate` are those fields of any result.
+
+The target of a value is the `host` of its result, or its `url` for
+results without a host. Sketches and aggregators serialise to compact
+bytes with `to_bytes()`, so probes can send theirs to be merged.
+"""
+
+import collections
+import math
+import struct
+
+from measurement.units import BIT_PER_SECOND_FACTORS, FACTORS, LATENCY_DIVISOR, TimeUnit
+
+RELATIVE_ACCURACY = 0.01
+MAX_BINS = 2048
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Factors converting each unit to seconds
+SECOND_FACTORS = {unit: FACTORS[unit] for unit in TimeUnit}
+RATE_FIELDS = ("download_rate", "upload_rate")
+TARGET_FIELDS = ("host", "url")
+
+_VERSION = 1
+# The version, relative accuracy, maximum bins, sum, minimum and maximum
+_HEADER = struct.Struct("<BdIddd")
+
+
+class PercentileSketch(object):
+    """A mergeable sketch of the distribution of non-negative values.
+
+    :param relative_accuracy: The relative error of estimated quantiles,
+    between 0 and 1.
+    :param max_bins: The maximum number of buckets kept.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_bins=MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                "A relative accuracy of {accuracy} was provided. This must be "
+                "between 0 and 1.".format(accuracy=relative_accuracy)
+            )
+        if max_bins < 1:
+            raise ValueError(
+                "A value of {max_bins} was provided for the maximum number of "
+                "bins. This must be a positive integer greater than 0.".format(
+                    max_bins=max_bins
+                )
+            )
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # The number of values in each bucket, by bucket index
+        self._bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def __eq__(self, other):
+        if not isinstance(other, PercentileSketch):
+            return NotImplemented
+        return (
+            self.relative_accuracy == other.relative_accuracy
+            and self.max_bins == other.max_bins
+            and self._bins == other._bins
+            and self.zero_count == other.zero_count
+            and self.sum == other.sum
+            and self.minimum == other.minimum
+            and self.maximum == other.maximum
+        )
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def mean(self):
+        """The mean of the values, or `None` if there are none."""
+        return self.sum / self.count if self.count else None
+
+    def add(self, value, count=1):
+        """Add a value `count` times.
+
+        :raises ValueError: If the value is negative or not a number.
+        """
+        if not value >= 0:
+            raise ValueError(
+                "{value!r} cannot be added to a sketch, as it is not a "
+                "non-negative number.".format(value=value)
+            )
+        if value == 0:
+            self.zero_count += count
+        else:
+            key = int(math.ceil(math.log(value) / self._log_gamma))
+            self._bins[key] = self._bins.get(key, 0) + count
+            if len(self._bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        """Add the values of another sketch to this one.
+
+        :raises ValueError: If the sketches have different accuracies.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                "Sketches with relative accuracies of {a} and {b} cannot be "
+                "merged.".format(a=self.relative_accuracy, b=other.relative_accuracy)
+            )
+        if not other.count:
+            return
+        for key, count in other._bins.items():
+            self._bins[key] = self._bins.get(key, 0) + count
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+    def quantile(self, q):
+        """Return the estimated `q` quantile, or `None` if the sketch is
+        empty.
+
+        :param q: The quantile, between 0 and 1, e.g. `0.99` for the 99th
+        percentile.
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """Return the estimated quantiles `qs` in one pass."""
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError(
+                    "A quantile of {q} was provided. This must be between 0 and "
+                    "1.".format(q=q)
+                )
+        if not self.count:
+            return [None for _ in qs]
+        # The rank of each quantile, in increasing order
+        ranks = sorted((q * (self.count - 1), index) for index, q in enumerate(qs))
+        estimates = [None] * len(qs)
+        position = 0
+        cumulative = self.zero_count
+        while position < len(ranks) and ranks[position][0] < cumulative:
+            estimates[ranks[position][1]] = 0.0
+            position += 1
+        for key in sorted(self._bins):
+            if position == len(ranks):
+                break
+            cumulative += self._bins[key]
+            # The value in the middle of the bucket in relative terms
+            value = 2 * self._gamma**key / (self._gamma + 1)
+            value = min(max(value, self.minimum), self.maximum)
+            while position < len(ranks) and ranks[position][0] < cumulative:
+                estimates[ranks[position][1]] = value
+                position += 1
+        for rank, index in ranks[position:]:
+            estimates[index] = self.maximum
+        return estimates
+
+    def to_bytes(self):
+        """Serialise the sketch compactly."""
+        data = bytearray(
+            _HEADER.pack(
+                _VERSION,
+                self.relative_accuracy,
+                self.max_bins,
+                self.sum,
+                _NONE if self.minimum is None else self.minimum,
+                _NONE if self.maximum is None else self.maximum,
+            )
+        )
+        _write_varint(data, self.zero_count)
+        _write_varint(data, len(self._bins))
+        previous = 0
+        # The buckets in order, as the difference from the previous index
+        for key in sorted(self._bins):
+            _write_varint(data, _zigzag(key - previous))
+            _write_varint(data, self._bins[key])
+            previous = key
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserialise a sketch serialised by `to_bytes()`.
+
+        :raises ValueError: If `data` is not a serialised sketch.
+        """
+        sketch, position = cls._read(data, 0)
+        if position != len(data):
+            raise ValueError("Unexpected data after the sketch")
+        return sketch
+
+    @classmethod
+    def _read(cls, data, position):
+        if len(data) < position + _HEADER.size:
+            raise ValueError("Truncated sketch")
+        version, relative_accuracy, max_bins, total, minimum, maximum = (
+            _HEADER.unpack_from(data, position)
+        )
+        if version != _VERSION:
+            raise ValueError(
+                "Unsupported sketch version {version}".format(version=version)
+            )
+        sketch = cls(relative_accuracy, max_bins)
+        position += _HEADER.size
+        sketch.zero_count, position = _read_varint(data, position)
+        length, position = _read_varint(data, position)
+        key = 0
+        for _ in range(length):
+            delta, position = _read_varint(data, position)
+            key += _unzigzag(delta)
+            sketch._bins[key], position = _read_varint(data, position)
+        sketch.count = sketch.zero_count + sum(sketch._bins.values())
+        sketch.sum = total
+        if sketch.count:
+            sketch.minimum = minimum
+            sketch.maximum = maximum
+        return sketch, position
+
+    def _collapse(self):
+        # The lowest buckets are merged into the lowest bucket kept
+        keys = sorted(self._bins)
+        excess = keys[: len(keys) - self.max_bins + 1]
+        self._bins[excess[-1]] = sum(self._bins.pop(key) for key in excess)
+
+
+class PercentileAggregator(object):
+    """Keeps a `PercentileSketch` of each metric of results per target.
+
+    :param relative_accuracy: The relative accuracy of the sketches.
+    :param max_bins: The maximum number of buckets of each sketch.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_bins=MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        # Sketches by `(metric, target)`
+        self.sketches = collections.OrderedDict()
+
+    def __eq__(self, other):
+        if not isinstance(other, PercentileAggregator):
+            return NotImplemented
+        return self.sketches == other.sketches
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def add(self, results):
+        """Add the values of one or more results.
+
+        :param results: A `MeasurementResult`, or an iterable of them.
+        """
+        if hasattr(results, "errors"):
+            results = [results]
+        for result in results:
+            for metric, target, value in get_metric_values(result):
+                self.get_sketch(metric, target).add(value)
+
+    def merge(self, other):
+        """Add the sketches of another aggregator to this one."""
+        for (metric, target), sketch in other.sketches.items():
+            self.get_sketch(metric, target).merge(sketch)
+
+    def get_sketch(self, metric, target):
+        """Return the sketch of a metric of a target, creating it if there
+        is none yet."""
+        sketch = self.sketches.get((metric, target))
+        if sketch is None:
+            sketch = self.sketches[(metric, target)] = PercentileSketch(
+                self.relative_accuracy, self.max_bins
+            )
+        return sketch
+
+    def quantiles(self, metric, target, qs=DEFAULT_QUANTILES):
+        """Return the estimated quantiles of a metric of a target, or
+        `None` for each if it has no values."""
+        sketch = self.sketches.get((metric, target))
+        if sketch is None:
+            return [None for _ in qs]
+        return sketch.quantiles(qs)
+
+    def report(self, qs=DEFAULT_QUANTILES):
+        """Return the count and estimated quantiles of every metric of
+        every target, as an ordered dict by `(metric, target)`."""
+        return collections.OrderedDict(
+            (key, (sketch.count, sketch.quantiles(qs)))
+            for key, sketch in sorted(
+                self.sketches.items(), key=lambda item: _sort_key(item[0])
+            )
+        )
+
+    def to_bytes(self):
+        """Serialise the sketches compactly."""
+        data = bytearray()
+        _write_varint(data, len(self.sketches))
+        for (metric, target), sketch in self.sketches.items():
+            for name in (metric, target):
+                encoded = b"" if name is None else name.encode("utf-8")
+                # 0 for `None`, or the length of the name plus one
+                _write_varint(data, 0 if name is None else len(encoded) + 1)
+                data += encoded
+            data += sketch.to_bytes()
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserialise sketches serialised by `to_bytes()`.
+
+        :raises ValueError: If `data` is not serialised sketches.
+        """
+        aggregator = cls()
+        length, position = _read_varint(data, 0)
+        for _ in range(length):
+            names = []
+            for _ in range(2):
+                size, position = _read_varint(data, position)
+                if size == 0:
+                    names.append(None)
+                    continue
+                if len(data) < position + size - 1:
+                    raise ValueError("Truncated sketch")
+                names.append(
+                    bytes(data[position : position + size - 1]).decode("utf-8")
+                )
+                position += size - 1
+            sketch, position = PercentileSketch._read(data, position)
+            aggregator.relative_accuracy = sketch.relative_accuracy
+            aggregator.max_bins = sketch.max_bins
+            aggregator.sketches[tuple(names)] = sketch
+        if position != len(data):
+            raise ValueError("Unexpected data after the sketches")
+        return aggregator
+
+
+def get_metric_values(result):
+    """Return the `(metric, target, value)` of each value of a result that
+    is aggregated, normalised to seconds and bit/s."""
+    fields = result._asdict()
+    target = None
+    for name in TARGET_FIELDS:
+        if fields.get(name) is not None:
+            target = fields[name]
+            break
+    values = []
+    # Only results with these names, so other results with the same
+    # fields are not mistaken for ping results
+    type_name = type(result).__name__
+    if type_name == "LatencyMeasurementResult":
+        if fields.get("average_latency") is not None:
+            values.append(
+                ("average_latency", target, fields["average_latency"] / LATENCY_DIVISOR)
+            )
+    elif type_name == "LatencyIndividualMeasurementResult":
+        factor = SECOND_FACTORS.get(fields.get("elapsed_time_unit"))
+        elapsed_time = _to_float(fields.get("elapsed_time"))
+        if elapsed_time is not None and factor is not None:
+            values.append(("latency", target, elapsed_time * factor))
+    for name in RATE_FIELDS:
+        factor = BIT_PER_SECOND_FACTORS.get(fields.get(name + "_unit"))
+        rate = _to_float(fields.get(name))
+        if rate is not None and factor is not None:
+            values.append((name, target, rate * factor))
+    return [value for value in values if value[2] >= 0]
+
+
+# A float that cannot be a minimum or maximum, marking `None`
+_NONE = float("nan")
+
+
+def _to_float(value):
+    # The ping parser stores the individual results as strings
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _sort_key(key):
+    return tuple((name is None, name or "") for name in key)
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _write_varint(buffer, value):
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, position):
+    result = shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("Truncated sketch")
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
@@ -0,0 +1,151 @@
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase, mock
+
+from measurement import aio
+from measurement.measurements import BaseMeasurement
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/content-length")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/content-length":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", "11")
+            self.end_headers()
+            self.wfile.write(b"hello world")
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n")
+        elif self.path == "/truncated":
+            self.send_response(200)
+            self.send_header("Content-Length", "11")
+            self.end_headers()
+            self.wfile.write(b"hello")
+            self.close_connection = True
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPGetTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), LocalHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base_url = "http://127.0.0.1:{port}".format(port=cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_content_length(self):
+        response = aio.run(aio.http_get(self.base_url + "/content-length", timeout=5))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "hello world")
+        self.assertEqual(response.encoding, "utf-8")
+
+    def test_chunked(self):
+        response = aio.run(aio.http_get(self.base_url + "/chunked", timeout=5))
+        self.assertEqual(response.content, b"hello world")
+
+    def test_redirect(self):
+        response = aio.run(aio.http_get(self.base_url + "/redirect", timeout=5))
+        self.assertEqual(response.url, self.base_url + "/content-length")
+        self.assertEqual(response.text, "hello world")
+
+    def test_truncated(self):
+        with self.assertRaises(ConnectionError):
+            aio.run(aio.http_get(self.base_url + "/truncated", timeout=5))
+
+    def test_not_found(self):
+        response = aio.run(aio.http_get(self.base_url + "/missing", timeout=5))
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_url(self):
+        with self.assertRaises(ValueError):
+            aio.run(aio.http_get("/relative/path"))
+
+
+class RunSubprocessTestCase(TestCase):
+    def test_completed_process(self):
+        result = aio.run(
+            aio.run_subprocess([sys.executable, "-c", "print('out')"], timeout=10)
+        )
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "out\n")
+        self.assertEqual(result.stderr, "")
+
+    def test_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired) as context:
+            aio.run(
+                aio.run_subprocess(
+                    [
+                        sys.executable,
+                        "-c",
+                        "import time; print('out', flush=True); time.sleep(10)",
+                    ],
+                    timeout=1,
+                )
+            )
+        self.assertEqual(context.exception.stdout, b"out\n")
+
+    def test_worker_thread(self):
+        # Without a child watcher attached to the loop of the thread
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(
+                aio.run(aio.run_subprocess([sys.executable, "-c", "print('out')"]))
+            )
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual(results[0].stdout, "out\n")
+
+    @mock.patch.object(aio, "THREADED_SUBPROCESSES", True)
+    def test_threaded_subprocesses(self):
+        result = aio.run(
+            aio.run_subprocess([sys.executable, "-c", "print('out')"], timeout=10)
+        )
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "out\n")
+        with self.assertRaises(subprocess.TimeoutExpired) as context:
+            aio.run(
+                aio.run_subprocess(
+                    [
+                        sys.executable,
+                        "-c",
+                        "import time; print('out', flush=True); time.sleep(10)",
+                    ],
+                    timeout=1,
+                )
+            )
+        self.assertEqual(context.exception.stdout, b"out\n")
+
+
+class BaseMeasurementAsyncTestCase(TestCase):
+    def test_measure_async_runs_measure_in_executor(self):
+        class ThreadNameMeasurement(BaseMeasurement):
+            def measure(self):
+                return [threading.current_thread().name]
+
+        results = aio.run(ThreadNameMeasurement("test").measure_async())
+        self.assertNotEqual(results, [threading.current_thread().name])
@@ -0,0 +1,149 @@
+import math
+from unittest import TestCase, skipIf
+
+from measurement.batch import ResultBatch
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.latency.results import (
+    LatencyIndividualMeasurementResult,
+    LatencyMeasurementResult,
+)
+from measurement.results import Error
+from measurement.units import NetworkUnit, RatioUnit, StorageUnit, TimeUnit
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def _latency_result(host, average_latency, errors=None):
+    return LatencyMeasurementResult(
+        id="1",
+        errors=errors or [],
+        host=host,
+        minimum_latency=average_latency,
+        average_latency=average_latency,
+        maximum_latency=average_latency,
+        median_deviation=None if average_latency is None else 0.1,
+        packets_transmitted=4,
+        packets_received=None if average_latency is None else 4,
+        packets_lost=0.0,
+        packets_lost_unit=RatioUnit.percentage,
+        elapsed_time=3.0,
+        elapsed_time_unit=None if average_latency is None else TimeUnit.millisecond,
+    )
+
+
+class ResultBatchTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.error = Error(key="ping-err", description="", traceback="failed")
+        self.results = [
+            _latency_result("a.com", 6.5),
+            _latency_result("b.com", None, errors=[self.error]),
+            _latency_result("a.com", 7.25),
+        ]
+        self.batch = ResultBatch.from_results(self.results)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.batch), 3)
+        self.assertEqual(list(self.batch), self.results)
+        self.assertEqual(self.batch[-1], self.results[2])
+        with self.assertRaises(IndexError):
+            self.batch[3]
+
+    def test_columns(self):
+        self.assertEqual(self.batch.fields, LatencyMeasurementResult._fields)
+        self.assertEqual(self.batch.kind("average_latency"), "float")
+        self.assertEqual(self.batch.kind("packets_received"), "int")
+        self.assertEqual(self.batch.kind("elapsed_time_unit"), "enum")
+        self.assertEqual(self.batch.kind("host"), "string")
+        self.assertEqual(self.batch.kind("errors"), "object")
+        self.assertEqual(self.batch.column("average_latency"), [6.5, None, 7.25])
+        self.assertEqual(self.batch.column("packets_received"), [4, None, 4])
+
+    def test_strings_interned(self):
+        self.assertEqual(self.batch.categories("host"), ["a.com", "b.com"])
+        self.assertEqual(list(self.batch._columns["host"].codes), [0, 1, 0])
+
+    def test_units_coded(self):
+        self.assertEqual(self.batch.categories("elapsed_time_unit"), list(TimeUnit))
+        self.assertEqual(
+            list(self.batch._columns["elapsed_time_unit"].codes),
+            [list(TimeUnit).index(TimeUnit.millisecond), -1, 0],
+        )
+
+    def test_mismatched_values_kept(self):
+        # The ping parser stores the individual results as strings
+        result = LatencyIndividualMeasurementResult(
+            id="1",
+            errors=[],
+            host="a.com",
+            packet_size="64",
+            packet_size_unit=StorageUnit.bytes,
+            reverse_dns_address="a.com",
+            ip_address="1.1.1.1",
+            icmp_sequence="1",
+            time_to_live="64",
+            elapsed_time="6.21",
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+        batch = ResultBatch(LatencyIndividualMeasurementResult)
+        batch.append(result._replace(icmp_sequence=None))
+        batch.append(result)
+        self.assertEqual(batch.kind("icmp_sequence"), "object")
+        self.assertEqual(batch.kind("elapsed_time"), "object")
+        self.assertEqual(list(batch), [result._replace(icmp_sequence=None), result])
+
+    def test_out_of_range_int_kept(self):
+        result = self.results[0]._replace(packets_transmitted=2**70)
+        self.batch.append(result)
+        self.assertEqual(len(self.batch), 4)
+        self.assertEqual(self.batch.kind("packets_transmitted"), "object")
+        self.assertEqual(self.batch.kind("packets_received"), "int")
+        self.assertEqual(list(self.batch), self.results + [result])
+
+    def test_wrong_type(self):
+        with self.assertRaises(ValueError):
+            self.batch.append(
+                DownloadSpeedMeasurementResult(
+                    id="1",
+                    errors=[],
+                    url="http://a.com/",
+                    download_size=None,
+                    download_size_unit=None,
+                    download_rate=1.0,
+                    download_rate_unit=NetworkUnit.bit_per_second,
+                )
+            )
+        with self.assertRaises(ValueError):
+            ResultBatch.from_results([])
+
+    @skipIf(numpy is None, "numpy is not installed")
+    def test_to_numpy(self):
+        arrays = self.batch.to_numpy()
+        self.assertEqual(list(arrays), list(LatencyMeasurementResult._fields))
+        self.assertEqual(arrays["average_latency"][0], 6.5)
+        self.assertTrue(math.isnan(arrays["average_latency"][1]))
+        self.assertEqual(arrays["packets_received"].mask.tolist(), [False, True, False])
+        self.assertEqual(arrays["host"].tolist(), [0, 1, 0])
+        self.assertEqual(arrays["errors"][1], [self.error])
+        # The numeric columns are not copied
+        with self.assertRaises(BufferError):
+            self.batch.append(self.results[0])
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_to_arrow(self):
+        table = self.batch.to_arrow()
+        self.assertEqual(table.column_names, list(LatencyMeasurementResult._fields))
+        self.assertEqual(table.column("average_latency").to_pylist(), [6.5, None, 7.25])
+        self.assertEqual(table.column("packets_received").to_pylist(), [4, None, 4])
+        self.assertEqual(table.column("host").to_pylist(), ["a.com", "b.com", "a.com"])
+        self.assertEqual(
+            table.column("elapsed_time_unit").to_pylist(), ["ms", None, "ms"]
+        )
+        self.assertEqual(table.column("errors").to_pylist(), [[], ["ping-err"], []])
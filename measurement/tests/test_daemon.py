@@ -0,0 +1,291 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+from unittest import TestCase
+
+from measurement.daemon import (
+    Job,
+    MeasurementDaemon,
+    _make_private_directory,
+    _remove_stale_socket,
+    _run_job,
+    load_schedule,
+    parse_schedule,
+    send_command,
+)
+from measurement.measurements import BaseMeasurement, ResourceClass
+from measurement.results import MeasurementResult
+from measurement.runner import RUNNER_ERRORS
+
+ECHO_MEASUREMENT = "measurement.tests.test_daemon:EchoMeasurement"
+FAILING_MEASUREMENT = "measurement.tests.test_daemon:FailingMeasurement"
+
+
+class EchoMeasurement(BaseMeasurement):
+    def measure(self, deadline=None):
+        return [MeasurementResult(id=self.id, errors=[])]
+
+
+class FailingMeasurement(BaseMeasurement):
+    def measure(self):
+        raise RuntimeError("the measurement messed up!")
+
+
+class ScheduleTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.job = {
+            "name": "latency",
+            "measurement": "latency",
+            "args": {"id": "1", "host": "validfakehost.com"},
+            "interval": 300,
+            "jitter": 30,
+        }
+
+    def test_parse_schedule(self):
+        self.assertEqual(
+            parse_schedule({"jobs": [self.job]}),
+            [
+                Job(
+                    name="latency",
+                    measurement="latency",
+                    args={"id": "1", "host": "validfakehost.com"},
+                    interval=300,
+                    jitter=30,
+                    deadline=None,
+                )
+            ],
+        )
+
+    def test_load_schedule(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"jobs": [self.job]}, f)
+        self.addCleanup(os.unlink, f.name)
+        self.assertEqual(load_schedule(f.name)[0].name, "latency")
+
+    def test_invalid_json(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            f.write("{jobs")
+        self.addCleanup(os.unlink, f.name)
+        with self.assertRaises(ValueError):
+            load_schedule(f.name)
+
+    def test_missing_field(self):
+        del self.job["interval"]
+        with self.assertRaises(ValueError):
+            parse_schedule({"jobs": [self.job]})
+
+    def test_invalid_interval(self):
+        self.job["interval"] = 0
+        with self.assertRaises(ValueError):
+            parse_schedule({"jobs": [self.job]})
+
+    def test_jitter_longer_than_interval(self):
+        self.job["jitter"] = 300
+        with self.assertRaises(ValueError):
+            parse_schedule({"jobs": [self.job]})
+
+    def test_duplicate_job(self):
+        with self.assertRaises(ValueError):
+            parse_schedule({"jobs": [self.job, self.job]})
+
+    def test_unknown_measurement(self):
+        self.job["measurement"] = "unknown"
+        with self.assertRaises(ValueError):
+            parse_schedule({"jobs": [self.job]})
+
+    def test_invalid_args(self):
+        self.job["args"]["host"] = "%invalid"
+        with self.assertRaises(ValueError):
+            parse_schedule({"jobs": [self.job]})
+
+
+class RunJobTestCase(TestCase):
+    def test_run_job(self):
+        self.assertEqual(
+            _run_job(ECHO_MEASUREMENT, {"id": "1"}, None),
+            [MeasurementResult(id="1", errors=[])],
+        )
+
+    def test_run_job_with_deadline(self):
+        self.assertEqual(
+            _run_job(ECHO_MEASUREMENT, {"id": "1"}, 10),
+            [MeasurementResult(id="1", errors=[])],
+        )
+
+    def test_exception_returns_runner_error(self):
+        results = _run_job(FAILING_MEASUREMENT, {"id": "1"}, None)
+        self.assertEqual(len(results), 1)
+        result = results[0]
+        self.assertEqual(result.id, "1")
+        self.assertEqual(result.errors[0].key, "runner-err")
+        self.assertEqual(result.errors[0].description, RUNNER_ERRORS["runner-err"])
+        self.assertIn("the measurement messed up!", result.errors[0].traceback)
+
+
+class MeasurementDaemonTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.results = []
+        self.received = threading.Condition()
+        self.socket_path = os.path.join(tempfile.mkdtemp(), "daemon.sock")
+
+    def on_results(self, job, results):
+        with self.received:
+            self.results.append((job.name, results))
+            self.received.notify_all()
+
+    def start_daemon(self, jobs):
+        daemon = MeasurementDaemon(
+            jobs, workers=1, socket_path=self.socket_path, on_results=self.on_results
+        )
+        thread = threading.Thread(target=daemon.run_forever)
+        thread.start()
+
+        def stop():
+            daemon.stop()
+            thread.join()
+
+        self.addCleanup(stop)
+        return daemon
+
+    def wait_for_results(self, count):
+        with self.received:
+            self.assertTrue(
+                self.received.wait_for(lambda: len(self.results) >= count, timeout=30)
+            )
+
+    def test_jobs_run_on_interval(self):
+        self.start_daemon(
+            [
+                Job(
+                    name="echo",
+                    measurement=ECHO_MEASUREMENT,
+                    args={"id": "1"},
+                    interval=0.1,
+                )
+            ]
+        )
+        self.wait_for_results(3)
+        self.assertEqual(
+            self.results[:3], [("echo", [MeasurementResult(id="1", errors=[])])] * 3
+        )
+
+    def test_link_wait_counts_against_deadline(self):
+        daemon = MeasurementDaemon(
+            [
+                Job(
+                    name="echo",
+                    measurement=ECHO_MEASUREMENT,
+                    args={"id": "1"},
+                    interval=3600,
+                    deadline=0.1,
+                )
+            ],
+            workers=1,
+            on_results=self.on_results,
+        )
+        daemon.link_lock.acquire(ResourceClass.exclusive)
+        self.addCleanup(daemon.link_lock.release, ResourceClass.exclusive)
+        thread = threading.Thread(target=daemon.run_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(daemon.stop)
+        self.wait_for_results(1)
+        result = self.results[0][1][0]
+        self.assertEqual(result.id, "1")
+        self.assertEqual(result.errors[0].key, "runner-timeout")
+        self.assertEqual(result.errors[0].description, RUNNER_ERRORS["runner-timeout"])
+
+    def test_trigger_over_socket(self):
+        self.start_daemon(
+            [
+                Job(
+                    name="echo",
+                    measurement=ECHO_MEASUREMENT,
+                    args={"id": "1"},
+                    interval=3600,
+                )
+            ]
+        )
+        self.wait_for_results(1)
+        self.assertEqual(
+            send_command({"command": "jobs"}, socket_path=self.socket_path),
+            {"status": "ok", "jobs": ["echo"]},
+        )
+        self.assertEqual(
+            send_command(
+                {"command": "run", "job": "echo", "wait": True},
+                socket_path=self.socket_path,
+                timeout=30,
+            ),
+            {
+                "status": "ok",
+                "results": [{"type": "MeasurementResult", "errors": []}],
+            },
+        )
+        self.assertEqual(len(self.results), 2)
+
+    def test_trigger_unknown_job(self):
+        self.start_daemon(
+            [
+                Job(
+                    name="echo",
+                    measurement=ECHO_MEASUREMENT,
+                    args={"id": "1"},
+                    interval=3600,
+                )
+            ]
+        )
+        self.wait_for_results(1)
+        reply = send_command(
+            {"command": "run", "job": "unknown"}, socket_path=self.socket_path
+        )
+        self.assertEqual(reply["status"], "error")
+
+    def test_stale_socket_removed(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            # Bound, but no longer listening
+            sock.bind(self.socket_path)
+        self.test_trigger_unknown_job()
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            MeasurementDaemon([], workers=0)
+
+
+class SocketPathTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, "daemon.sock")
+
+    def test_missing_socket(self):
+        _remove_stale_socket(self.socket_path)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_other_file_kept(self):
+        with open(self.socket_path, "w") as f:
+            f.write("data")
+        with self.assertRaises(FileExistsError):
+            _remove_stale_socket(self.socket_path)
+        self.assertTrue(os.path.exists(self.socket_path))
+
+    def test_live_socket_kept(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(self.socket_path)
+            sock.listen(1)
+            with self.assertRaises(OSError):
+                _remove_stale_socket(self.socket_path)
+        self.assertTrue(os.path.exists(self.socket_path))
+
+    def test_private_directory(self):
+        path = os.path.join(self.directory, "private")
+        _make_private_directory(path)
+        _make_private_directory(path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        os.chmod(path, 0o777)
+        with self.assertRaises(PermissionError):
+            _make_private_directory(path)
@@ -0,0 +1,63 @@
+import threading
+import time
+from unittest import TestCase, mock
+
+from measurement.deadline import Deadline
+
+
+class DeadlineTestCase(TestCase):
+    def test_unlimited_deadline(self):
+        deadline = Deadline()
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired())
+        self.assertEqual(deadline.timeout(5), 5)
+        self.assertIsNone(deadline.timeout())
+
+    @mock.patch("time.monotonic")
+    def test_remaining(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        deadline = Deadline(10)
+        mock_monotonic.return_value = 104.0
+        self.assertEqual(deadline.remaining(), 6.0)
+        self.assertEqual(deadline.timeout(), 6.0)
+        self.assertEqual(deadline.timeout(2), 2)
+        self.assertEqual(deadline.timeout(180), 6.0)
+        mock_monotonic.return_value = 111.0
+        self.assertEqual(deadline.remaining(), 0)
+        self.assertTrue(deadline.expired())
+
+    def test_cancel_from_another_thread(self):
+        deadline = Deadline(60)
+        thread = threading.Thread(target=deadline.cancel)
+        thread.start()
+        thread.join()
+        self.assertTrue(deadline.cancelled)
+        self.assertTrue(deadline.expired())
+        self.assertEqual(deadline.timeout(5), 0)
+
+    def test_zero_deadline_expires_immediately(self):
+        self.assertTrue(Deadline(0).expired())
+
+    def test_negative_deadline(self):
+        with self.assertRaises(ValueError):
+            Deadline(-1)
+
+    def test_coerce(self):
+        deadline = Deadline(1)
+        self.assertIs(Deadline.coerce(deadline), deadline)
+        self.assertIsNone(Deadline.coerce(None).remaining())
+
+    def test_short_deadline_expires(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        self.assertTrue(deadline.expired())
+
+    def test_bound(self):
+        deadline = Deadline(5)
+        self.assertLessEqual(deadline.bound(1).remaining(), 1)
+        self.assertGreater(deadline.bound(10).remaining(), 1)
+        self.assertLessEqual(deadline.bound(10).remaining(), 5)
+        self.assertIsNone(Deadline().bound().remaining())
+        bounded = deadline.bound(1)
+        deadline.cancel()
+        self.assertTrue(bounded.expired())
@@ -0,0 +1,152 @@
+from unittest import TestCase
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+from measurement.exporter import (
+    MetricsExporter,
+    MetricsServer,
+    OPENMETRICS_CONTENT_TYPE,
+    PROMETHEUS_CONTENT_TYPE,
+)
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.ip_route.results import IPRouteMeasurementResult
+from measurement.plugins.latency.results import LatencyMeasurementResult
+from measurement.results import Error
+from measurement.trace import MeasurementTrace, attach_trace
+from measurement.units import NetworkUnit, RatioUnit, StorageUnit, TimeUnit
+
+
+class MetricsExporterTestCase(TestCase):
+    maxDiff = None
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.exporter = MetricsExporter()
+        self.latency_result = LatencyMeasurementResult(
+            id="test",
+            host="validfakehost.com",
+            minimum_latency=6.211,
+            average_latency=6.617,
+            maximum_latency=7.069,
+            median_deviation=0.315,
+            errors=[],
+            packets_transmitted=4,
+            packets_received=3,
+            packets_lost=25.0,
+            packets_lost_unit=RatioUnit.percentage,
+            elapsed_time=3.0,
+            elapsed_time_unit=TimeUnit.second,
+        )
+        self.download_result = DownloadSpeedMeasurementResult(
+            id="test",
+            url="http://validfakehost.com/test",
+            download_rate=133.6,
+            download_rate_unit=NetworkUnit.kibibit_per_second,
+            download_size=11376,
+            download_size_unit=StorageUnit.bit,
+            errors=[],
+        )
+        self.route_error = IPRouteMeasurementResult(
+            id="test",
+            host=None,
+            ip=None,
+            hop_count=None,
+            route=None,
+            errors=[
+                Error(key="route-permission", description="", traceback='a "quote"')
+            ],
+        )
+
+    def test_latency_metrics(self):
+        self.exporter.update([self.latency_result])
+        self.assertEqual(
+            self.exporter.exposition().decode("utf-8"),
+            "# HELP measurement_latency_seconds The latency of the most recent measurement.\n"
+            "# TYPE measurement_latency_seconds gauge\n"
+            'measurement_latency_seconds{result_type="LatencyMeasurementResult",stat="avg",target="validfakehost.com"} 0.006617\n'
+            'measurement_latency_seconds{result_type="LatencyMeasurementResult",stat="max",target="validfakehost.com"} 0.007069\n'
+            'measurement_latency_seconds{result_type="LatencyMeasurementResult",stat="min",target="validfakehost.com"} 0.006211\n'
+            "# HELP measurement_packet_loss_ratio The ratio of packets lost in the most recent measurement.\n"
+            "# TYPE measurement_packet_loss_ratio gauge\n"
+            'measurement_packet_loss_ratio{result_type="LatencyMeasurementResult",target="validfakehost.com"} 0.25\n',
+        )
+
+    def test_download_rate_normalised_to_bit_per_second(self):
+        self.exporter.update(self.download_result)
+        self.assertIn(
+            'measurement_download_rate_bits_per_second{result_type="DownloadSpeedMeasurementResult",'
+            'target="http://validfakehost.com/test"} 136806.4\n',
+            self.exporter.exposition().decode("utf-8"),
+        )
+
+    def test_errors_are_counted(self):
+        self.exporter.update([self.route_error])
+        self.exporter.update([self.route_error])
+        text = self.exporter.exposition().decode("utf-8")
+        self.assertIn("# TYPE measurement_errors_total counter\n", text)
+        self.assertIn(
+            'measurement_errors_total{key="route-permission",'
+            'result_type="IPRouteMeasurementResult"} 2.0\n',
+            text,
+        )
+        self.assertNotIn("measurement_hop_count", text)
+
+    def test_openmetrics(self):
+        self.exporter.update([self.route_error])
+        text = self.exporter.exposition(openmetrics=True).decode("utf-8")
+        self.assertIn("# TYPE measurement_errors counter\n", text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+    def test_phase_timings(self):
+        trace = MeasurementTrace("DownloadSpeedMeasurement")
+        with trace.phase("wget"):
+            pass
+        self.exporter.update(attach_trace([self.download_result], trace))
+        self.assertIn(
+            'measurement_phase_wall_seconds{measurement="DownloadSpeedMeasurement",phase="wget"}',
+            self.exporter.exposition().decode("utf-8"),
+        )
+
+    def test_empty_exposition(self):
+        self.assertEqual(self.exporter.exposition(), b"")
+        self.assertEqual(self.exporter.exposition(openmetrics=True), b"# EOF\n")
+
+
+class MetricsServerTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.exporter = MetricsExporter()
+        self.server = MetricsServer(self.exporter, port=0)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.url = "http://{}:{}".format(*self.server.address)
+
+    def test_serves_metrics(self):
+        self.exporter.update(
+            [
+                IPRouteMeasurementResult(
+                    id="test",
+                    host="validfakehost.com",
+                    ip="1.1.1.1",
+                    hop_count=5,
+                    route=[],
+                    errors=[],
+                )
+            ]
+        )
+        with urlopen(self.url + "/metrics") as response:
+            self.assertEqual(response.headers["Content-Type"], PROMETHEUS_CONTENT_TYPE)
+            self.assertEqual(response.read(), self.exporter.exposition())
+
+    def test_serves_openmetrics(self):
+        request = Request(
+            self.url + "/metrics", headers={"Accept": "application/openmetrics-text"}
+        )
+        with urlopen(request) as response:
+            self.assertEqual(response.headers["Content-Type"], OPENMETRICS_CONTENT_TYPE)
+            self.assertEqual(response.read(), b"# EOF\n")
+
+    def test_unknown_path(self):
+        with self.assertRaises(HTTPError) as cm:
+            urlopen(self.url + "/")
+        self.assertEqual(cm.exception.code, 404)
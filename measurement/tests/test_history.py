@@ -0,0 +1,170 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import typing
+from unittest import TestCase
+
+from measurement.history import HistoryStore, HostAggregate
+from measurement.plugins.latency.results import (
+    LatencyIndividualMeasurementResult,
+    LatencyMeasurementResult,
+)
+from measurement.results import Field, MeasurementResult, Timing
+from measurement.tests.test_results import PLUGIN_RESULT_TYPES, make_example_result
+from measurement.timing import attach_timing
+from measurement.units import StorageUnit, TimeUnit
+
+
+class HistoryExampleResult(MeasurementResult):
+    url = Field(str)
+    rate = Field(typing.Optional[float])
+
+
+class HistoryStoreTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "history.db")
+        self.store = HistoryStore(self.path)
+        self.addCleanup(self.store.close)
+        self.results = [
+            make_example_result(LatencyMeasurementResult)._replace(
+                id=str(index), host=host, average_latency=float(index)
+            )
+            for index, host in enumerate(["a.com", "b.com", "a.com", "a.com"])
+        ]
+        for index, result in enumerate(self.results):
+            self.store.insert(result, timestamp=1000 + index)
+
+    def test_round_trip(self):
+        results = [make_example_result(t) for t in PLUGIN_RESULT_TYPES]
+        self.store.insert(results, timestamp=2000)
+        for result in results:
+            self.assertEqual(self.store.latest(type(result)), [(2000, result)])
+
+    def test_latest(self):
+        self.assertEqual(
+            self.store.latest(LatencyMeasurementResult, 2),
+            [(1003, self.results[3]), (1002, self.results[2])],
+        )
+        self.assertEqual(
+            self.store.latest(LatencyMeasurementResult, 5, host="b.com"),
+            [(1001, self.results[1])],
+        )
+        self.assertEqual(self.store.latest(HistoryExampleResult), [])
+
+    def test_window(self):
+        self.assertEqual(
+            self.store.window(LatencyMeasurementResult, start=1001, end=1002),
+            [(1001, self.results[1]), (1002, self.results[2])],
+        )
+        self.assertEqual(
+            self.store.window(LatencyMeasurementResult, start=1001, host="a.com"),
+            [(1002, self.results[2]), (1003, self.results[3])],
+        )
+
+    def test_aggregate(self):
+        self.store.insert(self.results[0]._replace(average_latency=None))
+        self.assertEqual(
+            self.store.aggregate(LatencyMeasurementResult, "average_latency"),
+            {
+                "a.com": HostAggregate(count=3, mean=5 / 3, minimum=0.0, maximum=3.0),
+                "b.com": HostAggregate(count=1, mean=1.0, minimum=1.0, maximum=1.0),
+            },
+        )
+        self.assertEqual(
+            list(
+                self.store.aggregate(
+                    LatencyMeasurementResult, "average_latency", start=1002
+                )
+            ),
+            ["a.com"],
+        )
+        self.store.insert(
+            HistoryExampleResult(id="1", errors=[], url="a.com/", rate=2.0)
+        )
+        self.assertEqual(
+            self.store.aggregate(HistoryExampleResult, "rate")["a.com/"].count, 1
+        )
+        with self.assertRaises(ValueError):
+            self.store.aggregate(LatencyMeasurementResult, "unknown")
+
+    def test_numeric_strings(self):
+        # The ping parser stores the individual results as strings
+        result = LatencyIndividualMeasurementResult(
+            id="1",
+            errors=[],
+            host="a.com",
+            packet_size="64",
+            packet_size_unit=StorageUnit.bytes,
+            reverse_dns_address="a.com",
+            ip_address="1.1.1.1",
+            icmp_sequence="1",
+            time_to_live="64",
+            elapsed_time="6.21",
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+        self.store.insert(result)
+        self.assertEqual(
+            self.store.latest(LatencyIndividualMeasurementResult)[0][1],
+            result._replace(
+                packet_size=64.0, icmp_sequence=1, time_to_live=64.0, elapsed_time=6.21
+            ),
+        )
+
+    def test_schema(self):
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        indexes = {
+            row[1]: [
+                column[2]
+                for column in connection.execute(
+                    "PRAGMA index_info('{index}')".format(index=row[1])
+                )
+            ]
+            for row in connection.execute(
+                "PRAGMA index_list('LatencyMeasurementResult')"
+            )
+        }
+        self.assertEqual(
+            indexes,
+            {
+                "LatencyMeasurementResult_timestamp": ["timestamp"],
+                "LatencyMeasurementResult_id": ["id", "timestamp"],
+                "LatencyMeasurementResult_host": ["host", "timestamp"],
+            },
+        )
+
+    def test_added_field(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            'CREATE TABLE "HistoryExampleResult" (timestamp REAL NOT NULL, id TEXT, '
+            "errors TEXT, url TEXT)"
+        )
+        connection.execute(
+            """INSERT INTO "HistoryExampleResult" VALUES (1000, '1', '[]', 'a.com/')"""
+        )
+        connection.commit()
+        connection.close()
+        self.assertEqual(
+            self.store.latest(HistoryExampleResult),
+            [(1000, HistoryExampleResult(id="1", errors=[], url="a.com/", rate=None))],
+        )
+
+    def test_rollback(self):
+        with self.assertRaises(sqlite3.Error):
+            self.store.insert(
+                [self.results[0], self.results[0]._replace(host=object())]
+            )
+        self.assertEqual(len(self.store.window(LatencyMeasurementResult)), 4)
+
+    def test_timing(self):
+        result = attach_timing(
+            HistoryExampleResult(id="1", errors=[], url="a.com/", rate=1.0),
+            Timing(start_time=500.0, end_time=501.0, start_ns=0, end_ns=10**9),
+        )
+        self.store.insert(result)
+        self.assertEqual(self.store.latest(HistoryExampleResult), [(500.0, result)])
@@ -0,0 +1,296 @@
+import asyncio
+import errno
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from measurement import aio, journal as journal_module
+from measurement.journal import (
+    SEGMENT_MAGIC,
+    Journal,
+    JournalPosition,
+    JournalReader,
+    drain,
+)
+from measurement.plugins.ip_route.results import IPRouteMeasurementResult
+from measurement.plugins.latency.results import LatencyMeasurementResult
+from measurement.results import Error, decode
+from measurement.tests.test_results import make_example_result
+from measurement.units import RatioUnit, TimeUnit
+
+
+def _latency_result(index):
+    return LatencyMeasurementResult(
+        id=str(index),
+        errors=(
+            [Error(key="ping-err", description="", traceback=None)] if index % 2 else []
+        ),
+        host="example.com",
+        minimum_latency=6.5,
+        average_latency=7.25,
+        maximum_latency=9.0,
+        median_deviation=0.5,
+        packets_transmitted=4,
+        packets_received=4,
+        packets_lost=0.0,
+        packets_lost_unit=RatioUnit.percentage,
+        elapsed_time=3003.0,
+        elapsed_time_unit=TimeUnit.millisecond,
+    )
+
+
+class JournalTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.results = [_latency_result(index) for index in range(20)]
+
+    def _open(self, **kwargs):
+        journal = Journal(self.directory, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def _read(self, journal, position=None):
+        return [result for _, result in journal.read(position)]
+
+    def test_append(self):
+        journal = self._open()
+        journal.append(self.results[0])
+        journal.append(self.results[1:])
+        self.assertTrue(journal.flush(timeout=10))
+        self.assertEqual(self._read(journal), self.results)
+        records = list(journal.records())
+        self.assertEqual(records[0].result_type, "LatencyMeasurementResult")
+        self.assertEqual(records[0].codec, "json")
+        self.assertEqual(
+            records[0].position, JournalPosition(1, records[0].position.offset)
+        )
+
+    def test_rotation(self):
+        journal = self._open(segment_size=1024)
+        journal.append(self.results)
+        journal.close()
+        self.assertGreater(len(journal.segments()), 1)
+        for segment in journal.segments()[:-1]:
+            self.assertGreaterEqual(
+                os.path.getsize(journal.segment_path(segment)), 1024
+            )
+        self.assertEqual(self._read(journal), self.results)
+
+    def test_batched_sync(self):
+        with mock.patch("measurement.journal.os.fsync") as fsync:
+            journal = self._open(sync_interval=60)
+            fsync.reset_mock()
+            for result in self.results:
+                journal.append(result)
+            journal.flush(timeout=10)
+            self.assertEqual(fsync.call_count, 1)
+
+    def test_recovery(self):
+        journal = self._open()
+        journal.append(self.results[:10])
+        journal.close()
+        path = journal.segment_path(journal.segments()[-1])
+        size = os.path.getsize(path)
+        # A record torn by a power loss
+        with open(path, "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x01\x02")
+
+        journal = self._open()
+        self.assertEqual(os.path.getsize(path), size)
+        journal.append(self.results[10:])
+        journal.close()
+        self.assertEqual(self._read(journal), self.results)
+
+    def test_unencodable_result(self):
+        journal = self._open()
+        result = _latency_result(0)._replace(host=object())
+        with self.assertLogs("measurement.journal", "ERROR"):
+            journal.append([self.results[0], result, self.results[1]])
+            self.assertTrue(journal.flush(timeout=10))
+        journal.append(self.results[2])
+        journal.close()
+        self.assertEqual(self._read(journal), self.results[:3])
+
+    def test_torn_write(self):
+        write_all = journal_module._write_all
+        failures = []
+
+        def write_part(f, data):
+            if not failures:
+                # The disk fills up part way through the record
+                failures.append(f.write(data[: len(data) // 2]))
+                raise OSError(errno.ENOSPC, "No space left on device")
+            write_all(f, data)
+
+        journal = self._open(sync_interval=0.01)
+        journal.append(self.results[0])
+        self.assertTrue(journal.flush(timeout=10))
+        with mock.patch("measurement.journal._write_all", write_part):
+            journal.append(self.results[1:])
+            self.assertTrue(journal.flush(timeout=10))
+        journal.close()
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(self._read(journal), self.results)
+
+    def test_failed_rotation(self):
+        journal = self._open(segment_size=1024)
+        error = OSError(errno.ENOSPC, "No space left on device")
+        with mock.patch.object(Journal, "_start_segment", side_effect=error):
+            with self.assertLogs("measurement.journal", "ERROR"):
+                journal.append(self.results)
+                with self.assertRaises(OSError):
+                    journal.flush()
+            with self.assertRaises(OSError):
+                journal.flush()
+            with self.assertRaises(OSError):
+                journal.close()
+        self.assertEqual(len(journal.segments()), 1)
+
+    def test_corrupt_record(self):
+        journal = self._open()
+        journal.append(self.results[:2])
+        journal.close()
+        positions = [position for position, _ in journal.read()]
+        path = journal.segment_path(1)
+        with open(path, "r+b") as f:
+            f.seek(positions[0].offset - 1)
+            f.write(b"X")
+        self.assertEqual(self._read(journal), [])
+        # Both records are removed, as the second cannot be found without
+        # the length of the first
+        self._open()
+        self.assertEqual(os.path.getsize(path), len(SEGMENT_MAGIC) + 2 + len("json"))
+
+    def test_incomplete_header(self):
+        with open(os.path.join(self.directory, "000000000001.journal"), "wb") as f:
+            f.write(b"HBM")
+        journal = self._open()
+        journal.append(self.results[0])
+        journal.close()
+        self.assertEqual(self._read(journal), self.results[:1])
+
+    def test_commit(self):
+        journal = self._open(segment_size=1024)
+        journal.append(self.results)
+        journal.flush(timeout=10)
+        self.assertIsNone(journal.checkpoint())
+        results, position = journal.read_batch(15)
+        self.assertEqual(results, self.results[:15])
+        journal.commit(position)
+        self.assertEqual(journal.checkpoint(), position)
+        self.assertEqual(journal.segments()[0], position.segment)
+        self.assertEqual(self._read(journal), self.results[15:])
+        self.assertEqual(journal.read_batch(10, position=None)[0], self.results[15:])
+
+    def test_drain(self):
+        journal = self._open()
+        journal.append(self.results)
+        journal.flush(timeout=10)
+        uploaded = []
+        attempts = []
+
+        async def upload(results):
+            attempts.append(results)
+            if len(attempts) == 1:
+                raise ConnectionError()
+            uploaded.extend(results)
+
+        async def run():
+            task = asyncio.ensure_future(
+                drain(journal, upload, batch_size=8, poll_interval=0, retry_interval=0)
+            )
+            while len(uploaded) < len(self.results):
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        aio.run(asyncio.wait_for(run(), 10))
+        self.assertEqual(uploaded, self.results)
+        self.assertEqual(attempts[0], self.results[:8])
+        self.assertEqual(journal.read_batch(10), ([], journal.checkpoint()))
+
+
+class JournalReaderTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.journal = Journal(self.directory, segment_size=4096)
+        self.addCleanup(self.journal.close)
+        self.reader = JournalReader(self.directory, index_interval=4)
+        self.addCleanup(self.reader.close)
+        self.latency_results = [_latency_result(index) for index in range(40)]
+        self.route_results = [
+            make_example_result(IPRouteMeasurementResult)._replace(id=str(index))
+            for index in range(40)
+        ]
+        for index, (latency_result, route_result) in enumerate(
+            zip(self.latency_results, self.route_results)
+        ):
+            self.journal.append([latency_result, route_result], timestamp=1000 + index)
+        self.journal.flush(timeout=10)
+
+    def test_query(self):
+        self.assertEqual(len(list(self.reader.query())), 80)
+        self.assertEqual(
+            list(self.reader.query(IPRouteMeasurementResult, start=1010, end=1012)),
+            [(1000.0 + index, self.route_results[index]) for index in range(10, 13)],
+        )
+        self.assertEqual(
+            [
+                result
+                for _, result in self.reader.query(
+                    "LatencyMeasurementResult", start=1035
+                )
+            ],
+            self.latency_results[35:],
+        )
+        self.assertEqual(list(self.reader.query(start=2000)), [])
+
+    def test_fields(self):
+        timestamp, fields = next(
+            self.reader.query(
+                LatencyMeasurementResult,
+                start=1001,
+                fields=["errors", "average_latency", "elapsed_time_unit"],
+            )
+        )
+        self.assertEqual(timestamp, 1001)
+        self.assertEqual(
+            fields,
+            {
+                "errors": self.latency_results[1].errors,
+                "average_latency": 7.25,
+                "elapsed_time_unit": TimeUnit.millisecond,
+            },
+        )
+
+    def test_only_window_decoded(self):
+        with mock.patch("measurement.journal.decode", wraps=decode) as decode_mock:
+            results = list(
+                self.reader.query(LatencyMeasurementResult, start=1020, end=1021)
+            )
+        self.assertEqual(len(results), 2)
+        self.assertEqual(decode_mock.call_count, 2)
+
+    def test_updates(self):
+        list(self.reader.query())
+        self.journal.append(self.latency_results[0], timestamp=5000)
+        self.journal.flush(timeout=10)
+        self.assertEqual(
+            list(self.reader.query(start=5000)), [(5000, self.latency_results[0])]
+        )
+        # Segments before the checkpoint are deleted
+        self.journal.commit(self.journal.read_batch(60)[1])
+        remaining = [
+            record.timestamp
+            for record in self.journal.records(
+                JournalPosition(self.journal.segments()[0], 0)
+            )
+        ]
+        self.assertLess(len(remaining), 81)
+        self.assertEqual([timestamp for timestamp, _ in self.reader.query()], remaining)
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from measurement.measurements import BaseMeasurement
+
+
+class ListMeasurement(BaseMeasurement):
+    def measure(self):
+        return ["first", "second"]
+
+
+class SingleMeasurement(BaseMeasurement):
+    def measure(self):
+        return "only"
+
+
+class StepMeasurement(BaseMeasurement):
+    def __init__(self, id):
+        super(StepMeasurement, self).__init__(id=id)
+        self.steps = []
+
+    def measure(self, deadline=None):
+        return self._attach_trace(list(self._iter_results(deadline)))
+
+    def _iter_results(self, deadline):
+        for step in ["first", "second"]:
+            self.steps.append(step)
+            yield step
+
+
+class BaseMeasurementIterTestCase(TestCase):
+    def test_measure_iter_yields_list_results(self):
+        self.assertEqual(
+            list(ListMeasurement("test").measure_iter()), ["first", "second"]
+        )
+
+    def test_measure_iter_yields_single_result(self):
+        self.assertEqual(list(SingleMeasurement("test").measure_iter()), ["only"])
+
+    def test_measure_iter_yields_each_step(self):
+        measurement = StepMeasurement("test")
+        results = measurement.measure_iter()
+        self.assertEqual(next(results), "first")
+        self.assertEqual(measurement.steps, ["first"])
+        self.assertEqual(list(results), ["second"])
+        self.assertEqual(measurement.measure(), ["first", "second"])
+
+    def test_measure_not_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            BaseMeasurement("test").measure()
@@ -0,0 +1,84 @@
+import subprocess
+import sys
+from unittest import TestCase, mock
+
+from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.registry import (
+    BUILTIN_MEASUREMENTS,
+    MeasurementRegistry,
+    get_measurement,
+)
+
+
+class MeasurementRegistryTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.registry = MeasurementRegistry(
+            BUILTIN_MEASUREMENTS, entry_point_group="test.plugins"
+        )
+
+    def test_get_builtin(self):
+        self.assertIs(self.registry.get("latency"), LatencyMeasurement)
+
+    def test_get_default_registry(self):
+        self.assertIs(get_measurement("latency"), LatencyMeasurement)
+
+    @mock.patch("measurement.registry._iter_entry_points")
+    def test_get_unknown_raises(self, mock_iter_entry_points):
+        mock_iter_entry_points.return_value = []
+        with self.assertRaises(KeyError):
+            self.registry.get("unknown")
+
+    def test_register_class(self):
+        self.registry.register("custom", LatencyMeasurement)
+        self.assertIs(self.registry.get("custom"), LatencyMeasurement)
+
+    def test_register_path(self):
+        self.registry.register(
+            "custom", "measurement.plugins.latency.measurements:LatencyMeasurement"
+        )
+        self.assertIs(self.registry.get("custom"), LatencyMeasurement)
+
+    @mock.patch("measurement.registry._iter_entry_points")
+    def test_entry_points(self, mock_iter_entry_points):
+        mock_iter_entry_points.return_value = [
+            (
+                "third_party",
+                "measurement.plugins.latency.measurements:LatencyMeasurement",
+            )
+        ]
+        self.assertIn("third_party", self.registry.names())
+        self.assertIs(self.registry.get("third_party"), LatencyMeasurement)
+        mock_iter_entry_points.assert_called_once_with("test.plugins")
+
+    @mock.patch("measurement.registry._iter_entry_points")
+    def test_builtin_does_not_scan_entry_points(self, mock_iter_entry_points):
+        self.registry.get("latency")
+        mock_iter_entry_points.assert_not_called()
+
+    def test_get_import_path(self):
+        self.assertIs(
+            self.registry.get(
+                "measurement.plugins.latency.measurements:LatencyMeasurement"
+            ),
+            LatencyMeasurement,
+        )
+
+
+class LazyImportTestCase(TestCase):
+    def test_resolving_measurements_does_not_import_heavy_modules(self):
+        out = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys\n"
+                "from measurement.registry import registry\n"
+                "for name in registry.names():\n"
+                "    registry.get(name)\n"
+                "print(sorted(m for m in ('bs4', 'requests', 'scapy', 'speedtest',"
+                " 'youtube_dl') if m in sys.modules))\n",
+            ],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.assertEqual(out.stdout.strip(), "[]")
@@ -0,0 +1,190 @@
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase, mock
+
+import requests
+
+from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.replay import (
+    REPLAY_ID,
+    CorpusReplayer,
+    Recorder,
+    read_corpus,
+    replay_corpus,
+)
+
+PING_STDOUT = (
+    "PING validfakehost.com (192.168.1.1) 56(84) bytes of data.\n"
+    "64 bytes from validfakehost.com (192.168.1.1): icmp_seq=1 ttl=64 time=6.21 ms\n"
+    "64 bytes from validfakehost.com (192.168.1.1): icmp_seq=2 ttl=64 time=7.07 ms\n"
+    "\n"
+    "--- validfakehost.com ping statistics ---\n"
+    "2 packets transmitted, 2 received, 0% packet loss, time 1001ms\n"
+    "rtt min/avg/max/mdev = 6.211/6.617/7.069/0.315 ms\n"
+)
+WGET_STDERR = "\n2019-08-07 09:12:08 (16.7 MB/s) - '/dev/null' saved [11376]\n\n"
+
+
+class RecorderTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.directory, "corpus.jsonl.gz")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    @mock.patch("subprocess.run")
+    def test_records_subprocess_output(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess(
+            ["ping", "-c", "2", "validfakehost.com"], 0, PING_STDOUT, ""
+        )
+        with Recorder(self.corpus):
+            results = LatencyMeasurement(
+                REPLAY_ID, "validfakehost.com", count=2, include_individual_results=True
+            ).measure()
+        self.assertIs(subprocess.run, mock_run)
+
+        records = list(read_corpus(self.corpus))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["type"], "subprocess")
+        self.assertEqual(records[0]["stdout"], PING_STDOUT)
+        replayed = list(CorpusReplayer().replay(records))
+        self.assertEqual(replayed, [("ping", results)])
+
+    @mock.patch("requests.Session.request")
+    def test_records_http_responses(self, mock_request):
+        response = mock.MagicMock(
+            status_code=200,
+            headers={"Content-Type": "text/html"},
+            text='<html><img src="/a.png"></html>',
+        )
+        mock_request.return_value = response
+        with Recorder(self.corpus):
+            requests.Session().get("http://validfakehost.com/")
+            requests.Session().get("http://validfakehost.com/data", stream=True)
+
+        records = list(read_corpus(self.corpus))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["url"], "http://validfakehost.com/")
+        self.assertEqual(
+            list(CorpusReplayer().replay(records)), [("webpage", ["/a.png"])]
+        )
+
+    def test_appends_to_corpus(self):
+        for _ in range(2):
+            with Recorder(self.corpus) as recorder:
+                recorder.write({"type": "unknown"})
+        self.assertEqual(len(list(read_corpus(self.corpus))), 2)
+
+
+class CorpusReplayerTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.replayer = CorpusReplayer()
+
+    def test_get_kind(self):
+        self.assertEqual(
+            self.replayer.get_kind({"type": "subprocess", "args": ["/bin/wget"]}),
+            "wget",
+        )
+        self.assertIsNone(
+            self.replayer.get_kind({"type": "subprocess", "args": ["traceroute"]})
+        )
+        self.assertEqual(
+            self.replayer.get_kind({"type": "http", "url": "https://fast.com/"}),
+            "fast-page",
+        )
+        self.assertEqual(
+            self.replayer.get_kind(
+                {"type": "http", "url": "https://fast.com/app-1a2b.js"}
+            ),
+            "fast-script",
+        )
+        self.assertEqual(
+            self.replayer.get_kind(
+                {"type": "http", "url": "https://api.fast.com/netflix/speedtest/v2"}
+            ),
+            "fast-api",
+        )
+        self.assertEqual(
+            self.replayer.get_kind(
+                {"type": "http", "url": "http://example.com/a.css", "text": ""}
+            ),
+            "webpage-asset",
+        )
+
+    def test_replay_fast_api(self):
+        record = {
+            "type": "http",
+            "url": "https://api.fast.com/netflix/speedtest/v2",
+            "text": json.dumps(
+                {
+                    "client": {"ip": "1.1.1.1"},
+                    "targets": [
+                        {"url": "https://a.example.com/1", "location": {"city": "A"}}
+                    ],
+                }
+            ),
+        }
+        self.assertEqual(
+            self.replayer.replay_record(record),
+            {
+                "client": {"ip": "1.1.1.1"},
+                "targets": [["https://a.example.com/1", {"city": "A"}]],
+            },
+        )
+        self.assertEqual(
+            self.replayer.replay_record(dict(record, text="{")), "netflix-api-json"
+        )
+        self.assertEqual(
+            self.replayer.replay_record(dict(record, text="{}")), "netflix-api-parse"
+        )
+
+
+class ReplayCorpusTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.directory, "corpus.jsonl.gz")
+        self.output = os.path.join(self.directory, "output.jsonl.gz")
+        with Recorder(self.corpus) as recorder:
+            recorder.write(
+                {
+                    "type": "subprocess",
+                    "args": ["wget", "--tries=2", "-O", "/dev/null", "http://a.com/"],
+                    "returncode": 0,
+                    "stdout": "",
+                    "stderr": WGET_STDERR,
+                }
+            )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_repeat(self):
+        report = replay_corpus([self.corpus], repeat=3)
+        self.assertEqual(report.counts, {"wget": 3})
+        self.assertEqual(report.mismatches, [])
+
+    def test_compare_identical(self):
+        replay_corpus([self.corpus], output=self.output)
+        [output] = read_corpus(self.output)
+        self.assertEqual(output["output"]["type"], "DownloadSpeedMeasurementResult")
+        self.assertEqual(output["output"]["fields"]["download_rate"], 133.6)
+        self.assertEqual(output["output"]["fields"]["download_rate_unit"], "Mibit/s")
+
+        report = replay_corpus([self.corpus], compare=self.output)
+        self.assertEqual(report.mismatches, [])
+
+    def test_compare_different(self):
+        with gzip.open(self.output, "wt") as f:
+            f.write(json.dumps({"kind": "wget", "output": None}) + "\n")
+        report = replay_corpus([self.corpus], compare=self.output)
+        self.assertEqual(report.mismatches, ["output 0 (wget) differs"])
@@ -0,0 +1,294 @@
+import copy
+import enum
+import inspect
+import json
+import pickle
+import typing
+from unittest import TestCase, skipIf
+
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.ip_route.results import IPRouteMeasurementResult
+from measurement.plugins.latency.results import (
+    LatencyIndividualMeasurementResult,
+    LatencyMeasurementResult,
+)
+from measurement.plugins.netflix_fast.results import (
+    NetflixFastMeasurementResult,
+    NetflixFastThreadResult,
+)
+from measurement.plugins.speedtestdotnet.results import (
+    SpeedtestdotnetMeasurementResult,
+)
+from measurement.plugins.webpage_download.results import WebpageMeasurementResult
+from measurement.plugins.youtube.results import YouTubeMeasurementResult
+from measurement.results import (
+    CODECS,
+    Error,
+    Field,
+    MeasurementResult,
+    decode,
+    dumps,
+    encode,
+    loads,
+    register_codec,
+    unwrap_optional,
+)
+from measurement.trace import MeasurementTrace
+from measurement.units import StorageUnit, TimeUnit
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PLUGIN_RESULT_TYPES = (
+    DownloadSpeedMeasurementResult,
+    IPRouteMeasurementResult,
+    LatencyMeasurementResult,
+    LatencyIndividualMeasurementResult,
+    NetflixFastMeasurementResult,
+    NetflixFastThreadResult,
+    SpeedtestdotnetMeasurementResult,
+    WebpageMeasurementResult,
+    YouTubeMeasurementResult,
+)
+
+
+class ExampleResult(MeasurementResult):
+    host = Field(str)
+    rate = Field(typing.Optional[float])
+
+
+class MeasurementResultTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.error = Error(key="err", description="An error", traceback=None)
+        self.result = ExampleResult(
+            id="1", errors=[self.error], host="example.com", rate=1.5
+        )
+
+    def test_fields(self):
+        self.assertEqual(ExampleResult._fields, ("id", "errors", "host", "rate"))
+        self.assertEqual(
+            LatencyIndividualMeasurementResult._fields,
+            (
+                "id",
+                "errors",
+                "host",
+                "packet_size",
+                "packet_size_unit",
+                "reverse_dns_address",
+                "ip_address",
+                "icmp_sequence",
+                "time_to_live",
+                "elapsed_time",
+                "elapsed_time_unit",
+            ),
+        )
+        self.assertEqual(self.result.host, "example.com")
+        self.assertEqual(
+            self.result._asdict(),
+            {"id": "1", "errors": [self.error], "host": "example.com", "rate": 1.5},
+        )
+
+    def test_positional_construction(self):
+        self.assertEqual(
+            ExampleResult("1", [self.error], "example.com", 1.5), self.result
+        )
+        with self.assertRaises(TypeError):
+            ExampleResult(id="1", errors=[], host="example.com")
+        with self.assertRaises(TypeError):
+            ExampleResult("1", [], "example.com", 1.5, None)
+        with self.assertRaises(TypeError):
+            ExampleResult("1", [], "example.com", 1.5, id="1")
+        with self.assertRaises(TypeError):
+            ExampleResult(id="1", errors=[], host="example.com", rate=1.5, size=2)
+        self.assertEqual(
+            list(inspect.signature(ExampleResult).parameters),
+            ["id", "errors", "host", "rate"],
+        )
+
+    def test_invalid_field_name(self):
+        with self.assertRaises(ValueError):
+
+            class PrivateResult(MeasurementResult):
+                _rate = Field(float)
+
+    def test_slotted(self):
+        self.assertFalse(hasattr(self.result, "__dict__"))
+        result = LatencyIndividualMeasurementResult(
+            id="1",
+            errors=[],
+            host="example.com",
+            packet_size=64.0,
+            packet_size_unit=StorageUnit.bytes,
+            reverse_dns_address="example.com",
+            ip_address="127.0.0.1",
+            icmp_sequence=1,
+            time_to_live=64.0,
+            elapsed_time=0.1,
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+        self.assertFalse(hasattr(result, "__dict__"))
+
+    def test_equality(self):
+        self.assertEqual(self.result, self.result._replace())
+        self.assertNotEqual(self.result, self.result._replace(rate=2.0))
+        self.assertNotEqual(
+            MeasurementResult(id="1", errors=[]), ExampleResult("1", [], None, None)
+        )
+        self.assertEqual(
+            hash(self.error),
+            hash(Error(key="err", description="An error", traceback=None)),
+        )
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.result.host = "other.com"
+        with self.assertRaises(AttributeError):
+            del self.result.host
+        with self.assertRaises(AttributeError):
+            self.result.unknown = 1
+
+    def test_repr(self):
+        self.assertEqual(
+            repr(self.result),
+            "ExampleResult(id='1', errors=[Error(key='err', description='An error', "
+            "traceback=None)], host='example.com', rate=1.5)",
+        )
+
+    def test_trace(self):
+        self.assertIsNone(self.result.trace)
+        trace = MeasurementTrace()
+        object.__setattr__(self.result, "trace", trace)
+        self.assertIs(self.result.trace, trace)
+        self.assertEqual(self.result, self.result._replace())
+        with self.assertRaises(AttributeError):
+            self.result.unknown
+
+    def test_pickle(self):
+        for result in (self.result, self.error):
+            self.assertEqual(pickle.loads(pickle.dumps(result)), result)
+            self.assertEqual(copy.deepcopy(result), result)
+        object.__setattr__(self.result, "trace", MeasurementTrace("Example"))
+        self.assertEqual(
+            pickle.loads(pickle.dumps(self.result)).trace.measurement, "Example"
+        )
+
+
+def make_example_result(result_type):
+    """Return a result with an example value of the type of each field."""
+    error = Error(key="err", description="An error", traceback="line 1")
+    values = {float: 1.5, int: 2, str: "example.com", list: ["10.0.0.1"]}
+    fields = {}
+    for name, field_type in result_type._field_types.items():
+        field_type = unwrap_optional(field_type)
+        if name == "errors":
+            fields[name] = [error]
+        elif isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+            fields[name] = list(field_type)[-1]
+        else:
+            fields[name] = values[field_type]
+    return result_type(**fields)
+
+
+class CodecTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.results = [
+            make_example_result(result_type) for result_type in PLUGIN_RESULT_TYPES
+        ]
+        self.results.append(
+            LatencyMeasurementResult(
+                id="1",
+                errors=[Error(key="ping-err", description="", traceback=None)],
+                host="example.com",
+                minimum_latency=None,
+                average_latency=None,
+                maximum_latency=None,
+                median_deviation=None,
+                packets_transmitted=None,
+                packets_received=None,
+                packets_lost=None,
+                packets_lost_unit=None,
+                elapsed_time=None,
+                elapsed_time_unit=None,
+            )
+        )
+
+    def test_encode(self):
+        result = ExampleResult(id="1", errors=[], host="example.com", rate=None)
+        self.assertEqual(
+            encode(result),
+            {
+                "type": "ExampleResult",
+                "fields": {
+                    "id": "1",
+                    "errors": [],
+                    "host": "example.com",
+                    "rate": None,
+                },
+            },
+        )
+        result = make_example_result(DownloadSpeedMeasurementResult)
+        fields = encode({"result": result})["result"]["fields"]
+        self.assertEqual(fields["download_rate_unit"], "Byte/s")
+        self.assertEqual(
+            fields["errors"],
+            [
+                {
+                    "type": "Error",
+                    "fields": {
+                        "key": "err",
+                        "description": "An error",
+                        "traceback": "line 1",
+                    },
+                }
+            ],
+        )
+
+    def test_json_round_trip(self):
+        for result in self.results:
+            self.assertEqual(loads(dumps(result)), result)
+        self.assertEqual(loads(dumps(self.results)), self.results)
+        self.assertEqual(json.loads(dumps(self.results[0])), encode(self.results[0]))
+
+    @skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        data = dumps(self.results, codec="msgpack")
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(loads(data, codec="msgpack"), self.results)
+
+    def test_tuples_decoded_as_lists(self):
+        result = make_example_result(IPRouteMeasurementResult)._replace(
+            route=("10.0.0.1", "10.0.0.2")
+        )
+        self.assertEqual(loads(dumps(result)).route, ["10.0.0.1", "10.0.0.2"])
+
+    def test_register_codec(self):
+        register_codec(
+            "indented-json",
+            dumps=lambda data: json.dumps(data, indent=2),
+            loads=json.loads,
+        )
+        self.addCleanup(CODECS.pop, "indented-json")
+        data = dumps(self.results, codec="indented-json")
+        self.assertIn("\n", data)
+        self.assertEqual(loads(data, codec="indented-json"), self.results)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            dumps(self.results, codec="unknown")
+        with self.assertRaises(ValueError):
+            decode({"type": "UnknownResult", "fields": {}})
+        with self.assertRaises(ValueError):
+            decode({"type": "Error", "fields": {"key": "err"}})
+        with self.assertRaises(ValueError):
+            decode(
+                {
+                    "type": "DownloadSpeedMeasurementResult",
+                    "fields": dict(
+                        encode(self.results[0])["fields"], download_rate_unit="furlong"
+                    ),
+                }
+            )
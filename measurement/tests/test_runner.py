@@ -0,0 +1,129 @@
+import threading
+import time
+from unittest import TestCase
+
+from measurement.deadline import Deadline
+from measurement.measurements import BaseMeasurement, ResourceClass
+from measurement.results import MeasurementResult
+from measurement.runner import MeasurementRunner, RUNNER_ERRORS
+
+
+class RecordingMeasurement(BaseMeasurement):
+    """A measurement which records which measurements overlapped it."""
+
+    def __init__(self, id, log, resource_class, duration=0.05):
+        super(RecordingMeasurement, self).__init__(id=id)
+        self.log = log
+        self.resource_class = resource_class
+        self.duration = duration
+
+    def measure(self):
+        with self.log["lock"]:
+            self.log["running"].add(self.id)
+            self.log["overlaps"][self.id] = set(self.log["running"])
+        time.sleep(self.duration)
+        with self.log["lock"]:
+            self.log["overlaps"][self.id] |= self.log["running"]
+            self.log["running"].discard(self.id)
+        return [self.id]
+
+
+class FailingMeasurement(BaseMeasurement):
+    def measure(self):
+        raise RuntimeError("the measurement messed up!")
+
+
+class DeadlineMeasurement(BaseMeasurement):
+    def measure(self, deadline=None):
+        self.deadline = deadline
+        return []
+
+
+class BlockingMeasurement(BaseMeasurement):
+    """An exclusive measurement which holds the link until released."""
+
+    resource_class = ResourceClass.exclusive
+
+    def __init__(self, id, released):
+        super(BlockingMeasurement, self).__init__(id=id)
+        self.released = released
+
+    def measure(self, deadline=None):
+        self.released.wait(5)
+        return [self.id]
+
+
+class MeasurementRunnerTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.log = {"lock": threading.Lock(), "running": set(), "overlaps": {}}
+
+    def test_results_in_measurement_order(self):
+        measurements = [
+            RecordingMeasurement("shared-1", self.log, ResourceClass.shared),
+            RecordingMeasurement("exclusive-1", self.log, ResourceClass.exclusive),
+            RecordingMeasurement("shared-2", self.log, ResourceClass.shared),
+        ]
+        self.assertEqual(
+            MeasurementRunner(measurements).run(),
+            [["shared-1"], ["exclusive-1"], ["shared-2"]],
+        )
+
+    def test_exclusive_measurements_run_alone(self):
+        measurements = [
+            RecordingMeasurement("shared-1", self.log, ResourceClass.shared),
+            RecordingMeasurement("exclusive-1", self.log, ResourceClass.exclusive),
+            RecordingMeasurement("shared-2", self.log, ResourceClass.shared),
+            RecordingMeasurement("exclusive-2", self.log, ResourceClass.exclusive),
+        ]
+        MeasurementRunner(measurements, max_workers=4).run()
+        self.assertEqual(self.log["overlaps"]["exclusive-1"], {"exclusive-1"})
+        self.assertEqual(self.log["overlaps"]["exclusive-2"], {"exclusive-2"})
+
+    def test_shared_measurements_run_concurrently(self):
+        measurements = [
+            RecordingMeasurement(
+                "shared-{i}".format(i=i), self.log, ResourceClass.shared, duration=0.2
+            )
+            for i in range(4)
+        ]
+        start_time = time.time()
+        MeasurementRunner(measurements, max_workers=4).run()
+        self.assertLess(time.time() - start_time, 0.6)
+        self.assertEqual(len(self.log["overlaps"]["shared-3"]), 4)
+
+    def test_exception_returns_runner_error(self):
+        results = MeasurementRunner([FailingMeasurement("test")]).run()
+        self.assertEqual(len(results[0]), 1)
+        result = results[0][0]
+        self.assertIsInstance(result, MeasurementResult)
+        self.assertEqual(result.id, "test")
+        self.assertEqual(result.errors[0].key, "runner-err")
+        self.assertEqual(result.errors[0].description, RUNNER_ERRORS.get("runner-err"))
+        self.assertIn("the measurement messed up!", result.errors[0].traceback)
+
+    def test_deadline_expires_waiting_for_link(self):
+        released = threading.Event()
+        # Hold the link past the deadline
+        timer = threading.Timer(0.5, released.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        measurements = [
+            BlockingMeasurement("exclusive-1", released),
+            DeadlineMeasurement("shared-1"),
+        ]
+        deadline = Deadline(0.1)
+        results = MeasurementRunner(measurements).run(deadline=deadline)
+        self.assertEqual(results[0], ["exclusive-1"])
+        self.assertEqual(results[1][0].id, "shared-1")
+        self.assertEqual(results[1][0].errors[0].key, "runner-timeout")
+
+    def test_invalid_max_workers(self):
+        with self.assertRaises(ValueError):
+            MeasurementRunner([], max_workers=0)
+
+    def test_deadline_passed_to_measurements(self):
+        deadline = Deadline()
+        measurement = DeadlineMeasurement("test")
+        MeasurementRunner([measurement]).run(deadline=deadline)
+        self.assertIs(measurement.deadline, deadline)
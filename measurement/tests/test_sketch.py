@@ -0,0 +1,150 @@
+import random
+from unittest import TestCase
+
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.latency.results import (
+    LatencyIndividualMeasurementResult,
+    LatencyMeasurementResult,
+)
+from measurement.sketch import PercentileAggregator, PercentileSketch
+from measurement.tests.test_results import make_example_result
+from measurement.units import NetworkUnit, StorageUnit, TimeUnit
+
+
+def _exact_quantile(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+class PercentileSketchTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        generator = random.Random(1)
+        self.values = [generator.lognormvariate(3, 1) for _ in range(10000)]
+        self.qs = [0, 0.01, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999, 1]
+
+    def _sketch(self, values, **kwargs):
+        sketch = PercentileSketch(**kwargs)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    def _assert_accurate(self, sketch, values, qs, accuracy=0.01):
+        for q, estimate in zip(qs, sketch.quantiles(qs)):
+            exact = _exact_quantile(values, q)
+            self.assertLessEqual(abs(estimate - exact), exact * accuracy, q)
+
+    def test_quantiles(self):
+        sketch = self._sketch(self.values)
+        self._assert_accurate(sketch, self.values, self.qs)
+        self.assertEqual(sketch.count, 10000)
+        self.assertEqual(sketch.minimum, min(self.values))
+        self.assertEqual(sketch.quantile(1), max(self.values))
+        self.assertAlmostEqual(sketch.mean, sum(self.values) / 10000)
+
+    def test_zero(self):
+        sketch = self._sketch([0, 0, 0, 5])
+        self.assertEqual(sketch.quantiles([0, 0.5, 1]), [0.0, 0.0, 5])
+        for value in (-1, float("nan")):
+            with self.assertRaises(ValueError):
+                sketch.add(value)
+        self.assertEqual(PercentileSketch().quantile(0.5), None)
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+    def test_merge(self):
+        sketch = self._sketch(self.values[:3000])
+        sketch.merge(self._sketch(self.values[3000:]))
+        self.assertEqual(sketch.count, 10000)
+        self.assertEqual(
+            sketch.quantiles(self.qs), self._sketch(self.values).quantiles(self.qs)
+        )
+        with self.assertRaises(ValueError):
+            sketch.merge(PercentileSketch(relative_accuracy=0.02))
+
+    def test_bounded(self):
+        values = [10**-exponent for exponent in range(3, 9)] * 10 + self.values
+        sketch = self._sketch(values, max_bins=200)
+        self.assertEqual(len(sketch._bins), 200)
+        # Only the lowest values lose accuracy
+        self._assert_accurate(sketch, values, [0.5, 0.95, 0.99])
+        self.assertGreater(sketch.quantile(0.01), _exact_quantile(values, 0.01))
+
+    def test_serialise(self):
+        sketch = self._sketch(self.values)
+        data = sketch.to_bytes()
+        self.assertEqual(PercentileSketch.from_bytes(data), sketch)
+        self.assertLess(len(data), len(sketch._bins) * 4 + 64)
+        self.assertEqual(
+            PercentileSketch.from_bytes(PercentileSketch().to_bytes()),
+            PercentileSketch(),
+        )
+        for invalid in (data[:-1], data + b"\x00", b""):
+            with self.assertRaises(ValueError):
+                PercentileSketch.from_bytes(invalid)
+
+
+class PercentileAggregatorTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.results = [
+            make_example_result(LatencyMeasurementResult)._replace(
+                host="a.com", average_latency=float(index)
+            )
+            for index in range(1, 101)
+        ]
+        self.results.append(
+            LatencyIndividualMeasurementResult(
+                id="1",
+                errors=[],
+                host="a.com",
+                packet_size="64",
+                packet_size_unit=StorageUnit.bytes,
+                reverse_dns_address="a.com",
+                ip_address="1.1.1.1",
+                icmp_sequence="1",
+                time_to_live="64",
+                elapsed_time="6.21",
+                elapsed_time_unit=TimeUnit.millisecond,
+            )
+        )
+        self.results.append(
+            make_example_result(DownloadSpeedMeasurementResult)._replace(
+                url="http://b.com/file",
+                download_rate=80.0,
+                download_rate_unit=NetworkUnit.megabit_per_second,
+            )
+        )
+
+    def test_add(self):
+        aggregator = PercentileAggregator()
+        aggregator.add(self.results)
+        self.assertEqual(
+            list(aggregator.report()),
+            [
+                ("average_latency", "a.com"),
+                ("download_rate", "http://b.com/file"),
+                ("latency", "a.com"),
+            ],
+        )
+        p50, p99 = aggregator.quantiles("average_latency", "a.com", [0.5, 0.99])
+        self.assertAlmostEqual(p50, 0.05, delta=0.05 * 0.01)
+        self.assertAlmostEqual(p99, 0.099, delta=0.099 * 0.01)
+        self.assertAlmostEqual(
+            aggregator.quantiles("latency", "a.com", [0.5])[0], 0.00621
+        )
+        self.assertEqual(
+            aggregator.quantiles("download_rate", "http://b.com/file", [0.5]), [8e7]
+        )
+        self.assertEqual(aggregator.quantiles("latency", "b.com"), [None] * 3)
+
+    def test_merge_and_serialise(self):
+        first = PercentileAggregator()
+        first.add(self.results[:50])
+        second = PercentileAggregator()
+        second.add(self.results[50:])
+        merged = PercentileAggregator.from_bytes(first.to_bytes())
+        merged.merge(PercentileAggregator.from_bytes(second.to_bytes()))
+        expected = PercentileAggregator()
+        expected.add(self.results)
+        self.assertEqual(merged.report(), expected.report())
+        self.assertEqual(PercentileAggregator.from_bytes(expected.to_bytes()), expected)
@@ -0,0 +1,90 @@
+import pickle
+import time
+from unittest import TestCase
+
+from measurement import aio
+from measurement.measurements import BaseMeasurement
+from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.results import MeasurementResult, Timing, decode, dumps, encode, loads
+from measurement.runner import MeasurementRunner
+from measurement.timing import Stopwatch, attach_timing, get_start_time, timed
+
+
+class TimedMeasurement(BaseMeasurement):
+    def measure(self, deadline=None):
+        return [self._get_result(), MeasurementResult(id=self.id, errors=[])]
+
+    @timed
+    def _get_result(self):
+        time.sleep(0.01)
+        return MeasurementResult(id=self.id, errors=[])
+
+    @timed
+    async def measure_async(self, deadline=None):
+        return [MeasurementResult(id=self.id, errors=[])]
+
+
+class FailingMeasurement(BaseMeasurement):
+    def measure(self, deadline=None):
+        raise RuntimeError()
+
+
+class TimingTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.timing = Timing(
+            start_time=1000.0, end_time=1000.5, start_ns=10**9, end_ns=15 * 10**8
+        )
+
+    def test_stopwatch(self):
+        before = time.time()
+        stopwatch = Stopwatch()
+        time.sleep(0.01)
+        timing = stopwatch.stop()
+        self.assertGreaterEqual(timing.elapsed, 0.01)
+        self.assertGreaterEqual(timing.start_time, before)
+        # Unix timestamps only have microsecond precision as floats
+        self.assertAlmostEqual(
+            timing.end_time - timing.start_time, timing.elapsed, places=5
+        )
+
+    def test_nested(self):
+        start = time.time()
+        nested, outer = TimedMeasurement("1")._measure(None)
+        self.assertGreaterEqual(nested.timing.elapsed, 0.01)
+        self.assertGreaterEqual(nested.timing.start_time, start)
+        # Stamped by the whole call, which started first
+        self.assertLess(outer.timing.start_ns, nested.timing.start_ns)
+        self.assertGreater(outer.timing.end_ns, nested.timing.end_ns)
+
+    def test_async(self):
+        results = aio.run(TimedMeasurement("1").measure_async())
+        self.assertIsInstance(results[0].timing, Timing)
+
+    def test_plugin(self):
+        results = LatencyMeasurement("1", "example.com")._get_latency_results(None)
+        self.assertIsInstance(results[0].timing, Timing)
+
+    def test_runner_error(self):
+        result = MeasurementRunner([FailingMeasurement("1")]).run()[0][0]
+        self.assertEqual(result.errors[0].key, "runner-err")
+        self.assertIsInstance(result.timing, Timing)
+
+    def test_attach(self):
+        result = MeasurementResult(id="1", errors=[])
+        self.assertIsNone(result.timing)
+        self.assertIsNone(get_start_time(result))
+        attach_timing([result, None], self.timing)
+        attach_timing(result, self.timing._replace(start_time=0))
+        self.assertEqual(result.timing, self.timing)
+        self.assertEqual(get_start_time(result), 1000.0)
+        self.assertEqual(result, MeasurementResult(id="1", errors=[]))
+        self.assertEqual(result._replace(id="2").timing, self.timing)
+
+    def test_serialised(self):
+        result = attach_timing(MeasurementResult(id="1", errors=[]), self.timing)
+        self.assertEqual(encode(result)["timing"], list(self.timing))
+        self.assertEqual(decode(encode(result)).timing, self.timing)
+        self.assertEqual(loads(dumps([result]))[0].timing, self.timing)
+        self.assertEqual(pickle.loads(pickle.dumps(result)).timing, self.timing)
+        self.assertNotIn("timing", encode(MeasurementResult(id="1", errors=[])))
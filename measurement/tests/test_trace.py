@@ -0,0 +1,76 @@
+import threading
+from unittest import TestCase
+
+from measurement.results import Error, MeasurementResult
+from measurement.trace import (
+    MeasurementTrace,
+    attach_trace,
+    phase,
+    record_bytes,
+    record_subprocess,
+)
+
+
+class MeasurementTraceTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.trace = MeasurementTrace()
+
+    def test_phase_records_timing(self):
+        with self.trace.phase("download"):
+            sum(range(10000))
+        self.assertEqual(len(self.trace.phases), 1)
+        recorded = self.trace.phases[0]
+        self.assertEqual(recorded.name, "download")
+        self.assertGreater(recorded.wall_time, 0)
+        self.assertGreaterEqual(recorded.cpu_time, 0)
+        self.assertEqual(recorded.bytes_transferred, 0)
+        self.assertEqual(recorded.subprocess_count, 0)
+
+    def test_nested_phases_count_towards_outer_phase(self):
+        with self.trace.phase("outer"):
+            record_bytes(10)
+            with self.trace.phase("inner"):
+                record_bytes(5)
+                record_subprocess()
+        self.assertEqual([p.name for p in self.trace.phases], ["inner", "outer"])
+        inner, outer = self.trace.phases
+        self.assertEqual((inner.bytes_transferred, inner.subprocess_count), (5, 1))
+        self.assertEqual((outer.bytes_transferred, outer.subprocess_count), (15, 1))
+        self.assertGreaterEqual(outer.wall_time, inner.wall_time)
+
+    def test_phase_recorded_when_raising(self):
+        with self.assertRaises(ValueError):
+            with self.trace.phase("failing"):
+                raise ValueError()
+        self.assertEqual(self.trace.get_phases("failing")[0].name, "failing")
+
+    def test_counters_are_per_thread(self):
+        def other_thread():
+            record_bytes(100)
+            record_subprocess()
+
+        with self.trace.phase("download"):
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            thread.join()
+        self.assertEqual(self.trace.phases[0].bytes_transferred, 0)
+        self.assertEqual(self.trace.phases[0].subprocess_count, 0)
+
+    def test_phase_without_trace(self):
+        with phase(None, "download"):
+            record_bytes(10)
+        self.assertEqual(self.trace.phases, [])
+
+    def test_attach_trace(self):
+        result = MeasurementResult(id="test", errors=[])
+        results = attach_trace([result], self.trace)
+        self.assertIs(results[0].trace, self.trace)
+        self.assertEqual(result, MeasurementResult(id="test", errors=[]))
+
+    def test_attach_no_trace(self):
+        result = MeasurementResult(
+            id="test", errors=[Error(key="err", description="", traceback=None)]
+        )
+        self.assertIs(attach_trace(result, None), result)
+        self.assertIsNone(result.trace)
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from measurement import tracebacks
+from measurement.plugins.latency.measurements import LatencyMeasurement
+from measurement.tracebacks import (
+    MARKER_REGEX,
+    TracebackStore,
+    cap_traceback,
+    configure,
+    get_full_traceback,
+)
+
+
+class TracebacksTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        configure(head=10, tail=5)
+        self.addCleanup(configure)
+        self.traceback = "".join(str(index % 10) for index in range(100))
+
+    def test_short(self):
+        traceback = "0123456789abcde"
+        self.assertEqual(cap_traceback(traceback), traceback)
+        self.assertEqual(get_full_traceback(traceback), traceback)
+        self.assertIsNone(cap_traceback(None))
+
+    def test_capped(self):
+        capped = cap_traceback(self.traceback)
+        self.assertTrue(capped.startswith("0123456789\n[... 85 characters omitted"))
+        self.assertTrue(capped.endswith(" ...]\n56789"))
+        self.assertEqual(
+            MARKER_REGEX.search(capped).group(2),
+            hashlib.sha256(self.traceback.encode()).hexdigest(),
+        )
+        self.assertEqual(get_full_traceback(capped), self.traceback)
+
+    def test_interned(self):
+        first = cap_traceback(self.traceback)
+        self.assertIs(cap_traceback("".join(list(self.traceback))), first)
+        short = "".join(["ping: ", "unknown host"])
+        self.assertIs(cap_traceback("ping: unknown host"), cap_traceback(short))
+
+    def test_plugin_error(self):
+        output = "PING example.com\n" + "64 bytes from example.com\n" * 1000
+        result = LatencyMeasurement("1", "example.com")._get_latency_error(
+            "ping-split", "example.com", traceback=output
+        )
+        self.assertLess(len(result.errors[0].traceback), 200)
+        self.assertEqual(get_full_traceback(result.errors[0].traceback), output)
+
+    def test_memory_store(self):
+        store = TracebackStore(size=150)
+        configure(head=10, tail=5, store=store)
+        capped = cap_traceback(self.traceback)
+        cap_traceback("x" * 100)
+        self.assertIsNone(get_full_traceback(capped))
+        self.assertEqual(store.get(hashlib.sha256(b"x" * 100).hexdigest()), "x" * 100)
+
+    def test_directory_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        configure(head=10, tail=5, store=TracebackStore(directory))
+        capped = cap_traceback(self.traceback)
+        self.assertEqual(len(os.listdir(directory)), 1)
+        # Read back by a new store, as another process would
+        configure(head=10, tail=5, store=TracebackStore(directory))
+        self.assertEqual(get_full_traceback(capped), self.traceback)
+        self.assertEqual(tracebacks.get_store().directory, directory)
@@ -0,0 +1,151 @@
+import array
+from unittest import TestCase, skipIf
+
+from measurement.batch import FLOAT, ResultBatch
+from measurement.plugins.download_speed.results import DownloadSpeedMeasurementResult
+from measurement.plugins.latency.results import LatencyIndividualMeasurementResult
+from measurement.results import Timing
+from measurement.timing import attach_timing
+from measurement.units import (
+    NetworkUnit,
+    StorageUnit,
+    TimeUnit,
+    convert,
+    convert_array,
+    convert_codes,
+    get_factor,
+    get_unit,
+    normalise,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _download_result(rate, rate_unit, size=None, size_unit=None):
+    return DownloadSpeedMeasurementResult(
+        id="1",
+        errors=[],
+        url="http://example.com/",
+        download_size=size,
+        download_size_unit=size_unit,
+        download_rate=rate,
+        download_rate_unit=rate_unit,
+    )
+
+
+class ConvertTestCase(TestCase):
+    def test_convert(self):
+        self.assertAlmostEqual(convert(6.21, TimeUnit.millisecond), 0.00621)
+        self.assertEqual(convert(2, TimeUnit.hour, TimeUnit.minute), 120)
+        self.assertEqual(
+            convert(3.5, "Mibit/s", NetworkUnit.kilobit_per_second), 3670.016
+        )
+        self.assertEqual(convert(1, NetworkUnit.byte_per_second), 8)
+        self.assertEqual(convert(1, StorageUnit.kibibyte, "kbit"), 8.192)
+        # The ping parser stores the individual results as strings
+        self.assertEqual(convert("64", StorageUnit.bytes, StorageUnit.bit), 512)
+        self.assertIsNone(convert(None, TimeUnit.second))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError) as context:
+            get_factor(TimeUnit.millisecond, StorageUnit.bytes)
+        self.assertEqual(str(context.exception), "Cannot convert ms to B")
+        with self.assertRaises(ValueError):
+            get_unit("furlong/fortnight")
+        with self.assertRaises(ValueError):
+            convert("fast", NetworkUnit.bit_per_second)
+
+    def test_convert_array(self):
+        self.assertEqual(
+            convert_array([1, 2.5], TimeUnit.minute),
+            array.array("d", [60, 150]),
+        )
+        self.assertEqual(
+            convert_codes(
+                [1, 1, 1],
+                [
+                    list(NetworkUnit).index(NetworkUnit.kibibit_per_second),
+                    -1,
+                    list(NetworkUnit).index(NetworkUnit.byte_per_second),
+                ],
+                NetworkUnit,
+            ),
+            array.array("d", [1024, 1, 8]),
+        )
+
+    @skipIf(numpy is None, "numpy is not installed")
+    def test_convert_array_numpy(self):
+        converted = convert_array(numpy.array([1, 2.5]), TimeUnit.minute)
+        self.assertEqual(converted.dtype, numpy.float64)
+        self.assertEqual(converted.tolist(), [60, 150])
+        converted = convert_codes(
+            numpy.array([1.0, 1.0]), numpy.array([4, -1], dtype=numpy.int8), NetworkUnit
+        )
+        self.assertEqual(converted.tolist(), [2**20, 1])
+
+    def test_normalise(self):
+        timing = Timing(start_time=500.0, end_time=501.0, start_ns=0, end_ns=10**9)
+        result = attach_timing(
+            _download_result(
+                2.5, NetworkUnit.mebibit_per_second, 1, StorageUnit.megabyte
+            ),
+            timing,
+        )
+        normalised = normalise(result)
+        self.assertEqual(
+            normalised,
+            _download_result(
+                2.5 * 2**20, NetworkUnit.bit_per_second, 10**6, StorageUnit.bytes
+            ),
+        )
+        self.assertEqual(normalised.timing, timing)
+        result = _download_result(None, None)
+        self.assertIs(normalise(result), result)
+
+    def test_normalise_strings(self):
+        result = LatencyIndividualMeasurementResult(
+            id="1",
+            errors=[],
+            host="a.com",
+            packet_size="64",
+            packet_size_unit=StorageUnit.bytes,
+            reverse_dns_address="a.com",
+            ip_address="1.1.1.1",
+            icmp_sequence="1",
+            time_to_live="64",
+            elapsed_time="6.21",
+            elapsed_time_unit=TimeUnit.millisecond,
+        )
+        normalised = normalise(result)
+        self.assertAlmostEqual(normalised.elapsed_time, 0.00621)
+        self.assertEqual(normalised.elapsed_time_unit, TimeUnit.second)
+        self.assertEqual(normalised.packet_size, 64)
+
+
+class BatchNormaliseTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.results = [
+            _download_result(
+                2.0, NetworkUnit.kibibit_per_second, 1.0, StorageUnit.kibibyte
+            ),
+            _download_result(None, None),
+            _download_result(1.5, NetworkUnit.mebibit_per_second, 8.0, StorageUnit.bit),
+        ]
+        self.batch = ResultBatch.from_results(self.results)
+
+    def test_normalise(self):
+        normalised = self.batch.normalise()
+        self.assertEqual(list(normalised), [normalise(r) for r in self.results])
+        self.assertEqual(normalised.kind("download_rate"), FLOAT)
+        # The original batch is unchanged
+        self.assertEqual(list(self.batch), self.results)
+
+    @skipIf(numpy is None, "numpy is not installed")
+    def test_normalise_numpy(self):
+        columns = self.batch.normalise().to_numpy()
+        self.assertEqual(columns["download_rate"][0], 2048)
+        self.assertEqual(columns["download_rate"][2], 1.5 * 2**20)
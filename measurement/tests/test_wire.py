@@ -0,0 +1,116 @@
+from unittest import TestCase, skipIf
+
+from measurement.plugins.ip_route.results import IPRouteMeasurementResult
+from measurement.plugins.latency.results import LatencyIndividualMeasurementResult
+from measurement.results import Error, dumps
+from measurement.tests.test_results import PLUGIN_RESULT_TYPES, make_example_result
+from measurement.units import StorageUnit, TimeUnit
+from measurement.wire import WireReader, WireWriter, decode_results, encode_results
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _individual_result(sequence):
+    # The ping parser stores the individual results as strings
+    return LatencyIndividualMeasurementResult(
+        id="1",
+        errors=[],
+        host="example.com",
+        packet_size="64",
+        packet_size_unit=StorageUnit.bytes,
+        reverse_dns_address="example.com",
+        ip_address="93.184.216.34",
+        icmp_sequence=str(sequence),
+        time_to_live="56",
+        elapsed_time="{:.3f}".format(150 + sequence * 0.1),
+        elapsed_time_unit=TimeUnit.millisecond,
+    )
+
+
+class _Pipe(object):
+    """A stream that only returns the bytes written to it so far."""
+
+    def __init__(self):
+        self._data = bytearray()
+
+    def write(self, data):
+        self._data += data
+
+    def flush(self):
+        pass
+
+    def read(self, size):
+        data = bytes(self._data[:size])
+        del self._data[:size]
+        return data
+
+
+class WireTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.results = [
+            make_example_result(result_type) for result_type in PLUGIN_RESULT_TYPES
+        ]
+
+    def test_round_trip(self):
+        self.assertEqual(decode_results(encode_results(self.results)), self.results)
+
+    def test_mismatched_values(self):
+        results = [
+            _individual_result(1),
+            _individual_result(2)._replace(icmp_sequence=True, time_to_live=2**70),
+            _individual_result(3)._replace(
+                errors=[Error(key="ping-err", description="", traceback=1)]
+            ),
+            make_example_result(IPRouteMeasurementResult)._replace(
+                route=[{"hop": 1}], hop_count=2.5
+            ),
+        ]
+        self.assertEqual(decode_results(encode_results(results)), results)
+
+    def test_batches(self):
+        results = [_individual_result(sequence) for sequence in range(10)]
+        results.append(self.results[0])
+        self.assertEqual(decode_results(encode_results(results, batch_size=3)), results)
+
+    def test_compact(self):
+        results = [_individual_result(sequence) for sequence in range(100)]
+        data = encode_results(results)
+        self.assertLess(len(data) * 4, sum(len(dumps(r)) for r in results))
+
+    def test_streaming(self):
+        pipe = _Pipe()
+        writer = WireWriter(pipe)
+        reader = iter(WireReader(pipe, chunk_size=3))
+        for result in self.results:
+            writer.write(result)
+            writer.flush()
+            self.assertEqual(next(reader), result)
+        writer.close()
+        self.assertEqual(list(reader), [])
+
+    @skipIf(zstandard is None, "zstandard is not installed")
+    def test_compressed(self):
+        results = [_individual_result(sequence) for sequence in range(100)]
+        data = encode_results(results, compress=True)
+        self.assertLess(len(data), len(encode_results(results)))
+        self.assertEqual(decode_results(data), results)
+
+        pipe = _Pipe()
+        writer = WireWriter(pipe, compress=True)
+        reader = iter(WireReader(pipe))
+        writer.write(results[0])
+        writer.flush()
+        self.assertEqual(next(reader), results[0])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            decode_results(b"not results")
+        data = encode_results(self.results)
+        with self.assertRaises(ValueError):
+            decode_results(data[:-1])
+        with self.assertRaises(ValueError):
+            decode_results(data.replace(b"DownloadSpeedMeasurementResult", b"X" * 30))
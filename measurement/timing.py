@@ -0,0 +1,101 @@
+"""
+When results were measured.
+
+Every result is stamped with a `Timing` of the sub-measurement that
+produced it as its `timing` attribute:
+
+    >>> result = LatencyMeasurement("1", "1.1.1.1").measure()[0]
+    >>> result.timing.start_time, result.timing.elapsed
+    (1602993600.25, 3.004)
+
+`start_ns` and `end_ns` are readings of `time.perf_counter_ns()`, which
+have nanosecond resolution and are unaffected by changes to the system
+clock, but are only comparable within a process. `start_time` is read
+from the system clock when the sub-measurement starts, and `end_time` is
+derived from it and the monotonic elapsed time, so the clock being
+stepped by NTP during a measurement does not distort its duration.
+
+Measurements stamp their results with the `timed` decorator on the
+methods that perform each sub-measurement. Results that are already
+stamped keep their timing, so the results of nested sub-measurements,
+e.g. the latency tests of a `DownloadSpeedMeasurement`, carry the time
+that sub-measurement ran rather than that of the whole measurement.
+Results left unstamped by a measurement are stamped with the time of the
+whole call by `BaseMeasurement`.
+"""
+
+import asyncio
+import functools
+import time
+
+from measurement.results import MeasurementResult, Timing
+
+try:
+    perf_counter_ns = time.perf_counter_ns
+except AttributeError:  # Python < 3.7
+
+    def perf_counter_ns():
+        return int(time.perf_counter() * 1e9)
+
+
+class Stopwatch(object):
+    """Times a sub-measurement from when it is created."""
+
+    __slots__ = ("start_time", "start_ns")
+
+    def __init__(self):
+        self.start_ns = perf_counter_ns()
+        self.start_time = time.time()
+
+    def stop(self):
+        """Return the `Timing` from the start until now."""
+        end_ns = perf_counter_ns()
+        return Timing(
+            start_time=self.start_time,
+            end_time=self.start_time + (end_ns - self.start_ns) / 1e9,
+            start_ns=self.start_ns,
+            end_ns=end_ns,
+        )
+
+
+def attach_timing(results, timing):
+    """Stamp each result of a measurement that is not stamped yet.
+
+    :param results: A result, or a list of results.
+    :param timing: A `Timing`.
+    :return: `results`, unchanged.
+    """
+    for result in results if isinstance(results, list) else [results]:
+        if isinstance(result, MeasurementResult) and result.timing is None:
+            # Results are immutable; the timing is not a field
+            object.__setattr__(result, "timing", timing)
+    return results
+
+
+def get_start_time(result, default=None):
+    """Return the Unix timestamp a result started being measured at, or
+    `default` if it is not stamped."""
+    timing = getattr(result, "timing", None)
+    return default if timing is None else timing.start_time
+
+
+def timed(method):
+    """Stamp the results returned by a method, or coroutine method, with
+    the time the call took."""
+    if asyncio.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def timed_method(*args, **kwargs):
+            stopwatch = Stopwatch()
+            results = await method(*args, **kwargs)
+            return attach_timing(results, stopwatch.stop())
+
+    else:
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            stopwatch = Stopwatch()
+            results = method(*args, **kwargs)
+            return attach_timing(results, stopwatch.stop())
+
+    return timed_method
@@ -0,0 +1,198 @@
+"""
+Per-phase timing and resource usage of a measurement.
+
+Tracing is opt-in. Setting the `trace` attribute of a measurement to a
+`MeasurementTrace` before calling `measure()` records a `Phase` for each
+named step the measurement performs, e.g. for `DownloadSpeedMeasurement`:
+
+    >>> measurement = DownloadSpeedMeasurement("1", urls)
+    >>> measurement.trace = MeasurementTrace()
+    >>> results = measurement.measure()
+    >>> [(p.name, p.subprocess_count) for p in results[0].trace.phases]
+    [('find_least_latent_url', 2), ('wget', 1), ('latency', 1)]
+
+The trace is attached to each result returned by the measurement as its
+`trace` attribute. Attaching a trace does not change a result's fields,
+so traced and untraced results compare equal.
+
+Phases may be nested, in which case they are recorded in the order they
+complete and the totals of the outer phase include those of the phases
+nested within it. Nested measurements that are not traced themselves
+still count their subprocesses and bytes towards the enclosing phases of
+the same thread. Only the blocking `measure()` and `measure_iter()`
+implementations are instrumented.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Per-thread CPU time where available (Python 3.7+), so that measurements
+# run concurrently by `MeasurementRunner` do not count each other's work
+_cpu_time = getattr(time, "thread_time", time.process_time)
+
+_active_phases = threading.local()
+# Phases are counted towards from every thread they are inherited by
+_counters_lock = threading.Lock()
+
+
+class Phase(
+    collections.namedtuple(
+        "Phase",
+        "name wall_time cpu_time child_cpu_time bytes_transferred subprocess_count",
+    )
+):
+    """The timing and resource usage of one phase of a measurement.
+
+    :param name: The name of the phase.
+    :param wall_time: The monotonic wall time taken, in seconds.
+    :param cpu_time: The CPU time used by the measuring thread, in
+    seconds.
+    :param child_cpu_time: The CPU time used by subprocesses that exited
+    during the phase, including the cost of spawning them, in seconds.
+    `None` where unavailable.
+    :param bytes_transferred: The number of bytes sent and received.
+    :param subprocess_count: The number of subprocesses spawned.
+    """
+
+    __slots__ = ()
+
+
+class _PhaseCounters(object):
+    def __init__(self):
+        self.bytes_transferred = 0
+        self.subprocess_count = 0
+
+
+class MeasurementTrace(object):
+    """Records a `Phase` for each named step of a measurement.
+
+    :param measurement: The name of the traced measurement. Set to the
+    class name of the measurement when it is attached to results, if
+    not provided.
+    """
+
+    def __init__(self, measurement=None):
+        self.measurement = measurement
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record the enclosed block as the phase `name`."""
+        counters = _PhaseCounters()
+        stack = _get_active_phases()
+        stack.append(counters)
+        start_child_cpu_time = _child_cpu_time()
+        start_cpu_time = _cpu_time()
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            wall_time = time.monotonic() - start_time
+            cpu_time = _cpu_time() - start_cpu_time
+            end_child_cpu_time = _child_cpu_time()
+            stack.remove(counters)
+            self.phases.append(
+                Phase(
+                    name=name,
+                    wall_time=wall_time,
+                    cpu_time=cpu_time,
+                    child_cpu_time=(
+                        None
+                        if start_child_cpu_time is None
+                        else end_child_cpu_time - start_child_cpu_time
+                    ),
+                    bytes_transferred=counters.bytes_transferred,
+                    subprocess_count=counters.subprocess_count,
+                )
+            )
+
+    def get_phases(self, name):
+        """Return every recorded phase called `name`."""
+        return [phase for phase in self.phases if phase.name == name]
+
+
+def phase(trace, name):
+    """Record the enclosed block as the phase `name` of `trace`.
+
+    :param trace: A `MeasurementTrace`, or `None` if tracing is off.
+    :param name: The name of the phase.
+    """
+    if trace is None:
+        return _null_phase()
+    return trace.phase(name)
+
+
+@contextlib.contextmanager
+def _null_phase():
+    yield
+
+
+def record_bytes(count):
+    """Count `count` bytes towards the active phases of this thread."""
+    with _counters_lock:
+        for counters in _get_active_phases():
+            counters.bytes_transferred += count
+
+
+def record_subprocess():
+    """Count a subprocess spawn towards the active phases of this thread."""
+    with _counters_lock:
+        for counters in _get_active_phases():
+            counters.subprocess_count += 1
+
+
+def active_phases():
+    """Return the active phases of this thread, for `inherit_phases()`."""
+    return list(_get_active_phases())
+
+
+@contextlib.contextmanager
+def inherit_phases(phases):
+    """Count the enclosed block towards `phases` of another thread.
+
+    :param phases: The result of `active_phases()` in that thread.
+    """
+    stack = _get_active_phases()
+    stack.extend(phases)
+    try:
+        yield
+    finally:
+        for counters in phases:
+            stack.remove(counters)
+
+
+def attach_trace(results, trace):
+    """Attach `trace` to each result of a measurement.
+
+    :param results: A result, or a list of results.
+    :param trace: A `MeasurementTrace`, or `None` if tracing is off.
+    :return: `results`, unchanged.
+    """
+    if trace is None:
+        return results
+    for result in results if isinstance(results, list) else [results]:
+        # Results are immutable; the trace is not a field
+        object.__setattr__(result, "trace", trace)
+    return results
+
+
+def _get_active_phases():
+    try:
+        return _active_phases.stack
+    except AttributeError:
+        _active_phases.stack = []
+        return _active_phases.stack
+
+
+def _child_cpu_time():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
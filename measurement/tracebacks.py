@@ -0,0 +1,175 @@
+"""
+Bounded error tracebacks.
+
+The `traceback` of an `Error` can hold the whole output of a failed
+command, e.g. the stdout of ping or the stderr of wget, which can be
+hundreds of kilobytes. `cap_traceback()` bounds it to its first `head`
+and last `tail` characters, with a marker in between giving the number of
+characters omitted and the SHA-256 digest of the full text:
+
+    Traceback (most recent call last):
+    [... 183021 characters omitted, sha256:9f86d0...0a08 ...]
+    ConnectionError: ...
+
+The full text is kept in the traceback store, from which
+`get_full_traceback()` returns it on demand. By default the store keeps
+up to `STORE_SIZE` characters of tracebacks in memory, dropping the
+least recently stored first; `configure()` can instead give it a
+directory, which the tracebacks are written to, compressed. The daemon's
+worker processes each have their own store, so `--tracebacks DIR` gives
+them a shared directory.
+
+Tracebacks are also interned: capping text equal to a recently capped
+traceback returns the same string, so an error storm of identical
+failures holds one copy in memory, and `measurement.wire` sends it once
+per batch.
+"""
+
+import collections
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+HEAD = 2048
+TAIL = 2048
+# The number of distinct tracebacks interned
+INTERN_SIZE = 256
+# The number of characters of tracebacks kept by a store in memory
+STORE_SIZE = 16 * 1024 * 1024
+
+MARKER = "\n[... {omitted} characters omitted, sha256:{digest} ...]\n"
+MARKER_REGEX = re.compile(
+    r"\[\.\.\. (\d+) characters omitted, sha256:([0-9a-f]{64}) \.\.\.\]"
+)
+
+
+class TracebackStore(object):
+    """Keeps the full text of capped tracebacks by their SHA-256 digest.
+
+    :param directory: A directory to write each traceback to as a gzip
+    file named after its digest, or `None` to keep tracebacks in memory.
+    :param size: The number of characters of tracebacks kept in memory,
+    after which the least recently stored are dropped.
+    """
+
+    def __init__(self, directory=None, size=STORE_SIZE):
+        self.directory = directory
+        self.size = size
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._tracebacks = collections.OrderedDict()
+        self._length = 0
+        self._lock = threading.Lock()
+
+    def put(self, digest, traceback):
+        """Store the full text of a traceback."""
+        if self.directory is not None:
+            path = self._get_path(digest)
+            if not os.path.exists(path):
+                temporary_path = "{path}.{pid}.tmp".format(path=path, pid=os.getpid())
+                with gzip.open(temporary_path, "wt", encoding="utf-8") as f:
+                    f.write(traceback)
+                os.replace(temporary_path, path)
+            return
+        with self._lock:
+            if digest in self._tracebacks:
+                self._tracebacks.move_to_end(digest)
+                return
+            self._tracebacks[digest] = traceback
+            self._length += len(traceback)
+            while self._length > self.size and self._tracebacks:
+                _, dropped = self._tracebacks.popitem(last=False)
+                self._length -= len(dropped)
+
+    def get(self, digest):
+        """Return the full text of a traceback, or `None` if it is not
+        stored."""
+        if self.directory is not None:
+            try:
+                with gzip.open(self._get_path(digest), "rt", encoding="utf-8") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        with self._lock:
+            return self._tracebacks.get(digest)
+
+    def _get_path(self, digest):
+        return os.path.join(self.directory, digest + ".txt.gz")
+
+
+_head = HEAD
+_tail = TAIL
+_store = TracebackStore()
+# Recently capped tracebacks, by their text if short or their digest
+_interned = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def configure(head=HEAD, tail=TAIL, store=None):
+    """Set how tracebacks are capped and where their full text is kept.
+
+    :param head: The number of characters kept from the start.
+    :param tail: The number of characters kept from the end.
+    :param store: A `TracebackStore`, or `None` for a new store in memory.
+    """
+    global _head, _tail, _store
+    with _lock:
+        _head = head
+        _tail = tail
+        _store = store if store is not None else TracebackStore()
+        _interned.clear()
+
+
+def get_store():
+    """Return the `TracebackStore` the full text of tracebacks is kept in."""
+    return _store
+
+
+def cap_traceback(traceback):
+    """Return a traceback capped to its head and tail, and interned.
+
+    Tracebacks that are not strings are returned unchanged.
+    """
+    if not isinstance(traceback, str):
+        return traceback
+    if len(traceback) <= _head + _tail:
+        return _intern(traceback, traceback)
+    digest = hashlib.sha256(traceback.encode("utf-8", "surrogatepass")).hexdigest()
+    with _lock:
+        capped = _interned.get(digest)
+    if capped is not None:
+        return _intern(digest, capped)
+    _store.put(digest, traceback)
+    capped = "".join(
+        [
+            traceback[:_head],
+            MARKER.format(omitted=len(traceback) - _head - _tail, digest=digest),
+            traceback[len(traceback) - _tail :] if _tail else "",
+        ]
+    )
+    return _intern(digest, capped)
+
+
+def get_full_traceback(traceback):
+    """Return the full text of a traceback returned by `cap_traceback()`,
+    or `None` if it was capped and is no longer in the store."""
+    if not isinstance(traceback, str):
+        return traceback
+    match = MARKER_REGEX.search(traceback)
+    if match is None:
+        return traceback
+    return _store.get(match.group(2))
+
+
+def _intern(key, traceback):
+    with _lock:
+        interned = _interned.get(key)
+        if interned is not None:
+            _interned.move_to_end(key)
+            return interned
+        _interned[key] = traceback
+        if len(_interned) > INTERN_SIZE:
+            _interned.popitem(last=False)
+        return traceback
@@ -1,3 +1,26 @@
+"""
+Units of measurement results, and conversion between them.
+
+Each unit converts to the canonical unit of its kind: bit/s for
+`NetworkUnit`, B for `StorageUnit`, s for `TimeUnit` and % for
+`RatioUnit`. The factors between every pair of units of a kind are
+computed once, so `convert()` is a dict lookup and a multiplication:
+
+    >>> convert(6.21, TimeUnit.millisecond)
+    0.00621
+    >>> convert(3.5, "Mibit/s", NetworkUnit.kilobit_per_second)
+    3670.016
+
+`convert_array()` converts many values of one unit, and `convert_codes()`
+many values each with its own unit, given as codes indexing the members
+of the unit as `ResultBatch` stores them. Both take numpy arrays, which
+are converted in one vectorised operation, or any sequence of numbers.
+`normalise()` converts every field of a result that has a `*_unit` field
+to its canonical unit, and `ResultBatch.normalise()` every such column of
+a batch.
+"""
+
+import array
 from enum import Enum
 
 
@@ -37,3 +60,184 @@ class TimeUnit(Enum):
 
 class RatioUnit(Enum):
     percentage = "%"
+
+
+CANONICAL_UNITS = {
+    NetworkUnit: NetworkUnit.bit_per_second,
+    StorageUnit: StorageUnit.bytes,
+    TimeUnit: TimeUnit.second,
+    RatioUnit: RatioUnit.percentage,
+}
+
+# Factors converting each unit to the canonical unit of its kind
+FACTORS = {
+    NetworkUnit.bit_per_second: 1,
+    NetworkUnit.kilobit_per_second: 10**3,
+    NetworkUnit.megabit_per_second: 10**6,
+    NetworkUnit.kibibit_per_second: 2**10,
+    NetworkUnit.mebibit_per_second: 2**20,
+    NetworkUnit.byte_per_second: 8,
+    StorageUnit.bit: 1 / 8,
+    StorageUnit.bytes: 1,
+    StorageUnit.kilobit: 10**3 / 8,
+    StorageUnit.megabit: 10**6 / 8,
+    StorageUnit.kibibit: 2**10 / 8,
+    StorageUnit.mebibit: 2**20 / 8,
+    StorageUnit.kilobyte: 10**3,
+    StorageUnit.megabyte: 10**6,
+    StorageUnit.kibibyte: 2**10,
+    StorageUnit.mebibyte: 2**20,
+    TimeUnit.millisecond: 1 / 1000,
+    TimeUnit.second: 1,
+    TimeUnit.minute: 60,
+    TimeUnit.hour: 60 * 60,
+    TimeUnit.day: 24 * 60 * 60,
+    RatioUnit.percentage: 1,
+}
+# Factors converting each unit to bit/s
+BIT_PER_SECOND_FACTORS = {unit: FACTORS[unit] for unit in NetworkUnit}
+# ping reports latency in milliseconds
+LATENCY_DIVISOR = 1000
+
+# Factors between every pair of units of a kind, by `(from, to)`
+_CONVERSION_FACTORS = {
+    (from_unit, to_unit): (
+        FACTORS[from_unit]
+        if FACTORS[to_unit] == 1
+        else FACTORS[from_unit] / FACTORS[to_unit]
+    )
+    for unit_type in CANONICAL_UNITS
+    for from_unit in unit_type
+    for to_unit in unit_type
+}
+_CONVERSION_FACTORS.update(
+    ((unit, None), FACTORS[unit]) for unit_type in CANONICAL_UNITS for unit in unit_type
+)
+# Units by their values, which are distinct across kinds
+_UNITS_BY_VALUE = {
+    unit.value: unit for unit_type in CANONICAL_UNITS for unit in unit_type
+}
+
+
+def get_unit(unit):
+    """Return the unit `unit` or its value, e.g. `"ms"`, refers to.
+
+    :raises ValueError: If `unit` is not a unit.
+    """
+    if unit in FACTORS:
+        return unit
+    try:
+        return _UNITS_BY_VALUE[unit]
+    except (KeyError, TypeError):
+        raise ValueError("Unknown unit {unit!r}".format(unit=unit))
+
+
+def get_factor(from_unit, to_unit=None):
+    """Return the factor converting values in `from_unit` to `to_unit`.
+
+    :param from_unit: A unit, or its value.
+    :param to_unit: A unit of the same kind, or its value, or `None` for
+    the canonical unit of the kind.
+    :raises ValueError: If the units are unknown or of different kinds.
+    """
+    try:
+        return _CONVERSION_FACTORS[(from_unit, to_unit)]
+    except (KeyError, TypeError):
+        pass
+    from_unit = get_unit(from_unit)
+    to_unit = CANONICAL_UNITS[type(from_unit)] if to_unit is None else get_unit(to_unit)
+    try:
+        return _CONVERSION_FACTORS[(from_unit, to_unit)]
+    except KeyError:
+        raise ValueError(
+            "Cannot convert {from_unit} to {to_unit}".format(
+                from_unit=from_unit.value, to_unit=to_unit.value
+            )
+        )
+
+
+def convert(value, from_unit, to_unit=None):
+    """Convert a value from one unit to another of the same kind.
+
+    :param value: A number, a numeric string as the ping parser stores,
+    or `None`, which is returned unchanged.
+    :param from_unit: The unit of `value`, or its value.
+    :param to_unit: The unit to convert to, or its value, or `None` for
+    the canonical unit of the kind.
+    :raises ValueError: If the units are unknown or of different kinds,
+    or `value` is not a number.
+    """
+    if value is None:
+        return None
+    return float(value) * get_factor(from_unit, to_unit)
+
+
+def convert_array(values, from_unit, to_unit=None):
+    """Convert many values of one unit to another of the same kind.
+
+    :param values: A numpy array, or any sequence of numbers.
+    :return: A numpy array of `float64` if `values` is a numpy array, or
+    otherwise an `array.array` of doubles.
+    """
+    factor = get_factor(from_unit, to_unit)
+    if _is_numpy_array(values):
+        return values * float(factor)
+    return array.array("d", [value * factor for value in values])
+
+
+def convert_codes(values, codes, unit_type, to_unit=None):
+    """Convert many values, each with its own unit, to one unit.
+
+    :param values: A numpy array, or any sequence of numbers.
+    :param codes: The unit of each value as the index of a member of
+    `unit_type`, or `-1` where it is unknown, in which case the value is
+    left unchanged. A numpy array, or any sequence of integers.
+    :param unit_type: The kind of the units, e.g. `NetworkUnit`.
+    :param to_unit: The unit to convert to, or `None` for the canonical
+    unit of `unit_type`.
+    :return: A numpy array of `float64` if `values` is a numpy array, or
+    otherwise an `array.array` of doubles.
+    """
+    to_unit = CANONICAL_UNITS[unit_type] if to_unit is None else get_unit(to_unit)
+    # The factor of each code, with `-1` indexing the last, for no unit
+    factors = [get_factor(unit, to_unit) for unit in unit_type] + [1.0]
+    if _is_numpy_array(values):
+        import numpy
+
+        factors = numpy.array(factors, dtype=numpy.float64)
+        return values * factors[numpy.asarray(codes, dtype=numpy.intp)]
+    return array.array(
+        "d", [value * factors[code] for value, code in zip(values, codes)]
+    )
+
+
+def get_unit_fields(result_type):
+    """Return the `(field, unit field)` of each field of a result type
+    that has a `*_unit` field."""
+    return [
+        (name[: -len("_unit")], name)
+        for name in result_type._fields
+        if name.endswith("_unit") and name[: -len("_unit")] in result_type._fields
+    ]
+
+
+def normalise(result):
+    """Return a copy of a result with every field that has a `*_unit`
+    field converted to the canonical unit of its kind.
+
+    Values without a unit are left unchanged.
+    """
+    fields = result._asdict()
+    changes = {}
+    for name, unit_name in get_unit_fields(type(result)):
+        unit = fields[unit_name]
+        if unit is None or fields[name] is None:
+            continue
+        unit = get_unit(unit)
+        changes[name] = convert(fields[name], unit)
+        changes[unit_name] = CANONICAL_UNITS[type(unit)]
+    return result._replace(**changes) if changes else result
+
+
+def _is_numpy_array(values):
+    return type(values).__module__.split(".")[0] == "numpy"
@@ -0,0 +1,500 @@
+"""
+A compact binary format for streams of results.
+
+Results are written to the stream as they are produced, so a probe can
+upload them over a metered link without first collecting a whole batch
+of JSON:
+
+    >>> with open("results.hbw", "wb") as f, WireWriter(f, compress=True) as writer:
+    ...     for result in measurement.measure_iter():
+    ...         writer.write(result)
+    >>> with open("results.hbw", "rb") as f:
+    ...     results = list(WireReader(f))
+
+A stream is a header followed by items, each introduced by a tag byte:
+
+ - A batch item starts a batch of up to `batch_size` records, clearing
+   the schemas and string table of the previous batch, so that each
+   batch can be decoded on its own.
+ - A schema item describes a result type the first time it appears in a
+   batch: its name, and the name and kind of each field, with the values
+   of the members of unit fields.
+ - A record item holds one result: the index of its schema, two bits per
+   field giving the state of the value, and the values of the fields
+   that are not `None`.
+
+Numbers are fixed-width little-endian doubles and 64-bit integers, units
+are one byte indexing the members listed in the schema, and errors are a
+count followed by their fields. Strings are varints indexing the batch's
+string table, with a string's first use followed by its UTF-8 bytes, so
+a host repeated across results is sent once per batch. A value that
+does not match its field's type, e.g. a string in a `float` field, is
+written as a string or with the `"json"` codec of `measurement.results`,
+so no value is lost. An `int` in a `float` field is read back as an
+equal `float`, and tuples as lists.
+
+With `compress=True` the items are compressed in a single zstd frame,
+which requires the zstandard package. `WireWriter.flush()` ends a zstd
+block, so everything written so far can be decoded by the reader.
+"""
+
+import enum
+import io
+import json
+import struct
+
+from measurement.results import (
+    Error,
+    decode,
+    encode,
+    get_result_type,
+    unwrap_optional,
+)
+
+MAGIC = b"HBMW"
+VERSION = 1
+FLAG_ZSTD = 0x01
+BATCH_SIZE = 1000
+# The number of buffered bytes at which the writer writes to the stream,
+# and the number of bytes the reader reads at a time
+CHUNK_SIZE = 65536
+ZSTD_LEVEL = 3
+
+# Item tags
+_BATCH = 0x01
+_SCHEMA = 0x02
+_RECORD = 0x03
+
+# Field kinds
+FLOAT = 1
+INT = 2
+ENUM = 3
+STRING = 4
+ERRORS = 5
+OBJECT = 6
+
+# The states of the value of a field in a record
+_NONE = 0
+_NATIVE = 1
+_STRING = 2
+_OBJECT = 3
+
+_DOUBLE = struct.Struct("<d")
+_INT64 = struct.Struct("<q")
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+
+class _Incomplete(Exception):
+    """Raised when an item continues past the end of the data read."""
+
+
+class WireWriter(object):
+    """Writes results to a binary stream.
+
+    :param stream: A binary file object to write to. It is not closed by
+    `close()`.
+    :param compress: Whether to compress the stream with zstd.
+    :param batch_size: The number of records in each batch.
+    :param level: The zstd compression level.
+    """
+
+    def __init__(self, stream, compress=False, batch_size=BATCH_SIZE, level=ZSTD_LEVEL):
+        self._stream = stream
+        self._batch_size = batch_size
+        self._compressor = None
+        if compress:
+            import zstandard
+
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        stream.write(MAGIC + bytes([VERSION, FLAG_ZSTD if compress else 0]))
+        self._buffer = bytearray()
+        self._count = 0
+        # Schemas of the batch by result type, as their index and the kind
+        # and unit member codes of each field
+        self._schemas = {}
+        self._strings = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, result):
+        """Add a result to the stream."""
+        if self._count % self._batch_size == 0:
+            self._buffer.append(_BATCH)
+            self._schemas.clear()
+            self._strings.clear()
+        schema = self._schemas.get(result.__class__)
+        if schema is None:
+            schema = self._write_schema(result.__class__)
+        index, fields = schema
+        buffer = self._buffer
+        buffer.append(_RECORD)
+        _write_varint(buffer, index)
+        states = bytearray((len(fields) + 3) // 4)
+        values = bytearray()
+        for position, ((kind, members), value) in enumerate(
+            zip(fields, result._values(result))
+        ):
+            if value is not None:
+                state = self._write_value(values, kind, members, value)
+                states[position >> 2] |= state << ((position & 3) << 1)
+        buffer += states
+        buffer += values
+        self._count += 1
+        if len(buffer) >= CHUNK_SIZE:
+            self._write_buffer()
+
+    def flush(self):
+        """Write any buffered records to the stream and flush it."""
+        self._write_buffer()
+        if self._compressor is not None:
+            self._stream.write(self._compressor.flush(self._flush_block))
+        self._stream.flush()
+
+    def close(self):
+        """Write any buffered records, ending the zstd frame if compressed."""
+        self._write_buffer()
+        if self._compressor is not None:
+            self._stream.write(self._compressor.flush())
+            self._compressor = None
+        self._stream.flush()
+
+    def _write_buffer(self):
+        if not self._buffer:
+            return
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._stream.write(data)
+
+    def _write_schema(self, result_type):
+        buffer = self._buffer
+        index = len(self._schemas)
+        buffer.append(_SCHEMA)
+        _write_varint(buffer, index)
+        self._write_string(buffer, result_type.__name__)
+        _write_varint(buffer, len(result_type._fields))
+        fields = []
+        for name, field_type in result_type._field_types.items():
+            kind, members = _get_field_kind(field_type)
+            self._write_string(buffer, name)
+            buffer.append(kind)
+            if kind == ENUM:
+                _write_varint(buffer, len(members))
+                for member in members:
+                    self._write_string(buffer, member.value)
+                members = {member: code for code, member in enumerate(members)}
+            fields.append((kind, members))
+        schema = self._schemas[result_type] = (index, fields)
+        return schema
+
+    def _write_value(self, buffer, kind, members, value):
+        value_type = value.__class__
+        if kind == FLOAT:
+            if value_type is float or value_type is int:
+                buffer += _DOUBLE.pack(value)
+                return _NATIVE
+        elif kind == INT:
+            if value_type is int and _INT64_MIN <= value <= _INT64_MAX:
+                buffer += _INT64.pack(value)
+                return _NATIVE
+        elif kind == ENUM:
+            code = members.get(value) if isinstance(value, enum.Enum) else None
+            if code is not None:
+                buffer.append(code)
+                return _NATIVE
+        elif kind == STRING:
+            if value_type is str:
+                self._write_string(buffer, value)
+                return _NATIVE
+        elif kind == ERRORS:
+            if value_type is list and all(_is_plain_error(e) for e in value):
+                _write_varint(buffer, len(value))
+                for error in value:
+                    self._write_string(buffer, error.key)
+                    self._write_string(buffer, error.description)
+                    self._write_string(buffer, error.traceback)
+                return _NATIVE
+        if value_type is str:
+            self._write_string(buffer, value)
+            return _STRING
+        data = json.dumps(encode(value), separators=(",", ":")).encode("utf-8")
+        _write_varint(buffer, len(data))
+        buffer += data
+        return _OBJECT
+
+    def _write_string(self, buffer, value):
+        # 0 is `None`, 1 is a new string, and 2 onwards index the table
+        if value is None:
+            buffer.append(0)
+            return
+        index = self._strings.get(value)
+        if index is not None:
+            _write_varint(buffer, index + 2)
+            return
+        self._strings[value] = len(self._strings)
+        data = value.encode("utf-8", "surrogatepass")
+        buffer.append(1)
+        _write_varint(buffer, len(data))
+        buffer += data
+
+
+class WireReader(object):
+    """Iterates over the results in a binary stream written by `WireWriter`.
+
+    Results are yielded as soon as they have been read, so the stream can
+    be read while it is being written, e.g. from a socket.
+
+    :param stream: A binary file object to read from.
+    :param chunk_size: The number of bytes to read at a time.
+    :raises ValueError: While iterating, if the stream is not a results
+    stream, is truncated, or holds a result type that is not known.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decompressor = None
+        # Schemas of the batch, as the result type, the name, kind and
+        # unit members of each field, and whether the fields match the type
+        self._schemas = []
+        self._strings = []
+
+    def __iter__(self):
+        header = self._stream.read(len(MAGIC) + 2)
+        if len(header) < len(MAGIC) + 2 or header[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a results stream")
+        version, flags = header[len(MAGIC)], header[len(MAGIC) + 1]
+        if version != VERSION:
+            raise ValueError(
+                "Unsupported results stream version {version}".format(version=version)
+            )
+        if flags & FLAG_ZSTD:
+            import zstandard
+
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+        data = b""
+        position = 0
+        for chunk in self._read_chunks():
+            data = data[position:] + chunk
+            position = 0
+            while position < len(data):
+                string_count = len(self._strings)
+                try:
+                    result, position = self._read_item(data, position)
+                except _Incomplete:
+                    # Strings of the incomplete item are read again
+                    del self._strings[string_count:]
+                    break
+                if result is not None:
+                    yield result
+        if position < len(data):
+            raise ValueError("Results stream is truncated")
+
+    def _read_chunks(self):
+        while True:
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                return
+            if self._decompressor is not None:
+                chunk = self._decompressor.decompress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+    def _read_item(self, data, position):
+        tag = data[position]
+        position += 1
+        if tag == _RECORD:
+            return self._read_record(data, position)
+        if tag == _SCHEMA:
+            return None, self._read_schema(data, position)
+        if tag == _BATCH:
+            del self._schemas[:]
+            del self._strings[:]
+            return None, position
+        raise ValueError("Unknown item tag {tag}".format(tag=tag))
+
+    def _read_schema(self, data, position):
+        index, position = _read_varint(data, position)
+        name, position = self._read_string(data, position)
+        count, position = _read_varint(data, position)
+        fields = []
+        for _ in range(count):
+            field_name, position = self._read_string(data, position)
+            kind = _read_bytes(data, position, 1)[0]
+            position += 1
+            members = None
+            if kind == ENUM:
+                member_count, position = _read_varint(data, position)
+                members = []
+                for _ in range(member_count):
+                    value, position = self._read_string(data, position)
+                    members.append(value)
+            fields.append((field_name, kind, members))
+        result_type = get_result_type(name)
+        for field_name, kind, members in fields:
+            unit = unwrap_optional(result_type._field_types.get(field_name))
+            # Units are matched by value, so members may be reordered, and
+            # are left as values if the field is no longer a unit
+            if kind == ENUM and isinstance(unit, type) and issubclass(unit, enum.Enum):
+                members[:] = [_get_member(unit, value) for value in members]
+        names = tuple(field_name for field_name, _, _ in fields)
+        schema = (result_type, fields, names == result_type._fields)
+        if index == len(self._schemas):
+            self._schemas.append(schema)
+        else:
+            raise ValueError("Unexpected schema {index}".format(index=index))
+        return position
+
+    def _read_record(self, data, position):
+        index, position = _read_varint(data, position)
+        try:
+            result_type, fields, positional = self._schemas[index]
+        except IndexError:
+            raise ValueError("Unknown schema {index}".format(index=index))
+        states = _read_bytes(data, position, (len(fields) + 3) // 4)
+        position += len(states)
+        values = []
+        for field_position, (_, kind, members) in enumerate(fields):
+            state = (states[field_position >> 2] >> ((field_position & 3) << 1)) & 3
+            if state == _NONE:
+                value = None
+            elif state == _STRING:
+                value, position = self._read_string(data, position)
+            elif state == _OBJECT:
+                length, position = _read_varint(data, position)
+                value = decode(
+                    json.loads(_read_bytes(data, position, length).decode("utf-8"))
+                )
+                position += length
+            elif kind == FLOAT:
+                value = _DOUBLE.unpack(_read_bytes(data, position, 8))[0]
+                position += 8
+            elif kind == INT:
+                value = _INT64.unpack(_read_bytes(data, position, 8))[0]
+                position += 8
+            elif kind == ENUM:
+                value = members[_read_bytes(data, position, 1)[0]]
+                position += 1
+            elif kind == STRING:
+                value, position = self._read_string(data, position)
+            elif kind == ERRORS:
+                value, position = self._read_errors(data, position)
+            else:
+                raise ValueError("Unknown field kind {kind}".format(kind=kind))
+            values.append(value)
+        if positional:
+            return result_type(*values), position
+        # Fields missing from the stream are `None`, and fields no longer
+        # in the result type are dropped
+        values = dict(zip((name for name, _, _ in fields), values))
+        return (
+            result_type(**{name: values.get(name) for name in result_type._fields}),
+            position,
+        )
+
+    def _read_errors(self, data, position):
+        count, position = _read_varint(data, position)
+        errors = []
+        for _ in range(count):
+            key, position = self._read_string(data, position)
+            description, position = self._read_string(data, position)
+            traceback, position = self._read_string(data, position)
+            errors.append(Error(key=key, description=description, traceback=traceback))
+        return errors, position
+
+    def _read_string(self, data, position):
+        reference, position = _read_varint(data, position)
+        if reference == 0:
+            return None, position
+        if reference > 1:
+            try:
+                return self._strings[reference - 2], position
+            except IndexError:
+                raise ValueError("Unknown string {index}".format(index=reference - 2))
+        length, position = _read_varint(data, position)
+        value = _read_bytes(data, position, length).decode("utf-8", "surrogatepass")
+        self._strings.append(value)
+        return value, position + length
+
+
+def encode_results(results, compress=False, batch_size=BATCH_SIZE):
+    """Return results written to a binary stream by `WireWriter`."""
+    stream = io.BytesIO()
+    with WireWriter(stream, compress=compress, batch_size=batch_size) as writer:
+        for result in results:
+            writer.write(result)
+    return stream.getvalue()
+
+
+def decode_results(data):
+    """Return the results of a binary stream written by `WireWriter`."""
+    return list(WireReader(io.BytesIO(data)))
+
+
+def _get_field_kind(field_type):
+    """Return the kind of a field, and the members of a unit field."""
+    field_type = unwrap_optional(field_type)
+    if field_type is float:
+        return FLOAT, None
+    if field_type is int:
+        return INT, None
+    if field_type is str:
+        return STRING, None
+    if isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+        members = list(field_type)
+        if len(members) <= 256 and all(isinstance(m.value, str) for m in members):
+            return ENUM, members
+    args = getattr(field_type, "__args__", None)
+    if args and args[0] is Error:
+        return ERRORS, None
+    return OBJECT, None
+
+
+def _get_member(unit, value):
+    try:
+        return unit(value)
+    except ValueError:
+        raise ValueError(
+            "Unknown {unit} value {value!r}".format(unit=unit.__name__, value=value)
+        )
+
+
+def _is_plain_error(error):
+    return error.__class__ is Error and all(
+        value is None or value.__class__ is str for value in error._values(error)
+    )
+
+
+def _write_varint(buffer, value):
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, position):
+    result = shift = 0
+    while True:
+        if position >= len(data):
+            raise _Incomplete()
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def _read_bytes(data, position, length):
+    if position + length > len(data):
+        raise _Incomplete()
+    return data[position : position + length]